@@ -0,0 +1,74 @@
+import functools
+import typing as tp
+
+from exceptions import BarcodeBadFormat, TubeBarcodeBadFormat, PlateBarcodeBadFormat
+
+
+@functools.total_ordering
+class Barcode:
+    """
+    Parsed barcode: "NT00042" -> prefix="NT", number=42, width=5
+    width keeps leading zeros, so "NT42" and "NT00042" stay different barcodes
+    """
+    __slots__ = ("prefix", "number", "width")
+
+    def __init__(self, prefix: str, number: int, width: int):
+        self.prefix = prefix
+        self.number = number
+        self.width = width
+
+    def __str__(self) -> str:
+        return f"{self.prefix}{self.number:0{self.width}d}"
+
+    def __repr__(self) -> str:
+        return f"Barcode({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Barcode):
+            return NotImplemented
+        return (self.prefix, self.number, self.width) == (other.prefix, other.number, other.width)
+
+    def __lt__(self, other: "Barcode") -> bool:
+        return (self.prefix, self.number, self.width) < (other.prefix, other.number, other.width)
+
+    def __hash__(self) -> int:
+        return hash((self.prefix, self.number, self.width))
+
+
+class BarcodeCodec:
+    """Parse barcodes of format <prefix><number> without regular expressions"""
+
+    def __init__(self, prefix: str, error: tp.Type[BarcodeBadFormat]):
+        self.prefix = prefix
+        self.error = error
+        self._prefix_length = len(prefix)
+
+    def parse_or_none(self, barcode: str) -> tp.Optional[Barcode]:
+        digits = barcode[self._prefix_length:]
+        # isdigit alone accepts non-ASCII digits like "²"
+        if not barcode.startswith(self.prefix) or not digits.isascii() or not digits.isdigit():
+            return None
+        return Barcode(prefix=self.prefix, number=int(digits), width=len(digits))
+
+    def parse(self, barcode: str) -> Barcode:
+        parsed = self.parse_or_none(barcode)
+        if parsed is None:
+            raise self.error(barcode=barcode)
+        return parsed
+
+    def validate(self, barcode: str) -> bool:
+        return self.parse_or_none(barcode) is not None
+
+    def number(self, barcode: str) -> tp.Optional[int]:
+        """Numeric part for integer-keyed storage, None for barcodes of another format"""
+        parsed = self.parse_or_none(barcode)
+        return None if parsed is None else parsed.number
+
+    def parse_many(self, barcodes: tp.Iterable[str]) -> tp.List[tp.Optional[Barcode]]:
+        """Parse barcodes for bulk imports, None in place of each invalid barcode"""
+        parse_or_none = self.parse_or_none
+        return [parse_or_none(barcode) for barcode in barcodes]
+
+
+tube_barcode_codec = BarcodeCodec(prefix="NT", error=TubeBarcodeBadFormat)
+plate_barcode_codec = BarcodeCodec(prefix="DN", error=PlateBarcodeBadFormat)
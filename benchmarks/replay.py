@@ -0,0 +1,126 @@
+"""
+Replay of command journal against a fresh database
+
+    python -m benchmarks.replay journal.jsonl --backend postgresql --workers 4
+    python -m benchmarks.replay journal.jsonl --paced --speed 2
+"""
+import argparse
+import contextlib
+import io
+import queue
+import sys
+import tempfile
+import threading
+import time
+import typing as tp
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from benchmarks.run import BACKENDS, create_benchmark_engine
+from benchmarks.stats import summarize
+from command_journal import CollectingJournal, JournalEntry, read_journal
+from database.database import DatabaseLayer
+from main import MyCLIApp
+
+
+class ReplayResult:
+    def __init__(self, entries: tp.List[JournalEntry], replayed: tp.List[JournalEntry], elapsed_seconds: float):
+        # replayed[i] is the replay of entries[i]
+        self.entries = entries
+        self.replayed = replayed
+        self.elapsed_seconds = elapsed_seconds
+
+    @property
+    def mismatches(self) -> tp.List[tp.Tuple[JournalEntry, JournalEntry]]:
+        """Commands which outcome differs from the recorded one"""
+        return [(entry, replayed) for (entry, replayed) in zip(self.entries, self.replayed)
+                if (entry.outcome, entry.error) != (replayed.outcome, replayed.error)]
+
+    def summary(self) -> tp.Dict[str, tp.Dict[str, float]]:
+        """Throughput and latency percentiles of all commands ("all") and of every command name"""
+        latencies_by_command: tp.Dict[str, tp.List[float]] = {"all": []}
+        for replayed in self.replayed:
+            latencies_by_command["all"].append(replayed.duration_ms / 1000)
+            latencies_by_command.setdefault(replayed.command, []).append(replayed.duration_ms / 1000)
+
+        return {command: summarize(latencies, self.elapsed_seconds)
+                for (command, latencies) in latencies_by_command.items()}
+
+
+def replay(entries: tp.Sequence[JournalEntry], engine: Engine, workers: int = 1, paced: bool = False,
+           speed: float = 1.0) -> ReplayResult:
+    """
+    Run journal commands through MyCLIApp instances, one app and session per worker thread.
+    Workers take commands in journal order, so with several workers commands of one operator may overtake each other.
+    :param paced: keep original intervals between commands (divided by speed), otherwise run as fast as possible
+    """
+    pending: "queue.Queue[int]" = queue.Queue()
+    for index in range(len(entries)):
+        pending.put(index)
+
+    replayed: tp.List[tp.Optional[JournalEntry]] = [None] * len(entries)
+    first_started_at = entries[0].started_at if entries else None
+    started = time.perf_counter()
+
+    def worker() -> None:
+        with Session(bind=engine) as session:
+            journal = CollectingJournal()
+            app = MyCLIApp(database_layer=DatabaseLayer(session), journal=journal)
+            app.stdout = io.StringIO()
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                if paced and first_started_at is not None:
+                    due = (entries[index].started_at - first_started_at).total_seconds() / speed
+                    delay = started + due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                app.onecmd_plus_hooks(entries[index].line)
+                replayed[index] = journal.entries[-1]
+                # Output is not needed, only outcomes and durations
+                app.stdout.seek(0)
+                app.stdout.truncate()
+
+    # Commands print errors to stderr, replay only reports mismatching outcomes
+    with contextlib.redirect_stderr(io.StringIO()):
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return ReplayResult(list(entries), [tp.cast(JournalEntry, entry) for entry in replayed],
+                        time.perf_counter() - started)
+
+
+def main(argv: tp.Optional[tp.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay command journal against a fresh database")
+    parser.add_argument('journal_path', help='JSONL journal written with PROD_COMMAND_JOURNAL')
+    parser.add_argument('--backend', choices=BACKENDS, default="postgresql")
+    parser.add_argument('--workers', type=int, default=1, help='Concurrent worker threads')
+    parser.add_argument('--paced', action='store_true', help='Keep original intervals between commands')
+    parser.add_argument('--speed', type=float, default=1.0, help='Pace multiplier used with --paced')
+    args = parser.parse_args(argv)
+
+    entries = list(read_journal(args.journal_path))
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_benchmark_engine(args.backend, workdir)
+        try:
+            result = replay(entries, engine, workers=args.workers, paced=args.paced, speed=args.speed)
+        finally:
+            engine.dispose()
+
+    for command, summary in sorted(result.summary().items()):
+        print(f"{command:<22} {summary['count']:>8.0f} commands {summary['throughput_per_second']:>10.1f} ops/s  "
+              f"p50 {summary['p50_ms']:.2f} ms  p95 {summary['p95_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms")
+    print(f"Outcome mismatches: {len(result.mismatches)} of {len(entries)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Benchmarks of DatabaseLayer operations on seeded databases
+
+    python -m benchmarks.run --backends sqlite postgresql --scales 10k 1m 10m --output results.json
+    python -m benchmarks.run --scales 10k --baseline benchmarks/baseline.json --threshold 0.2
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import typing as tp
+
+from dotenv import load_dotenv
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy_utils import database_exists, create_database  # type: ignore
+
+from benchmarks.seed import seed_samples, DEFAULT_PLATE_FILL
+from benchmarks.stats import summarize, find_regressions
+from database.database import DatabaseLayer
+from database.management import CreateEngineAdapter
+from database.scheme import Base
+from env import read_database_credentials_from_env
+from plate_occupancy import WELLS_PER_PLATE, PLATE_COLUMNS
+from reports import WellPositionFormatAdapter
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+BACKENDS = ("sqlite", "postgresql")
+OPERATIONS = ("record_receipt", "add_to_plate", "tube_transfer", "list_samples_in_tube", "list_samples_in_plate",
+              "locate_sample", "list_samples_in_tube_as_of")
+
+Operation = tp.Callable[[DatabaseLayer, int], tp.Any]
+
+
+def create_benchmark_engine(backend: str, workdir: str) -> Engine:
+    """Empty database with fresh tables: SQLite file in workdir or <TEST_DATABASE_NAME>_benchmark on PostgreSQL"""
+    if backend == "sqlite":
+        path = os.path.join(workdir, "benchmark.sqlite")
+        if os.path.exists(path):
+            os.remove(path)
+        engine = create_engine(f"sqlite:///{path}")
+    else:
+        load_dotenv()
+        database_arguments = read_database_credentials_from_env("TEST")
+        database_arguments["database_name"] = f"{database_arguments['database_name']}_benchmark"
+        engine = CreateEngineAdapter.create_engine(**database_arguments)
+        if not database_exists(engine.url):
+            create_database(engine.url)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def build_operations(samples_count: int, plates_count: int, operations_count: int,
+                     random_generator: random.Random) -> tp.Dict[str, Operation]:
+    """
+    Operation of benchmark by name, called with operation index 0..operations_count - 1.
+    New tubes and plates get numbers after seeded ones, so every call succeeds.
+    """
+    tube_numbers = random_generator.sample(range(1, samples_count + 1), operations_count)
+    seeded_until = datetime.datetime.now(datetime.timezone.utc)
+    plate_numbers = [random_generator.randint(1, max(plates_count, 1)) for _ in range(operations_count)]
+
+    def record_receipt(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        return database_layer.record_receipt(f"benchmark {index}", f"NT{samples_count + index + 1}")
+
+    def add_to_plate(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        plate_barcode = f"DN{plates_count + index // WELLS_PER_PLATE + 1}"
+        well_index = index % WELLS_PER_PLATE
+        well_position = WellPositionFormatAdapter.get_string_position(row=well_index // PLATE_COLUMNS + 1,
+                                                                      col=well_index % PLATE_COLUMNS + 1)
+        return database_layer.add_to_plate(tube_numbers[index], plate_barcode, well_position)
+
+    def tube_transfer(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        return database_layer.tube_transfer(f"NT{tube_numbers[index]}",
+                                            f"NT{samples_count + operations_count + index + 1}")
+
+    def list_samples_in_tube(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        # Tubes moved by tube_transfer are listed under their new barcodes
+        return database_layer.list_samples_in(f"NT{samples_count + operations_count + index + 1}")
+
+    def list_samples_in_plate(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        return database_layer.list_samples_in(f"DN{plate_numbers[index]}")
+
+    def locate_sample(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        # Seeded sample ids equal tube numbers
+        return database_layer.locate_sample(tube_numbers[index])
+
+    def list_samples_in_tube_as_of(database_layer: DatabaseLayer, index: int) -> tp.Any:
+        # Seeded tube before it was moved by tube_transfer
+        return database_layer.list_samples_in(f"NT{tube_numbers[index]}", as_of=seeded_until)
+
+    return {
+        "record_receipt": record_receipt,
+        "add_to_plate": add_to_plate,
+        "tube_transfer": tube_transfer,
+        "list_samples_in_tube": list_samples_in_tube,
+        "list_samples_in_plate": list_samples_in_plate,
+        "locate_sample": locate_sample,
+        "list_samples_in_tube_as_of": list_samples_in_tube_as_of,
+    }
+
+
+def measure(database_layer: DatabaseLayer, operation: Operation, operations_count: int) -> tp.Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for index in range(operations_count):
+        operation_started = time.perf_counter()
+        operation(database_layer, index)
+        latencies.append(time.perf_counter() - operation_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_benchmarks(backends: tp.Sequence[str], scales: tp.Sequence[str], operations_count: int,
+                   plate_fill: float = DEFAULT_PLATE_FILL, seed: int = 0,
+                   workdir: tp.Optional[str] = None) -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Seed database of every backend and scale and measure all OPERATIONS in order
+    :param operations_count: calls per operation, not greater than seeded samples
+    :return: one result per backend, scale and operation
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        for backend in backends:
+            for scale in scales:
+                samples_count = SCALES[scale]
+                engine = create_benchmark_engine(backend, workdir or temporary_directory)
+
+                seed_started = time.perf_counter()
+                plates_count = seed_samples(engine, samples_count, plate_fill=plate_fill)
+                seed_seconds = time.perf_counter() - seed_started
+
+                operations = build_operations(samples_count, plates_count, operations_count, random.Random(seed))
+                with Session(bind=engine) as session:
+                    database_layer = DatabaseLayer(session)
+                    for operation_name in OPERATIONS:
+                        result = measure(database_layer, operations[operation_name], operations_count)
+                        results.append({"backend": backend, "scale": scale, "operation": operation_name,
+                                        "seed_seconds": seed_seconds, **result})
+                        print(format_result(results[-1]), file=sys.stderr)
+
+                engine.dispose()
+    return results
+
+
+def format_result(result: tp.Dict[str, tp.Any]) -> str:
+    return (f"{result['backend']:<10} {result['scale']:<4} {result['operation']:<26} "
+            f"{result['throughput_per_second']:>10.1f} ops/s  p50 {result['p50_ms']:.2f} ms  "
+            f"p95 {result['p95_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms")
+
+
+def main(argv: tp.Optional[tp.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseLayer operations")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=list(SCALES))
+    parser.add_argument('--operations', type=int, default=1000, help='Calls per operation')
+    parser.add_argument('--plate-fill', type=float, default=DEFAULT_PLATE_FILL,
+                        help='Part of seeded samples placed on plates')
+    parser.add_argument('--output', default=None, help='Write results to JSON file')
+    parser.add_argument('--baseline', default=None, help='Compare with results JSON file of previous run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative slowdown against baseline, 0.2 is 20%%')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.backends, args.scales, args.operations, plate_fill=args.plate_fill)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import datetime
+import typing as tp
+
+from sqlalchemy import DateTime, Engine, Integer, String, cast, func, insert, literal, select, text, ColumnElement
+from sqlalchemy.sql.selectable import NamedFromClause
+
+from database.scheme import Sample, Well, PlateSummary, custody_events, RECEIVED, PLATED
+from plate_occupancy import WELLS_PER_PLATE, PLATE_COLUMNS, FULL_PLATE_MASK
+
+# Rows generated per INSERT ... SELECT, keeps transactions and SQLite recursive CTEs small
+SEED_CHUNK_SIZE = 100000
+
+# Part of samples placed on plates, the rest stays in tubes only
+DEFAULT_PLATE_FILL = 0.75
+
+
+def _series(engine: Engine, first: int, last: int) -> NamedFromClause:
+    """Integers first..last (column "value") generated by the database"""
+    if engine.dialect.name == "postgresql":
+        return tp.cast(NamedFromClause,
+                       func.generate_series(first, last).table_valued("value").render_derived(name="series"))
+
+    # Recursive CTE works on SQLite builds without the generate_series extension
+    series = select(literal(first, Integer).label("value")).cte("series", recursive=True)
+    return series.union_all(select((series.c.value + 1).label("value")).where(series.c.value < last))
+
+
+def _concat(prefix: str, number: ColumnElement[int]) -> ColumnElement[str]:
+    return literal(prefix) + cast(number, String)
+
+
+def seed_samples(engine: Engine, samples_count: int, plate_fill: float = DEFAULT_PLATE_FILL,
+                 chunk_size: int = SEED_CHUNK_SIZE) -> int:
+    """
+    Fill empty database with samples in tubes NT1..NT<samples_count>. The first plate_fill part of samples
+    is placed row by row into plates DN1, DN2, ... of 96 wells, the last plate may be partially filled.
+    Receipts and placements are recorded as custody events at seeding time.
+    Rows are generated by INSERT ... SELECT on the database side.
+    :return: number of plates
+    """
+    placed_count = int(samples_count * plate_fill)
+    seeded_time = datetime.datetime.now(datetime.timezone.utc)
+    seeded_at = literal(seeded_time, DateTime(timezone=True))
+
+    with engine.begin() as connection:
+        for first in range(1, samples_count + 1, chunk_size):
+            last = min(first + chunk_size - 1, samples_count)
+            series = _series(engine, first, last)
+            connection.execute(
+                insert(Sample).from_select(
+                    ["id", "customer_sample_name", "tube_barcode", "tube_barcode_number"],
+                    select(series.c.value, _concat("sample ", series.c.value), _concat("NT", series.c.value),
+                           series.c.value)
+                )
+            )
+            connection.execute(
+                insert(custody_events).from_select(
+                    ["occurred_at", "event_type", "sample_id", "tube_barcode"],
+                    select(seeded_at, literal(RECEIVED), series.c.value, _concat("NT", series.c.value))
+                )
+            )
+
+        for first in range(1, placed_count + 1, chunk_size):
+            last = min(first + chunk_size - 1, placed_count)
+            series = _series(engine, first, last)
+            well_index = series.c.value - 1
+            plate_number = well_index // WELLS_PER_PLATE + 1
+            connection.execute(
+                insert(Well).from_select(
+                    ["plate_barcode", "row", "col", "sample_id", "plate_barcode_number"],
+                    select(_concat("DN", plate_number), well_index % WELLS_PER_PLATE // PLATE_COLUMNS + 1,
+                           well_index % PLATE_COLUMNS + 1, series.c.value, plate_number)
+                )
+            )
+            connection.execute(
+                insert(custody_events).from_select(
+                    ["occurred_at", "event_type", "sample_id", "plate_barcode", "row", "col"],
+                    select(seeded_at, literal(PLATED), series.c.value, _concat("DN", plate_number),
+                           well_index % WELLS_PER_PLATE // PLATE_COLUMNS + 1, well_index % PLATE_COLUMNS + 1)
+                )
+            )
+
+        plates_count = -(-placed_count // WELLS_PER_PLATE)
+        for first in range(1, plates_count + 1, chunk_size):
+            last = min(first + chunk_size - 1, plates_count)
+            connection.execute(insert(PlateSummary), [
+                _plate_summary_row(plate_number, placed_count, seeded_time) for plate_number in range(first, last + 1)
+            ])
+
+        if engine.dialect.name == "postgresql":
+            # Ids were inserted explicitly, move the sequence past them
+            connection.execute(text("SELECT setval(pg_get_serial_sequence('samples', 'id'), :last_id)"),
+                               {"last_id": max(samples_count, 1)})
+            # Planner statistics as autovacuum would collect them, otherwise fresh tables look empty
+            connection.execute(text("ANALYZE samples, wells, plate_summary, custody_events"))
+
+    return plates_count
+
+
+def _plate_wells_count(plate_number: int, placed_count: int) -> int:
+    return min(placed_count - (plate_number - 1) * WELLS_PER_PLATE, WELLS_PER_PLATE)
+
+
+def _plate_summary_row(plate_number: int, placed_count: int, seeded_at: datetime.datetime) -> tp.Dict[str, tp.Any]:
+    wells_count = _plate_wells_count(plate_number, placed_count)
+    return {"plate_barcode": f"DN{plate_number}", "occupancy": _plate_occupancy(plate_number, placed_count),
+            "well_count": wells_count, "first_filled_at": seeded_at, "last_filled_at": seeded_at,
+            # Samples are placed in id order
+            "last_sample_id": (plate_number - 1) * WELLS_PER_PLATE + wells_count}
+
+
+def _plate_occupancy(plate_number: int, placed_count: int) -> int:
+    wells_count = _plate_wells_count(plate_number, placed_count)
+    # Plates are filled row by row, so occupied wells are the lowest bits
+    return FULL_PLATE_MASK if wells_count == WELLS_PER_PLATE else (1 << wells_count) - 1
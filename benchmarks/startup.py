@@ -0,0 +1,121 @@
+"""
+Startup time of one-shot main.py commands, as launched by scanner wrappers
+
+    python -m benchmarks.startup --runs 20
+    python -m benchmarks.startup --command "list_samples_in NT1 --format json" --output startup.json
+
+Every run starts a fresh interpreter against <TEST_DATABASE_NAME>_benchmark and reports phases separately:
+interpreter start, import of main, connect (database initialization, session, app) and the command.
+"full" runs the complete initialization on every start, "cached" skips it through the schema cache.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import typing as tp
+
+from dotenv import load_dotenv
+
+from benchmarks.stats import percentile
+
+MODES = ("full", "cached")
+PHASES = ("interpreter", "import", "connect", "command", "total")
+
+# Runs in the child interpreter, prints phase durations in seconds as JSON
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.create_app()
+connected = time.perf_counter()
+app.run_command_line(sys.argv[1:])
+finished = time.perf_counter()
+sys.stderr.write(json.dumps({"import": imported - started, "connect": connected - imported,
+                             "command": finished - connected}) + "\\n")
+"""
+
+ENV_SUFFIXES = ("DATABASE_TYPE", "DATABASE_NAME", "DATABASE_HOST", "DATABASE_USER", "DATABASE_PASSWORD",
+                "DATABASE_PORT")
+
+
+def child_environment(schema_cache_path: tp.Optional[str]) -> tp.Dict[str, str]:
+    """Environment with PROD settings pointing to the benchmark database"""
+    load_dotenv()
+    environment = dict(os.environ)
+    for suffix in ENV_SUFFIXES:
+        environment[f"PROD_{suffix}"] = os.environ[f"TEST_{suffix}"]
+    environment["PROD_DATABASE_NAME"] = f"{os.environ['TEST_DATABASE_NAME']}_benchmark"
+    for name in ("PROD_SCHEMA_CACHE_PATH", "PROD_INVENTORY_ENGINE", "PROD_COMMAND_JOURNAL"):
+        environment.pop(name, None)
+    if schema_cache_path is not None:
+        environment["PROD_SCHEMA_CACHE_PATH"] = schema_cache_path
+    return environment
+
+
+def run_once(command: tp.Sequence[str], environment: tp.Dict[str, str]) -> tp.Dict[str, float]:
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, *command], env=environment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    total = time.perf_counter() - started
+
+    phases: tp.Dict[str, float] = json.loads(completed.stderr.strip().splitlines()[-1])
+    phases["interpreter"] = total - sum(phases.values())
+    phases["total"] = total
+    return phases
+
+
+def run_startup_benchmark(command: tp.Sequence[str], runs: int) -> tp.List[tp.Dict[str, tp.Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in MODES:
+            environment = child_environment(os.path.join(workdir, "schema_cache.json") if mode == "cached" else None)
+            # Warm-up run creates the database and fills the schema cache, file system caches get warm
+            run_once(command, environment)
+
+            measurements = [run_once(command, environment) for _ in range(runs)]
+            for phase in PHASES:
+                durations = [measurement[phase] for measurement in measurements]
+                result = {
+                    "mode": mode,
+                    "phase": phase,
+                    "p50_ms": percentile(durations, 50) * 1000,
+                    "p95_ms": percentile(durations, 95) * 1000,
+                }
+                results.append(result)
+                print(format_result(result), flush=True)
+    return results
+
+
+def format_result(result: tp.Dict[str, tp.Any]) -> str:
+    return f"{result['mode']:<7} {result['phase']:<12} p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms"
+
+
+def main(argv: tp.Optional[tp.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark startup of one-shot main.py commands")
+    parser.add_argument('--runs', type=int, default=10, help='Interpreter starts per mode')
+    parser.add_argument('--command', default="list_samples_in NT1", help='Command line passed to main.py')
+    parser.add_argument('--output', default=None, help='Write results to JSON file')
+    args = parser.parse_args(argv)
+
+    results = run_startup_benchmark(shlex.split(args.command), args.runs)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
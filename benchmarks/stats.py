@@ -0,0 +1,73 @@
+import math
+import typing as tp
+
+
+class Regression:
+    def __init__(self, key: str, metric: str, baseline: float, current: float):
+        self.key = key
+        self.metric = metric
+        self.baseline = baseline
+        self.current = current
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.metric} {self.baseline:.3f} -> {self.current:.3f}"
+
+
+def percentile(values: tp.Sequence[float], percent: float) -> float:
+    """
+    Percentile with linear interpolation between closest ranks
+    :param values: not empty sequence, sorted or not
+    :param percent: 0 - 100
+    """
+    if not values:
+        raise ValueError("Percentile of empty sequence")
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower, upper = math.floor(rank), math.ceil(rank)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(latencies: tp.Sequence[float], elapsed_seconds: float) -> tp.Dict[str, float]:
+    """
+    :param latencies: seconds per operation
+    :param elapsed_seconds: wall time of all operations
+    :return: count, throughput (operations per second) and latency percentiles in milliseconds
+    """
+    return {
+        "count": len(latencies),
+        "throughput_per_second": len(latencies) / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def result_key(result: tp.Dict[str, tp.Any]) -> str:
+    return f"{result['backend']}/{result['scale']}/{result['operation']}"
+
+
+def find_regressions(results: tp.Sequence[tp.Dict[str, tp.Any]], baseline: tp.Sequence[tp.Dict[str, tp.Any]],
+                     threshold: float) -> tp.List[Regression]:
+    """
+    Compare results with baseline of the same backend, scale and operation
+    :param threshold: allowed relative change, 0.2 flags p95/p99 latency 20% higher or throughput 20% lower
+    :return: regressions, results without baseline are skipped
+    """
+    baseline_by_key = {result_key(result): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        baseline_result = baseline_by_key.get(result_key(result))
+        if baseline_result is None:
+            continue
+
+        for metric in ("p95_ms", "p99_ms"):
+            if result[metric] > baseline_result[metric] * (1 + threshold):
+                regressions.append(Regression(result_key(result), metric, baseline_result[metric], result[metric]))
+
+        if result["throughput_per_second"] < baseline_result["throughput_per_second"] * (1 - threshold):
+            regressions.append(Regression(result_key(result), "throughput_per_second",
+                                          baseline_result["throughput_per_second"], result["throughput_per_second"]))
+
+    return regressions
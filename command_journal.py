@@ -0,0 +1,70 @@
+import datetime
+import json
+import threading
+import typing as tp
+
+SUCCESS = "success"
+ERROR = "error"
+
+
+class JournalEntry(tp.NamedTuple):
+    """One executed command, written as one JSON line"""
+    timestamp: str  # wall clock start time, ISO 8601 in UTC
+    line: str  # command with arguments as typed, replayed as is
+    command: str
+    duration_ms: float
+    outcome: str  # SUCCESS or ERROR
+    error: tp.Optional[str]  # exception class name, e.g. "WellPositionOccupied"
+
+    @property
+    def started_at(self) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(self.timestamp)
+
+
+class CommandJournal:
+    """Appends executed commands to JSONL file, safe to share between threads"""
+
+    def __init__(self, stream: tp.IO[str]):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> "CommandJournal":
+        # Line buffered, entries of crashed process are not lost
+        return cls(open(path, "a", buffering=1))
+
+    def record(self, entry: JournalEntry) -> None:
+        line = json.dumps(entry._asdict())
+        with self._lock:
+            self.stream.write(line + "\n")
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+class CollectingJournal(CommandJournal):
+    """Keeps entries in memory instead of writing them, used by replay"""
+
+    def __init__(self) -> None:
+        super().__init__(stream=tp.cast(tp.IO[str], None))
+        self.entries: tp.List[JournalEntry] = []
+
+    def record(self, entry: JournalEntry) -> None:
+        with self._lock:
+            self.entries.append(entry)
+
+    def close(self) -> None:
+        pass
+
+
+def read_journal(path: str) -> tp.Iterator[JournalEntry]:
+    """
+    Lazily read journal written by CommandJournal
+    :param path: str, path to JSONL file
+    :return: iterator over entries in file order
+    """
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            yield JournalEntry(**json.loads(line))
@@ -0,0 +1,110 @@
+import asyncio
+import typing as tp
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from database.database import DatabaseLayer
+from database.report_cache import ReportCache
+from database.scheme import Sample, Well
+from database.transactions import TransactionRunner, classify_contention_error, single_attempt
+from plate_occupancy import ROW_MAJOR
+from reports import TubeReport, PlateReport
+
+if tp.TYPE_CHECKING:
+    # NumPy is imported only by processes that load the inventory engine
+    from database.inventory_engine import InventoryEngine
+
+T = tp.TypeVar("T")
+
+
+def create_async_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    # Objects returned by operations are used after their session is closed, so they must not expire on commit
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+class AsyncDatabaseLayer:
+    """
+    Asyncio counterpart of DatabaseLayer for serving many scanner stations from one process.
+    Every operation opens its own session, so concurrent operations share the engine connection pool
+    instead of waiting for one session. Operations run DatabaseLayer code through AsyncSession.run_sync,
+    so validation, queries and raised exceptions are the same as in DatabaseLayer. Operations aborted by
+    contention are retried here with asyncio.sleep backoff, the event loop is never blocked by the wait.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession],
+                 report_cache: tp.Optional[ReportCache] = None,
+                 transaction_runner: tp.Optional[TransactionRunner] = None,
+                 inventory: tp.Optional["InventoryEngine"] = None,
+                 sleep: tp.Callable[[float], tp.Awaitable[None]] = asyncio.sleep):
+        self.session_factory = session_factory
+        self.report_cache = report_cache
+        # Shared by all operations, reads of it do not wait for the event loop
+        self.inventory = inventory
+        # Attempts, backoff and counters of retries, its blocking sleep is not used
+        self.transaction_runner = transaction_runner if transaction_runner is not None else TransactionRunner()
+        self.sleep = sleep
+
+    async def record_receipt(self, customer_sample_name: str, tube_barcode: str) -> Sample:
+        """
+        :param customer_sample_name: str, any format
+        :param tube_barcode: str, format: NT<number>
+        :return: Sample ID
+        """
+        return await self._run(lambda layer: layer.record_receipt(customer_sample_name, tube_barcode),
+                               "record_receipt")
+
+    async def add_to_plate(self, sample_id: int, plate_barcode: str, well_position: tp.Optional[str] = None,
+                           fill_order: str = ROW_MAJOR) -> Well:
+        """
+        Adds sample to well in specified plate, see DatabaseLayer.add_to_plate
+        :param sample_id: int, positive
+        :param plate_barcode: str, format: "DN<number>"
+        :param well_position: str, format: "<Row><Column>", None to place sample in next free well
+        :param fill_order: ROW_MAJOR or COLUMN_MAJOR
+        :return:
+        """
+        return await self._run(lambda layer: layer.add_to_plate(sample_id, plate_barcode, well_position, fill_order),
+                               "add_to_plate")
+
+    async def tube_transfer(self, source_tube_barcode: str, destination_tube_barcode: str) -> None:
+        """
+        :param source_tube_barcode: str, format: NT<number>
+        :param destination_tube_barcode: str, format: NT<number>
+        :return: None
+        """
+        await self._run(lambda layer: layer.tube_transfer(source_tube_barcode, destination_tube_barcode),
+                        "tube_transfer")
+
+    async def list_samples_in(self, container_barcode: str) -> tp.Union[TubeReport, PlateReport]:
+        """
+        :param container_barcode: str Tube: [NT<number>] or Plate: [DN<number>]
+        :return: report for specified container
+        """
+        return await self._run(lambda layer: layer.list_samples_in(container_barcode), "list_samples_in")
+
+    async def _run(self, operation: tp.Callable[[DatabaseLayer], T], operation_name: str) -> T:
+        def run_operation(sync_session: Session) -> T:
+            # Transactional methods run once, contention errors reach the retry loop below
+            with single_attempt(sync_session):
+                return operation(DatabaseLayer(sync_session, report_cache=self.report_cache,
+                                               transaction_runner=self.transaction_runner,
+                                               inventory=self.inventory))
+
+        runner = self.transaction_runner
+        runner.counters.increment("transactions")
+        for attempt in range(1, runner.max_attempts + 1):
+            # Fresh session for every attempt, closing the failed one rolls it back
+            async with self.session_factory() as session:
+                try:
+                    return await session.run_sync(run_operation)
+                except DBAPIError as exc:
+                    contention = classify_contention_error(exc)
+                    if contention is None:
+                        raise
+                    delay = runner.attempt_failed(contention, attempt, operation_name, exc)
+            # Connection is back in the pool while waiting
+            await self.sleep(delay)
+
+        raise AssertionError("max_attempts should be positive")
@@ -1,23 +1,73 @@
+import csv
+import datetime
+import io
 import typing as tp
 
+from sqlalchemy import Select, String, case, cast, insert, literal, select, update, exists
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased, make_transient_to_detached
 
 from exceptions import BarcodeBadFormat, TubeBarcodeBadFormat, PlateBarcodeBadFormat, OccupiedDestinationTube, \
     SampleNotFound, SampleIdBadFormatting, TubeNotFound, OccupiedWellsNotFound, SampleAlreadyReceived, \
-    WellPositionOccupied, WellPositionBadFormatting
-from database.scheme import Sample, Well
-from reports import TubeReport, PlateReport, WellPositionFormatAdapter
+    WellPositionOccupied, WellPositionBadFormatting, BaseApplicationException, ConflictingTubeTransfers, PlateFull, \
+    NotEnoughFreeWells, SampleNameNotFound, CustodyHistoryNotFound, ManifestRowIncomplete
+from database.dialects import insert_on_conflict_do_nothing, execute_on_conflict_do_nothing
+from database.report_cache import ReportCache
+from database.scheme import Sample, Well, PlateSummary, custody_events, RECEIVED, TRANSFERRED, PLATED
+from database.transactions import TransactionRunner, transactional
+from reports import TubeReport, PlateReport, WellPositionFormatAdapter, BulkReceiptReport, RowRejection, \
+    PlateLayoutReport, WellConflict, InventoryRow, PlateWell, SampleLocation, WellLocation, CustodyEvent, \
+    CustodyHistory, PlateStatus, PlateStatusReport
 
 from format_validator import tube_barcode_validator, plate_barcode_validator, well_position_validator
+from barcode_codec import tube_barcode_codec, plate_barcode_codec
+from plate_occupancy import ROW_MAJOR, WELLS_PER_PLATE, free_wells, is_occupied, mask_from_positions, next_free_well, \
+    occupied_count, occupy
+
+# Number of rows sent per statement on backends without COPY support
+RECEIPTS_BATCH_SIZE = 1000
+
+# Prefix of temporary barcodes used while rearraying swaps and chains, never a valid tube barcode
+TRANSFER_STAGING_PREFIX = "TRANSFER-"
+
+# Rows fetched per round trip from server side cursor while streaming inventory
+INVENTORY_BATCH_SIZE = 10000
+
+ModelType = tp.TypeVar("ModelType", Sample, Well)
+
+# (row_number, customer_sample_name, tube_barcode, tube_barcode_number)
+Receipt = tp.Tuple[int, str, str, int]
+
+# Row of custody_events table
+CustodyEventRow = tp.Dict[str, tp.Any]
+
+if tp.TYPE_CHECKING:
+    # NumPy is imported only by processes that load the inventory engine
+    from database.inventory_engine import InventoryEngine
+
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
 
 
 class DatabaseLayer:
     # Store db connection and give users point to connect
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, report_cache: tp.Optional[ReportCache] = None,
+                 transaction_runner: tp.Optional[TransactionRunner] = None,
+                 clock: tp.Callable[[], datetime.datetime] = utc_now,
+                 inventory: tp.Optional["InventoryEngine"] = None):
         self.session = session
+        self.report_cache = report_cache
+        # In-memory copy of samples and wells: serves reports and pre-write checks, updated after every commit.
+        # Other processes write without updating it, so errors it predicts are confirmed in the database
+        self.inventory = inventory
+        # Retries writes aborted by concurrent transactions, may be shared between layers to sum contention counters
+        self.transaction_runner = transaction_runner if transaction_runner is not None else TransactionRunner()
+        # Time of custody events
+        self.clock = clock
 
+    @transactional
     def record_receipt(self, customer_sample_name: str, tube_barcode: str) -> Sample:
         """
         :param customer_sample_name: str, any format
@@ -28,22 +78,197 @@ class DatabaseLayer:
         if not tube_barcode_validator.validate(tube_barcode):
             raise TubeBarcodeBadFormat(tube_barcode)
 
-        sample = Sample(customer_sample_name=customer_sample_name, tube_barcode=tube_barcode)
-        self.session.add(sample)
+        if self.inventory is not None and self.inventory.tube_sample_id(tube_barcode) is not None and \
+                self._tube_sample_id(tube_barcode) is not None:
+            raise SampleAlreadyReceived(tube_barcode=tube_barcode)
+
+        # One statement: no row returned means the tube is already received, no IntegrityError and rollback
+        tube_barcode_number = tube_barcode_codec.number(tube_barcode)
+        sample_id = execute_on_conflict_do_nothing(
+            self.session,
+            insert_on_conflict_do_nothing(self.session, Sample, index_elements=["tube_barcode"])
+            .values(customer_sample_name=customer_sample_name, tube_barcode=tube_barcode,
+                    tube_barcode_number=tube_barcode_number)
+            .returning(Sample.id)
+        )
+        if sample_id is not None:
+            self._append_custody_events([self._tube_event(RECEIVED, sample_id, tube_barcode)])
+        self.session.commit()
+
+        if sample_id is None:
+            raise SampleAlreadyReceived(tube_barcode=tube_barcode)
+
+        self._invalidate_reports(tube_barcode)
+        if self.inventory is not None:
+            self.inventory.add_samples([(sample_id, customer_sample_name, tube_barcode)])
+        return self._attach(Sample(id=sample_id, customer_sample_name=customer_sample_name,
+                                   tube_barcode=tube_barcode))
+
+    def record_receipts_bulk(self, rows: tp.Iterable[tp.Sequence[tp.Optional[str]]]) -> BulkReceiptReport:
+        """
+        Records many receipts in one transaction. Invalid rows are reported instead of stopping the import.
+        :param rows: iterable of (customer_sample_name, tube_barcode), tube_barcode format: NT<number>.
+            Rows with missing or None values are rejected
+        :return: report with assigned Sample IDs and rejected rows
+        """
+
+        receipts: tp.List[Receipt] = []
+        rejections: tp.List[RowRejection] = []
+        complete_rows: tp.List[tp.Tuple[int, str, str]] = []
+        seen_tube_barcodes: tp.Set[str] = set()
+
+        for row_number, row in enumerate(rows, start=1):
+            customer_sample_name = row[0] if len(row) > 0 else None
+            tube_barcode = row[1] if len(row) > 1 else None
+            if len(row) != 2 or customer_sample_name is None or tube_barcode is None:
+                error: BaseApplicationException = ManifestRowIncomplete()
+                rejections.append(RowRejection(row_number, tube_barcode or "", error))
+            else:
+                complete_rows.append((row_number, customer_sample_name, tube_barcode))
+
+        parsed_tube_barcodes = tube_barcode_codec.parse_many(tube_barcode for (_, _, tube_barcode) in complete_rows)
+        for (row_number, customer_sample_name, tube_barcode), parsed in zip(complete_rows, parsed_tube_barcodes):
+            if parsed is None:
+                error = TubeBarcodeBadFormat(barcode=tube_barcode)
+                rejections.append(RowRejection(row_number, tube_barcode, error))
+            elif tube_barcode in seen_tube_barcodes:
+                error = SampleAlreadyReceived(tube_barcode=tube_barcode)
+                rejections.append(RowRejection(row_number, tube_barcode, error))
+            else:
+                seen_tube_barcodes.add(tube_barcode)
+                receipts.append((row_number, customer_sample_name, tube_barcode, parsed.number))
+
+        if self.inventory is not None:
+            receipts = self._skip_received_tubes(receipts, rejections)
+
+        sample_ids = self._store_receipts(receipts)
+        self._invalidate_reports(*sample_ids)
+        if self.inventory is not None:
+            self.inventory.add_samples([
+                (sample_ids[tube_barcode], customer_sample_name, tube_barcode)
+                for (_, customer_sample_name, tube_barcode, _) in receipts if tube_barcode in sample_ids
+            ])
+
+        for row_number, _, tube_barcode, _ in receipts:
+            if tube_barcode not in sample_ids:
+                error = SampleAlreadyReceived(tube_barcode=tube_barcode)
+                rejections.append(RowRejection(row_number, tube_barcode, error))
+        rejections.sort(key=lambda rejection: rejection.row_number)
+
+        return BulkReceiptReport(sample_ids=sample_ids, rejections=rejections)
+
+    def _skip_received_tubes(self, receipts: tp.List[Receipt], rejections: tp.List[RowRejection]) -> tp.List[Receipt]:
+        # Tubes received by the inventory are confirmed in the database with one query, the rest are inserted
+        assert self.inventory is not None
+        known_tube_barcodes = [tube_barcode for (_, _, tube_barcode, _) in receipts
+                               if self.inventory.tube_sample_id(tube_barcode) is not None]
+        if not known_tube_barcodes:
+            return receipts
+
+        received_tube_barcodes = set(self.session.scalars(
+            select(Sample.tube_barcode).where(Sample.tube_barcode.in_(known_tube_barcodes))
+        ))
+        for row_number, _, tube_barcode, _ in receipts:
+            if tube_barcode in received_tube_barcodes:
+                error = SampleAlreadyReceived(tube_barcode=tube_barcode)
+                rejections.append(RowRejection(row_number, tube_barcode, error))
+        return [receipt for receipt in receipts if receipt[2] not in received_tube_barcodes]
+
+    @transactional
+    def _store_receipts(self, receipts: tp.List[Receipt]) -> tp.Dict[str, int]:
         try:
+            if self.session.get_bind().dialect.name == "postgresql":
+                sample_ids = self._copy_receipts(receipts)
+            else:
+                sample_ids = self._insert_receipts_in_batches(receipts)
             self.session.commit()
-        except IntegrityError as exc:
+        except Exception:
             self.session.rollback()
-            raise SampleAlreadyReceived(tube_barcode=tube_barcode) from exc
+            raise
+        return sample_ids
+
+    def _copy_receipts(self, receipts: tp.List[Receipt]) -> tp.Dict[str, int]:
+        # COPY into staging table, then merge with one INSERT ... SELECT skipping already received tubes
+        connection = self.session.connection()
+        connection.exec_driver_sql(
+            "CREATE TEMPORARY TABLE receipts_staging "
+            "(row_number INTEGER, customer_sample_name VARCHAR, tube_barcode VARCHAR, tube_barcode_number BIGINT) "
+            "ON COMMIT DROP"
+        )
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(receipts)
+        buffer.seek(0)
+
+        cursor = connection.connection.cursor()
+        try:
+            # Default NULL of csv format is an unquoted empty string, empty sample names are stored as "" like in SQLite
+            cursor.copy_expert(r"COPY receipts_staging FROM STDIN WITH (FORMAT csv, NULL '\N')", buffer)  # type: ignore
+        finally:
+            cursor.close()
+
+        # Custody events are appended by the same statement from the inserted rows
+        inserted = connection.exec_driver_sql(
+            "WITH inserted AS ("
+            "INSERT INTO samples (customer_sample_name, tube_barcode, tube_barcode_number) "
+            "SELECT customer_sample_name, tube_barcode, tube_barcode_number FROM receipts_staging ORDER BY row_number "
+            "ON CONFLICT (tube_barcode) DO NOTHING "
+            "RETURNING tube_barcode, id"
+            "), events AS ("
+            "INSERT INTO custody_events (occurred_at, event_type, sample_id, tube_barcode) "
+            "SELECT %(occurred_at)s, %(event_type)s, id, tube_barcode FROM inserted"
+            ") SELECT tube_barcode, id FROM inserted",
+            {"occurred_at": self.clock(), "event_type": RECEIVED}
+        )
+        sample_ids = {tube_barcode: sample_id for (tube_barcode, sample_id) in inserted}
 
-        return sample
+        connection.exec_driver_sql("DROP TABLE receipts_staging")
+        return sample_ids
 
-    def add_to_plate(self, sample_id: int, plate_barcode: str, well_position: str) -> Well:
+    def _insert_receipts_in_batches(self, receipts: tp.List[Receipt]) -> tp.Dict[str, int]:
+        sample_ids: tp.Dict[str, int] = {}
+
+        for start in range(0, len(receipts), RECEIPTS_BATCH_SIZE):
+            batch = receipts[start:start + RECEIPTS_BATCH_SIZE]
+            tube_barcodes = [tube_barcode for (_, _, tube_barcode, _) in batch]
+
+            received_tube_barcodes = set(self.session.scalars(
+                select(Sample.tube_barcode).where(Sample.tube_barcode.in_(tube_barcodes))
+            ))
+            new_samples = [
+                {
+                    "customer_sample_name": customer_sample_name,
+                    "tube_barcode": tube_barcode,
+                    "tube_barcode_number": tube_barcode_number
+                }
+                for (_, customer_sample_name, tube_barcode, tube_barcode_number) in batch
+                if tube_barcode not in received_tube_barcodes
+            ]
+            if not new_samples:
+                continue
+
+            self.session.execute(insert(Sample), new_samples)
+            inserted = self.session.execute(
+                select(Sample.tube_barcode, Sample.id)
+                .where(Sample.tube_barcode.in_([sample["tube_barcode"] for sample in new_samples]))
+            )
+            inserted_sample_ids = {tube_barcode: sample_id for (tube_barcode, sample_id) in inserted}
+            self._append_custody_events([self._tube_event(RECEIVED, sample_id, tube_barcode)
+                                         for (tube_barcode, sample_id) in inserted_sample_ids.items()])
+            sample_ids.update(inserted_sample_ids)
+
+        return sample_ids
+
+    @transactional
+    def add_to_plate(self, sample_id: int, plate_barcode: str, well_position: tp.Optional[str] = None,
+                     fill_order: str = ROW_MAJOR) -> Well:
         """
         Adds sample to well in specified plate
         :param sample_id: int, positive
         :param plate_barcode: str, format: "DN<number>"
         :param well_position: str, format: "<Row><Column>" where <Row> is Char from A to H and <Column> is int from 1 to 12
+            None to place sample in next free well
+        :param fill_order: ROW_MAJOR or COLUMN_MAJOR, order of wells to look for free one when well_position is None
         :return:
         """
 
@@ -53,73 +278,616 @@ class DatabaseLayer:
         if not plate_barcode_validator.validate(plate_barcode):
             raise PlateBarcodeBadFormat(barcode=plate_barcode)
 
-        well_position = well_position.upper()
+        if well_position is not None:
+            well_position = well_position.upper()
 
-        if not well_position_validator.validate(well_position):
-            raise WellPositionBadFormatting(well_position=well_position)
+            if not well_position_validator.validate(well_position):
+                raise WellPositionBadFormatting(well_position=well_position)
 
-        row, col = WellPositionFormatAdapter.get_row_col_position(well_position=well_position)
+            row, col = WellPositionFormatAdapter.get_row_col_position(well_position=well_position)
 
-        query = self.session.query(Sample.id).filter(Sample.id == sample_id)
-        if not self.session.query(query.exists()).scalar():
+        if self.inventory is not None:
+            # Errors of known state without locking the plate, the database still checks both on insert
+            if not self.inventory.sample_exists(sample_id):
+                self._raise_if_sample_not_found(sample_id)
+            if well_position is not None and self.inventory.well_sample_id(plate_barcode, row, col) is not None \
+                    and self._well_sample_id(plate_barcode, row, col) is not None:
+                raise WellPositionOccupied(well_position=well_position, plate_barcode=plate_barcode)
+
+        plate_summary = self._lock_plate_summary(plate_barcode)
+
+        if well_position is None:
+            free_well = next_free_well(plate_summary.occupancy, fill_order)
+            if free_well is None:
+                # Release plate lock
+                self.session.commit()
+                self._raise_if_sample_not_found(sample_id)
+                raise PlateFull(plate_barcode=plate_barcode)
+            row, col = free_well
+            well_position = WellPositionFormatAdapter.get_string_position(row=row, col=col)
+        elif is_occupied(plate_summary.occupancy, row, col):
+            self.session.commit()
+            self._raise_if_sample_not_found(sample_id)
+            raise WellPositionOccupied(well_position=well_position, plate_barcode=plate_barcode)
+
+        # One statement checks the sample and inserts the well: no row returned means missing sample,
+        # or a well occupied behind plate_summary
+        plate_barcode_number = plate_barcode_codec.number(plate_barcode)
+        inserted_sample_id = execute_on_conflict_do_nothing(
+            self.session,
+            insert_on_conflict_do_nothing(self.session, Well, index_elements=["plate_barcode", "row", "col"])
+            .from_select(
+                ["plate_barcode", "row", "col", "sample_id", "plate_barcode_number"],
+                select(literal(plate_barcode, String), literal(row), literal(col), literal(sample_id),
+                       literal(plate_barcode_number))
+                .where(select(Sample.id).where(Sample.id == sample_id).exists())
+            )
+            .returning(Well.sample_id)
+        )
+
+        if inserted_sample_id is None:
+            self.session.commit()
+            self._raise_if_sample_not_found(sample_id)
+            raise WellPositionOccupied(well_position=well_position, plate_barcode=plate_barcode)
+
+        event = self._well_event(sample_id, plate_barcode, row, col)
+        self._append_custody_events([event])
+        plate_summary.occupancy = occupy(plate_summary.occupancy, row, col)
+        self._record_plate_fill(plate_summary, event)
+        self.session.commit()
+
+        self._invalidate_reports(plate_barcode)
+        if self.inventory is not None:
+            self.inventory.add_wells([(plate_barcode, row, col, sample_id)])
+        return self._attach(Well(sample_id=sample_id, plate_barcode=plate_barcode, col=col, row=row))
+
+    def _raise_if_sample_not_found(self, sample_id: int) -> None:
+        # Only on error paths, keeps SampleNotFound ahead of plate errors
+        if self.session.get(Sample, sample_id) is None:
             raise SampleNotFound(sample_id=sample_id)
 
-        well = Well(sample_id=sample_id, plate_barcode=plate_barcode, col=col, row=row)
-        self.session.add(well)
+    def _tube_sample_id(self, tube_barcode: str) -> tp.Optional[int]:
+        # Confirms inventory predictions on error paths
+        return self.session.scalar(select(Sample.id).where(Sample.tube_barcode == tube_barcode))
+
+    def _well_sample_id(self, plate_barcode: str, row: int, col: int) -> tp.Optional[int]:
+        return self.session.scalar(
+            select(Well.sample_id)
+            .where(Well.plate_barcode == plate_barcode).where(Well.row == row).where(Well.col == col)
+        )
+
+    def _attach(self, instance: ModelType) -> ModelType:
+        # Rows written by Core statements become persistent entities without loading them back
+        make_transient_to_detached(instance)
+        self.session.add(instance)
+        return instance
+
+    @transactional
+    def load_plate_layout(self, plate_barcode: str, layout: tp.Mapping[str, int]) -> PlateLayoutReport:
+        """
+        Adds samples to many wells of one plate in one transaction. Nothing is added if any well conflicts.
+        :param plate_barcode: str, format: "DN<number>"
+        :param layout: mapping well_position -> sample_id, well_position format: "<Row><Column>"
+        :return: report with loaded wells or per-well conflicts
+        """
+
+        if not plate_barcode_validator.validate(plate_barcode):
+            raise PlateBarcodeBadFormat(barcode=plate_barcode)
+
+        conflicts: tp.List[WellConflict] = []
+        wells: tp.Dict[tp.Tuple[int, int], tp.Tuple[str, int]] = {}
+
+        for well_position, sample_id in layout.items():
+            well_position = well_position.upper()
+            try:
+                if sample_id <= 0:
+                    raise SampleIdBadFormatting(sample_id=sample_id)
+                if not well_position_validator.validate(well_position):
+                    raise WellPositionBadFormatting(well_position=well_position)
+                row, col = WellPositionFormatAdapter.get_row_col_position(well_position=well_position)
+                if (row, col) in wells:
+                    raise WellPositionOccupied(well_position=well_position, plate_barcode=plate_barcode)
+            except (SampleIdBadFormatting, WellPositionBadFormatting, WellPositionOccupied) as exc:
+                conflicts.append(WellConflict(well_position, sample_id, exc))
+            else:
+                wells[(row, col)] = (well_position, sample_id)
+
+        if not wells:
+            return PlateLayoutReport(plate_barcode=plate_barcode, loaded_wells={}, conflicts=conflicts)
+
+        plate_summary = self._lock_plate_summary(plate_barcode)
+        conflicts.extend(self._find_plate_layout_conflicts(plate_barcode, plate_summary.occupancy, wells))
+
+        if conflicts:
+            # Release plate lock
+            self.session.commit()
+            return PlateLayoutReport(plate_barcode=plate_barcode, loaded_wells={}, conflicts=conflicts)
+
         try:
+            events = self._insert_wells([(plate_barcode, row, col, sample_id)
+                                         for (row, col), (_, sample_id) in wells.items()])
+            plate_summary.occupancy |= mask_from_positions(wells)
+            self._record_plate_fill(plate_summary, events[-1])
             self.session.commit()
-        except IntegrityError as exc:
+        except IntegrityError:
+            # Wells were filled bypassing plate_summary
+            self.session.rollback()
+            raise
+
+        self._invalidate_reports(plate_barcode)
+        if self.inventory is not None:
+            self.inventory.add_wells([(plate_barcode, row, col, sample_id)
+                                      for (row, col), (_, sample_id) in wells.items()])
+        return PlateLayoutReport(
+            plate_barcode=plate_barcode,
+            loaded_wells={well_position: sample_id for (well_position, sample_id) in wells.values()},
+            conflicts=[]
+        )
+
+    def _find_plate_layout_conflicts(self, plate_barcode: str, occupancy: int,
+                                     wells: tp.Dict[tp.Tuple[int, int], tp.Tuple[str, int]]) -> tp.List[WellConflict]:
+        found_sample_ids = self._find_sample_ids({sample_id for (_, sample_id) in wells.values()})
+
+        conflicts = []
+        for (row, col), (well_position, sample_id) in wells.items():
+            if sample_id not in found_sample_ids:
+                conflicts.append(WellConflict(well_position, sample_id, SampleNotFound(sample_id=sample_id)))
+            elif is_occupied(occupancy, row, col):
+                error = WellPositionOccupied(well_position=well_position, plate_barcode=plate_barcode)
+                conflicts.append(WellConflict(well_position, sample_id, error))
+
+        return conflicts
+
+    @transactional
+    def pack_samples(self, sample_ids: tp.Sequence[int], plate_barcodes: tp.Sequence[str],
+                     fill_order: str = ROW_MAJOR) -> tp.List[PlateLayoutReport]:
+        """
+        Places samples into free wells of plates in one transaction, filling plates one after another
+        :param sample_ids: samples to place, in order
+        :param plate_barcodes: plates to fill, in order, format: "DN<number>"
+        :param fill_order: ROW_MAJOR or COLUMN_MAJOR, order of wells inside plate
+        :return: report of loaded wells for every plate that got samples
+        """
+
+        for sample_id in sample_ids:
+            if sample_id <= 0:
+                raise SampleIdBadFormatting(sample_id=sample_id)
+
+        for plate_barcode in plate_barcodes:
+            if not plate_barcode_validator.validate(plate_barcode):
+                raise PlateBarcodeBadFormat(barcode=plate_barcode)
+
+        if not sample_ids:
+            return []
+
+        found_sample_ids = self._find_sample_ids(set(sample_ids))
+        for sample_id in sample_ids:
+            if sample_id not in found_sample_ids:
+                raise SampleNotFound(sample_id=sample_id)
+
+        # Lock plates in stable order to avoid deadlocks between concurrent packs
+        plate_summaries = {
+            plate_barcode: self._lock_plate_summary(plate_barcode) for plate_barcode in sorted(set(plate_barcodes))
+        }
+
+        remaining_sample_ids = iter(sample_ids)
+        wells: tp.List[tp.Tuple[str, int, int, int]] = []
+        reports: tp.List[PlateLayoutReport] = []
+
+        for plate_barcode in dict.fromkeys(plate_barcodes):
+            plate_summary = plate_summaries[plate_barcode]
+            loaded_wells: tp.Dict[str, int] = {}
+
+            for (row, col), sample_id in zip(free_wells(plate_summary.occupancy, fill_order), remaining_sample_ids):
+                wells.append((plate_barcode, row, col, sample_id))
+                loaded_wells[WellPositionFormatAdapter.get_string_position(row=row, col=col)] = sample_id
+                plate_summary.occupancy = occupy(plate_summary.occupancy, row, col)
+
+            if loaded_wells:
+                reports.append(PlateLayoutReport(plate_barcode=plate_barcode, loaded_wells=loaded_wells, conflicts=[]))
+            if len(wells) == len(sample_ids):
+                break
+
+        if len(wells) < len(sample_ids):
+            self.session.rollback()
+            raise NotEnoughFreeWells(samples_count=len(sample_ids), free_wells_count=len(wells))
+
+        try:
+            events = self._insert_wells(wells)
+            # Last placement into every plate
+            for plate_barcode, event in {event["plate_barcode"]: event for event in events}.items():
+                self._record_plate_fill(plate_summaries[plate_barcode], event)
+            self.session.commit()
+        except IntegrityError:
             self.session.rollback()
-            raise WellPositionOccupied(well_position=well_position, plate_barcode=plate_barcode) from exc
+            raise
+
+        self._invalidate_reports(*(report.barcode for report in reports))
+        if self.inventory is not None:
+            self.inventory.add_wells(wells)
+        return reports
+
+    def _find_sample_ids(self, sample_ids: tp.Set[int]) -> tp.Set[int]:
+        if self.inventory is not None:
+            found_sample_ids = {sample_id for sample_id in sample_ids if self.inventory.sample_exists(sample_id)}
+            if len(found_sample_ids) == len(sample_ids):
+                return found_sample_ids
+            # Samples missing in memory may be received by another process
+            sample_ids = sample_ids - found_sample_ids
+        else:
+            found_sample_ids = set()
+        return found_sample_ids | set(self.session.scalars(select(Sample.id).where(Sample.id.in_(sample_ids))))
 
-        return well
+    def _insert_wells(self, wells: tp.List[tp.Tuple[str, int, int, int]]) -> tp.List[CustodyEventRow]:
+        # One multi-row INSERT for (plate_barcode, row, col, sample_id) tuples, returns custody events in wells order
+        self.session.execute(insert(Well).values([
+            {
+                "plate_barcode": plate_barcode,
+                "plate_barcode_number": plate_barcode_codec.number(plate_barcode),
+                "row": row,
+                "col": col,
+                "sample_id": sample_id
+            }
+            for (plate_barcode, row, col, sample_id) in wells
+        ]))
+        events = [self._well_event(sample_id, plate_barcode, row, col)
+                  for (plate_barcode, row, col, sample_id) in wells]
+        self._append_custody_events(events)
+        return events
+
+    def _append_custody_events(self, events: tp.List[CustodyEventRow]) -> None:
+        # Appended in the transaction of the change, so history never misses a committed write.
+        # One multi-row INSERT, the table has no unique constraints to check
+        if events:
+            self.session.execute(insert(custody_events).values(events))
+
+    def _tube_event(self, event_type: str, sample_id: int, tube_barcode: str,
+                    source_tube_barcode: tp.Optional[str] = None) -> CustodyEventRow:
+        return {"occurred_at": self.clock(), "event_type": event_type, "sample_id": sample_id,
+                "tube_barcode": tube_barcode, "source_tube_barcode": source_tube_barcode,
+                "plate_barcode": None, "row": None, "col": None}
+
+    def _well_event(self, sample_id: int, plate_barcode: str, row: int, col: int) -> CustodyEventRow:
+        return {"occurred_at": self.clock(), "event_type": PLATED, "sample_id": sample_id,
+                "tube_barcode": None, "source_tube_barcode": None,
+                "plate_barcode": plate_barcode, "row": row, "col": col}
+
+    def _lock_plate_summary(self, plate_barcode: str) -> PlateSummary:
+        # SELECT ... FOR UPDATE of plate row, serializes writers of the same plate until commit
+        plate_summary = self.session.get(PlateSummary, plate_barcode, with_for_update=True, populate_existing=True)
+        if plate_summary is not None:
+            return plate_summary
+
+        # New plate, or plate filled before plate_summary existed: rebuild occupancy from wells
+        positions = self.session.execute(select(Well.row, Well.col).where(Well.plate_barcode == plate_barcode))
+        occupancy = mask_from_positions(positions.tuples())
+        execute_on_conflict_do_nothing(
+            self.session,
+            insert_on_conflict_do_nothing(self.session, PlateSummary, index_elements=["plate_barcode"])
+            .values(plate_barcode=plate_barcode, occupancy=occupancy, well_count=occupied_count(occupancy))
+        )
 
-    def list_samples_in(self, container_barcode: str) -> tp.Union[TubeReport, PlateReport]:
+        plate_summary = self.session.get(PlateSummary, plate_barcode, with_for_update=True, populate_existing=True)
+        assert plate_summary is not None
+        return plate_summary
+
+    def _record_plate_fill(self, plate_summary: PlateSummary, last_event: CustodyEventRow) -> None:
+        # Fill statistics follow occupancy in the same transaction, the row is locked by _lock_plate_summary.
+        # Times are those of custody events, so the summary agrees with plate history
+        plate_summary.well_count = occupied_count(plate_summary.occupancy)
+        if plate_summary.first_filled_at is None:
+            plate_summary.first_filled_at = last_event["occurred_at"]
+        plate_summary.last_filled_at = last_event["occurred_at"]
+        plate_summary.last_sample_id = last_event["sample_id"]
+
+    def plate_status(self, partial: bool = False, full: bool = False,
+                     empty_since: tp.Optional[datetime.datetime] = None) -> PlateStatusReport:
+        """
+        Fill state of all plates read from plate_summary only, cost grows with number of plates, not wells
+        :param partial: only plates with occupied and free wells
+        :param full: only plates without free wells
+        :param empty_since: only plates with free wells where no well was filled since this time
+        :return: plates ordered by barcode
+        """
+
+        statement = select(PlateSummary.plate_barcode, PlateSummary.well_count, PlateSummary.first_filled_at,
+                           PlateSummary.last_filled_at, PlateSummary.last_sample_id) \
+            .where(PlateSummary.well_count > 0) \
+            .order_by(PlateSummary.plate_barcode)
+        selections = []
+        if partial or empty_since is not None:
+            statement = statement.where(PlateSummary.well_count < WELLS_PER_PLATE)
+            selections.append("partial")
+        if full:
+            statement = statement.where(PlateSummary.well_count == WELLS_PER_PLATE)
+            selections.append("full")
+        if empty_since is not None:
+            # Naive time is local time
+            empty_since = empty_since.astimezone(datetime.timezone.utc)
+            statement = statement.where(PlateSummary.last_filled_at < empty_since)
+            selections.append(f"empty since {empty_since.isoformat()}")
+
+        plates = [
+            PlateStatus(plate_barcode, well_count, WELLS_PER_PLATE - well_count, first_filled_at, last_filled_at,
+                        last_sample_id)
+            for (plate_barcode, well_count, first_filled_at, last_filled_at, last_sample_id)
+            in self.session.execute(statement)
+        ]
+        return PlateStatusReport(selection=", ".join(selections) or "all", plates=plates)
+
+    def list_samples_in(self, container_barcode: str, as_of: tp.Optional[datetime.datetime] = None) \
+            -> tp.Union[TubeReport, PlateReport]:
         """
         :param container_barcode: str Tube: [NT<number>] or Plate: [DN<number>]
+        :param as_of: report container content at this time from custody history, None for current content.
+            Naive datetime is local time
         :return: report for specified container
         """
 
+        if as_of is not None:
+            return self._get_report_as_of(container_barcode, as_of.astimezone(datetime.timezone.utc))
+
+        if self.inventory is not None:
+            inventory_report = self._get_inventory_report(container_barcode)
+            if inventory_report is not None:
+                return inventory_report
+
+        if self.report_cache is not None:
+            cached_report = self.report_cache.get(container_barcode)
+            if cached_report is not None:
+                return cached_report
+
+        report: tp.Union[TubeReport, PlateReport]
         if tube_barcode_validator.validate(container_barcode):
-            return self._get_tube_report(tube_barcode=container_barcode)
+            report = self._get_tube_report(tube_barcode=container_barcode)
         elif plate_barcode_validator.validate(container_barcode):
-            return self._get_plate_report(plate_barcode=container_barcode)
+            report = self._get_plate_report(plate_barcode=container_barcode)
         else:
             raise BarcodeBadFormat(barcode=container_barcode)
 
+        if self.report_cache is not None:
+            self.report_cache.put(container_barcode, report)
+        return report
+
+    def _get_inventory_report(self, container_barcode: str) -> tp.Optional[tp.Union[TubeReport, PlateReport]]:
+        # None for containers missing in memory, they are looked up in the database
+        assert self.inventory is not None
+        if tube_barcode_validator.validate(container_barcode):
+            return self.inventory.tube_report(container_barcode)
+        if plate_barcode_validator.validate(container_barcode):
+            return self.inventory.plate_report(container_barcode)
+        raise BarcodeBadFormat(barcode=container_barcode)
+
+    def list_tubes_in_range(self, first_tube_barcode: str, last_tube_barcode: str) -> tp.List[TubeReport]:
+        """
+        Range scan over numeric part of tube barcodes: NT1000 - NT2000 includes NT1500 and NT01500
+        :param first_tube_barcode: str, format: NT<number>
+        :param last_tube_barcode: str, format: NT<number>
+        :return: reports for occupied tubes in range, ordered by barcode number
+        """
+
+        first_number = tube_barcode_codec.parse(first_tube_barcode).number
+        last_number = tube_barcode_codec.parse(last_tube_barcode).number
+
+        fetched_samples = self.session.execute(
+            select(Sample.tube_barcode, Sample.id, Sample.customer_sample_name)
+            .where(Sample.tube_barcode_number.between(first_number, last_number))
+            .order_by(Sample.tube_barcode_number, Sample.tube_barcode)
+        )
+
+        return [
+            TubeReport(tube_barcode=tube_barcode, sample_id=sample_id, customer_sample_name=customer_sample_name)
+            for (tube_barcode, sample_id, customer_sample_name) in fetched_samples
+        ]
+
+    def iter_inventory(self, plate_prefix: tp.Optional[str] = None, first_barcode: tp.Optional[str] = None,
+                       last_barcode: tp.Optional[str] = None,
+                       batch_size: int = INVENTORY_BATCH_SIZE) -> tp.Iterator[InventoryRow]:
+        """
+        Stream all samples with their plate placements, one row per well (or one row for samples not on plates).
+        Rows are fetched in batches from a server side cursor, so memory does not grow with inventory size.
+        :param plate_prefix: only wells of plates which barcodes start with the prefix, e.g. "DN12"
+        :param first_barcode: lower bound of range by barcode number, tube (NT<number>) or plate (DN<number>)
+        :param last_barcode: upper bound of range, same container type as first_barcode
+        :param batch_size: rows per fetch
+        :return: iterator over inventory rows ordered by sample id and well
+        """
+
+        statement = (
+            select(Sample.id, Sample.customer_sample_name, Sample.tube_barcode, Well.plate_barcode, Well.row, Well.col)
+            .outerjoin(Well, Well.sample_id == Sample.id)
+            .order_by(Sample.id, Well.plate_barcode, Well.row, Well.col)
+        )
+
+        if plate_prefix is not None:
+            statement = statement.where(Well.plate_barcode.startswith(plate_prefix, autoescape=True))
+
+        if first_barcode is not None or last_barcode is not None:
+            range_barcode = tp.cast(str, first_barcode if first_barcode is not None else last_barcode)
+            if tube_barcode_codec.validate(range_barcode):
+                codec, number_column = tube_barcode_codec, Sample.tube_barcode_number
+            elif plate_barcode_codec.validate(range_barcode):
+                codec, number_column = plate_barcode_codec, Well.plate_barcode_number
+            else:
+                raise BarcodeBadFormat(barcode=range_barcode)
+
+            if first_barcode is not None:
+                statement = statement.where(number_column >= codec.parse(first_barcode).number)
+            if last_barcode is not None:
+                statement = statement.where(number_column <= codec.parse(last_barcode).number)
+
+        # Filters are validated eagerly, rows are fetched only when the iterator is consumed
+        return self._stream_inventory(statement, batch_size)
+
+    def _stream_inventory(self, statement: Select[tp.Tuple[int, tp.Optional[str], str, tp.Optional[str],
+                                                           tp.Optional[int], tp.Optional[int]]],
+                          batch_size: int) -> tp.Iterator[InventoryRow]:
+        # yield_per implies stream_results: named cursor on psycopg2, rows are buffered by batch_size
+        result = self.session.execute(statement, execution_options={"yield_per": batch_size})
+        try:
+            for sample_id, customer_sample_name, tube_barcode, plate_barcode, row, col in result:
+                well_position = None
+                if row is not None and col is not None:
+                    well_position = WellPositionFormatAdapter.get_string_position(row=row, col=col)
+                yield InventoryRow(sample_id, customer_sample_name, tube_barcode, plate_barcode, well_position)
+        finally:
+            result.close()
+
     def _get_tube_report(self, tube_barcode: str) -> TubeReport:
 
-        fetched_sample = self.session.query(Sample).filter(Sample.tube_barcode == tube_barcode).first()
+        fetched_sample = self.session.execute(
+            select(Sample.id, Sample.customer_sample_name).where(Sample.tube_barcode == tube_barcode)
+        ).first()
 
         if fetched_sample is None:
             raise TubeNotFound(tube_barcode=tube_barcode)
         else:
-            assert fetched_sample.customer_sample_name is not None
+            sample_id, customer_sample_name = fetched_sample
+            assert customer_sample_name is not None
             return TubeReport(
                 tube_barcode=tube_barcode,
-                sample_id=fetched_sample.id,
-                customer_sample_name=fetched_sample.customer_sample_name
+                sample_id=sample_id,
+                customer_sample_name=customer_sample_name
             )
 
     def _get_plate_report(self, plate_barcode: str) -> PlateReport:
-        fetched_wells_and_samples = (
-            self.session.query(Well, Sample)
-                .join(Well, Sample.id == Well.sample_id)
-                .filter(Well.plate_barcode == plate_barcode)
-                .all()
+        # Column projection, entities are not loaded into the identity map
+        fetched_wells = self.session.execute(
+            select(Well.row, Well.col, Well.sample_id, Sample.customer_sample_name)
+            .join(Sample, Sample.id == Well.sample_id)
+            .where(Well.plate_barcode == plate_barcode)
+            .order_by(Well.row, Well.col)
         )
 
-        # Convert to list[tuple(Well, Sample)]
-        fetched_wells_and_samples_converted = [(well, sample) for (well, sample) in fetched_wells_and_samples]
+        wells = [
+            PlateWell(WellPositionFormatAdapter.get_string_position(row=row, col=col), row, col, sample_id,
+                      customer_sample_name)
+            for (row, col, sample_id, customer_sample_name) in fetched_wells
+        ]
 
-        if not fetched_wells_and_samples:
+        if not wells:
             raise OccupiedWellsNotFound(plate_barcode=plate_barcode)
         else:
-            return PlateReport(
-                plate_barcode=plate_barcode,
-                wells_and_samples=fetched_wells_and_samples_converted
+            return PlateReport(plate_barcode=plate_barcode, wells=wells)
+
+    def _get_report_as_of(self, container_barcode: str, as_of: datetime.datetime) -> tp.Union[TubeReport, PlateReport]:
+        # occurred_at <= as_of prunes partitions of later months on PostgreSQL
+        if tube_barcode_validator.validate(container_barcode):
+            # Latest event that moved a sample into the tube, if the sample did not leave it before as_of
+            event, later_event = custody_events.alias("event"), custody_events.alias("later_event")
+            fetched_sample = self.session.execute(
+                select(event.c.sample_id, Sample.customer_sample_name)
+                .join(Sample, Sample.id == event.c.sample_id)
+                .where(event.c.tube_barcode == container_barcode, event.c.occurred_at <= as_of)
+                .where(~exists().where(later_event.c.sample_id == event.c.sample_id,
+                                       later_event.c.tube_barcode.is_not(None),
+                                       later_event.c.occurred_at > event.c.occurred_at,
+                                       later_event.c.occurred_at <= as_of))
+                .order_by(event.c.occurred_at.desc())
+                .limit(1)
+            ).first()
+            if fetched_sample is None:
+                raise TubeNotFound(tube_barcode=container_barcode)
+            sample_id, customer_sample_name = fetched_sample
+            return TubeReport(tube_barcode=container_barcode, sample_id=sample_id,
+                              customer_sample_name=customer_sample_name)
+
+        if plate_barcode_validator.validate(container_barcode):
+            # Wells are never emptied, so the plate had every sample placed before as_of
+            fetched_wells = self.session.execute(
+                select(custody_events.c.row, custody_events.c.col, custody_events.c.sample_id,
+                       Sample.customer_sample_name)
+                .join(Sample, Sample.id == custody_events.c.sample_id)
+                .where(custody_events.c.plate_barcode == container_barcode, custody_events.c.occurred_at <= as_of)
+                .order_by(custody_events.c.row, custody_events.c.col)
             )
+            wells = [
+                PlateWell(WellPositionFormatAdapter.get_string_position(row=row, col=col), row, col, sample_id,
+                          customer_sample_name)
+                for (row, col, sample_id, customer_sample_name) in fetched_wells
+            ]
+            if not wells:
+                raise OccupiedWellsNotFound(plate_barcode=container_barcode)
+            return PlateReport(plate_barcode=container_barcode, wells=wells)
+
+        raise BarcodeBadFormat(barcode=container_barcode)
+
+    def custody_history(self, subject: tp.Union[int, str]) -> CustodyHistory:
+        """
+        Receipts, transfers and plate placements of sample or container
+        :param subject: int sample_id, tube barcode (events into and out of the tube) or plate barcode
+        :return: events ordered by time
+        """
+
+        if isinstance(subject, int):
+            if subject <= 0:
+                raise SampleIdBadFormatting(sample_id=subject)
+            condition = custody_events.c.sample_id == subject
+        elif tube_barcode_validator.validate(subject):
+            # Two partial indexes, combined by bitmap OR on PostgreSQL
+            condition = (custody_events.c.tube_barcode == subject) | (custody_events.c.source_tube_barcode == subject)
+        elif plate_barcode_validator.validate(subject):
+            condition = custody_events.c.plate_barcode == subject
+        else:
+            raise BarcodeBadFormat(barcode=subject)
+
+        fetched_events = self.session.execute(
+            select(custody_events)
+            .where(condition)
+            .order_by(custody_events.c.occurred_at, custody_events.c.sample_id, custody_events.c.row,
+                      custody_events.c.col)
+        )
+
+        events = [
+            CustodyEvent(occurred_at, event_type, sample_id, tube_barcode, source_tube_barcode, plate_barcode,
+                         None if row is None else WellPositionFormatAdapter.get_string_position(row=row, col=col))
+            for (occurred_at, event_type, sample_id, tube_barcode, source_tube_barcode, plate_barcode, row, col)
+            in fetched_events
+        ]
+
+        if not events:
+            raise CustodyHistoryNotFound(subject=subject)
+        return CustodyHistory(subject=subject, events=events)
 
+    def locate_sample(self, sample: tp.Union[int, str]) -> tp.List[SampleLocation]:
+        """
+        Current tube and plate wells of sample
+        :param sample: int sample_id, or str customer_sample_name which may match several samples
+        :return: one location per matching sample, ordered by sample_id
+        """
+
+        if isinstance(sample, int):
+            if sample <= 0:
+                raise SampleIdBadFormatting(sample_id=sample)
+            condition = Sample.id == sample
+        else:
+            condition = Sample.customer_sample_name == sample
+
+        # One round trip: sample row by primary key or name index, wells from covering ix_wells_sample_id
+        fetched_rows = self.session.execute(
+            select(Sample.id, Sample.customer_sample_name, Sample.tube_barcode, Well.plate_barcode, Well.row, Well.col)
+            .outerjoin(Well, Well.sample_id == Sample.id)
+            .where(condition)
+            .order_by(Sample.id, Well.plate_barcode, Well.row, Well.col)
+        )
+
+        locations: tp.Dict[int, SampleLocation] = {}
+        for sample_id, customer_sample_name, tube_barcode, plate_barcode, row, col in fetched_rows:
+            location = locations.get(sample_id)
+            if location is None:
+                location = locations[sample_id] = SampleLocation(sample_id, customer_sample_name, tube_barcode, [])
+            if plate_barcode is not None:
+                well_position = WellPositionFormatAdapter.get_string_position(row=row, col=col)
+                location.wells.append(WellLocation(plate_barcode, well_position))
+
+        if not locations:
+            if isinstance(sample, int):
+                raise SampleNotFound(sample_id=sample)
+            raise SampleNameNotFound(customer_sample_name=sample)
+
+        return list(locations.values())
+
+    @transactional
     def tube_transfer(self, source_tube_barcode: str, destination_tube_barcode: str) -> None:
         """
         :param source_tube_barcode: str, format: NT<number>
@@ -133,21 +901,166 @@ class DatabaseLayer:
         if not tube_barcode_validator.validate(destination_tube_barcode):
             raise TubeBarcodeBadFormat(barcode=destination_tube_barcode)
 
-        fetched_dest_sample = self.session.query(Sample).filter(Sample.tube_barcode == destination_tube_barcode).first()
-
-        if fetched_dest_sample:
-            raise OccupiedDestinationTube(tube_barcode=destination_tube_barcode)
+        if self.inventory is not None:
+            # Same order of errors as the checks after UPDATE below
+            if self.inventory.tube_sample_id(destination_tube_barcode) is not None and \
+                    self._tube_sample_id(destination_tube_barcode) is not None:
+                raise OccupiedDestinationTube(tube_barcode=destination_tube_barcode)
+            if self.inventory.tube_sample_id(source_tube_barcode) is None and \
+                    self._tube_sample_id(source_tube_barcode) is None:
+                raise TubeNotFound(tube_barcode=source_tube_barcode)
 
-        fetched_source_sample = self.session.query(Sample).filter(Sample.tube_barcode == source_tube_barcode).first()
+        # Conditional UPDATE locks the source row and checks the destination in one statement, so concurrent
+        # transfers of the same tube wait for each other and the later one finds the source empty
+        destination_sample = aliased(Sample)
+        try:
+            moved_sample_id = self.session.execute(
+                update(Sample)
+                .where(Sample.tube_barcode == source_tube_barcode)
+                .where(~select(destination_sample.id)
+                       .where(destination_sample.tube_barcode == destination_tube_barcode).exists())
+                .values(tube_barcode=destination_tube_barcode,
+                        tube_barcode_number=tube_barcode_codec.number(destination_tube_barcode))
+                .returning(Sample.id)
+            ).scalar()
+        except IntegrityError as exc:
+            # Destination was filled by concurrent transaction committed after the check
+            self.session.rollback()
+            raise OccupiedDestinationTube(tube_barcode=destination_tube_barcode) from exc
 
-        if not fetched_source_sample:
+        if moved_sample_id is None:
+            destination_occupied = self.session.scalar(
+                select(Sample.id).where(Sample.tube_barcode == destination_tube_barcode).exists().select()
+            )
+            if destination_occupied:
+                raise OccupiedDestinationTube(tube_barcode=destination_tube_barcode)
             raise TubeNotFound(tube_barcode=source_tube_barcode)
 
-        fetched_source_sample.tube_barcode = destination_tube_barcode
+        self._append_custody_events([
+            self._tube_event(TRANSFERRED, moved_sample_id, destination_tube_barcode, source_tube_barcode)
+        ])
+        self.session.commit()
+        self._invalidate_reports(source_tube_barcode, destination_tube_barcode)
+        if self.inventory is not None:
+            self.inventory.move_tubes([(source_tube_barcode, destination_tube_barcode)])
+
+    def tube_transfer_batch(self, transfers: tp.Iterable[tp.Sequence[str]]) -> int:
+        """
+        Applies all transfers in one transaction. A destination may be occupied by a tube that is
+        emptied by another transfer of the same batch, so swaps and chains (A -> B -> C) are allowed.
+        :param transfers: iterable of (source_tube_barcode, destination_tube_barcode), format: NT<number>
+        :return: number of applied transfers, transfers of a tube to itself are validated and skipped
+        """
+
+        pairs = [(source, destination) for (source, destination) in transfers]
+        for source_tube_barcode, destination_tube_barcode in pairs:
+            if not tube_barcode_validator.validate(source_tube_barcode):
+                raise TubeBarcodeBadFormat(barcode=source_tube_barcode)
+            if not tube_barcode_validator.validate(destination_tube_barcode):
+                raise TubeBarcodeBadFormat(barcode=destination_tube_barcode)
+
+        moves = [(source, destination) for (source, destination) in pairs if source != destination]
+
+        source_tube_barcodes: tp.Set[str] = set()
+        destination_tube_barcodes: tp.Set[str] = set()
+        for source_tube_barcode, destination_tube_barcode in moves:
+            if source_tube_barcode in source_tube_barcodes:
+                raise ConflictingTubeTransfers(tube_barcode=source_tube_barcode)
+            if destination_tube_barcode in destination_tube_barcodes:
+                raise ConflictingTubeTransfers(tube_barcode=destination_tube_barcode)
+            source_tube_barcodes.add(source_tube_barcode)
+            destination_tube_barcodes.add(destination_tube_barcode)
+
+        if not moves:
+            return 0
+
+        if self.inventory is not None:
+            # Same checks as under row locks in _apply_tube_transfers, failing batches skip the locking transaction
+            for source_tube_barcode, destination_tube_barcode in moves:
+                if self.inventory.tube_sample_id(source_tube_barcode) is None and \
+                        self._tube_sample_id(source_tube_barcode) is None:
+                    raise TubeNotFound(tube_barcode=source_tube_barcode)
+                if destination_tube_barcode not in source_tube_barcodes and \
+                        self.inventory.tube_sample_id(destination_tube_barcode) is not None and \
+                        self._tube_sample_id(destination_tube_barcode) is not None:
+                    raise OccupiedDestinationTube(tube_barcode=destination_tube_barcode)
+
+        self._apply_tube_transfers(moves, source_tube_barcodes, destination_tube_barcodes)
+        self._invalidate_reports(*source_tube_barcodes, *destination_tube_barcodes)
+        if self.inventory is not None:
+            self.inventory.move_tubes(moves)
+        return len(moves)
+
+    @transactional
+    def _apply_tube_transfers(self, moves: tp.List[tp.Tuple[str, str]], source_tube_barcodes: tp.Set[str],
+                              destination_tube_barcodes: tp.Set[str]) -> None:
+        # Rows are locked in id order, so concurrent batches touching the same tubes do not deadlock
+        fetched_sample_ids = {tube_barcode: sample_id for (tube_barcode, sample_id) in self.session.execute(
+            select(Sample.tube_barcode, Sample.id)
+            .where(Sample.tube_barcode.in_(source_tube_barcodes | destination_tube_barcodes))
+            .order_by(Sample.id)
+            .with_for_update()
+        )}
+
+        for source_tube_barcode, destination_tube_barcode in moves:
+            if source_tube_barcode not in fetched_sample_ids:
+                # Release row locks
+                self.session.commit()
+                raise TubeNotFound(tube_barcode=source_tube_barcode)
+            if destination_tube_barcode in fetched_sample_ids and destination_tube_barcode not in source_tube_barcodes:
+                self.session.commit()
+                raise OccupiedDestinationTube(tube_barcode=destination_tube_barcode)
+
+        destinations_by_sample_id = {
+            fetched_sample_ids[source_tube_barcode]: destination_tube_barcode
+            for (source_tube_barcode, destination_tube_barcode) in moves
+        }
 
         try:
+            if destination_tube_barcodes & source_tube_barcodes:
+                # Unique constraint is checked row by row, so tubes of swaps and chains
+                # are moved out of the way before the final update
+                self.session.execute(
+                    update(Sample)
+                    .where(Sample.id.in_(destinations_by_sample_id))
+                    .values(tube_barcode=literal(TRANSFER_STAGING_PREFIX) + cast(Sample.id, String))
+                    .execution_options(synchronize_session=False)
+                )
+
+            self.session.execute(
+                update(Sample)
+                .where(Sample.id.in_(destinations_by_sample_id))
+                .values(
+                    tube_barcode=case(destinations_by_sample_id, value=Sample.id),
+                    tube_barcode_number=case(
+                        {sample_id: tube_barcode_codec.number(tube_barcode)
+                         for (sample_id, tube_barcode) in destinations_by_sample_id.items()},
+                        value=Sample.id
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self._append_custody_events([
+                self._tube_event(TRANSFERRED, fetched_sample_ids[source_tube_barcode], destination_tube_barcode,
+                                 source_tube_barcode)
+                for (source_tube_barcode, destination_tube_barcode) in moves
+            ])
             self.session.commit()
-        except IntegrityError as exc:
+        except Exception:
             self.session.rollback()
+            raise
 
+    def _invalidate_reports(self, *container_barcodes: str) -> None:
+        if self.report_cache is not None:
+            self.report_cache.invalidate(*container_barcodes)
 
+    def discard_derived_state(self) -> None:
+        """
+        Drop cached reports and reload inventory after outer transaction (group commit) was rolled back:
+        they were updated by writes which are not in database anymore
+        """
+        if self.report_cache is not None:
+            self.report_cache.clear()
+        if self.inventory is not None:
+            self.inventory = type(self.inventory).load(self.session)
+            self.session.commit()
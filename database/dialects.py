@@ -0,0 +1,64 @@
+import typing as tp
+
+from sqlalchemy import insert, Insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database.scheme import Base
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING, others fall back to savepoints in execute_on_conflict_do_nothing
+ON_CONFLICT_DIALECTS = ("postgresql", "sqlite")
+
+
+def _dialect_name(session: tp.Union[Session, Connection]) -> str:
+    return session.dialect.name if isinstance(session, Connection) else session.get_bind().dialect.name
+
+
+def insert_on_conflict_do_nothing(session: tp.Union[Session, Connection], model: tp.Type[Base],
+                                  index_elements: tp.Sequence[str]) -> Insert:
+    """
+    INSERT ... ON CONFLICT (index_elements) DO NOTHING for the dialect of session, plain INSERT for dialects
+    without ON CONFLICT. Execute it with execute_on_conflict_do_nothing, so conflicts are skipped on every dialect
+    :param session: session or connection
+    :param model: mapped class of table to insert into
+    :param index_elements: columns of unique constraint to check conflicts against
+    :return: insert statement
+    """
+    dialect_name = _dialect_name(session)
+
+    if dialect_name not in ON_CONFLICT_DIALECTS:
+        return insert(model)
+    elif dialect_name == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    else:
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
+def execute_on_conflict_do_nothing(session: tp.Union[Session, Connection], statement: Insert,
+                                   parameters: tp.Optional[tp.Sequence[tp.Dict[str, tp.Any]]] = None) -> tp.Any:
+    """
+    Executes statement of insert_on_conflict_do_nothing. Without ON CONFLICT every row is inserted in a savepoint
+    and a row failing with IntegrityError is skipped, as ON CONFLICT DO NOTHING would skip it
+    :param session: session or connection the statement was built for
+    :param statement: insert statement of insert_on_conflict_do_nothing
+    :param parameters: rows to insert with executemany, None for statement with values or from_select
+    :return: first column of last returned row for statement with RETURNING, None if the row was skipped
+    """
+    if _dialect_name(session) in ON_CONFLICT_DIALECTS:
+        result = session.execute(statement, parameters)
+        return result.scalar() if statement.exported_columns else None
+
+    rows: tp.Sequence[tp.Optional[tp.Dict[str, tp.Any]]] = [None]
+    if parameters is not None:
+        rows = parameters
+    returned = None
+    for row_parameters in rows:
+        try:
+            with session.begin_nested():
+                result = session.execute(statement, row_parameters)
+                returned = result.scalar() if statement.exported_columns else None
+        except IntegrityError:
+            returned = None
+    return returned
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import threading
+import time
+import typing as tp
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+from sqlalchemy.orm import Session
+
+from database.transactions import ContentionCounters, format_contention_prometheus
+
+# Key of statements executed outside of any command, e.g. during startup
+NO_COMMAND = "(no command)"
+
+
+class CommandStats:
+    """Counters of one command name, summed over all its executions"""
+    __slots__ = ("count", "statements", "rows", "sql_seconds", "total_seconds", "commits", "commit_seconds")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.statements = 0
+        # Rows affected or returned as reported by the driver, SQLite does not report rows of SELECT
+        self.rows = 0
+        self.sql_seconds = 0.0
+        self.total_seconds = 0.0
+        self.commits = 0
+        # Session.commit including flush of pending changes
+        self.commit_seconds = 0.0
+
+    @property
+    def python_seconds(self) -> float:
+        return max(self.total_seconds - self.sql_seconds, 0.0)
+
+    def add(self, other: "CommandStats") -> None:
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+class SqlInstrumentation:
+    """
+    Per-command SQL counters collected from engine and session events.
+    Current command is kept per thread, so one instance can serve threaded front ends.
+    """
+
+    def __init__(self, clock: tp.Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self._stats: tp.Dict[str, CommandStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._listeners: tp.List[tp.Tuple[tp.Any, str, tp.Callable[..., None]]] = []
+
+    def instrument_engine(self, engine: Engine) -> None:
+        self._listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        self._listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def instrument_session(self, session: Session) -> None:
+        self._listen(session, "before_commit", self._before_commit)
+        self._listen(session, "after_commit", self._after_commit)
+
+    def remove_listeners(self) -> None:
+        for target, name, listener in self._listeners:
+            event.remove(target, name, listener)
+        self._listeners.clear()
+
+    def _listen(self, target: tp.Any, name: str, listener: tp.Callable[..., None]) -> None:
+        event.listen(target, name, listener)
+        self._listeners.append((target, name, listener))
+
+    def start_command(self, command: str) -> None:
+        self._local.command = command
+        self._local.stats = CommandStats()
+        self._local.started = self.clock()
+
+    def finish_command(self) -> None:
+        command = getattr(self._local, "command", None)
+        if command is None:
+            return
+
+        stats = self._current_stats()
+        stats.count += 1
+        stats.total_seconds += self.clock() - self._local.started
+        self._local.command = None
+        self._merge(command, stats)
+
+    def snapshot(self) -> tp.Dict[str, CommandStats]:
+        """Copy of counters by command name"""
+        with self._lock:
+            snapshot = {}
+            for command, stats in self._stats.items():
+                snapshot[command] = CommandStats()
+                snapshot[command].add(stats)
+            return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _current_stats(self) -> CommandStats:
+        if getattr(self._local, "command", None) is None:
+            # Outside of commands every event is merged right away
+            self._local.stats = CommandStats()
+        return tp.cast(CommandStats, self._local.stats)
+
+    def _record(self, update: tp.Callable[[CommandStats], None]) -> None:
+        stats = self._current_stats()
+        update(stats)
+        if getattr(self._local, "command", None) is None:
+            self._merge(NO_COMMAND, stats)
+
+    def _merge(self, command: str, stats: CommandStats) -> None:
+        with self._lock:
+            self._stats.setdefault(command, CommandStats()).add(stats)
+
+    def _before_cursor_execute(self, conn: Connection, cursor: DBAPICursor, statement: str, parameters: tp.Any,
+                               context: tp.Optional[ExecutionContext], executemany: bool) -> None:
+        conn.info.setdefault("instrumentation_started", []).append(self.clock())
+
+    def _after_cursor_execute(self, conn: Connection, cursor: DBAPICursor, statement: str, parameters: tp.Any,
+                              context: tp.Optional[ExecutionContext], executemany: bool) -> None:
+        elapsed = self.clock() - conn.info["instrumentation_started"].pop()
+        rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount > 0 else 0
+
+        def update(stats: CommandStats) -> None:
+            stats.statements += 1
+            stats.rows += rows
+            stats.sql_seconds += elapsed
+        self._record(update)
+
+    def _before_commit(self, session: Session) -> None:
+        self._local.commit_started = self.clock()
+
+    def _after_commit(self, session: Session) -> None:
+        commit_started = getattr(self._local, "commit_started", None)
+        if commit_started is None:
+            return
+        elapsed = self.clock() - commit_started
+        self._local.commit_started = None
+
+        def update(stats: CommandStats) -> None:
+            stats.commits += 1
+            stats.commit_seconds += elapsed
+        self._record(update)
+
+
+PROMETHEUS_METRICS = [
+    # (metric name, CommandStats attribute, help)
+    ("sample_tracking_commands_total", "count", "Executed commands"),
+    ("sample_tracking_command_seconds_total", "total_seconds", "Wall time of commands"),
+    ("sample_tracking_sql_statements_total", "statements", "SQL statements sent to database"),
+    ("sample_tracking_sql_rows_total", "rows", "Rows affected or returned as reported by driver"),
+    ("sample_tracking_sql_seconds_total", "sql_seconds", "Time spent in SQL statements"),
+    ("sample_tracking_python_seconds_total", "python_seconds", "Time of commands spent outside of SQL statements"),
+    ("sample_tracking_commits_total", "commits", "Session commits"),
+    ("sample_tracking_commit_seconds_total", "commit_seconds", "Time of session commits including flush"),
+]
+
+
+def format_prometheus(snapshot: tp.Dict[str, CommandStats]) -> str:
+    """Counters in Prometheus text exposition format, labelled by command"""
+    lines = []
+    for metric, attribute, help_text in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for command, stats in sorted(snapshot.items()):
+            label = command.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{metric}{{command="{label}"}} {getattr(stats, attribute)}')
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusFileWriter:
+    """Writes counters to file for textfile collectors, at most once per interval"""
+
+    def __init__(self, path: str, instrumentation: SqlInstrumentation, interval_seconds: float = 15.0,
+                 clock: tp.Callable[[], float] = time.monotonic,
+                 contention_counters: tp.Optional[ContentionCounters] = None):
+        self.path = path
+        self.instrumentation = instrumentation
+        # Transaction retry counters written after command counters
+        self.contention_counters = contention_counters
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self._written_at: tp.Optional[float] = None
+
+    def maybe_write(self) -> bool:
+        now = self.clock()
+        if self._written_at is not None and now - self._written_at < self.interval_seconds:
+            return False
+        self.write()
+        self._written_at = now
+        return True
+
+    def write(self) -> None:
+        # Replace file atomically, collectors never read half written file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w") as file:
+                file.write(format_prometheus(self.instrumentation.snapshot()))
+                if self.contention_counters is not None:
+                    file.write(format_contention_prometheus(self.contention_counters))
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
@@ -0,0 +1,480 @@
+import threading
+import typing as tp
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from barcode_codec import BarcodeCodec, tube_barcode_codec, plate_barcode_codec
+from database.scheme import Sample, Well
+from plate_occupancy import PLATE_COLUMNS, WELLS_PER_PLATE
+from reports import PlateReport, PlateWell, TubeReport, WellPositionFormatAdapter
+
+# Rows fetched per round trip while loading and checking
+INVENTORY_LOAD_BATCH_SIZE = 50000
+
+# Barcode key: numeric part shifted left, digits count in the low bits, so NT1 and NT01 get different keys
+_WIDTH_BITS = 5
+_MAX_KEY_NUMBER = (1 << (63 - _WIDTH_BITS)) - 1
+
+# Fibonacci hashing multiplier, spreads consecutive barcode numbers over the table
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_UINT64_MASK = (1 << 64) - 1
+
+_WELL_POSITIONS = [WellPositionFormatAdapter.get_string_position(row=index // PLATE_COLUMNS + 1,
+                                                                 col=index % PLATE_COLUMNS + 1)
+                   for index in range(WELLS_PER_PLATE)]
+
+Int64Array = npt.NDArray[np.int64]
+
+
+def barcode_key(codec: BarcodeCodec, barcode: str) -> tp.Optional[int]:
+    """Positive int64 key of barcode, None for invalid barcodes and numbers too long for the key"""
+    parsed = codec.parse_or_none(barcode)
+    if parsed is None or parsed.width >= 1 << _WIDTH_BITS or parsed.number > _MAX_KEY_NUMBER:
+        return None
+    return parsed.number << _WIDTH_BITS | parsed.width
+
+
+def barcode_keys(numbers: Int64Array, widths: Int64Array) -> Int64Array:
+    """Vectorized barcode_key of numeric parts and digit counts, 0 where the key can not hold them"""
+    keyable = (numbers >= 0) & (numbers <= _MAX_KEY_NUMBER) & (widths > 0) & (widths < 1 << _WIDTH_BITS)
+    return np.where(keyable, numbers << _WIDTH_BITS | widths, 0)
+
+
+class KeyIndex:
+    """
+    Hash table of positive int64 keys to int64 values in two NumPy arrays, open addressing with linear probing.
+    About 17 bytes per entry instead of about 100 for dict of ints.
+    """
+    _EMPTY = 0
+    _DELETED = -1
+    _MAX_LOAD = 0.7
+
+    def __init__(self, capacity: int = 1024):
+        self._bits = max(int(capacity - 1).bit_length(), 4)
+        self._keys: Int64Array = np.zeros(1 << self._bits, dtype=np.int64)
+        self._values: Int64Array = np.zeros(1 << self._bits, dtype=np.int64)
+        # Live entries and live plus deleted slots, probing stops only at empty slots
+        self._size = 0
+        self._used = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._values.nbytes
+
+    def _slot(self, key: int) -> int:
+        return ((key * _HASH_MULTIPLIER) & _UINT64_MASK) >> (64 - self._bits)
+
+    def _slots(self, keys: Int64Array) -> Int64Array:
+        # uint64 multiplication wraps around like the scalar version
+        hashed = keys.astype(np.uint64) * np.uint64(_HASH_MULTIPLIER)
+        return (hashed >> np.uint64(64 - self._bits)).astype(np.int64)
+
+    def get(self, key: int) -> tp.Optional[int]:
+        keys, mask = self._keys, (1 << self._bits) - 1
+        slot = self._slot(key)
+        while True:
+            found = keys[slot]
+            if found == key:
+                return int(self._values[slot])
+            if found == self._EMPTY:
+                return None
+            slot = (slot + 1) & mask
+
+    def put(self, key: int, value: int) -> None:
+        if self._used + 1 > self._MAX_LOAD * len(self._keys):
+            self._rebuild(self._size + 1)
+
+        keys, mask = self._keys, (1 << self._bits) - 1
+        slot, free_slot = self._slot(key), None
+        while True:
+            found = keys[slot]
+            if found == key:
+                self._values[slot] = value
+                return
+            if found == self._DELETED and free_slot is None:
+                free_slot = slot
+            if found == self._EMPTY:
+                break
+            slot = (slot + 1) & mask
+
+        if free_slot is None:
+            free_slot = slot
+            self._used += 1
+        keys[free_slot] = key
+        self._values[free_slot] = value
+        self._size += 1
+
+    def remove(self, key: int) -> None:
+        keys, mask = self._keys, (1 << self._bits) - 1
+        slot = self._slot(key)
+        while True:
+            found = keys[slot]
+            if found == key:
+                # Tombstone keeps probe chains of other keys unbroken
+                keys[slot] = self._DELETED
+                self._size -= 1
+                return
+            if found == self._EMPTY:
+                return
+            slot = (slot + 1) & mask
+
+    def put_new(self, keys: Int64Array, values: Int64Array) -> None:
+        """Vectorized insert of unique keys not yet in the index"""
+        if self._used + len(keys) > self._MAX_LOAD * len(self._keys):
+            self._rebuild(self._size + len(keys))
+        self._insert_new(keys, values)
+
+    def items(self) -> tp.Tuple[Int64Array, Int64Array]:
+        live = self._keys > 0
+        return self._keys[live], self._values[live]
+
+    def _rebuild(self, size: int) -> None:
+        keys, values = self.items()
+        self._bits = max(int(size / self._MAX_LOAD * 2 - 1).bit_length(), 4)
+        self._keys = np.zeros(1 << self._bits, dtype=np.int64)
+        self._values = np.zeros(1 << self._bits, dtype=np.int64)
+        self._size = self._used = 0
+        self._insert_new(keys, values)
+
+    def _insert_new(self, keys: Int64Array, values: Int64Array) -> None:
+        # Every round places each pending key into its next probe slot if the slot is empty, the first key wins
+        # slots wanted by several keys. Slots skipped by a key are never emptied, so lookups find it
+        mask = (1 << self._bits) - 1
+        home_slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        probe = 0
+        while len(pending):
+            slots = (home_slots[pending] + probe) & mask
+            free = self._keys[slots] == self._EMPTY
+            free_slots, first = np.unique(slots[free], return_index=True)
+            placed = pending[free][first]
+            self._keys[free_slots] = keys[placed]
+            self._values[free_slots] = values[placed]
+
+            is_placed = np.zeros(len(keys), dtype=bool)
+            is_placed[placed] = True
+            pending = pending[~is_placed[pending]]
+            probe += 1
+
+        self._size += len(keys)
+        self._used += len(keys)
+
+
+class InventoryMismatch(tp.NamedTuple):
+    """Difference between database and memory found by consistency check"""
+    kind: str
+    key: str
+    database_value: tp.Any
+    memory_value: tp.Any
+
+
+class InventoryEngine:
+    """
+    In-process copy of samples and wells in NumPy arrays for reads and pre-write checks without database round trips.
+    Arrays are indexed by sample id and by plate slot, tube and plate barcodes are found through KeyIndex.
+    DatabaseLayer applies its writes after commit, so the engine only stays in sync when writes of all processes
+    go through the layer owning it; check_consistency finds drift.
+    """
+
+    def __init__(self, sample_capacity: int = 1024, plate_capacity: int = 256):
+        # By sample id: tube key (0 no sample, -1 barcode kept in _other_tubes) and name slice of _names
+        self._tube_keys: Int64Array = np.zeros(sample_capacity, dtype=np.int64)
+        self._name_starts: Int64Array = np.zeros(sample_capacity, dtype=np.int64)
+        # -1 for NULL names
+        self._name_lengths: npt.NDArray[np.int32] = np.zeros(sample_capacity, dtype=np.int32)
+        # UTF-8 names one after another, names never change
+        self._names = bytearray()
+        self._samples_count = 0
+
+        self._tubes = KeyIndex()
+        self._plates = KeyIndex()
+        # By plate slot: sample id of every well in row-major order, 0 for empty wells
+        self._plate_wells: npt.NDArray[np.int32] = np.zeros((plate_capacity, WELLS_PER_PLATE), dtype=np.int32)
+        self._plates_count = 0
+        self._wells_count = 0
+
+        # Barcodes without key: legacy rows not matching the barcode format, very long numbers
+        self._other_tubes: tp.Dict[str, int] = {}
+        self._other_plates: tp.Dict[str, int] = {}
+
+        # Writes are applied by server threads, readers need consistent arrays while they grow
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, session: Session, batch_size: int = INVENTORY_LOAD_BATCH_SIZE) -> "InventoryEngine":
+        """Engine with all samples and wells of database, rows are streamed in batches"""
+        engine = cls()
+
+        # Barcodes are rebuilt from indexed numbers and lengths, so rows are converted without parsing strings
+        samples = session.execute(
+            select(Sample.id, Sample.customer_sample_name, Sample.tube_barcode_number,
+                   func.length(Sample.tube_barcode) - len(tube_barcode_codec.prefix),
+                   case((Sample.tube_barcode_number.is_(None), Sample.tube_barcode)))
+            .order_by(Sample.id),
+            execution_options={"yield_per": batch_size}
+        )
+        for rows in samples.partitions():
+            engine._load_samples(rows)
+
+        wells = session.execute(
+            select(Well.plate_barcode_number, func.length(Well.plate_barcode) - len(plate_barcode_codec.prefix),
+                   case((Well.plate_barcode_number.is_(None), Well.plate_barcode)), Well.row, Well.col,
+                   Well.sample_id)
+            .order_by(Well.plate_barcode),
+            execution_options={"yield_per": batch_size}
+        )
+        for rows in wells.partitions():
+            engine._load_wells(rows)
+
+        return engine
+
+    def _load_samples(self, rows: tp.Sequence[tp.Any]) -> None:
+        sample_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        numbers = np.fromiter((-1 if row[2] is None else row[2] for row in rows), dtype=np.int64, count=len(rows))
+        widths = np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows))
+        keys = barcode_keys(numbers, widths)
+
+        with self._lock:
+            self._ensure_sample_capacity(int(sample_ids.max()))
+            self._store_names(sample_ids, [row[1] for row in rows])
+
+            keyed = keys > 0
+            self._tube_keys[sample_ids[keyed]] = keys[keyed]
+            self._tubes.put_new(keys[keyed], sample_ids[keyed])
+            for index in np.flatnonzero(~keyed):
+                row = rows[index]
+                tube_barcode = row[4] if row[4] is not None else f"{tube_barcode_codec.prefix}{row[2]:0{row[3]}d}"
+                self._tube_keys[row[0]] = -1
+                self._other_tubes[tube_barcode] = row[0]
+            self._samples_count += len(rows)
+
+    def _load_wells(self, rows: tp.Sequence[tp.Any]) -> None:
+        numbers = np.fromiter((-1 if row[0] is None else row[0] for row in rows), dtype=np.int64, count=len(rows))
+        widths = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        keys = barcode_keys(numbers, widths)
+        well_indexes = np.fromiter(((row[3] - 1) * PLATE_COLUMNS + row[4] - 1 for row in rows), dtype=np.int64,
+                                   count=len(rows))
+        sample_ids = np.fromiter((row[5] for row in rows), dtype=np.int32, count=len(rows))
+
+        with self._lock:
+            plate_slots = np.zeros(len(rows), dtype=np.int64)
+            keyed = keys > 0
+            if keyed.any():
+                plate_keys, inverse = np.unique(keys[keyed], return_inverse=True)
+                found_slots = (self._plates.get(int(key)) for key in plate_keys.tolist())
+                slots = np.fromiter((-1 if slot is None else slot for slot in found_slots), dtype=np.int64,
+                                    count=len(plate_keys))
+                new = slots < 0
+                slots[new] = self._new_plate_slots(int(new.sum()))
+                self._plates.put_new(plate_keys[new], slots[new])
+                plate_slots[keyed] = slots[inverse]
+            for index in np.flatnonzero(~keyed):
+                row = rows[index]
+                plate_barcode = row[2] if row[2] is not None else f"{plate_barcode_codec.prefix}{row[0]:0{row[1]}d}"
+                plate_slots[index] = self._plate_slot(plate_barcode, create=True)
+
+            self._plate_wells[plate_slots, well_indexes] = sample_ids
+            self._wells_count += len(rows)
+
+    @property
+    def samples_count(self) -> int:
+        return self._samples_count
+
+    @property
+    def plates_count(self) -> int:
+        return self._plates_count
+
+    @property
+    def wells_count(self) -> int:
+        return self._wells_count
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of arrays and indexes, without the small dicts of barcodes that have no key"""
+        return (self._tube_keys.nbytes + self._name_starts.nbytes + self._name_lengths.nbytes + len(self._names)
+                + self._tubes.nbytes + self._plates.nbytes + self._plate_wells.nbytes)
+
+    def sample_exists(self, sample_id: int) -> bool:
+        return 0 < sample_id < len(self._tube_keys) and self._tube_keys[sample_id] != 0
+
+    def tube_sample_id(self, tube_barcode: str) -> tp.Optional[int]:
+        key = barcode_key(tube_barcode_codec, tube_barcode)
+        with self._lock:
+            if key is None:
+                return self._other_tubes.get(tube_barcode)
+            return self._tubes.get(key)
+
+    def well_sample_id(self, plate_barcode: str, row: int, col: int) -> tp.Optional[int]:
+        with self._lock:
+            plate_slot = self._plate_slot(plate_barcode)
+            if plate_slot is None:
+                return None
+            sample_id = int(self._plate_wells[plate_slot, (row - 1) * PLATE_COLUMNS + col - 1])
+            return sample_id or None
+
+    def tube_report(self, tube_barcode: str) -> tp.Optional[TubeReport]:
+        with self._lock:
+            sample_id = self.tube_sample_id(tube_barcode)
+            if sample_id is None:
+                return None
+            return TubeReport(tube_barcode=tube_barcode, sample_id=sample_id,
+                              customer_sample_name=self._name(sample_id))  # type: ignore[arg-type]
+
+    def plate_report(self, plate_barcode: str) -> tp.Optional[PlateReport]:
+        with self._lock:
+            plate_slot = self._plate_slot(plate_barcode)
+            if plate_slot is None:
+                return None
+            plate_wells = self._plate_wells[plate_slot]
+            wells = [
+                PlateWell(_WELL_POSITIONS[index], index // PLATE_COLUMNS + 1, index % PLATE_COLUMNS + 1,
+                          int(plate_wells[index]), self._name(int(plate_wells[index])))
+                for index in np.flatnonzero(plate_wells).tolist()
+            ]
+            return PlateReport(plate_barcode=plate_barcode, wells=wells) if wells else None
+
+    def add_samples(self, samples: tp.Sequence[tp.Tuple[int, tp.Optional[str], str]]) -> None:
+        """Committed receipts: (sample_id, customer_sample_name, tube_barcode)"""
+        if not samples:
+            return
+        with self._lock:
+            sample_ids = np.array([sample_id for (sample_id, _, _) in samples], dtype=np.int64)
+            self._ensure_sample_capacity(int(sample_ids.max()))
+            self._store_names(sample_ids, [customer_sample_name for (_, customer_sample_name, _) in samples])
+            for sample_id, _, tube_barcode in samples:
+                self._put_tube(tube_barcode, sample_id)
+            self._samples_count += len(samples)
+
+    def move_tubes(self, moves: tp.Sequence[tp.Tuple[str, str]]) -> None:
+        """Committed transfers (source_tube_barcode, destination_tube_barcode), swaps and chains included"""
+        with self._lock:
+            sample_ids = [self.tube_sample_id(source_tube_barcode) for (source_tube_barcode, _) in moves]
+            for source_tube_barcode, _ in moves:
+                self._remove_tube(source_tube_barcode)
+            for (_, destination_tube_barcode), sample_id in zip(moves, sample_ids):
+                if sample_id is not None:
+                    self._put_tube(destination_tube_barcode, sample_id)
+
+    def add_wells(self, wells: tp.Sequence[tp.Tuple[str, int, int, int]]) -> None:
+        """Committed placements: (plate_barcode, row, col, sample_id)"""
+        with self._lock:
+            for plate_barcode, row, col, sample_id in wells:
+                plate_slot = self._plate_slot(plate_barcode, create=True)
+                assert plate_slot is not None
+                self._plate_wells[plate_slot, (row - 1) * PLATE_COLUMNS + col - 1] = sample_id
+            self._wells_count += len(wells)
+
+    def check_consistency(self, session: Session, batch_size: int = INVENTORY_LOAD_BATCH_SIZE,
+                          max_mismatches: int = 100) -> tp.List[InventoryMismatch]:
+        """
+        Compare every sample and well of database with memory
+        :return: up to max_mismatches differences, empty list if engine is in sync
+        """
+        mismatches: tp.List[InventoryMismatch] = []
+
+        def report(kind: str, key: tp.Any, database_value: tp.Any, memory_value: tp.Any) -> None:
+            if len(mismatches) < max_mismatches:
+                mismatches.append(InventoryMismatch(kind, str(key), database_value, memory_value))
+
+        samples_count = 0
+        samples = session.execute(select(Sample.id, Sample.customer_sample_name, Sample.tube_barcode)
+                                  .order_by(Sample.id), execution_options={"yield_per": batch_size})
+        for sample_id, customer_sample_name, tube_barcode in samples:
+            samples_count += 1
+            with self._lock:
+                if not self.sample_exists(sample_id):
+                    report("sample", sample_id, tube_barcode, None)
+                    continue
+                memory_name = self._name(sample_id)
+                memory_sample_id = self.tube_sample_id(tube_barcode)
+            if memory_name != customer_sample_name:
+                report("customer_sample_name", sample_id, customer_sample_name, memory_name)
+            if memory_sample_id != sample_id:
+                report("tube", tube_barcode, sample_id, memory_sample_id)
+        if samples_count != self.samples_count:
+            report("samples_count", "samples", samples_count, self.samples_count)
+
+        wells_count = 0
+        wells = session.execute(select(Well.plate_barcode, Well.row, Well.col, Well.sample_id),
+                                execution_options={"yield_per": batch_size})
+        for plate_barcode, row, col, sample_id in wells:
+            wells_count += 1
+            memory_sample_id = self.well_sample_id(plate_barcode, row, col)
+            if memory_sample_id != sample_id:
+                well_position = WellPositionFormatAdapter.get_string_position(row=row, col=col)
+                report("well", f"{plate_barcode}:{well_position}", sample_id, memory_sample_id)
+        if wells_count != self.wells_count:
+            report("wells_count", "wells", wells_count, self.wells_count)
+
+        return mismatches
+
+    def _ensure_sample_capacity(self, max_sample_id: int) -> None:
+        capacity = len(self._tube_keys)
+        if max_sample_id < capacity:
+            return
+        capacity = max(capacity * 2, max_sample_id + 1)
+        self._tube_keys = self._grown(self._tube_keys, capacity)
+        self._name_starts = self._grown(self._name_starts, capacity)
+        self._name_lengths = self._grown(self._name_lengths, capacity)
+
+    @staticmethod
+    def _grown(array: npt.NDArray[tp.Any], capacity: int) -> npt.NDArray[tp.Any]:
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _store_names(self, sample_ids: Int64Array, names: tp.Sequence[tp.Optional[str]]) -> None:
+        encoded = [b"" if name is None else name.encode() for name in names]
+        lengths = np.fromiter((len(name) for name in encoded), dtype=np.int64, count=len(encoded))
+        self._name_starts[sample_ids] = len(self._names) + np.cumsum(lengths) - lengths
+        self._name_lengths[sample_ids] = np.where([name is None for name in names], -1, lengths)
+        self._names += b"".join(encoded)
+
+    def _name(self, sample_id: int) -> tp.Optional[str]:
+        length = int(self._name_lengths[sample_id])
+        if length < 0:
+            return None
+        start = int(self._name_starts[sample_id])
+        return self._names[start:start + length].decode()
+
+    def _put_tube(self, tube_barcode: str, sample_id: int) -> None:
+        key = barcode_key(tube_barcode_codec, tube_barcode)
+        if key is None:
+            self._other_tubes[tube_barcode] = sample_id
+            self._tube_keys[sample_id] = -1
+        else:
+            self._tubes.put(key, sample_id)
+            self._tube_keys[sample_id] = key
+
+    def _remove_tube(self, tube_barcode: str) -> None:
+        key = barcode_key(tube_barcode_codec, tube_barcode)
+        if key is None:
+            self._other_tubes.pop(tube_barcode, None)
+        else:
+            self._tubes.remove(key)
+
+    def _plate_slot(self, plate_barcode: str, create: bool = False) -> tp.Optional[int]:
+        key = barcode_key(plate_barcode_codec, plate_barcode)
+        plate_slot = self._other_plates.get(plate_barcode) if key is None else self._plates.get(key)
+        if plate_slot is not None or not create:
+            return plate_slot
+
+        plate_slot = int(self._new_plate_slots(1)[0])
+        if key is None:
+            self._other_plates[plate_barcode] = plate_slot
+        else:
+            self._plates.put(key, plate_slot)
+        return plate_slot
+
+    def _new_plate_slots(self, count: int) -> Int64Array:
+        first = self._plates_count
+        if first + count > len(self._plate_wells):
+            self._plate_wells = self._grown(self._plate_wells, max(len(self._plate_wells) * 2, first + count))
+        self._plates_count += count
+        return np.arange(first, first + count, dtype=np.int64)
@@ -1,22 +1,92 @@
+import datetime
+import hashlib
+import json
+import os
+
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import MetaData, create_engine, Engine, inspect, func, select
+from sqlalchemy.engine import Dialect
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import DeclarativeMeta
+from sqlalchemy.pool import QueuePool
 
 import typing as tp
 
-from sqlalchemy_utils import database_exists, create_database # type: ignore
-from database.scheme import Base
+from database.migrations import MigrationRunner, schema_migrations
+from database.partitions import ensure_monthly_partitions
+from database.scheme import Base, custody_events
+from database.slow_query_log import SlowQueryLog
+
+from env import read_database_credentials_from_env, read_report_cache_settings_from_env, \
+    read_engine_options_from_env, read_command_journal_path_from_env, read_sql_stats_settings_from_env, \
+    read_slow_query_log_settings_from_env, read_transaction_retry_settings_from_env, \
+    read_inventory_engine_enabled_from_env, read_schema_cache_path_from_env
 
-from env import read_database_credentials_from_env
+if tp.TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
 
 
 class CreateEngineAdapter:
 
     @staticmethod
     def create_engine(database: str, user: str, password: str, host: str, port: tp.Union[str, int],
-                      database_name: str) -> Engine:
+                      database_name: str, pool_size: tp.Optional[int] = None, max_overflow: tp.Optional[int] = None,
+                      pool_timeout: tp.Optional[float] = None, pool_pre_ping: bool = False, pool_recycle: int = -1,
+                      statement_timeout_ms: tp.Optional[int] = None, lock_timeout_ms: tp.Optional[int] = None,
+                      executemany_mode: tp.Optional[str] = None,
+                      executemany_page_size: tp.Optional[int] = None,
+                      query_cache_size: tp.Optional[int] = None) -> Engine:
+        """
+        Create engine, options left as None keep SQLAlchemy defaults
+        :param statement_timeout_ms: server side statement timeout (PostgreSQL only), 0 or None disables it
+        :param lock_timeout_ms: server side wait limit for row and table locks (PostgreSQL only), 0 or None disables it
+        :param executemany_mode: psycopg2 executemany mode, "values_only" or "values_plus_batch"
+        :param executemany_page_size: rows per statement for INSERT ... VALUES and psycopg2 batches
+        """
+        options: tp.Dict[str, tp.Any] = {"pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+        if pool_size is not None:
+            options["pool_size"] = pool_size
+        if max_overflow is not None:
+            options["max_overflow"] = max_overflow
+        if pool_timeout is not None:
+            options["pool_timeout"] = pool_timeout
+        if query_cache_size is not None:
+            options["query_cache_size"] = query_cache_size
+        if executemany_page_size is not None:
+            options["insertmanyvalues_page_size"] = executemany_page_size
+
+        if database.startswith("postgresql"):
+            server_settings = [f"-c {name}={value}" for (name, value) in
+                               (("statement_timeout", statement_timeout_ms), ("lock_timeout", lock_timeout_ms)) if value]
+            if server_settings:
+                options["connect_args"] = {"options": " ".join(server_settings)}
+            if database in ("postgresql", "postgresql+psycopg2"):
+                if executemany_mode is not None:
+                    options["executemany_mode"] = executemany_mode
+                if executemany_page_size is not None:
+                    options["executemany_batch_page_size"] = executemany_page_size
+
         return create_engine(
-            f'{database}://{user}:{password}@{host}:{port}/{database_name}')
+            f'{database}://{user}:{password}@{host}:{port}/{database_name}', **options)
+
+
+class CreateAsyncEngineAdapter:
+    # Asyncio drivers by database name, "postgresql+psycopg2" -> "postgresql+asyncpg"
+    ASYNC_DRIVERS = {
+        "postgresql": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }
+
+    @staticmethod
+    def create_engine(database: str, user: str, password: str, host: str, port: tp.Union[str, int],
+                      database_name: str, pool_size: int = 5, max_overflow: int = 5) -> "AsyncEngine":
+        # Only asyncio front ends pay for importing the asyncio extension
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        async_database = CreateAsyncEngineAdapter.ASYNC_DRIVERS[database.split("+")[0]]
+        return create_async_engine(
+            f'{async_database}://{user}:{password}@{host}:{port}/{database_name}',
+            pool_size=pool_size, max_overflow=max_overflow)
 
 
 class DatabaseInitializer:
@@ -25,17 +95,109 @@ class DatabaseInitializer:
     def __init__(self, Base: tp.Type[Base]):
         self.Base = Base
 
-    def init_database(self, database_arguments: tp.Dict[str, tp.Any], recreate: bool = False) -> Engine:
+    def init_database(self, database_arguments: tp.Dict[str, tp.Any], recreate: bool = False,
+                      engine_options: tp.Optional[tp.Dict[str, tp.Any]] = None,
+                      slow_query_log_settings: tp.Optional[tp.Dict[str, tp.Any]] = None,
+                      schema_cache_path: tp.Optional[str] = None) -> Engine:
+        """
+        Create engine, database and missing tables
+        :param schema_cache_path: JSON file with fingerprint of schema created by the last full initialization.
+            While it matches the tables and the database has the same migration version, initialization takes one
+            query instead of catalog queries of database_exists and create_all. None always runs full initialization
+        """
+
+        engine = CreateEngineAdapter.create_engine(**database_arguments, **(engine_options or {}))
+        if slow_query_log_settings is not None:
+            SlowQueryLog(**slow_query_log_settings).attach(engine)
+
+        if schema_cache_path is not None and not recreate:
+            schema_cache = SchemaCache(schema_cache_path, engine, self.Base.metadata)
+            if schema_cache.is_current():
+                return engine
+            self._create_schema(engine, recreate)
+            schema_cache.write()
+        else:
+            self._create_schema(engine, recreate)
+        return engine
 
-        engine = CreateEngineAdapter.create_engine(**database_arguments)
+    def _create_schema(self, engine: Engine, recreate: bool) -> None:
+        # Imported here, only full initialization needs it
+        from sqlalchemy_utils import database_exists, create_database  # type: ignore
 
         if not database_exists(engine.url):
             create_database(engine.url)
         if recreate:
             self.Base.metadata.drop_all(engine)
+        # Tables created below already have the latest schema, existing tables are brought to it by migrate.py
+        inspector = inspect(engine)
+        new_schema = recreate or not any(inspector.has_table(table) for table in self.Base.metadata.tables)
         self.Base.metadata.create_all(engine)
+        if new_schema:
+            MigrationRunner(engine).stamp()
+        if custody_events.name in self.Base.metadata.tables:
+            # Partitions for the next months, so new events do not pile up in the default partition
+            ensure_monthly_partitions(engine, custody_events.name)
 
-        return engine
+
+def schema_fingerprint(metadata: MetaData, dialect: Dialect) -> str:
+    """Hash of tables, columns, types and indexes of metadata as created on dialect"""
+    digest = hashlib.sha256(dialect.name.encode())
+    for table in metadata.sorted_tables:
+        digest.update(f"table {table.name}\n".encode())
+        for column in table.columns:
+            column_type = column.type.compile(dialect=dialect)
+            digest.update(f"{column.name} {column_type} {column.nullable} {column.primary_key}\n".encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            columns = ",".join(column.name for column in index.columns)
+            digest.update(f"index {index.name} {columns} {index.unique}\n".encode())
+    return digest.hexdigest()
+
+
+class SchemaCache:
+    """
+    Local record of the last full initialization of a database: URL without password, schema fingerprint,
+    migration version of the database and month of custody_events partitions.
+    """
+
+    def __init__(self, path: str, engine: Engine, metadata: MetaData):
+        self.path = path
+        self.engine = engine
+        self.metadata = metadata
+
+    def _schema_key(self) -> tp.Dict[str, str]:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "fingerprint": schema_fingerprint(self.metadata, self.engine.dialect),
+            # Partitions are created months ahead on full initialization, so once a month is enough
+            "partitions_month": datetime.date.today().strftime("%Y-%m"),
+        }
+
+    def _migration_version(self) -> tp.Optional[int]:
+        with self.engine.connect() as connection:
+            return connection.scalar(select(func.max(schema_migrations.c.version)))
+
+    def is_current(self) -> bool:
+        try:
+            with open(self.path) as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return False
+
+        if any(cached.get(key) != value for (key, value) in self._schema_key().items()):
+            return False
+        try:
+            # Missing database or table fails here, full initialization creates them
+            return bool(self._migration_version() == cached.get("migration_version"))
+        except SQLAlchemyError:
+            return False
+
+    def write(self) -> None:
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as cache_file:
+            # applied_versions creates migration tables missing in databases made by create_all alone
+            migration_version = max(MigrationRunner(self.engine).applied_versions(), default=None)
+            json.dump({**self._schema_key(), "migration_version": migration_version}, cache_file)
+        os.replace(temporary_path, self.path)
 
 
 class DatabaseArgumentsLoader:
@@ -45,3 +207,62 @@ class DatabaseArgumentsLoader:
     def load_database_arguments(database_type: tp.Literal['TEST', 'PROD']) -> tp.Dict[str, tp.Any]:
         load_dotenv()
         return read_database_credentials_from_env(database_type)
+
+    @staticmethod
+    def load_report_cache_settings(database_type: tp.Literal['TEST', 'PROD']) -> tp.Optional[tp.Dict[str, tp.Any]]:
+        load_dotenv()
+        return read_report_cache_settings_from_env(database_type)
+
+    @staticmethod
+    def load_command_journal_path(database_type: tp.Literal['TEST', 'PROD']) -> tp.Optional[str]:
+        load_dotenv()
+        return read_command_journal_path_from_env(database_type)
+
+    @staticmethod
+    def load_sql_stats_settings(database_type: tp.Literal['TEST', 'PROD']) -> tp.Optional[tp.Dict[str, tp.Any]]:
+        load_dotenv()
+        return read_sql_stats_settings_from_env(database_type)
+
+    @staticmethod
+    def load_slow_query_log_settings(database_type: tp.Literal['TEST', 'PROD']) \
+            -> tp.Optional[tp.Dict[str, tp.Any]]:
+        load_dotenv()
+        return read_slow_query_log_settings_from_env(database_type)
+
+    @staticmethod
+    def load_transaction_retry_settings(database_type: tp.Literal['TEST', 'PROD']) -> tp.Dict[str, tp.Any]:
+        load_dotenv()
+        return read_transaction_retry_settings_from_env(database_type)
+
+    @staticmethod
+    def load_inventory_engine_enabled(database_type: tp.Literal['TEST', 'PROD']) -> bool:
+        load_dotenv()
+        return read_inventory_engine_enabled_from_env(database_type)
+
+    @staticmethod
+    def load_schema_cache_path(database_type: tp.Literal['TEST', 'PROD']) -> tp.Optional[str]:
+        load_dotenv()
+        return read_schema_cache_path_from_env(database_type)
+
+    @staticmethod
+    def load_engine_options(database_type: tp.Literal['TEST', 'PROD']) -> tp.Dict[str, tp.Any]:
+        load_dotenv()
+        return read_engine_options_from_env(database_type)
+
+
+def get_pool_status(engine: Engine) -> tp.Optional[tp.Dict[str, int]]:
+    """
+    Counters of engine connection pool
+    :return: size, checked_in, checked_out and overflow connections or None if pool does not keep connections
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        # QueuePool counts overflow from -pool_size, negative values mean the pool is not filled yet
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+    }
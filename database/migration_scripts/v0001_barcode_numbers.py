@@ -0,0 +1,36 @@
+import typing as tp
+
+from database.migrations import AddColumn, Backfill, CreateIndex, Migration
+
+
+def barcode_number_sql(column: str, prefix: str) -> tp.Dict[str, str]:
+    """Numeric part of <prefix><digits> barcode by dialect, NULL for other values like barcode codec"""
+    start, max_length = len(prefix) + 1, len(prefix) + 18
+    return {
+        "postgresql": f"CASE WHEN {column} ~ '^{prefix}[0-9]{{1,18}}$' "
+                      f"THEN CAST(SUBSTR({column}, {start}) AS BIGINT) END",
+        "sqlite": f"CASE WHEN {column} GLOB '{prefix}[0-9]*' AND SUBSTR({column}, {start}) NOT GLOB '*[^0-9]*' "
+                  f"AND LENGTH({column}) <= {max_length} THEN CAST(SUBSTR({column}, {start}) AS INTEGER) END",
+    }
+
+
+MIGRATION = Migration(
+    version=1,
+    description="Numeric parts of tube and plate barcodes for range scans",
+    steps=[
+        AddColumn("samples", "tube_barcode_number", "BIGINT"),
+        AddColumn("wells", "plate_barcode_number", "BIGINT"),
+        Backfill("samples", key="id",
+                 set_sql={dialect: f"tube_barcode_number = {sql}"
+                          for dialect, sql in barcode_number_sql("tube_barcode", "NT").items()},
+                 where_sql={"postgresql": "tube_barcode_number IS NULL", "sqlite": "tube_barcode_number IS NULL"},
+                 description="Backfill samples.tube_barcode_number"),
+        Backfill("wells", key="plate_barcode",
+                 set_sql={dialect: f"plate_barcode_number = {sql}"
+                          for dialect, sql in barcode_number_sql("plate_barcode", "DN").items()},
+                 where_sql={"postgresql": "plate_barcode_number IS NULL", "sqlite": "plate_barcode_number IS NULL"},
+                 description="Backfill wells.plate_barcode_number"),
+        CreateIndex("ix_samples_tube_barcode_number", "samples", ["tube_barcode_number"]),
+        CreateIndex("ix_wells_plate_barcode_number", "wells", ["plate_barcode_number"]),
+    ],
+)
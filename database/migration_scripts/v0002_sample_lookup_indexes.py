@@ -0,0 +1,10 @@
+from database.migrations import CreateIndex, Migration
+
+MIGRATION = Migration(
+    version=2,
+    description="Indexes for where_is lookups by sample id and customer sample name",
+    steps=[
+        CreateIndex("ix_wells_sample_id", "wells", ["sample_id"], include=["plate_barcode", "row", "col"]),
+        CreateIndex("ix_samples_customer_sample_name", "samples", ["customer_sample_name"]),
+    ],
+)
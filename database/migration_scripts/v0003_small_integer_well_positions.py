@@ -0,0 +1,11 @@
+from database.migrations import AlterColumnType, Migration
+
+MIGRATION = Migration(
+    version=3,
+    description="Two byte well row and column",
+    steps=[
+        # Rewrites wells and its indexes under ACCESS EXCLUSIVE lock
+        AlterColumnType("wells", "row", "SMALLINT"),
+        AlterColumnType("wells", "col", "SMALLINT"),
+    ],
+)
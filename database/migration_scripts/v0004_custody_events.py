@@ -0,0 +1,32 @@
+from database.migrations import CreateTable, InsertBackfill, Migration
+from database.scheme import RECORDED, custody_events
+
+# Current tube and wells of samples become their first custody events, time of the migration
+SAMPLE_EVENTS_SQL = ("INSERT INTO custody_events (occurred_at, event_type, sample_id, tube_barcode) "
+                     f"SELECT CURRENT_TIMESTAMP, '{RECORDED}', id, tube_barcode FROM samples")
+WELL_EVENTS_SQL = ('INSERT INTO custody_events (occurred_at, event_type, sample_id, plate_barcode, "row", col) '
+                   f'SELECT CURRENT_TIMESTAMP, \'{RECORDED}\', sample_id, plate_barcode, "row", col FROM wells')
+
+# Skips samples and wells already recorded by the application while the backfill runs
+SAMPLE_NOT_RECORDED_SQL = ("NOT EXISTS (SELECT 1 FROM custody_events event WHERE event.sample_id = samples.id "
+                           "AND event.tube_barcode IS NOT NULL)")
+WELL_NOT_RECORDED_SQL = ('NOT EXISTS (SELECT 1 FROM custody_events event '
+                         'WHERE event.plate_barcode = wells.plate_barcode AND event."row" = wells."row" '
+                         'AND event.col = wells.col)')
+
+MIGRATION = Migration(
+    version=4,
+    description="Append-only custody history of samples",
+    steps=[
+        # Partitioned by month on PostgreSQL
+        CreateTable(custody_events),
+        InsertBackfill("samples", key="id",
+                       insert_sql={"postgresql": SAMPLE_EVENTS_SQL, "sqlite": SAMPLE_EVENTS_SQL},
+                       where_sql={"postgresql": SAMPLE_NOT_RECORDED_SQL, "sqlite": SAMPLE_NOT_RECORDED_SQL},
+                       description="Record current tubes of samples"),
+        InsertBackfill("wells", key="plate_barcode",
+                       insert_sql={"postgresql": WELL_EVENTS_SQL, "sqlite": WELL_EVENTS_SQL},
+                       where_sql={"postgresql": WELL_NOT_RECORDED_SQL, "sqlite": WELL_NOT_RECORDED_SQL},
+                       description="Record occupied wells"),
+    ],
+)
@@ -0,0 +1,78 @@
+from sqlalchemy import exists, select
+
+from database.dialects import insert_on_conflict_do_nothing, execute_on_conflict_do_nothing
+from database.migrations import AddColumn, Backfill, CreateTable, Migration, MigrationContext, MigrationStep
+from database.scheme import Base, PlateSummary, Well
+from plate_occupancy import occupied_count, occupy
+
+
+class InsertPlateSummaries(MigrationStep):
+    """
+    Summary rows of plates filled before plate_summary existed, occupancy is built from their wells in Python.
+    Batches of plates commit on their own and rows written meanwhile by the application are kept,
+    so interrupted step continues where it stopped.
+    """
+    description = "Insert plate_summary rows of plates without one"
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        position = None
+        rows_done = 0
+        while True:
+            with context.engine.begin() as connection:
+                statement = select(Well.plate_barcode).distinct() \
+                    .where(~exists().where(PlateSummary.plate_barcode == Well.plate_barcode)) \
+                    .order_by(Well.plate_barcode).limit(context.batch_size)
+                if position is not None:
+                    statement = statement.where(Well.plate_barcode > position)
+                plate_barcodes = connection.scalars(statement).all()
+                if not plate_barcodes:
+                    return
+
+                occupancies = dict.fromkeys(plate_barcodes, 0)
+                for plate_barcode, row, col in connection.execute(
+                        select(Well.plate_barcode, Well.row, Well.col).where(Well.plate_barcode.in_(plate_barcodes))):
+                    occupancies[plate_barcode] = occupy(occupancies[plate_barcode], row, col)
+                execute_on_conflict_do_nothing(
+                    connection,
+                    insert_on_conflict_do_nothing(connection, PlateSummary, index_elements=["plate_barcode"]),
+                    [{"plate_barcode": plate_barcode, "occupancy": occupancy, "well_count": occupied_count(occupancy)}
+                     for plate_barcode, occupancy in occupancies.items()]
+                )
+
+            rows_done += len(plate_barcodes)
+            position = plate_barcodes[-1]
+            context.progress(f"{self.description}: {rows_done} rows inserted, scanned up to {position}")
+            if context.throttle_seconds > 0:
+                context.sleep(context.throttle_seconds)
+
+
+# Fill times and last sample from plate placements in custody history, plates without events keep NULL times
+FILL_STATISTICS_SQL = (
+    "well_count = (SELECT count(*) FROM wells WHERE wells.plate_barcode = plate_summary.plate_barcode), "
+    "first_filled_at = (SELECT min(occurred_at) FROM custody_events event "
+    "WHERE event.plate_barcode = plate_summary.plate_barcode), "
+    "last_filled_at = (SELECT max(occurred_at) FROM custody_events event "
+    "WHERE event.plate_barcode = plate_summary.plate_barcode), "
+    "last_sample_id = (SELECT sample_id FROM custody_events event "
+    'WHERE event.plate_barcode = plate_summary.plate_barcode ORDER BY occurred_at DESC, "row" DESC, col DESC LIMIT 1)'
+)
+# Rows filled by the application after the columns were added already have their statistics
+NOT_FILLED_SQL = "last_filled_at IS NULL"
+
+MIGRATION = Migration(
+    version=5,
+    description="Fill statistics of plates in plate_summary",
+    steps=[
+        # Databases created before plate_summary get it with all columns
+        CreateTable(Base.metadata.tables["plate_summary"]),
+        AddColumn("plate_summary", "well_count", "SMALLINT NOT NULL DEFAULT 0"),
+        AddColumn("plate_summary", "first_filled_at", "TIMESTAMP WITH TIME ZONE"),
+        AddColumn("plate_summary", "last_filled_at", "TIMESTAMP WITH TIME ZONE"),
+        AddColumn("plate_summary", "last_sample_id", "INTEGER"),
+        InsertPlateSummaries(),
+        Backfill("plate_summary", key="plate_barcode",
+                 set_sql={"postgresql": FILL_STATISTICS_SQL, "sqlite": FILL_STATISTICS_SQL},
+                 where_sql={"postgresql": NOT_FILLED_SQL, "sqlite": NOT_FILLED_SQL},
+                 description="Backfill fill statistics of plate_summary"),
+    ],
+)
@@ -0,0 +1,388 @@
+import datetime
+import importlib
+import json
+import pkgutil
+import time
+import typing as tp
+
+from sqlalchemy import BigInteger, Column, DateTime, Engine, Integer, MetaData, String, Table, delete, insert, \
+    inspect, select, text, update
+from sqlalchemy.engine import Connection
+
+from exceptions import OfflineMigrationRequired, MigrationInProgress
+
+# Package with ordered migration scripts, every module defines MIGRATION
+MIGRATION_SCRIPTS_PACKAGE = "database.migration_scripts"
+
+# Rows updated per backfill transaction
+BACKFILL_BATCH_SIZE = 10000
+
+# Key of PostgreSQL advisory lock held while migrating, keeps concurrent migrate runs apart
+MIGRATION_LOCK_KEY = 7_201_900
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+# Position of unfinished backfills, rows of a migration are removed when it is applied
+schema_migration_progress = Table(
+    "schema_migration_progress", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("step", Integer, primary_key=True),
+    # JSON encoded key of the last backfilled row
+    Column("position", String, nullable=False),
+    Column("rows_done", BigInteger, nullable=False),
+)
+
+Progress = tp.Callable[[str], None]
+
+
+class MigrationContext:
+    def __init__(self, engine: Engine, version: int, online: bool, batch_size: int, throttle_seconds: float,
+                 progress: Progress, sleep: tp.Callable[[float], None]):
+        self.engine = engine
+        self.version = version
+        self.online = online
+        self.batch_size = batch_size
+        self.throttle_seconds = throttle_seconds
+        self.progress = progress
+        self.sleep = sleep
+
+    @property
+    def dialect_name(self) -> str:
+        return self.engine.dialect.name
+
+    def quote(self, identifier: str) -> str:
+        return tp.cast(str, self.engine.dialect.identifier_preparer.quote(identifier))
+
+
+class MigrationStep:
+    """One idempotent schema or data change, steps already applied to the database are skipped"""
+    description = ""
+    # False for steps that rewrite or lock whole tables, they only run in offline mode
+    online = True
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        raise NotImplementedError
+
+
+class AddColumn(MigrationStep):
+    """Nullable column without default, on PostgreSQL adding it does not rewrite the table"""
+
+    def __init__(self, table: str, column: str, column_type: str):
+        self.table = table
+        self.column = column
+        self.column_type = column_type
+        self.description = f"Add column {table}.{column}"
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        columns = {column["name"] for column in inspect(context.engine).get_columns(self.table)}
+        if self.column in columns:
+            return
+        with context.engine.begin() as connection:
+            connection.exec_driver_sql(f"ALTER TABLE {context.quote(self.table)} "
+                                       f"ADD COLUMN {context.quote(self.column)} {self.column_type}")
+
+
+class CreateIndex(MigrationStep):
+    """
+    Index built with CREATE INDEX CONCURRENTLY in online mode on PostgreSQL, so writes to the table go on.
+    Invalid index left by interrupted concurrent build is dropped and built again.
+    """
+
+    def __init__(self, name: str, table: str, columns: tp.Sequence[str], include: tp.Sequence[str] = ()):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        # Covered columns, PostgreSQL only
+        self.include = include
+        self.description = f"Create index {name}"
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        if context.dialect_name != "postgresql":
+            with context.engine.begin() as connection:
+                connection.exec_driver_sql(self._create_sql(context, concurrently=False))
+            return
+
+        # CONCURRENTLY can not run inside transaction block
+        with context.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            valid = connection.execute(
+                text("SELECT indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                     "WHERE pg_class.relname = :name"), {"name": self.name}
+            ).scalar()
+            if valid:
+                return
+            if valid is not None:
+                context.progress(f"Dropping invalid index {self.name} left by interrupted build")
+                drop = "DROP INDEX CONCURRENTLY" if context.online else "DROP INDEX"
+                connection.exec_driver_sql(f"{drop} {context.quote(self.name)}")
+            connection.exec_driver_sql(self._create_sql(context, concurrently=context.online))
+
+    def _create_sql(self, context: MigrationContext, concurrently: bool) -> str:
+        columns = ", ".join(context.quote(column) for column in self.columns)
+        sql = (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {context.quote(self.name)} "
+               f"ON {context.quote(self.table)} ({columns})")
+        if self.include and context.dialect_name == "postgresql":
+            sql += f" INCLUDE ({', '.join(context.quote(column) for column in self.include)})"
+        return sql
+
+
+class AlterColumnType(MigrationStep):
+    """Rewrites the table under exclusive lock on PostgreSQL, SQLite column affinity does not change"""
+    online = False
+
+    def __init__(self, table: str, column: str, column_type: str):
+        self.table = table
+        self.column = column
+        self.column_type = column_type
+        self.description = f"Change type of {table}.{column} to {column_type}"
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        if context.dialect_name != "postgresql":
+            return
+        columns = {column["name"]: column for column in inspect(context.engine).get_columns(self.table)}
+        if str(columns[self.column]["type"]).upper() == self.column_type.upper():
+            return
+        with context.engine.begin() as connection:
+            connection.exec_driver_sql(f"ALTER TABLE {context.quote(self.table)} ALTER COLUMN "
+                                       f"{context.quote(self.column)} TYPE {self.column_type}")
+
+
+class CreateTable(MigrationStep):
+    """New table with its indexes, created from the model"""
+
+    def __init__(self, table: Table):
+        self.table = table
+        self.description = f"Create table {table.name}"
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        self.table.create(context.engine, checkfirst=True)
+
+
+class Backfill(MigrationStep):
+    """
+    UPDATE of all table rows in batches of consecutive key ranges, one transaction per batch.
+    The last key of every batch is saved in the same transaction, so interrupted backfill resumes after it.
+    """
+    # Progress message wording
+    written = "updated"
+
+    def __init__(self, table: str, key: str, set_sql: tp.Mapping[str, str], where_sql: tp.Mapping[str, str],
+                 description: str):
+        self.table = table
+        # Indexed column, batches are key ranges
+        self.key = key
+        # SQL by dialect name
+        self.set_sql = set_sql
+        self.where_sql = where_sql
+        self.description = description
+
+    def apply(self, context: MigrationContext, step: int) -> None:
+        table, key = context.quote(self.table), context.quote(self.key)
+        position, rows_done = self._load_progress(context, step)
+        estimated_rows = self._estimate_rows(context)
+
+        while True:
+            with context.engine.begin() as connection:
+                lower_bound = "" if position is None else f"WHERE {key} > :lower"
+                upper = connection.execute(
+                    text(f"SELECT {key} FROM {table} {lower_bound} ORDER BY {key} LIMIT 1 OFFSET :offset"),
+                    {"lower": position, "offset": context.batch_size - 1}
+                ).scalar()
+
+                conditions = [self.where_sql[context.dialect_name]]
+                if position is not None:
+                    conditions.append(f"{key} > :lower")
+                if upper is not None:
+                    conditions.append(f"{key} <= :upper")
+                written = connection.execute(text(self._batch_sql(context, " AND ".join(conditions))),
+                                             {"lower": position, "upper": upper})
+                rows_done += max(written.rowcount, 0)
+
+                if upper is not None:
+                    self._save_progress(connection, context.version, step, upper, rows_done)
+
+            context.progress(f"{self.description}: {rows_done} rows {self.written}, "
+                             f"scanned up to {self.key} {upper if upper is not None else 'end'} "
+                             f"of ~{estimated_rows} rows")
+            if upper is None:
+                return
+            position = upper
+            if context.throttle_seconds > 0:
+                context.sleep(context.throttle_seconds)
+
+    def _batch_sql(self, context: MigrationContext, conditions: str) -> str:
+        return f"UPDATE {context.quote(self.table)} SET {self.set_sql[context.dialect_name]} WHERE {conditions}"
+
+    @staticmethod
+    def _load_progress(context: MigrationContext, step: int) -> tp.Tuple[tp.Any, int]:
+        with context.engine.connect() as connection:
+            saved = connection.execute(
+                select(schema_migration_progress.c.position, schema_migration_progress.c.rows_done)
+                .where(schema_migration_progress.c.version == context.version,
+                       schema_migration_progress.c.step == step)
+            ).first()
+        if saved is None:
+            return None, 0
+        context.progress(f"Resuming backfill after {saved.position}")
+        return json.loads(saved.position), saved.rows_done
+
+    @staticmethod
+    def _save_progress(connection: Connection, version: int, step: int, position: tp.Any, rows_done: int) -> None:
+        values = {"position": json.dumps(position), "rows_done": rows_done}
+        saved = connection.execute(
+            update(schema_migration_progress)
+            .where(schema_migration_progress.c.version == version, schema_migration_progress.c.step == step)
+            .values(**values)
+        )
+        if saved.rowcount == 0:
+            connection.execute(insert(schema_migration_progress).values(version=version, step=step, **values))
+
+    def _estimate_rows(self, context: MigrationContext) -> int:
+        with context.engine.connect() as connection:
+            if context.dialect_name == "postgresql":
+                # Planner estimate, counting 200M rows would take minutes
+                estimate = connection.execute(text("SELECT reltuples FROM pg_class WHERE relname = :table"),
+                                              {"table": self.table}).scalar()
+                return max(int(estimate or 0), 0)
+            return int(connection.execute(text(f"SELECT count(*) FROM {context.quote(self.table)}")).scalar() or 0)
+
+
+class InsertBackfill(Backfill):
+    """INSERT ... SELECT from all rows of table in key range batches, resumable like Backfill"""
+    written = "inserted"
+
+    def __init__(self, table: str, key: str, insert_sql: tp.Mapping[str, str], where_sql: tp.Mapping[str, str],
+                 description: str):
+        super().__init__(table, key, set_sql={}, where_sql=where_sql, description=description)
+        # INSERT INTO ... SELECT ... FROM table by dialect name, batch conditions are appended as WHERE clause
+        self.insert_sql = insert_sql
+
+    def _batch_sql(self, context: MigrationContext, conditions: str) -> str:
+        return f"{self.insert_sql[context.dialect_name]} WHERE {conditions}"
+
+
+class Migration:
+    def __init__(self, version: int, description: str, steps: tp.Sequence[MigrationStep]):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+    @property
+    def online(self) -> bool:
+        return all(step.online for step in self.steps)
+
+
+def load_migrations(package: str = MIGRATION_SCRIPTS_PACKAGE) -> tp.List[Migration]:
+    """
+    :param package: package with migration modules, every module defines MIGRATION
+    :return: migrations ordered by version
+    """
+    scripts = importlib.import_module(package)
+    migrations = [importlib.import_module(f"{package}.{module.name}").MIGRATION
+                  for module in pkgutil.iter_modules(scripts.__path__)]
+    migrations.sort(key=lambda migration: migration.version)
+
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {package}: {versions}")
+    return migrations
+
+
+class MigrationRunner:
+    """
+    Applies migrations not yet recorded in schema_migrations, in version order.
+    Online mode builds PostgreSQL indexes concurrently and refuses migrations that need downtime.
+    """
+
+    def __init__(self, engine: Engine, migrations: tp.Optional[tp.Sequence[Migration]] = None, online: bool = True,
+                 batch_size: int = BACKFILL_BATCH_SIZE, throttle_seconds: float = 0.0,
+                 progress: Progress = lambda message: None, sleep: tp.Callable[[float], None] = time.sleep):
+        self.engine = engine
+        self.migrations = list(migrations) if migrations is not None else load_migrations()
+        self.online = online
+        self.batch_size = batch_size
+        self.throttle_seconds = throttle_seconds
+        self.progress = progress
+        self.sleep = sleep
+
+    def applied_versions(self) -> tp.Set[int]:
+        metadata.create_all(self.engine)
+        with self.engine.connect() as connection:
+            return set(connection.scalars(select(schema_migrations.c.version)))
+
+    def pending(self) -> tp.List[Migration]:
+        applied_versions = self.applied_versions()
+        return [migration for migration in self.migrations if migration.version not in applied_versions]
+
+    def stamp(self) -> None:
+        """Record all migrations as applied, for databases created by create_all with the current schema"""
+        metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(delete(schema_migration_progress))
+            connection.execute(delete(schema_migrations))
+            if self.migrations:
+                connection.execute(insert(schema_migrations), [
+                    {"version": migration.version, "description": migration.description,
+                     "applied_at": datetime.datetime.now(datetime.timezone.utc)}
+                    for migration in self.migrations
+                ])
+
+    def migrate(self, target: tp.Optional[int] = None) -> tp.List[Migration]:
+        """
+        :param target: last version to apply, None for all
+        :return: applied migrations
+        """
+        with self.engine.connect() as lock_connection:
+            self._lock(lock_connection)
+            try:
+                return self._migrate(target)
+            finally:
+                self._unlock(lock_connection)
+
+    def _migrate(self, target: tp.Optional[int]) -> tp.List[Migration]:
+        pending = [migration for migration in self.pending() if target is None or migration.version <= target]
+        if self.online:
+            for migration in pending:
+                if not migration.online:
+                    raise OfflineMigrationRequired(version=migration.version, description=migration.description)
+
+        for migration in pending:
+            self.progress(f"Applying {migration.version:04d}: {migration.description}")
+            context = MigrationContext(self.engine, migration.version, self.online, self.batch_size,
+                                       self.throttle_seconds, self.progress, self.sleep)
+            for step_number, step in enumerate(migration.steps, start=1):
+                self.progress(f"  step {step_number}/{len(migration.steps)}: {step.description}")
+                started = time.perf_counter()
+                step.apply(context, step_number)
+                self.progress(f"  step {step_number}/{len(migration.steps)} done in "
+                              f"{time.perf_counter() - started:.1f} s")
+
+            with self.engine.begin() as connection:
+                connection.execute(delete(schema_migration_progress)
+                                   .where(schema_migration_progress.c.version == migration.version))
+                connection.execute(insert(schema_migrations).values(
+                    version=migration.version, description=migration.description,
+                    applied_at=datetime.datetime.now(datetime.timezone.utc)
+                ))
+
+        return pending
+
+    def _lock(self, connection: Connection) -> None:
+        if self.engine.dialect.name != "postgresql":
+            return
+        locked = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}).scalar()
+        connection.commit()
+        if not locked:
+            raise MigrationInProgress()
+
+    def _unlock(self, connection: Connection) -> None:
+        if self.engine.dialect.name != "postgresql":
+            return
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
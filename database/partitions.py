@@ -0,0 +1,88 @@
+import datetime
+import typing as tp
+
+from sqlalchemy import Engine, text
+from sqlalchemy.engine import Connection
+
+# Monthly partitions created ahead of the current month, rows past them go to the default partition
+PARTITION_MONTHS_AHEAD = 3
+
+
+def month_start(moment: datetime.datetime) -> datetime.datetime:
+    """First instant of the UTC month of moment"""
+    moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def next_month(start: datetime.datetime) -> datetime.datetime:
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def monthly_partition_name(table_name: str, start: datetime.datetime) -> str:
+    """custody_events, 2026-10-01 -> custody_events_p2026_10"""
+    return f"{table_name}_p{start.year:04d}_{start.month:02d}"
+
+
+def create_monthly_partitions(connection: Connection, table_name: str,
+                              first_month: tp.Optional[datetime.datetime] = None,
+                              months: int = PARTITION_MONTHS_AHEAD + 1) -> tp.List[str]:
+    """
+    Create default partition and monthly partitions of table range partitioned by timestamp, PostgreSQL only.
+    Existing partitions are kept, so it is safe to call on every start. Rows of a new month that already
+    landed in the default partition are moved into the created partition.
+    :param first_month: any moment of the first month, current month by default
+    :param months: number of monthly partitions from the first month
+    :return: names of all partitions that should exist
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    default_partition = f"{table_name}_default"
+    connection.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {quote(default_partition)} "
+                               f"PARTITION OF {quote(table_name)} DEFAULT")
+
+    partitions = [default_partition]
+    start = month_start(first_month if first_month is not None else datetime.datetime.now(datetime.timezone.utc))
+    for _ in range(months):
+        end = next_month(start)
+        partition = monthly_partition_name(table_name, start)
+        if connection.scalar(text("SELECT to_regclass(:partition)"), {"partition": partition}) is None:
+            _create_monthly_partition(connection, table_name, default_partition, partition, start, end)
+        partitions.append(partition)
+        start = end
+    return partitions
+
+
+def _create_monthly_partition(connection: Connection, table_name: str, default_partition: str, partition: str,
+                              start: datetime.datetime, end: datetime.datetime) -> None:
+    quote = connection.dialect.identifier_preparer.quote
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    key = connection.scalar(text(
+        "SELECT attname FROM pg_partitioned_table JOIN pg_attribute "
+        "ON attrelid = partrelid AND attnum = partattrs[0] WHERE partrelid = to_regclass(:table_name)"
+    ), {"table_name": table_name})
+    in_month = f"{quote(key)} >= '{start.isoformat()}' AND {quote(key)} < '{end.isoformat()}'"
+
+    # CREATE TABLE ... PARTITION OF fails when the default partition has rows of the month
+    if not connection.scalar(text(f"SELECT EXISTS (SELECT FROM {quote(default_partition)} WHERE {in_month})")):
+        connection.exec_driver_sql(f"CREATE TABLE {quote(partition)} PARTITION OF {quote(table_name)} "
+                                   f"FOR VALUES {bounds}")
+        return
+
+    # Move the rows into a standalone table first, attaching it then finds no rows of the month in default
+    connection.exec_driver_sql(f"CREATE TABLE {quote(partition)} "
+                               f"(LIKE {quote(table_name)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    connection.exec_driver_sql(f"WITH moved AS (DELETE FROM {quote(default_partition)} WHERE {in_month} "
+                               f"RETURNING *) INSERT INTO {quote(partition)} SELECT * FROM moved")
+    connection.exec_driver_sql(f"ALTER TABLE {quote(table_name)} ATTACH PARTITION {quote(partition)} "
+                               f"FOR VALUES {bounds}")
+
+
+def ensure_monthly_partitions(engine: Engine, table_name: str) -> None:
+    """
+    Create partitions for the current and next months, called on full initialization: application start
+    without current schema cache and migrate.py, which can run from a monthly cron job.
+    A missed month is not lost: its rows wait in the default partition until the partition is created.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as connection:
+        create_monthly_partitions(connection, table_name)
@@ -0,0 +1,67 @@
+import collections
+import threading
+import time
+import typing as tp
+
+from reports import TubeReport, PlateReport
+
+Report = tp.Union[TubeReport, PlateReport]
+
+
+class ReportCache:
+    """
+    Bounded LRU cache of container reports keyed by container barcode.
+    Entries older than ttl_seconds are treated as missing, so writes of other processes are seen eventually.
+    DatabaseLayer invalidates barcodes touched by its own writes.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: tp.Optional[float] = 5.0,
+                 clock: tp.Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+
+        # barcode -> (stored_at, report), ordered from least to most recently used
+        self._entries: tp.OrderedDict[str, tp.Tuple[float, Report]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, barcode: str) -> tp.Optional[Report]:
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is not None:
+                stored_at, report = entry
+                if self.ttl_seconds is None or self.clock() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(barcode)
+                    self.hits += 1
+                    return report
+                del self._entries[barcode]
+
+            self.misses += 1
+            return None
+
+    def put(self, barcode: str, report: Report) -> None:
+        with self._lock:
+            self._entries[barcode] = (self.clock(), report)
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *barcodes: str) -> None:
+        with self._lock:
+            for barcode in barcodes:
+                self._entries.pop(barcode, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
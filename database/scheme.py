@@ -1,5 +1,28 @@
-from sqlalchemy import CheckConstraint, Column, Integer, String, ForeignKey
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+import typing as tp
+
+from sqlalchemy import BigInteger, CheckConstraint, Column, DateTime, Index, Integer, SmallInteger, String, \
+    ForeignKey, LargeBinary, Dialect, Table, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, validates
+from sqlalchemy.types import TypeDecorator
+
+from database.partitions import create_monthly_partitions
+from barcode_codec import tube_barcode_codec, plate_barcode_codec
+from plate_occupancy import WELLS_PER_PLATE
+
+OCCUPANCY_MASK_BYTES = WELLS_PER_PLATE // 8
+
+
+class OccupancyMask(TypeDecorator[int]):
+    """96-bit well occupancy mask stored as 12 bytes, Python side is int"""
+    impl = LargeBinary(OCCUPANCY_MASK_BYTES)
+    cache_ok = True
+
+    def process_bind_param(self, value: tp.Optional[int], dialect: Dialect) -> tp.Optional[bytes]:
+        return None if value is None else value.to_bytes(OCCUPANCY_MASK_BYTES, "big")
+
+    def process_result_value(self, value: tp.Optional[bytes], dialect: Dialect) -> tp.Optional[int]:
+        return None if value is None else int.from_bytes(value, "big")
 
 
 class Base(DeclarativeBase):
@@ -13,8 +36,17 @@ class Sample(Base):
     )
 
     id = mapped_column(Integer, primary_key=True)
-    customer_sample_name = mapped_column(String)
+    # Indexed for where_is lookups by name
+    customer_sample_name = mapped_column(String, index=True)
     tube_barcode = mapped_column(String, unique=True, nullable=False)
+    # Numeric part of tube_barcode for cheap range scans: NT1000 -> 1000. Not unique: NT1 and NT01 share it
+    tube_barcode_number = mapped_column(BigInteger, index=True)
+
+    @validates("tube_barcode")
+    def validate_tube_barcode(self, key: str, tube_barcode: tp.Optional[str]) -> tp.Optional[str]:
+        if tube_barcode is not None:
+            self.tube_barcode_number = tube_barcode_codec.number(tube_barcode)
+        return tube_barcode
 
 
 class Well(Base):
@@ -28,9 +60,82 @@ class Well(Base):
 
         CheckConstraint('col >= 1'),
         CheckConstraint('col <= 12'),
+
+        # Reverse lookup of sample wells. On PostgreSQL the index covers the whole well,
+        # so where_is is an index only scan and does not touch the table
+        Index("ix_wells_sample_id", "sample_id", postgresql_include=["plate_barcode", "row", "col"]),
     )
 
     plate_barcode = mapped_column(String, primary_key=True, nullable=False)
-    row = mapped_column(Integer, primary_key=True, nullable=False)
-    col = mapped_column(Integer, primary_key=True, nullable=False)
+    # 1..8 and 1..12, two bytes each keep primary key and covering index entries small
+    row = mapped_column(SmallInteger, primary_key=True, nullable=False)
+    col = mapped_column(SmallInteger, primary_key=True, nullable=False)
     sample_id = mapped_column(Integer, ForeignKey("samples.id"), nullable=False)
+    # Numeric part of plate_barcode for cheap range scans: DN1000 -> 1000
+    plate_barcode_number = mapped_column(BigInteger, index=True)
+
+    @validates("plate_barcode")
+    def validate_plate_barcode(self, key: str, plate_barcode: tp.Optional[str]) -> tp.Optional[str]:
+        if plate_barcode is not None:
+            self.plate_barcode_number = plate_barcode_codec.number(plate_barcode)
+        return plate_barcode
+
+
+class PlateSummary(Base):
+    """
+    One row per plate with any occupied well, kept in sync by DatabaseLayer write paths.
+    Writers lock the row (SELECT ... FOR UPDATE) before changing wells of the plate.
+    Fill statistics answer plate_status from this table alone, without scanning wells.
+    """
+    __tablename__ = 'plate_summary'
+
+    plate_barcode = mapped_column(String, primary_key=True, nullable=False)
+    occupancy = mapped_column(OccupancyMask, nullable=False, default=0)
+    # Occupied wells, bits set in occupancy
+    well_count = mapped_column(SmallInteger, nullable=False, default=0, server_default=text("0"))
+    first_filled_at = mapped_column(DateTime(timezone=True))
+    last_filled_at = mapped_column(DateTime(timezone=True))
+    # Sample placed by the last fill
+    last_sample_id = mapped_column(Integer)
+
+
+# Custody event types
+RECEIVED = "received"
+TRANSFERRED = "transferred"
+PLATED = "plated"
+# Current tube or well of samples recorded when the history was introduced by migration
+RECORDED = "recorded"
+
+# Append-only history of sample containers, written in the transaction of every receipt, transfer and placement.
+# Events with tube_barcode move the sample into the tube, events with plate_barcode place it into the well.
+# No primary key: rows are never updated or looked up one by one, and on PostgreSQL the table is range
+# partitioned by month of occurred_at, so point in time queries only read partitions up to that time.
+custody_events = Table(
+    "custody_events", Base.metadata,
+    Column("occurred_at", DateTime(timezone=True), nullable=False),
+    Column("event_type", String, nullable=False),
+    Column("sample_id", Integer, nullable=False),
+    Column("tube_barcode", String),
+    # Tube the sample left, transfers only
+    Column("source_tube_barcode", String),
+    Column("plate_barcode", String),
+    Column("row", SmallInteger),
+    Column("col", SmallInteger),
+    # Rows are appended in time order, so block ranges stay narrow and BRIN index stays tiny
+    Index("ix_custody_events_occurred_at", "occurred_at", postgresql_using="brin"),
+    Index("ix_custody_events_sample_id", "sample_id", "occurred_at"),
+    Index("ix_custody_events_tube_barcode", "tube_barcode", "occurred_at",
+          postgresql_where=text("tube_barcode IS NOT NULL"), sqlite_where=text("tube_barcode IS NOT NULL")),
+    Index("ix_custody_events_source_tube_barcode", "source_tube_barcode",
+          postgresql_where=text("source_tube_barcode IS NOT NULL"),
+          sqlite_where=text("source_tube_barcode IS NOT NULL")),
+    Index("ix_custody_events_plate_barcode", "plate_barcode", "occurred_at",
+          postgresql_where=text("plate_barcode IS NOT NULL"), sqlite_where=text("plate_barcode IS NOT NULL")),
+    postgresql_partition_by="RANGE (occurred_at)",
+)
+
+
+@event.listens_for(custody_events, "after_create")
+def create_custody_event_partitions(target: Table, connection: Connection, **kwargs: tp.Any) -> None:
+    if connection.dialect.name == "postgresql":
+        create_monthly_partitions(connection, target.name)
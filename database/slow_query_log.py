@@ -0,0 +1,148 @@
+import collections
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import typing as tp
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Connection, ExceptionContext, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+
+# Statements that can be explained, the rest (DDL, transaction control) is logged without plan
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# WITH may wrap INSERT, UPDATE or DELETE (data-modifying CTE), only plain SELECT is analyzed
+_READS = ("SELECT",)
+
+_DATABASE_LAYER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.py")
+
+
+class SlowQueryLog:
+    """
+    Logs statements slower than threshold with parameters, calling DatabaseLayer methods and query plan
+    into rotating JSONL file. SELECT statements are explained with ANALYZE (executed again inside a savepoint that
+    is rolled back), the rest with plain EXPLAIN.
+    """
+
+    def __init__(self, threshold_ms: float, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 max_per_minute: int = 60, clock: tp.Callable[[], float] = time.monotonic):
+        self.threshold_ms = threshold_ms
+        self.max_per_minute = max_per_minute
+        self.clock = clock
+        self.handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                            delay=True)
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        # Entries logged during the last minute, older are dropped from the left
+        self._logged_at: tp.Deque[float] = collections.deque()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+        self._explaining = threading.local()
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def detach(self, engine: Engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(engine, "handle_error", self._handle_error)
+        self.handler.close()
+
+    def _before_cursor_execute(self, conn: Connection, cursor: DBAPICursor, statement: str, parameters: tp.Any,
+                               context: tp.Optional[ExecutionContext], executemany: bool) -> None:
+        # Keyed by cursor, failed statements are removed by _handle_error
+        conn.info.setdefault("slow_query_started", {})[id(cursor)] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn: Connection, cursor: DBAPICursor, statement: str, parameters: tp.Any,
+                              context: tp.Optional[ExecutionContext], executemany: bool) -> None:
+        duration_ms = (time.perf_counter() - conn.info["slow_query_started"].pop(id(cursor))) * 1000
+        if duration_ms < self.threshold_ms or getattr(self._explaining, "active", False):
+            return
+
+        suppressed = self._acquire()
+        if suppressed is None:
+            return
+
+        entry: tp.Dict[str, tp.Any] = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "statement": statement,
+            "parameters": parameters[:10] if executemany else parameters,
+            "executemany": executemany,
+            "caller": calling_database_layer_methods(),
+            "suppressed": suppressed,
+        }
+        entry.update(self._explain(conn, statement, parameters[0] if executemany and parameters else parameters))
+
+        record = logging.makeLogRecord({"msg": json.dumps(entry, default=str)})
+        self.handler.handle(record)
+
+    def _handle_error(self, context: ExceptionContext) -> None:
+        if context.connection is not None and context.execution_context is not None:
+            cursor = context.execution_context.cursor
+            context.connection.info.get("slow_query_started", {}).pop(id(cursor), None)
+
+    def _acquire(self) -> tp.Optional[int]:
+        """Rate limit: None if entry should be dropped, otherwise number of entries dropped since last one"""
+        now = self.clock()
+        with self._lock:
+            while self._logged_at and now - self._logged_at[0] >= 60:
+                self._logged_at.popleft()
+            if len(self._logged_at) >= self.max_per_minute:
+                self._suppressed += 1
+                return None
+            self._logged_at.append(now)
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def _explain(self, conn: Connection, statement: str, parameters: tp.Any) -> tp.Dict[str, tp.Any]:
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if keyword not in _EXPLAINABLE:
+            return {}
+
+        dialect_name = conn.dialect.name
+        if dialect_name == "postgresql":
+            # ANALYZE executes the statement, writes would be applied twice
+            explain = "EXPLAIN (ANALYZE, BUFFERS) " if keyword in _READS else "EXPLAIN "
+        elif dialect_name == "sqlite":
+            explain = "EXPLAIN QUERY PLAN "
+        else:
+            return {}
+
+        # Raw cursor: plan statements do not go through engine events. Savepoint is always rolled back, it undoes
+        # whatever the analyzed statement changed (volatile functions, row locks) and keeps the transaction usable
+        # if explaining fails
+        cursor = conn.connection.cursor()
+        self._explaining.active = True
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(explain + statement, parameters or ())
+                plan = [" ".join(str(value) for value in row) for row in cursor.fetchall()]
+                return {"plan": plan, "analyzed": explain.startswith("EXPLAIN (ANALYZE")}
+            except Exception as exc:
+                return {"plan_error": str(exc)}
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        except Exception as exc:
+            return {"plan_error": str(exc)}
+        finally:
+            self._explaining.active = False
+            cursor.close()
+
+
+def calling_database_layer_methods() -> tp.List[str]:
+    """DatabaseLayer methods on the call stack, outermost first: ["add_to_plate", "_lock_plate_summary"]"""
+    methods = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_filename == _DATABASE_LAYER_FILE:
+            methods.append(frame.f_code.co_name)
+        frame = frame.f_back  # type: ignore[assignment]
+    return methods[::-1]
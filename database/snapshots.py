@@ -0,0 +1,242 @@
+import bisect
+import datetime
+import json
+import os
+import shutil
+import typing as tp
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.scheme import Sample, Well
+from exceptions import SnapshotExists, SnapshotBadFormat
+from plate_occupancy import WELLS_PER_PLATE
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# Rows fetched per round trip from server side cursor while writing snapshot
+SNAPSHOT_BATCH_SIZE = 50000
+
+# Code of NULL customer_sample_name
+NULL_CODE = -1
+
+# Column file name -> dtype, string columns hold codes of the string table
+SAMPLE_COLUMNS = {
+    "samples.id": np.int64,
+    "samples.customer_sample_name": np.int32,
+    "samples.tube_barcode": np.int32,
+}
+WELL_COLUMNS = {
+    "wells.plate_barcode": np.int32,
+    "wells.row": np.int8,
+    "wells.col": np.int8,
+    "wells.sample_id": np.int64,
+}
+
+
+class _StringTableBuilder:
+    """Assigns codes in order of first appearance, codes are renumbered in sorted order by finish"""
+
+    def __init__(self) -> None:
+        self._codes: tp.Dict[str, int] = {}
+
+    def code(self, value: tp.Optional[str]) -> int:
+        if value is None:
+            return NULL_CODE
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._codes)
+        return code
+
+    def finish(self) -> tp.Tuple[tp.List[str], npt.NDArray[np.int32]]:
+        """
+        :return: sorted strings and array mapping appearance code -> sorted code
+        """
+        strings = list(self._codes)
+        order = sorted(range(len(strings)), key=strings.__getitem__)
+        remap = np.empty(len(strings), dtype=np.int32)
+        remap[order] = np.arange(len(strings), dtype=np.int32)
+        return [strings[index] for index in order], remap
+
+
+def write_snapshot(session: Session, path: str, batch_size: int = SNAPSHOT_BATCH_SIZE) -> "InventorySnapshot":
+    """
+    Write samples and wells into directory of .npy columns for offline analytics.
+    Both tables are read by one statement, so the snapshot is consistent without a long transaction.
+    Columns are written to <path>.partial first and the directory is renamed when complete.
+    :param path: directory to create, must not exist
+    :param batch_size: rows per fetch
+    :return: snapshot opened from path
+    """
+    if os.path.exists(path):
+        raise SnapshotExists(path=path)
+
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    # One row per well, or one row for sample not on any plate, ordered by sample id
+    result = session.execute(
+        select(Sample.id, Sample.customer_sample_name, Sample.tube_barcode, Well.plate_barcode, Well.row, Well.col)
+        .outerjoin(Well, Well.sample_id == Sample.id)
+        .order_by(Sample.id),
+        execution_options={"yield_per": batch_size}
+    )
+
+    string_table = _StringTableBuilder()
+    columns: tp.Dict[str, tp.List[npt.NDArray[tp.Any]]] = {
+        name: [np.empty(0, dtype=np.int64)] for name in {**SAMPLE_COLUMNS, **WELL_COLUMNS}
+    }
+    last_sample_id = None
+    try:
+        for rows in result.partitions():
+            samples: tp.List[tp.Tuple[int, int, int]] = []
+            wells: tp.List[tp.Tuple[int, int, int, int]] = []
+            for sample_id, customer_sample_name, tube_barcode, plate_barcode, row, col in rows:
+                if sample_id != last_sample_id:
+                    samples.append((sample_id, string_table.code(customer_sample_name),
+                                    string_table.code(tube_barcode)))
+                    last_sample_id = sample_id
+                if plate_barcode is not None:
+                    wells.append((string_table.code(plate_barcode), row, col, sample_id))
+            _append_columns(columns, SAMPLE_COLUMNS, samples)
+            _append_columns(columns, WELL_COLUMNS, wells)
+    finally:
+        result.close()
+
+    strings, remap = string_table.finish()
+    for name in ("samples.customer_sample_name", "samples.tube_barcode", "wells.plate_barcode"):
+        codes = np.concatenate(columns[name])
+        columns[name] = [np.where(codes == NULL_CODE, NULL_CODE, remap[np.maximum(codes, 0)]).astype(np.int32)]
+
+    partial_path = f"{path}.partial"
+    shutil.rmtree(partial_path, ignore_errors=True)
+    os.makedirs(partial_path)
+
+    for name, dtype in {**SAMPLE_COLUMNS, **WELL_COLUMNS}.items():
+        np.save(os.path.join(partial_path, f"{name}.npy"), np.concatenate(columns[name]).astype(dtype))
+
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    np.save(os.path.join(partial_path, "strings.offsets.npy"), offsets)
+    np.save(os.path.join(partial_path, "strings.data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    with open(os.path.join(partial_path, MANIFEST_FILE), "w") as manifest:
+        json.dump({
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": created_at.isoformat(),
+            "samples": sum(len(array) for array in columns["samples.id"]),
+            "wells": sum(len(array) for array in columns["wells.sample_id"]),
+            "strings": len(strings),
+        }, manifest)
+
+    os.rename(partial_path, path)
+    return InventorySnapshot.open(path)
+
+
+def _append_columns(columns: tp.Dict[str, tp.List[npt.NDArray[tp.Any]]], names: tp.Dict[str, tp.Any],
+                    rows: tp.Sequence[tp.Tuple[int, ...]]) -> None:
+    table = np.array(rows, dtype=np.int64).reshape(len(rows), len(names))
+    for index, name in enumerate(names):
+        columns[name].append(table[:, index])
+
+
+class _StringTable(tp.Sequence[str]):
+    """Sorted strings decoded on access from memory-mapped UTF-8 data"""
+
+    def __init__(self, offsets: npt.NDArray[np.int64], data: npt.NDArray[np.uint8]):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @tp.overload
+    def __getitem__(self, code: int) -> str: ...
+
+    @tp.overload
+    def __getitem__(self, code: slice) -> tp.Sequence[str]: ...
+
+    def __getitem__(self, code: tp.Union[int, slice]) -> tp.Union[str, tp.Sequence[str]]:
+        if isinstance(code, slice):
+            return [self[index] for index in range(*code.indices(len(self)))]
+        if not 0 <= code < len(self):
+            raise IndexError(code)
+        return self._data[self._offsets[code]:self._offsets[code + 1]].tobytes().decode()
+
+
+class InventorySnapshot:
+    """
+    Memory-mapped columns of snapshot written by write_snapshot. Columns are read-only NumPy arrays
+    backed by the files, so opening is instant and queries read only the pages they touch.
+    String columns hold codes of the sorted string table: codes compare like the strings,
+    strings with a common prefix have consecutive codes.
+    """
+
+    def __init__(self, path: str, manifest: tp.Dict[str, tp.Any], columns: tp.Dict[str, npt.NDArray[tp.Any]]):
+        self.path = path
+        self.created_at = datetime.datetime.fromisoformat(manifest["created_at"])
+
+        self.sample_ids: npt.NDArray[np.int64] = columns["samples.id"]
+        self.customer_sample_names: npt.NDArray[np.int32] = columns["samples.customer_sample_name"]
+        self.tube_barcodes: npt.NDArray[np.int32] = columns["samples.tube_barcode"]
+
+        self.plate_barcodes: npt.NDArray[np.int32] = columns["wells.plate_barcode"]
+        self.rows: npt.NDArray[np.int8] = columns["wells.row"]
+        self.cols: npt.NDArray[np.int8] = columns["wells.col"]
+        self.well_sample_ids: npt.NDArray[np.int64] = columns["wells.sample_id"]
+
+        self.strings = _StringTable(columns["strings.offsets"], columns["strings.data"])
+
+    @classmethod
+    def open(cls, path: str) -> "InventorySnapshot":
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError) as exc:
+            raise SnapshotBadFormat(path=path) from exc
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotBadFormat(path=path)
+
+        names = [*SAMPLE_COLUMNS, *WELL_COLUMNS, "strings.offsets", "strings.data"]
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in names}
+        return cls(path, manifest, columns)
+
+    @property
+    def samples_count(self) -> int:
+        return len(self.sample_ids)
+
+    @property
+    def wells_count(self) -> int:
+        return len(self.well_sample_ids)
+
+    def code(self, string: str) -> tp.Optional[int]:
+        """Code of string, None if the snapshot does not have it"""
+        code = bisect.bisect_left(self.strings, string)
+        return code if code < len(self.strings) and self.strings[code] == string else None
+
+    def prefix_codes(self, prefix: str) -> tp.Tuple[int, int]:
+        """Range [first, last) of codes of strings starting with prefix"""
+        first = bisect.bisect_left(self.strings, prefix)
+        last = bisect.bisect_right(self.strings, prefix, lo=first, key=lambda string: string[:len(prefix)])
+        return first, last
+
+    def plate_fill_rates(self) -> tp.Dict[str, float]:
+        """Occupied part of wells of every plate, ordered by plate barcode"""
+        codes, counts = np.unique(self.plate_barcodes, return_counts=True)
+        return {self.strings[code]: count / WELLS_PER_PLATE for code, count in zip(codes.tolist(), counts.tolist())}
+
+    def count_samples_with_name_prefix(self, prefix: str) -> int:
+        first, last = self.prefix_codes(prefix)
+        return int(np.count_nonzero((self.customer_sample_names >= first) & (self.customer_sample_names < last)))
+
+    def samples_per_name_prefix(self, length: int) -> tp.Dict[str, int]:
+        """Number of samples per first length characters of customer_sample_name, NULL names are not counted"""
+        counts = np.bincount(self.customer_sample_names[self.customer_sample_names != NULL_CODE],
+                             minlength=len(self.strings))
+        samples_per_prefix: tp.Dict[str, int] = {}
+        for code in np.flatnonzero(counts).tolist():
+            prefix = self.strings[code][:length]
+            samples_per_prefix[prefix] = samples_per_prefix.get(prefix, 0) + int(counts[code])
+        return samples_per_prefix
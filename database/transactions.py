@@ -0,0 +1,296 @@
+import contextlib
+import functools
+import random
+import threading
+import time
+import typing as tp
+
+from sqlalchemy.engine import Connection, RootTransaction
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from exceptions import TransactionContention
+
+T = tp.TypeVar("T")
+P = tp.ParamSpec("P")
+
+# Contention kinds, also names of ContentionCounters attributes
+SERIALIZATION_FAILURE = "serialization_failures"
+DEADLOCK = "deadlocks"
+LOCK_NOT_AVAILABLE = "lock_timeouts"
+
+# PostgreSQL SQLSTATE codes, reported as pgcode by psycopg2 and asyncpg adapter
+_PGCODES = {
+    "40001": SERIALIZATION_FAILURE,
+    "40P01": DEADLOCK,
+    "55P03": LOCK_NOT_AVAILABLE,
+}
+# SQLITE_BUSY, SQLITE_LOCKED
+_SQLITE_ERRORCODES = {5: LOCK_NOT_AVAILABLE, 6: LOCK_NOT_AVAILABLE}
+
+# Key of Session.info set while runner executes an operation, nested operations are not retried on their own
+_RUNNING_KEY = "transaction_runner_running"
+
+
+def classify_contention_error(exc: BaseException) -> tp.Optional[str]:
+    """
+    :return: SERIALIZATION_FAILURE, DEADLOCK or LOCK_NOT_AVAILABLE if transaction failed because of concurrent
+        transactions and can be retried, None for any other error
+    """
+    if not isinstance(exc, DBAPIError):
+        return None
+
+    pgcode = getattr(exc.orig, "pgcode", None)
+    if pgcode is not None:
+        return _PGCODES.get(pgcode)
+
+    return _SQLITE_ERRORCODES.get(getattr(exc.orig, "sqlite_errorcode", None))  # type: ignore[arg-type]
+
+
+class ContentionCounters:
+    """Counters of transactions run by TransactionRunner, safe to share between threads"""
+    __slots__ = ("transactions", "retries", "exhausted", "backoff_seconds", SERIALIZATION_FAILURE, DEADLOCK,
+                 LOCK_NOT_AVAILABLE, "_lock")
+
+    def __init__(self) -> None:
+        # Operations run, retried attempts are counted in retries
+        self.transactions = 0
+        self.retries = 0
+        # Gave up after max attempts
+        self.exhausted = 0
+        self.backoff_seconds = 0.0
+        self.serialization_failures = 0
+        self.deadlocks = 0
+        self.lock_timeouts = 0
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> tp.Dict[str, float]:
+        with self._lock:
+            return {name: getattr(self, name) for name in self.__slots__ if name != "_lock"}
+
+
+class TransactionRunner:
+    """
+    Runs write operations of a session and retries them when database aborts transaction because of
+    concurrent transactions: serialization failures, deadlocks and lock timeouts.
+    Session is rolled back before retry, so operations must start their own transaction and commit it.
+    Backoff is exponential with full jitter and capped, so latency under contention stays bounded.
+    """
+
+    def __init__(self, max_attempts: int = 5, backoff_seconds: float = 0.01, max_backoff_seconds: float = 0.2,
+                 counters: tp.Optional[ContentionCounters] = None, sleep: tp.Callable[[float], None] = time.sleep,
+                 random_fraction: tp.Callable[[], float] = random.random):
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.counters = counters if counters is not None else ContentionCounters()
+        self.sleep = sleep
+        self.random_fraction = random_fraction
+
+    def run(self, session: Session, operation: tp.Callable[[], T], operation_name: str = "transaction") -> T:
+        if session.info.get(_RUNNING_KEY):
+            # Retrying part of outer operation would lose its rolled back work, outer runner (or the caller of
+            # single_attempt) retries all of it
+            return operation()
+
+        with single_attempt(session):
+            self.counters.increment("transactions")
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    return operation()
+                except DBAPIError as exc:
+                    contention = classify_contention_error(exc)
+                    if contention is None:
+                        raise
+                    session.rollback()
+                    delay = self.attempt_failed(contention, attempt, operation_name, exc)
+                self.sleep(delay)
+
+        raise AssertionError("max_attempts should be positive")
+
+    def attempt_failed(self, contention: str, attempt: int, operation_name: str, exc: DBAPIError) -> float:
+        """
+        Counts attempt aborted by contention, its transaction must be already rolled back
+        :param contention: SERIALIZATION_FAILURE, DEADLOCK or LOCK_NOT_AVAILABLE
+        :return: delay in seconds before the next attempt
+        :raises TransactionContention: attempt was the last one
+        """
+        self.counters.increment(contention)
+        if attempt >= self.max_attempts:
+            self.counters.increment("exhausted")
+            raise TransactionContention(operation_name=operation_name, attempts=attempt) from exc
+
+        delay = self.backoff(attempt)
+        self.counters.increment("retries")
+        self.counters.increment("backoff_seconds", delay)
+        return delay
+
+    def backoff(self, attempt: int) -> float:
+        """Random delay before attempt + 1: uniform in [0, min(max_backoff, backoff * 2 ** (attempt - 1))]"""
+        return self.random_fraction() * min(self.max_backoff_seconds, self.backoff_seconds * 2.0 ** (attempt - 1))
+
+
+@contextlib.contextmanager
+def single_attempt(session: Session) -> tp.Iterator[None]:
+    """
+    Runners execute operations of session once while in the block, contention errors propagate to the caller,
+    which retries the whole unit of work
+    """
+    session.info[_RUNNING_KEY] = True
+    try:
+        yield
+    finally:
+        session.info.pop(_RUNNING_KEY, None)
+
+
+class _RunsTransactions(tp.Protocol):
+    session: Session
+    transaction_runner: TransactionRunner
+
+
+RunnerOwner = tp.TypeVar("RunnerOwner", bound=_RunsTransactions)
+
+
+def transactional(method: tp.Callable[tp.Concatenate[RunnerOwner, P], T]) \
+        -> tp.Callable[tp.Concatenate[RunnerOwner, P], T]:
+    """Runs write method of object with session and transaction_runner through the runner, retrying whole method"""
+
+    @functools.wraps(method)
+    def run_transactional(self: RunnerOwner, *args: P.args, **kwargs: P.kwargs) -> T:
+        return self.transaction_runner.run(self.session, lambda: method(self, *args, **kwargs),
+                                           operation_name=method.__name__.lstrip("_"))
+
+    return run_transactional
+
+
+class GroupCommitter:
+    """
+    Groups writes of many operations of one session into one database transaction, so scripted sessions pay for
+    one commit per group instead of one per operation.
+    The session must be bound to a Connection with join_transaction_mode="create_savepoint": while a group is open,
+    commits of operations release savepoints and their rollbacks return to them, the group stays usable after
+    a failed operation. Row locks taken by operations are held until the group is committed.
+    Groups are opened by begin, or automatically before an operation when every or max_seconds is set;
+    automatic groups are committed after every operations or once max_seconds passed since the group began.
+    """
+
+    def __init__(self, session: Session, every: tp.Optional[int] = None, max_seconds: tp.Optional[float] = None,
+                 on_rollback: tp.Optional[tp.Callable[[], None]] = None,
+                 clock: tp.Callable[[], float] = time.monotonic):
+        self.session = session
+        self.every = every
+        self.max_seconds = max_seconds
+        # Called after a group is rolled back, state derived from its writes (caches) is no longer valid
+        self.on_rollback = on_rollback
+        self.clock = clock
+
+        self._transaction: tp.Optional[RootTransaction] = None
+        # Group opened by begin, it is committed only by commit
+        self._explicit = False
+        self._started = 0.0
+        self.operations = 0
+        self.groups_committed = 0
+
+    @property
+    def automatic(self) -> bool:
+        return self.every is not None or self.max_seconds is not None
+
+    @property
+    def in_group(self) -> bool:
+        return self._transaction is not None
+
+    @property
+    def explicit(self) -> bool:
+        return self._explicit
+
+    def begin(self, explicit: bool = True) -> None:
+        if self._transaction is not None:
+            if explicit:
+                # Automatic group becomes explicit, its writes are kept
+                self._explicit = True
+            return
+
+        # Transaction of previous reads ends, so the group starts with a fresh snapshot
+        self.session.commit()
+        connection = self.session.get_bind()
+        if not isinstance(connection, Connection):
+            raise TypeError("Group commit needs session bound to Connection")
+        self._transaction = connection.begin()
+        self._explicit = explicit
+        self._started = self.clock()
+        self.operations = 0
+
+    def commit(self) -> None:
+        if self._transaction is None:
+            return
+        transaction, self._transaction = self._transaction, None
+        try:
+            self.session.commit()
+            transaction.commit()
+        except Exception:
+            transaction.rollback()
+            self._rolled_back()
+            raise
+        self.groups_committed += 1
+
+    def rollback(self) -> None:
+        if self._transaction is None:
+            return
+        transaction, self._transaction = self._transaction, None
+        self.session.rollback()
+        transaction.rollback()
+        self._rolled_back()
+
+    def start_operation(self) -> None:
+        if self._transaction is None and self.automatic:
+            self.begin(explicit=False)
+
+    def finish_operation(self, failed: bool) -> None:
+        """
+        End operation inside group: failed operation is rolled back to its savepoint, the rest of the group is kept
+        """
+        if self._transaction is None:
+            return
+        if failed:
+            self.session.rollback()
+        else:
+            self.session.commit()
+        self.operations += 1
+
+        if self._explicit:
+            return
+        if (self.every is not None and self.operations >= self.every) or \
+                (self.max_seconds is not None and self.clock() - self._started >= self.max_seconds):
+            self.commit()
+
+    def _rolled_back(self) -> None:
+        self._explicit = False
+        if self.on_rollback is not None:
+            self.on_rollback()
+
+
+CONTENTION_METRICS = [
+    # (metric name, ContentionCounters attribute, help)
+    ("sample_tracking_transactions_total", "transactions", "Write transactions run"),
+    ("sample_tracking_transaction_retries_total", "retries", "Transactions retried after contention error"),
+    ("sample_tracking_transactions_exhausted_total", "exhausted", "Transactions given up after max attempts"),
+    ("sample_tracking_transaction_backoff_seconds_total", "backoff_seconds", "Time slept before retries"),
+    ("sample_tracking_serialization_failures_total", SERIALIZATION_FAILURE, "Serialization failures"),
+    ("sample_tracking_deadlocks_total", DEADLOCK, "Deadlocks detected by database"),
+    ("sample_tracking_lock_timeouts_total", LOCK_NOT_AVAILABLE, "Lock waits over lock timeout, busy SQLite database"),
+]
+
+
+def format_contention_prometheus(counters: ContentionCounters) -> str:
+    """Counters in Prometheus text exposition format"""
+    snapshot = counters.snapshot()
+    lines = []
+    for metric, attribute, help_text in CONTENTION_METRICS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {snapshot[attribute]}")
+    return "\n".join(lines) + "\n"
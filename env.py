@@ -33,3 +33,127 @@ def read_database_credentials_from_env(type: str) -> tp.Dict[str, tp.Any]:
         credentials["database"] = "postgresql+psycopg2"
 
     return credentials
+
+
+def read_report_cache_settings_from_env(type: str) -> tp.Optional[tp.Dict[str, tp.Any]]:
+    """
+    Read optional report cache settings from environment variables
+    :param type: PROD or TEST
+    :return: arguments for ReportCache or None if cache is disabled ({type}_REPORT_CACHE_SIZE unset or 0)
+    """
+    max_size = int(os.getenv(f"{type}_REPORT_CACHE_SIZE", "0"))
+    if max_size <= 0:
+        return None
+
+    ttl_seconds = float(os.getenv(f"{type}_REPORT_CACHE_TTL_SECONDS", "5"))
+    return {
+        "max_size": max_size,
+        # 0 disables expiration, entries are only evicted and invalidated
+        "ttl_seconds": ttl_seconds if ttl_seconds > 0 else None
+    }
+
+
+def read_command_journal_path_from_env(type: str) -> tp.Optional[str]:
+    """
+    Read optional command journal path from environment variables
+    :param type: PROD or TEST
+    :return: path of JSONL journal ({type}_COMMAND_JOURNAL) or None if journal is disabled
+    """
+    return os.getenv(f"{type}_COMMAND_JOURNAL") or None
+
+
+def read_schema_cache_path_from_env(type: str) -> tp.Optional[str]:
+    """
+    Read optional path of schema cache that lets startup skip full database initialization
+    :param type: PROD or TEST
+    :return: path ({type}_SCHEMA_CACHE_PATH) or None if every start runs full initialization
+    """
+    return os.getenv(f"{type}_SCHEMA_CACHE_PATH") or None
+
+
+def read_sql_stats_settings_from_env(type: str) -> tp.Optional[tp.Dict[str, tp.Any]]:
+    """
+    Read optional SQL instrumentation settings from environment variables
+    :param type: PROD or TEST
+    :return: None if instrumentation is disabled ({type}_SQL_STATS unset or false),
+        otherwise Prometheus file path (None to not write it) and write interval
+    """
+    if not _read_bool_env_var(f"{type}_SQL_STATS", False):
+        return None
+
+    return {
+        "prometheus_path": os.getenv(f"{type}_SQL_STATS_PROMETHEUS_PATH") or None,
+        "prometheus_interval_seconds": float(os.getenv(f"{type}_SQL_STATS_PROMETHEUS_INTERVAL_SECONDS", "15")),
+    }
+
+
+def read_slow_query_log_settings_from_env(type: str) -> tp.Optional[tp.Dict[str, tp.Any]]:
+    """
+    Read optional slow query log settings from environment variables
+    :param type: PROD or TEST
+    :return: arguments for SlowQueryLog or None if log is disabled ({type}_SLOW_QUERY_THRESHOLD_MS unset or 0)
+    """
+    threshold_ms = float(os.getenv(f"{type}_SLOW_QUERY_THRESHOLD_MS", "0"))
+    if threshold_ms <= 0:
+        return None
+
+    return {
+        "threshold_ms": threshold_ms,
+        "path": os.getenv(f"{type}_SLOW_QUERY_LOG_PATH", "slow_queries.jsonl"),
+        "max_bytes": int(os.getenv(f"{type}_SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        "backup_count": int(os.getenv(f"{type}_SLOW_QUERY_LOG_BACKUP_COUNT", "5")),
+        "max_per_minute": int(os.getenv(f"{type}_SLOW_QUERY_LOG_MAX_PER_MINUTE", "60")),
+    }
+
+
+def read_inventory_engine_enabled_from_env(type: str) -> bool:
+    """
+    Read whether samples and wells are kept in memory by InventoryEngine
+    :param type: PROD or TEST
+    :return: value of {type}_INVENTORY_ENGINE, false by default
+    """
+    return _read_bool_env_var(f"{type}_INVENTORY_ENGINE", False)
+
+
+def _read_bool_env_var(var_name: str, default: bool) -> bool:
+    value = os.getenv(var_name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def read_engine_options_from_env(type: str) -> tp.Dict[str, tp.Any]:
+    """
+    Read connection pool and engine tuning options from environment variables
+    :param type: PROD or TEST
+    :return: options for CreateEngineAdapter.create_engine, every option has a production default
+    """
+    return {
+        "pool_size": int(os.getenv(f"{type}_DATABASE_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv(f"{type}_DATABASE_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv(f"{type}_DATABASE_POOL_TIMEOUT_SECONDS", "30")),
+        # Checks connections on checkout, so connections dropped by server or firewall are not handed out
+        "pool_pre_ping": _read_bool_env_var(f"{type}_DATABASE_POOL_PRE_PING", True),
+        # Recycle connections before typical idle timeouts of proxies and servers, -1 disables recycling
+        "pool_recycle": int(os.getenv(f"{type}_DATABASE_POOL_RECYCLE_SECONDS", "1800")),
+        # 0 disables the timeout
+        "statement_timeout_ms": int(os.getenv(f"{type}_DATABASE_STATEMENT_TIMEOUT_MS", "60000")),
+        # Lock waits over the limit fail with lock_not_available and are retried by TransactionRunner, 0 disables
+        "lock_timeout_ms": int(os.getenv(f"{type}_DATABASE_LOCK_TIMEOUT_MS", "5000")),
+        "executemany_mode": os.getenv(f"{type}_DATABASE_EXECUTEMANY_MODE", "values_plus_batch"),
+        "executemany_page_size": int(os.getenv(f"{type}_DATABASE_EXECUTEMANY_PAGE_SIZE", "1000")),
+        "query_cache_size": int(os.getenv(f"{type}_DATABASE_QUERY_CACHE_SIZE", "1200")),
+    }
+
+
+def read_transaction_retry_settings_from_env(type: str) -> tp.Dict[str, tp.Any]:
+    """
+    Read retry settings of writes aborted by concurrent transactions from environment variables
+    :param type: PROD or TEST
+    :return: arguments for TransactionRunner, every setting has a production default
+    """
+    return {
+        "max_attempts": int(os.getenv(f"{type}_TRANSACTION_MAX_ATTEMPTS", "5")),
+        "backoff_seconds": float(os.getenv(f"{type}_TRANSACTION_BACKOFF_MS", "10")) / 1000,
+        "max_backoff_seconds": float(os.getenv(f"{type}_TRANSACTION_MAX_BACKOFF_MS", "200")) / 1000,
+    }
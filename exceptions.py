@@ -19,13 +19,14 @@ class BarcodeBadFormat(FormattingException):
 class TubeBarcodeBadFormat(BarcodeBadFormat):
     def __init__(self, barcode: str, *args: tp.Any, **kwargs: tp.Any):  
         default_message = f'Tube barcode wrong format. Expected: "NT<Number>". Got: {barcode}'
-        super().__init__(default_message, *args, **kwargs)  
+        # Skip BarcodeBadFormat.__init__, it would wrap message as barcode
+        super(BarcodeBadFormat, self).__init__(default_message, *args, **kwargs)
 
 
 class PlateBarcodeBadFormat(BarcodeBadFormat):
     def __init__(self, barcode: str, *args: tp.Any, **kwargs: tp.Any):  
         default_message = f'Plate barcode wrong format. Expected: "DN<Number>". Got: {barcode}'
-        super().__init__(default_message, *args, **kwargs)  
+        super(BarcodeBadFormat, self).__init__(default_message, *args, **kwargs)
 
 
 class OccupiedDestinationTube(BaseApplicationException):
@@ -46,6 +47,18 @@ class SampleIdBadFormatting(FormattingException):
         super().__init__(default_message, *args, **kwargs)  
 
 
+class SampleNameNotFound(BaseApplicationException):
+    def __init__(self, customer_sample_name: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'No samples with customer_sample_name {customer_sample_name} found.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class CustodyHistoryNotFound(BaseApplicationException):
+    def __init__(self, subject: tp.Union[int, str], *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'No custody events recorded for {subject}.'
+        super().__init__(default_message, *args, **kwargs)
+
+
 class TubeNotFound(BaseApplicationException):
     def __init__(self, tube_barcode: str, *args: tp.Any, **kwargs: tp.Any):
         default_message = f'Tube with {tube_barcode} not found.'
@@ -71,12 +84,92 @@ class WellPositionOccupied(BaseApplicationException):
         super().__init__(default_message, *args, **kwargs)
 
 
-class WellPositionBadFormatting(Exception):
+class WellPositionBadFormatting(FormattingException):
     def __init__(self, well_position: str, *args: tp.Any, **kwargs: tp.Any):
         default_message = (f'Well position wrong format. Expected: "<Letter [A-H]><Number [1-12]>". '
-                           f'Got: f{well_position}')
+                           f'Got: {well_position}')
         super().__init__(default_message, *args, **kwargs)
 
 
 class UnknownReportType(Exception):
     pass
+
+
+class UnsupportedReportFormat(FormattingException):
+    def __init__(self, report_format: str, report_name: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Format "{report_format}" is not supported for {report_name}.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class UnsupportedFileFormat(FormattingException):
+    def __init__(self, path: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Unsupported file format: {path}. Expected ".csv" or ".jsonl" file.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class FileColumnMissing(FormattingException):
+    def __init__(self, column: str, path: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Column "{column}" is missing in {path}.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class FileRowMalformed(FormattingException):
+    def __init__(self, path: str, line_number: int, reason: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Malformed line {line_number} in {path}: {reason}'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class ManifestRowIncomplete(FormattingException):
+    def __init__(self, *args: tp.Any, **kwargs: tp.Any):
+        default_message = 'Manifest row is incomplete. Expected values: customer_sample_name and tube_barcode.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class ConflictingTubeTransfers(BaseApplicationException):
+    def __init__(self, tube_barcode: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Tube {tube_barcode} is used in more than one transfer.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class PlateFull(BaseApplicationException):
+    def __init__(self, plate_barcode: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'No free wells left in plate {plate_barcode}.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class NotEnoughFreeWells(BaseApplicationException):
+    def __init__(self, samples_count: int, free_wells_count: int, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Not enough free wells for {samples_count} samples. Free wells: {free_wells_count}.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class TransactionContention(BaseApplicationException):
+    def __init__(self, operation_name: str, attempts: int, *args: tp.Any, **kwargs: tp.Any):
+        default_message = (f'{operation_name} failed {attempts} times because of concurrent transactions, '
+                           f'try again later.')
+        super().__init__(default_message, *args, **kwargs)
+
+
+class OfflineMigrationRequired(BaseApplicationException):
+    def __init__(self, version: int, description: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = (f'Migration {version:04d} ({description}) locks whole tables. '
+                           f'Run it in offline mode during maintenance window.')
+        super().__init__(default_message, *args, **kwargs)
+
+
+class MigrationInProgress(BaseApplicationException):
+    def __init__(self, *args: tp.Any, **kwargs: tp.Any):
+        default_message = 'Another migration is running on this database.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class SnapshotExists(BaseApplicationException):
+    def __init__(self, path: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'Snapshot {path} already exists. Choose another directory.'
+        super().__init__(default_message, *args, **kwargs)
+
+
+class SnapshotBadFormat(FormattingException):
+    def __init__(self, path: str, *args: tp.Any, **kwargs: tp.Any):
+        default_message = f'{path} is not an inventory snapshot of supported format version.'
+        super().__init__(default_message, *args, **kwargs)
@@ -0,0 +1,101 @@
+import csv
+import json
+import os
+import typing as tp
+
+from exceptions import UnsupportedFileFormat, FileColumnMissing, FileRowMalformed
+
+
+def read_rows(path: str, columns: tp.Sequence[str]) -> tp.Iterator[tp.Tuple[tp.Optional[str], ...]]:
+    """
+    Lazily read rows from CSV (with header) or JSONL file
+    :param path: str, path to ".csv" or ".jsonl" file
+    :param columns: names of columns to extract, in order
+    :return: iterator over tuples of column values, missing values (short CSV row, JSON null) are None
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".csv":
+        return _read_csv_rows(path, columns)
+    elif extension == ".jsonl":
+        return _read_jsonl_rows(path, columns)
+    else:
+        raise UnsupportedFileFormat(path=path)
+
+
+def _read_csv_rows(path: str, columns: tp.Sequence[str]) -> tp.Iterator[tp.Tuple[tp.Optional[str], ...]]:
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        try:
+            for column in columns:
+                if reader.fieldnames is None or column not in reader.fieldnames:
+                    raise FileColumnMissing(column=column, path=path)
+
+            for record in reader:
+                yield tuple(record[column] for column in columns)
+        except csv.Error as exc:
+            raise FileRowMalformed(path=path, line_number=reader.line_num, reason=str(exc)) from exc
+        except UnicodeDecodeError as exc:
+            # Raised while reading the line after the last parsed one
+            raise FileRowMalformed(path=path, line_number=reader.line_num + 1, reason=str(exc)) from exc
+
+
+def _read_jsonl_rows(path: str, columns: tp.Sequence[str]) -> tp.Iterator[tp.Tuple[tp.Optional[str], ...]]:
+    with open(path) as file:
+        line_number = 0
+        try:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise FileRowMalformed(path=path, line_number=line_number, reason=str(exc)) from exc
+                if not isinstance(record, dict):
+                    raise FileRowMalformed(path=path, line_number=line_number, reason="expected JSON object")
+                for column in columns:
+                    if column not in record:
+                        raise FileColumnMissing(column=column, path=path)
+                # JSON values may be numbers, e.g. customer_sample_name: 123
+                yield tuple(None if record[column] is None else str(record[column]) for column in columns)
+        except UnicodeDecodeError as exc:
+            raise FileRowMalformed(path=path, line_number=line_number + 1, reason=str(exc)) from exc
+
+
+def write_rows(path: str, columns: tp.Sequence[str], rows: tp.Iterable[tp.Sequence[tp.Any]]) -> int:
+    """
+    Incrementally write rows into CSV (with header) or JSONL file, rows are not collected in memory
+    :param path: str, path to ".csv" or ".jsonl" file
+    :param columns: names of columns, in order of row values
+    :param rows: iterable over rows, None values are written as empty CSV fields or JSON null
+    :return: number of written rows
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".csv":
+        return _write_csv_rows(path, columns, rows)
+    elif extension == ".jsonl":
+        return _write_jsonl_rows(path, columns, rows)
+    else:
+        raise UnsupportedFileFormat(path=path)
+
+
+def _write_csv_rows(path: str, columns: tp.Sequence[str], rows: tp.Iterable[tp.Sequence[tp.Any]]) -> int:
+    rows_count = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            rows_count += 1
+    return rows_count
+
+
+def _write_jsonl_rows(path: str, columns: tp.Sequence[str], rows: tp.Iterable[tp.Sequence[tp.Any]]) -> int:
+    rows_count = 0
+    with open(path, "w") as file:
+        for row in rows:
+            file.write(json.dumps(dict(zip(columns, row))))
+            file.write("\n")
+            rows_count += 1
+    return rows_count
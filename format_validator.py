@@ -5,15 +5,18 @@ import typing as tp
 class RegexFormatExtractor:
     def __init__(self, regex_format: str):
         self.regex_format = regex_format
+        self.pattern = re.compile(regex_format)
 
     def validate(self, string: str) -> bool:
-        return bool(re.findall(self.regex_format, string))
+        return self.pattern.search(string) is not None
 
     def extract(self, string: str) -> tp.List[tp.Tuple[str, ...]]:
-        return re.findall(self.regex_format, string)
+        return self.pattern.findall(string)
 
 
-tube_barcode_validator = RegexFormatExtractor(regex_format=r"^NT\d+$")
-plate_barcode_validator = RegexFormatExtractor(regex_format=r"^DN\d+$")
+# \A and \Z: $ also matches before a trailing newline. [0-9]: \d also matches non-ASCII digits like "١",
+# the same barcodes as accepted by barcode_codec, which computes the stored numbers
+tube_barcode_validator = RegexFormatExtractor(regex_format=r"\ANT[0-9]+\Z")
+plate_barcode_validator = RegexFormatExtractor(regex_format=r"\ADN[0-9]+\Z")
 
-well_position_validator = RegexFormatExtractor(regex_format=r"^([A-H])([1-9]\d*)$")
+well_position_validator = RegexFormatExtractor(regex_format=r"\A([A-H])([1-9][0-9]*)\Z")
@@ -1,17 +1,32 @@
 # This is a sample Python script.
 import argparse
+import datetime
+import shlex
+import sys
+import time
+import typing as tp
 
 import cmd2
 
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 
+from command_journal import CommandJournal, JournalEntry, SUCCESS, ERROR
 from database.database import DatabaseLayer
-from database.management import DatabaseInitializer, DatabaseArgumentsLoader
+from database.instrumentation import SqlInstrumentation, PrometheusFileWriter
+from database.management import DatabaseInitializer, DatabaseArgumentsLoader, get_pool_status
+from database.report_cache import ReportCache
+from database.transactions import TransactionRunner, GroupCommitter
 from exceptions import TubeBarcodeBadFormat, SampleAlreadyReceived, SampleIdBadFormatting, PlateBarcodeBadFormat, \
     SampleNotFound, WellPositionOccupied, OccupiedDestinationTube, TubeNotFound, BarcodeBadFormat, \
-    OccupiedWellsNotFound, WellPositionBadFormatting
+    OccupiedWellsNotFound, WellPositionBadFormatting, UnsupportedFileFormat, FileColumnMissing, FileRowMalformed, \
+    ConflictingTubeTransfers, PlateFull, NotEnoughFreeWells, UnsupportedReportFormat, SampleNameNotFound, \
+    CustodyHistoryNotFound, SnapshotExists
+from file_formats import read_rows, write_rows
 
-from reports import print_report
+from plate_occupancy import ROW_MAJOR, COLUMN_MAJOR
+from reports import print_report, write_report, WellPositionFormatAdapter, InventoryRow, REPORT_FORMATS, \
+    TEXT_FORMAT, JSON_FORMAT
 from database.scheme import Base
 
 
@@ -21,11 +36,136 @@ class MyCLIApp(cmd2.Cmd):
     # Setting the prompt
     prompt = "sanger-sample-tool> "
 
-    def __init__(self, database_layer: DatabaseLayer):
+    def __init__(self, database_layer: DatabaseLayer, journal: tp.Optional[CommandJournal] = None,
+                 instrumentation: tp.Optional[SqlInstrumentation] = None,
+                 prometheus_writer: tp.Optional[PrometheusFileWriter] = None,
+                 group_committer: tp.Optional[GroupCommitter] = None):
         super().__init__()
 
         self.database_layer = database_layer
 
+        # Outcome of current command, reset before every command
+        self._command_failed = False
+        self._command_error: tp.Optional[BaseException] = None
+
+        # Groups commands into one transaction: begin / commit / rollback commands and --autocommit-every / -ms.
+        # Registered first, so the group is committed before instrumentation and journal finish the command
+        self.group_committer = group_committer
+        self.register_precmd_hook(self._start_command)
+        self.register_cmdfinalization_hook(self._finish_command)
+        self.register_postloop_hook(self._end_group_on_exit)
+
+        # SQL counters keyed by command name, optionally exported to Prometheus text file
+        self.instrumentation = instrumentation
+        self.prometheus_writer = prometheus_writer
+        if instrumentation is not None:
+            self.register_precmd_hook(self._start_instrumented_command)
+            self.register_cmdfinalization_hook(self._finish_instrumented_command)
+
+        # Commands of this app are appended to journal with duration and outcome
+        self.journal = journal
+        self._command_started: tp.Optional[tp.Tuple[datetime.datetime, float]] = None
+        if journal is not None:
+            self.register_precmd_hook(self._start_journal_entry)
+            self.register_cmdfinalization_hook(self._finish_journal_entry)
+
+    def perror(self, msg: tp.Any = '', *, end: str = '\n', apply_style: bool = True) -> None:
+        # Commands report handled exceptions from except blocks, so the handled exception is the cause
+        self._command_failed = True
+        self._command_error = self._command_error or sys.exc_info()[1]
+        super().perror(msg, end=end, apply_style=apply_style)
+
+    def onecmd(self, statement: tp.Union[cmd2.Statement, str], *, add_to_history: bool = True) -> bool:
+        try:
+            return super().onecmd(statement, add_to_history=add_to_history)
+        except Exception as exc:
+            # Argument parsing errors and unhandled exceptions of commands
+            self._command_failed = True
+            self._command_error = exc
+            raise
+
+    def run_command_line(self, argv: tp.Sequence[str]) -> int:
+        """
+        Run one command given as program arguments instead of interactive prompt, pending group is committed
+        :return: exit status, 1 if the command failed
+        """
+        self.onecmd_plus_hooks(shlex.join(argv))
+        self._end_group_on_exit()
+        return 1 if self._command_failed else 0
+
+    def _is_grouped_command(self, command: str) -> bool:
+        return f"do_{command}" in vars(MyCLIApp) and command not in ("begin", "commit", "rollback")
+
+    def _start_command(self, data: cmd2.plugin.PrecommandData) -> cmd2.plugin.PrecommandData:
+        self._command_failed = False
+        self._command_error = None
+        if self.group_committer is not None and self._is_grouped_command(data.statement.command):
+            try:
+                self.group_committer.start_operation()
+            except SQLAlchemyError as exc:
+                self.perror(f"Can not begin transaction: {exc}")
+        return data
+
+    def _finish_command(self, data: cmd2.plugin.CommandFinalizationData) -> cmd2.plugin.CommandFinalizationData:
+        if self.group_committer is None or data.statement is None or \
+                not self._is_grouped_command(data.statement.command):
+            return data
+        try:
+            self.group_committer.finish_operation(failed=self._command_failed)
+        except SQLAlchemyError as exc:
+            self.perror(f"Commit failed, transaction rolled back: {exc}")
+        return data
+
+    def _end_group_on_exit(self) -> None:
+        # Like psql: automatic group is committed, explicitly begun transaction is rolled back
+        if self.group_committer is None or not self.group_committer.in_group:
+            return
+        try:
+            if self.group_committer.explicit:
+                self.group_committer.rollback()
+                self.perror("Transaction was not committed, rolled back on exit.")
+            else:
+                self.group_committer.commit()
+        except SQLAlchemyError as exc:
+            self.perror(f"Commit failed, transaction rolled back: {exc}")
+
+    def _start_instrumented_command(self, data: cmd2.plugin.PrecommandData) -> cmd2.plugin.PrecommandData:
+        if self.instrumentation is not None and f"do_{data.statement.command}" in vars(MyCLIApp):
+            self.instrumentation.start_command(data.statement.command)
+        return data
+
+    def _finish_instrumented_command(self, data: cmd2.plugin.CommandFinalizationData) \
+            -> cmd2.plugin.CommandFinalizationData:
+        if self.instrumentation is not None:
+            self.instrumentation.finish_command()
+        if self.prometheus_writer is not None:
+            try:
+                self.prometheus_writer.maybe_write()
+            except OSError as exc:
+                self.perror(f"Can not write SQL stats to {self.prometheus_writer.path}: {exc.strerror}")
+        return data
+
+    def _start_journal_entry(self, data: cmd2.plugin.PrecommandData) -> cmd2.plugin.PrecommandData:
+        if f"do_{data.statement.command}" in vars(MyCLIApp):
+            self._command_started = (datetime.datetime.now(datetime.timezone.utc), time.perf_counter())
+        return data
+
+    def _finish_journal_entry(self, data: cmd2.plugin.CommandFinalizationData) -> cmd2.plugin.CommandFinalizationData:
+        if self._command_started is None or self.journal is None or data.statement is None:
+            return data
+
+        started_at, started = self._command_started
+        self._command_started = None
+        self.journal.record(JournalEntry(
+            timestamp=started_at.isoformat(),
+            line=data.statement.command_and_args,
+            command=data.statement.command,
+            duration_ms=(time.perf_counter() - started) * 1000,
+            outcome=ERROR if self._command_failed else SUCCESS,
+            error=type(self._command_error).__name__ if self._command_error is not None else None
+        ))
+        return data
+
     record_receipt_parser = cmd2.Cmd2ArgumentParser()
     record_receipt_parser.add_argument('customer_sample_name', help='Customer sample name')
     record_receipt_parser.add_argument('tube_barcode', help='Tube barcode, format: NT<Number>')
@@ -47,16 +187,41 @@ class MyCLIApp(cmd2.Cmd):
         self.poutput(f"Successfully recorded receipt: Test sample [NT100] -> "
                      f"Sample ID: {sample.id}")
 
+    import_receipts_parser = cmd2.Cmd2ArgumentParser()
+    import_receipts_parser.add_argument('manifest_path', help='Manifest file (.csv or .jsonl) with '
+                                                              'customer_sample_name and tube_barcode columns')
+
+    @cmd2.with_argparser(import_receipts_parser)  # type: ignore
+    def do_import_receipts(self, args: argparse.Namespace) -> None:
+        """Record receipts from manifest file: import_receipts [manifest_path]"""
+        try:
+            rows = read_rows(args.manifest_path, columns=("customer_sample_name", "tube_barcode"))
+            report = self.database_layer.record_receipts_bulk(rows)
+        except (UnsupportedFileFormat, FileColumnMissing, FileRowMalformed) as exc:
+            self.perror(str(exc))
+            return
+        except OSError as exc:
+            self.perror(f"Can not read manifest {args.manifest_path}: {exc.strerror}")
+            return
+
+        self.poutput(print_report(report))
+
     add_to_plate_parser = cmd2.Cmd2ArgumentParser()
     add_to_plate_parser.add_argument('sample_id', help='Sample name', type=int)
     add_to_plate_parser.add_argument('plate_barcode', help='Plate barcode, format: DN<Number>')
-    add_to_plate_parser.add_argument('well_position', help='Well position, format: <Row><Col>: A1, B8')
+    add_to_plate_parser.add_argument('well_position', nargs='?', default=None,
+                                     help='Well position, format: <Row><Col>: A1, B8. Next free well if omitted')
+    add_to_plate_parser.add_argument('--column-major', action='store_true',
+                                     help='Look for next free well column by column (A1, B1, ...) '
+                                          'instead of row by row')
 
     @cmd2.with_argparser(add_to_plate_parser)  # type: ignore
     def do_add_to_plate(self, args: argparse.Namespace) -> None:
         """Add sample to plate: add_to_plate [sample_id] [plate_barcode] [well_position]"""
+        fill_order = COLUMN_MAJOR if args.column_major else ROW_MAJOR
         try:
-            self.database_layer.add_to_plate(args.sample_id, args.plate_barcode, args.well_position)
+            well = self.database_layer.add_to_plate(args.sample_id, args.plate_barcode, args.well_position,
+                                                    fill_order=fill_order)
         except SampleIdBadFormatting:
             self.perror(f"Bad sample id: {args.sample_id}. Expected NT<PositiveNumber>")
             return
@@ -73,9 +238,70 @@ class MyCLIApp(cmd2.Cmd):
         except WellPositionOccupied:
             self.perror(f"Well at position {args.well_position} already occupied.")
             return
+        except PlateFull:
+            self.perror(f"No free wells left in plate {args.plate_barcode}.")
+            return
 
+        well_position = WellPositionFormatAdapter.get_string_position(row=well.row, col=well.col)
         self.poutput(
-            f"Successfully added sample (id: {args.sample_id}) to plate {args.plate_barcode} at {args.well_position}")
+            f"Successfully added sample (id: {args.sample_id}) to plate {args.plate_barcode} at {well_position}")
+
+    pack_samples_parser = cmd2.Cmd2ArgumentParser()
+    pack_samples_parser.add_argument('--samples', nargs='+', type=int, required=True, help='Sample ids to place')
+    pack_samples_parser.add_argument('--plates', nargs='+', required=True,
+                                     help='Plate barcodes to fill one after another, format: DN<Number>')
+    pack_samples_parser.add_argument('--column-major', action='store_true',
+                                     help='Fill plates column by column (A1, B1, ...) instead of row by row')
+
+    @cmd2.with_argparser(pack_samples_parser)  # type: ignore
+    def do_pack_samples(self, args: argparse.Namespace) -> None:
+        """Place samples into free wells of plates: pack_samples --samples [sample_id ...] --plates [barcode ...]"""
+        fill_order = COLUMN_MAJOR if args.column_major else ROW_MAJOR
+        try:
+            reports = self.database_layer.pack_samples(args.samples, args.plates, fill_order=fill_order)
+        except PlateBarcodeBadFormat:
+            self.perror(f'Plate barcode wrong format. Expected: "DN<Number>". Got: {" ".join(args.plates)}')
+            return
+        except (SampleIdBadFormatting, SampleNotFound, NotEnoughFreeWells) as exc:
+            self.perror(str(exc))
+            return
+
+        for report in reports:
+            self.poutput(print_report(report))
+
+    load_plate_layout_parser = cmd2.Cmd2ArgumentParser()
+    load_plate_layout_parser.add_argument('plate_barcode', help='Plate barcode, format: DN<Number>')
+    load_plate_layout_parser.add_argument('layout_path', help='Layout file (.csv or .jsonl) with '
+                                                              'well_position and sample_id columns')
+
+    @cmd2.with_argparser(load_plate_layout_parser)  # type: ignore
+    def do_load_plate_layout(self, args: argparse.Namespace) -> None:
+        """Add samples to whole plate: load_plate_layout [plate_barcode] [layout_path]"""
+        layout = {}
+        try:
+            for well_position, sample_id in read_rows(args.layout_path, columns=("well_position", "sample_id")):
+                if well_position is None or sample_id is None:
+                    self.perror(f"Layout {args.layout_path} has a row without well_position or sample_id.")
+                    return
+                if well_position.upper() in layout:
+                    self.perror(f"Well position {well_position} is listed more than once in {args.layout_path}.")
+                    return
+                layout[well_position.upper()] = int(sample_id)
+            report = self.database_layer.load_plate_layout(args.plate_barcode, layout)
+        except (UnsupportedFileFormat, FileColumnMissing, FileRowMalformed) as exc:
+            self.perror(str(exc))
+            return
+        except OSError as exc:
+            self.perror(f"Can not read layout {args.layout_path}: {exc.strerror}")
+            return
+        except ValueError as exc:
+            self.perror(f"Bad sample id in {args.layout_path}: {exc}")
+            return
+        except PlateBarcodeBadFormat:
+            self.perror(f'Plate barcode wrong format. Expected: "DN<Number>". Got: {args.plate_barcode}')
+            return
+
+        self.poutput(print_report(report))
 
     tube_transfer_parser = cmd2.Cmd2ArgumentParser()
     tube_transfer_parser.add_argument('source_tube_barcode', help='Source tube barcode. Format: NT<Number>')
@@ -100,15 +326,259 @@ class MyCLIApp(cmd2.Cmd):
         self.poutput(f"Successfully transfer sample from tube ({args.source_tube_barcode}) "
                      f"to tube ({args.destination_tube_barcode})")
 
+    rearray_parser = cmd2.Cmd2ArgumentParser()
+    rearray_parser.add_argument('worklist_path', help='Worklist file (.csv or .jsonl) with '
+                                                      'source_tube_barcode and destination_tube_barcode columns')
+
+    @cmd2.with_argparser(rearray_parser)  # type: ignore
+    def do_rearray(self, args: argparse.Namespace) -> None:
+        """Transfer samples between tubes from worklist in one transaction: rearray [worklist_path]"""
+        try:
+            transfers = []
+            for source_tube_barcode, destination_tube_barcode in read_rows(
+                    args.worklist_path, columns=("source_tube_barcode", "destination_tube_barcode")):
+                if source_tube_barcode is None or destination_tube_barcode is None:
+                    self.perror(f"Worklist {args.worklist_path} has a row without source or destination tube barcode.")
+                    return
+                transfers.append((source_tube_barcode, destination_tube_barcode))
+            transferred = self.database_layer.tube_transfer_batch(transfers)
+        except (UnsupportedFileFormat, FileColumnMissing, FileRowMalformed) as exc:
+            self.perror(str(exc))
+            return
+        except OSError as exc:
+            self.perror(f"Can not read worklist {args.worklist_path}: {exc.strerror}")
+            return
+        except TubeBarcodeBadFormat:
+            self.perror(f"Bad tube barcode format in worklist {args.worklist_path}. Should be: NT<Number>")
+            return
+        except (ConflictingTubeTransfers, OccupiedDestinationTube, TubeNotFound) as exc:
+            self.perror(str(exc))
+            return
+
+        self.poutput(f"Successfully rearrayed {transferred} tubes from worklist {args.worklist_path}")
+
+    where_is_parser = cmd2.Cmd2ArgumentParser()
+    where_is_sample = where_is_parser.add_mutually_exclusive_group(required=True)
+    where_is_sample.add_argument('sample_id', nargs='?', type=int, default=None, help='Sample id')
+    where_is_sample.add_argument('--name', dest='customer_sample_name', default=None,
+                                 help='Customer sample name, may match several samples')
+
+    @cmd2.with_argparser(where_is_parser)  # type: ignore
+    def do_where_is(self, args: argparse.Namespace) -> None:
+        """Print tube and plate wells of sample: where_is [sample_id] / where_is --name [customer_sample_name]"""
+        sample = args.sample_id if args.sample_id is not None else args.customer_sample_name
+        try:
+            locations = self.database_layer.locate_sample(sample)
+        except SampleIdBadFormatting:
+            self.perror(f"Bad sample id: {args.sample_id}. Expected positive number")
+            return
+        except (SampleNotFound, SampleNameNotFound) as exc:
+            self.perror(str(exc))
+            return
+
+        for location in locations:
+            self.poutput(print_report(location))
+
+    history_parser = cmd2.Cmd2ArgumentParser()
+    history_parser.add_argument('subject', help='Sample id, tube or plate barcode. Format: <Number> / NT<Number> / '
+                                                'DN<Number>')
+    history_parser.add_argument('--format', dest='report_format', choices=(TEXT_FORMAT, JSON_FORMAT),
+                                default=TEXT_FORMAT, help='Report format')
+
+    @cmd2.with_argparser(history_parser)  # type: ignore
+    def do_history(self, args: argparse.Namespace) -> None:
+        """Print receipts, transfers and plate placements of sample or container: history [subject]"""
+        # isdigit alone accepts non-ASCII digits like "²" that int() rejects, they are reported as bad barcodes
+        subject = int(args.subject) if args.subject.isascii() and args.subject.isdigit() else args.subject
+        try:
+            history = self.database_layer.custody_history(subject)
+        except SampleIdBadFormatting:
+            self.perror(f"Bad sample id: {args.subject}. Expected positive number")
+            return
+        except BarcodeBadFormat:
+            self.perror(f'Barcode ({args.subject}) has invalid format. Expected NT<Number> / DN<Number>')
+            return
+        except CustodyHistoryNotFound as exc:
+            self.perror(str(exc))
+            return
+
+        write_report(history, self.stdout, args.report_format)
+        self.stdout.write("\n")
+
+    def do_report_cache_stats(self, _: cmd2.Statement) -> None:
+        """Print hit and miss counters of report cache: report_cache_stats"""
+        report_cache = self.database_layer.report_cache
+        if report_cache is None:
+            self.perror("Report cache is disabled. Set PROD_REPORT_CACHE_SIZE to enable it.")
+            return
+
+        self.poutput(f"Hits: {report_cache.hits}, misses: {report_cache.misses}, "
+                     f"hit ratio: {report_cache.hit_ratio:.2%}, "
+                     f"size: {len(report_cache)} / {report_cache.max_size}")
+
+    def do_inventory_check(self, _: cmd2.Statement) -> None:
+        """Compare in-memory inventory with database: inventory_check"""
+        inventory = self.database_layer.inventory
+        if inventory is None:
+            self.perror("Inventory engine is disabled. Set PROD_INVENTORY_ENGINE=true to enable it.")
+            return
+
+        mismatches = inventory.check_consistency(self.database_layer.session)
+        # Consistency check reads whole tables, do not keep the snapshot open
+        self.database_layer.session.commit()
+        self.poutput(f"Samples: {inventory.samples_count}, plates: {inventory.plates_count}, "
+                     f"wells: {inventory.wells_count}, memory: {inventory.nbytes / 2 ** 20:.1f} MiB")
+        if not mismatches:
+            self.poutput("In sync with database")
+            return
+
+        for mismatch in mismatches:
+            self.perror(f"{mismatch.kind} {mismatch.key}: database {mismatch.database_value!r}, "
+                        f"memory {mismatch.memory_value!r}")
+        self.perror(f"Inventory differs from database in {len(mismatches)} places, restart to reload it")
+
+    export_inventory_parser = cmd2.Cmd2ArgumentParser()
+    export_inventory_parser.add_argument('export_path', help='Output file (.csv or .jsonl)')
+    export_inventory_parser.add_argument('--plate-prefix', default=None,
+                                         help='Only wells of plates which barcodes start with prefix, e.g. DN12')
+    export_inventory_parser.add_argument('--from', dest='first_barcode', default=None,
+                                         help='First barcode of range, format: NT<Number> / DN<Number>')
+    export_inventory_parser.add_argument('--to', dest='last_barcode', default=None,
+                                         help='Last barcode of range, same container type as --from')
+
+    @cmd2.with_argparser(export_inventory_parser)  # type: ignore
+    def do_export_inventory(self, args: argparse.Namespace) -> None:
+        """Export samples, tubes and plate wells: export_inventory [export_path]"""
+        try:
+            rows = self.database_layer.iter_inventory(plate_prefix=args.plate_prefix, first_barcode=args.first_barcode,
+                                                      last_barcode=args.last_barcode)
+            rows_count = write_rows(args.export_path, InventoryRow._fields, rows)
+        except (BarcodeBadFormat, UnsupportedFileFormat) as exc:
+            self.perror(str(exc))
+            return
+        except OSError as exc:
+            self.perror(f"Can not write export {args.export_path}: {exc.strerror}")
+            return
+
+        self.poutput(f"Exported {rows_count} rows to {args.export_path}")
+
+    snapshot_parser = cmd2.Cmd2ArgumentParser()
+    snapshot_parser.add_argument('snapshot_path', help='Directory to create for .npy columns')
+
+    @cmd2.with_argparser(snapshot_parser)  # type: ignore
+    def do_snapshot(self, args: argparse.Namespace) -> None:
+        """Write columnar snapshot of samples and wells for offline analytics: snapshot [snapshot_path]"""
+        # NumPy is imported only when snapshot is requested, keeps startup fast
+        from database.snapshots import write_snapshot
+
+        try:
+            snapshot = write_snapshot(self.database_layer.session, args.snapshot_path)
+        except SnapshotExists as exc:
+            self.perror(str(exc))
+            return
+        except OSError as exc:
+            self.perror(f"Can not write snapshot {args.snapshot_path}: {exc.strerror}")
+            return
+
+        self.poutput(f"Snapshot of {snapshot.samples_count} samples and {snapshot.wells_count} wells "
+                     f"written to {args.snapshot_path}")
+
+    def do_begin(self, _: cmd2.Statement) -> None:
+        """Start transaction, following commands are kept until commit or rollback: begin"""
+        if self.group_committer is None:
+            self.perror("Transactions are not supported by this session.")
+            return
+        if self.group_committer.in_group and self.group_committer.explicit:
+            self.perror("Transaction is already in progress.")
+            return
+
+        try:
+            self.group_committer.begin()
+        except SQLAlchemyError as exc:
+            self.perror(f"Can not begin transaction: {exc}")
+            return
+        self.poutput("Transaction started")
+
+    def do_commit(self, _: cmd2.Statement) -> None:
+        """Commit transaction started by begin or pending autocommit group: commit"""
+        if self.group_committer is None or not self.group_committer.in_group:
+            self.perror("No transaction in progress.")
+            return
+
+        operations = self.group_committer.operations
+        try:
+            self.group_committer.commit()
+        except SQLAlchemyError as exc:
+            self.perror(f"Commit failed, transaction rolled back: {exc}")
+            return
+        self.poutput(f"Committed {operations} commands")
+
+    def do_rollback(self, _: cmd2.Statement) -> None:
+        """Undo all commands since begin or since last autocommit: rollback"""
+        if self.group_committer is None or not self.group_committer.in_group:
+            self.perror("No transaction in progress.")
+            return
+
+        operations = self.group_committer.operations
+        self.group_committer.rollback()
+        self.poutput(f"Rolled back {operations} commands")
+
+    def do_db_pool_status(self, _: cmd2.Statement) -> None:
+        """Print connection pool counters: db_pool_status"""
+        pool_status = get_pool_status(self.database_layer.session.get_bind().engine)
+        if pool_status is None:
+            self.perror("Connection pool does not keep connections.")
+            return
+
+        self.poutput(f"Pool size: {pool_status['size']}, checked out: {pool_status['checked_out']}, "
+                     f"checked in: {pool_status['checked_in']}, "
+                     f"overflow: {pool_status['overflow']} / {pool_status['max_overflow']}")
+
+    def do_contention_stats(self, _: cmd2.Statement) -> None:
+        """Print retries of writes aborted by concurrent transactions: contention_stats"""
+        counters = self.database_layer.transaction_runner.counters.snapshot()
+        self.poutput(f"Transactions: {counters['transactions']:.0f}, retries: {counters['retries']:.0f}, "
+                     f"gave up: {counters['exhausted']:.0f}, backoff: {counters['backoff_seconds'] * 1000:.1f} ms")
+        self.poutput(f"Serialization failures: {counters['serialization_failures']:.0f}, "
+                     f"deadlocks: {counters['deadlocks']:.0f}, lock timeouts: {counters['lock_timeouts']:.0f}")
+
+    stats_parser = cmd2.Cmd2ArgumentParser()
+    stats_parser.add_argument('--reset', action='store_true', help='Reset counters after printing them')
+
+    @cmd2.with_argparser(stats_parser)  # type: ignore
+    def do_stats(self, args: argparse.Namespace) -> None:
+        """Print SQL statements, rows and time per command: stats"""
+        if self.instrumentation is None:
+            self.perror("SQL stats are disabled. Set PROD_SQL_STATS=true to enable them.")
+            return
+
+        self.poutput(f"{'Command':<20} {'Count':>7} {'Stmts':>7} {'Rows':>9} {'SQL ms':>9} {'Python ms':>10} "
+                     f"{'Commits':>8} {'Commit ms':>10}")
+        for command, stats in sorted(self.instrumentation.snapshot().items()):
+            # Averages per command execution, counters outside of commands are totals
+            executions = max(stats.count, 1)
+            self.poutput(f"{command:<20} {stats.count:>7} {stats.statements / executions:>7.1f} "
+                         f"{stats.rows / executions:>9.1f} {stats.sql_seconds * 1000 / executions:>9.2f} "
+                         f"{stats.python_seconds * 1000 / executions:>10.2f} {stats.commits / executions:>8.1f} "
+                         f"{stats.commit_seconds * 1000 / executions:>10.2f}")
+
+        if args.reset:
+            self.instrumentation.reset()
+
     list_samples_in_parser = cmd2.Cmd2ArgumentParser()
     list_samples_in_parser.add_argument('container_barcode', help='Tube or plate barcode. Format: '
                                                                   'NT<Number> / DN<Number>')
+    list_samples_in_parser.add_argument('--format', dest='report_format', choices=REPORT_FORMATS, default=TEXT_FORMAT,
+                                        help='Report format, grid is 8x12 map of plate sample ids')
+    list_samples_in_parser.add_argument('--as-of', dest='as_of', type=datetime.datetime.fromisoformat, default=None,
+                                        help='Content at this time from custody history, ISO format: '
+                                             '2026-10-13T09:00 (local time) or 2026-10-13T09:00+00:00')
 
     @cmd2.with_argparser(list_samples_in_parser)  # type: ignore
     def do_list_samples_in(self, args: argparse.Namespace) -> None:
-        """Print report for tube or plate: list_samples_in [container_barcode]"""
+        """Print report for tube or plate: list_samples_in [container_barcode] [--as-of time]"""
         try:
-            report = self.database_layer.list_samples_in(args.container_barcode)
+            report = self.database_layer.list_samples_in(args.container_barcode, as_of=args.as_of)
         except TubeNotFound:
             self.perror(f"Tube with barcode {args.container_barcode} not found.")
             return
@@ -119,17 +589,114 @@ class MyCLIApp(cmd2.Cmd):
             self.perror(f'Barcode ({args.container_barcode}) has invalid format. Expected NT<Number> / DN<Number>')
             return
 
-        self.poutput(print_report(report))
+        try:
+            write_report(report, self.stdout, args.report_format)
+        except UnsupportedReportFormat as exc:
+            self.perror(str(exc))
+            return
+        self.stdout.write("\n")
 
+    plate_status_parser = cmd2.Cmd2ArgumentParser()
+    plate_status_selection = plate_status_parser.add_mutually_exclusive_group()
+    plate_status_selection.add_argument('--partial', action='store_true', help='Plates with occupied and free wells')
+    plate_status_selection.add_argument('--full', action='store_true', help='Plates without free wells')
+    plate_status_selection.add_argument('--empty-since', dest='empty_since', type=datetime.datetime.fromisoformat,
+                                        default=None, help='Plates with free wells not filled since this time, '
+                                                           'ISO format: 2026-10-13T09:00 (local time)')
+    plate_status_parser.add_argument('--format', dest='report_format', choices=(TEXT_FORMAT, JSON_FORMAT),
+                                     default=TEXT_FORMAT, help='Report format')
 
-if __name__ == '__main__':
+    @cmd2.with_argparser(plate_status_parser)  # type: ignore
+    def do_plate_status(self, args: argparse.Namespace) -> None:
+        """Print fill state of plates: plate_status [--partial | --full | --empty-since time]"""
+        report = self.database_layer.plate_status(partial=args.partial, full=args.full, empty_since=args.empty_since)
+        write_report(report, self.stdout, args.report_format)
+        self.stdout.write("\n")
+
+
+def create_app(autocommit_every: tp.Optional[int] = None, autocommit_ms: tp.Optional[float] = None) -> MyCLIApp:
+    """
+    App connected to PROD database, configured from environment variables
+    :param autocommit_every: commit commands in groups of this size instead of one by one
+    :param autocommit_ms: commit group once it is open this long, checked after every command
+    """
     database_arguments = DatabaseArgumentsLoader.load_database_arguments("PROD")
-    engine = DatabaseInitializer(Base=Base).init_database(database_arguments, recreate=False)
+    engine_options = DatabaseArgumentsLoader.load_engine_options("PROD")
+    slow_query_log_settings = DatabaseArgumentsLoader.load_slow_query_log_settings("PROD")
+    engine = DatabaseInitializer(Base=Base).init_database(
+        database_arguments, recreate=False, engine_options=engine_options,
+        slow_query_log_settings=slow_query_log_settings,
+        schema_cache_path=DatabaseArgumentsLoader.load_schema_cache_path("PROD")
+    )
 
     connection = engine.connect()
 
-    Session = sessionmaker(bind=connection)
+    # Inside transaction of group commit session commits and rollbacks only release and roll back savepoints
+    Session = sessionmaker(bind=connection, join_transaction_mode="create_savepoint")
     session = Session()
 
-    app = MyCLIApp(database_layer=DatabaseLayer(session))
+    report_cache_settings = DatabaseArgumentsLoader.load_report_cache_settings("PROD")
+    report_cache = ReportCache(**report_cache_settings) if report_cache_settings else None
+
+    journal_path = DatabaseArgumentsLoader.load_command_journal_path("PROD")
+    journal = CommandJournal.open(journal_path) if journal_path else None
+
+    transaction_runner = TransactionRunner(**DatabaseArgumentsLoader.load_transaction_retry_settings("PROD"))
+
+    instrumentation, prometheus_writer = None, None
+    sql_stats_settings = DatabaseArgumentsLoader.load_sql_stats_settings("PROD")
+    if sql_stats_settings is not None:
+        instrumentation = SqlInstrumentation()
+        instrumentation.instrument_engine(engine)
+        instrumentation.instrument_session(session)
+        if sql_stats_settings["prometheus_path"] is not None:
+            prometheus_writer = PrometheusFileWriter(sql_stats_settings["prometheus_path"], instrumentation,
+                                                     interval_seconds=sql_stats_settings["prometheus_interval_seconds"],
+                                                     contention_counters=transaction_runner.counters)
+
+    inventory = None
+    if DatabaseArgumentsLoader.load_inventory_engine_enabled("PROD"):
+        from database.inventory_engine import InventoryEngine
+        inventory = InventoryEngine.load(session)
+
+    database_layer = DatabaseLayer(session, report_cache=report_cache, transaction_runner=transaction_runner,
+                                   inventory=inventory)
+    group_committer = GroupCommitter(session, every=autocommit_every,
+                                     max_seconds=autocommit_ms / 1000 if autocommit_ms is not None else None,
+                                     on_rollback=database_layer.discard_derived_state)
+    return MyCLIApp(database_layer=database_layer, journal=journal,
+                    instrumentation=instrumentation, prometheus_writer=prometheus_writer,
+                    group_committer=group_committer)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"expected positive number, got {value}")
+    return number
+
+
+def main(argv: tp.Sequence[str]) -> int:
+    """
+    Without command start interactive prompt, otherwise run the command given as arguments and exit:
+    python main.py list_samples_in NT1 --format json
+    Options go before the command: python main.py --autocommit-every 500
+    :return: exit status, 1 if the command failed
+    """
+    parser = argparse.ArgumentParser(description="CLI tool for tracking samples")
+    parser.add_argument('--autocommit-every', type=positive_int, default=None,
+                        help='Commit commands in groups of N, failed commands are rolled back alone')
+    parser.add_argument('--autocommit-ms', type=positive_int, default=None,
+                        help='Commit group of commands once it is open T milliseconds')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='Command to run instead of interactive prompt')
+    args = parser.parse_args(argv)
+
+    app = create_app(autocommit_every=args.autocommit_every, autocommit_ms=args.autocommit_ms)
+    if args.command:
+        return app.run_command_line(args.command)
     app.cmdloop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,57 @@
+import argparse
+import sys
+import typing as tp
+
+from database.management import DatabaseArgumentsLoader, DatabaseInitializer
+from database.migrations import BACKFILL_BATCH_SIZE, MigrationRunner
+from database.scheme import Base
+from exceptions import OfflineMigrationRequired, MigrationInProgress
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to PROD database")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations and exit")
+    parser.add_argument("--target", type=int, help="Last migration version to apply, all by default")
+    parser.add_argument("--offline", action="store_true",
+                        help="Allow migrations that lock whole tables and build indexes without CONCURRENTLY. "
+                             "Stop the application first")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="Rows per backfill transaction")
+    parser.add_argument("--throttle-ms", type=float, default=0.0,
+                        help="Pause between backfill batches, leaves IO for the application")
+    return parser
+
+
+def main(argv: tp.Optional[tp.Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    database_arguments = DatabaseArgumentsLoader.load_database_arguments("PROD")
+    engine_options = DatabaseArgumentsLoader.load_engine_options("PROD")
+    # Index builds on large tables run far longer than application statements
+    engine_options["statement_timeout_ms"] = 0
+    engine = DatabaseInitializer(Base=Base).init_database(database_arguments, engine_options=engine_options)
+
+    runner = MigrationRunner(engine, online=not args.offline, batch_size=args.batch_size,
+                             throttle_seconds=args.throttle_ms / 1000,
+                             progress=lambda message: print(message, flush=True))
+    if args.status:
+        applied_versions = runner.applied_versions()
+        for migration in runner.migrations:
+            state = "applied" if migration.version in applied_versions else "pending"
+            mode = "online" if migration.online else "offline"
+            print(f"{migration.version:04d} {state:<7} {mode:<7} {migration.description}")
+        return 0
+
+    try:
+        applied = runner.migrate(target=args.target)
+    except (OfflineMigrationRequired, MigrationInProgress) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    finally:
+        engine.dispose()
+
+    print(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
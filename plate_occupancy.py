@@ -0,0 +1,72 @@
+import typing as tp
+
+PLATE_ROWS = 8
+PLATE_COLUMNS = 12
+WELLS_PER_PLATE = PLATE_ROWS * PLATE_COLUMNS
+
+FULL_PLATE_MASK = (1 << WELLS_PER_PLATE) - 1
+
+# Fill orders for automatic well placement
+ROW_MAJOR = "row"  # A1, A2, ..., A12, B1, ...
+COLUMN_MAJOR = "column"  # A1, B1, ..., H1, A2, ...
+
+
+def well_bit(row: int, col: int) -> int:
+    """Bit of well in 96-bit occupancy mask, row-major: A1 is bit 0, A2 is bit 1, H12 is bit 95"""
+    return 1 << ((row - 1) * PLATE_COLUMNS + (col - 1))
+
+
+def is_occupied(mask: int, row: int, col: int) -> bool:
+    return bool(mask & well_bit(row, col))
+
+
+def occupy(mask: int, row: int, col: int) -> int:
+    return mask | well_bit(row, col)
+
+
+def occupied_count(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def mask_from_positions(positions: tp.Iterable[tp.Tuple[int, int]]) -> int:
+    mask = 0
+    for row, col in positions:
+        mask |= well_bit(row, col)
+    return mask
+
+
+_COLUMN_MAJOR_POSITIONS = [(row, col) for col in range(1, PLATE_COLUMNS + 1) for row in range(1, PLATE_ROWS + 1)]
+
+
+def next_free_well(mask: int, fill_order: str = ROW_MAJOR) -> tp.Optional[tp.Tuple[int, int]]:
+    """
+    :param mask: occupancy mask of plate
+    :param fill_order: ROW_MAJOR or COLUMN_MAJOR
+    :return: (row, col) of first free well or None for full plate
+    """
+    if fill_order == ROW_MAJOR:
+        free = ~mask & FULL_PLATE_MASK
+        if not free:
+            return None
+        # Lowest set bit is the first free well in row-major order
+        index = (free & -free).bit_length() - 1
+        return index // PLATE_COLUMNS + 1, index % PLATE_COLUMNS + 1
+
+    for position in free_wells(mask, fill_order):
+        return position
+    return None
+
+
+def free_wells(mask: int, fill_order: str = ROW_MAJOR) -> tp.Iterator[tp.Tuple[int, int]]:
+    if fill_order == ROW_MAJOR:
+        positions: tp.Iterable[tp.Tuple[int, int]] = (
+            (row, col) for row in range(1, PLATE_ROWS + 1) for col in range(1, PLATE_COLUMNS + 1)
+        )
+    elif fill_order == COLUMN_MAJOR:
+        positions = _COLUMN_MAJOR_POSITIONS
+    else:
+        raise ValueError(f"Unknown fill order: {fill_order}")
+
+    for row, col in positions:
+        if not is_occupied(mask, row, col):
+            yield row, col
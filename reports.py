@@ -1,8 +1,23 @@
+import csv
+import datetime
+import io
+import json
 import typing as tp
 
-from exceptions import WellPositionBadFormatting, UnknownReportType
+from exceptions import BaseApplicationException, WellPositionBadFormatting, UnknownReportType, \
+    UnsupportedReportFormat
 from format_validator import well_position_validator
-from database.scheme import Sample, Well
+
+PLATE_ROWS = "ABCDEFGH"
+PLATE_COLUMNS = range(1, 13)
+
+TEXT_FORMAT = "text"
+GRID_FORMAT = "grid"
+JSON_FORMAT = "json"
+CSV_FORMAT = "csv"
+REPORT_FORMATS = (TEXT_FORMAT, GRID_FORMAT, JSON_FORMAT, CSV_FORMAT)
+
+ReportT = tp.TypeVar("ReportT")
 
 
 class WellPositionFormatAdapter:
@@ -22,49 +37,386 @@ class WellPositionFormatAdapter:
 
 
 class TubeReport:
+    __slots__ = ("barcode", "sample_id", "customer_sample_name")
+
     def __init__(self, tube_barcode: str, sample_id: int, customer_sample_name: str):
         self.barcode = tube_barcode
         self.sample_id = sample_id
         self.customer_sample_name = customer_sample_name
 
 
+class PlateWell(tp.NamedTuple):
+    """Occupied well of plate report, projected from wells and samples tables"""
+    well_position: str
+    row: int
+    col: int
+    sample_id: int
+    customer_sample_name: tp.Optional[str]
+
+
 class PlateReport:
-    def __init__(self, plate_barcode: str, wells_and_samples: tp.List[tp.Tuple[Well, Sample]]):
+    __slots__ = ("barcode", "wells")
+
+    def __init__(self, plate_barcode: str, wells: tp.List[PlateWell]):
+        self.barcode = plate_barcode
+        # Ordered by row, then column
+        self.wells = wells
+
+
+class WellLocation(tp.NamedTuple):
+    plate_barcode: str
+    well_position: str
+
+
+class SampleLocation:
+    __slots__ = ("sample_id", "customer_sample_name", "tube_barcode", "wells")
+
+    def __init__(self, sample_id: int, customer_sample_name: tp.Optional[str], tube_barcode: str,
+                 wells: tp.List[WellLocation]):
+        self.sample_id = sample_id
+        self.customer_sample_name = customer_sample_name
+        self.tube_barcode = tube_barcode
+        # Ordered by plate barcode, then row and column
+        self.wells = wells
+
+
+class CustodyEvent(tp.NamedTuple):
+    """Sample moved into tube (tube_barcode, source_tube_barcode for transfers) or placed into plate well"""
+    occurred_at: datetime.datetime
+    event_type: str
+    sample_id: int
+    tube_barcode: tp.Optional[str]
+    source_tube_barcode: tp.Optional[str]
+    plate_barcode: tp.Optional[str]
+    well_position: tp.Optional[str]
+
+
+class CustodyHistory:
+    __slots__ = ("subject", "events")
+
+    def __init__(self, subject: tp.Union[int, str], events: tp.List[CustodyEvent]):
+        # Sample id, tube or plate barcode
+        self.subject = subject
+        # Ordered by time
+        self.events = events
+
+
+class PlateStatus(tp.NamedTuple):
+    plate_barcode: str
+    well_count: int
+    free_wells: int
+    first_filled_at: tp.Optional[datetime.datetime]
+    last_filled_at: tp.Optional[datetime.datetime]
+    last_sample_id: tp.Optional[int]
+
+
+class PlateStatusReport:
+    __slots__ = ("selection", "plates")
+
+    def __init__(self, selection: str, plates: tp.List[PlateStatus]):
+        # Description of selected plates: "all", "partial", "full", "partial, empty since <time>"
+        self.selection = selection
+        # Ordered by plate barcode
+        self.plates = plates
+
+    @property
+    def free_wells(self) -> int:
+        return sum(plate.free_wells for plate in self.plates)
+
+
+class InventoryRow(tp.NamedTuple):
+    """One sample placement: tube and, if the sample was added to plates, one of its wells"""
+    sample_id: int
+    customer_sample_name: tp.Optional[str]
+    tube_barcode: str
+    plate_barcode: tp.Optional[str]
+    well_position: tp.Optional[str]
+
+
+class RowRejection:
+    def __init__(self, row_number: int, barcode: str, error: BaseApplicationException):
+        self.row_number = row_number
+        self.barcode = barcode
+        self.error = error
+
+
+class BulkReceiptReport:
+    def __init__(self, sample_ids: tp.Dict[str, int], rejections: tp.List[RowRejection]):
+        # tube_barcode -> assigned sample_id
+        self.sample_ids = sample_ids
+        self.rejections = rejections
+
+
+class WellConflict:
+    def __init__(self, well_position: str, sample_id: int, error: Exception):
+        self.well_position = well_position
+        self.sample_id = sample_id
+        self.error = error
+
+
+class PlateLayoutReport:
+    def __init__(self, plate_barcode: str, loaded_wells: tp.Dict[str, int], conflicts: tp.List[WellConflict]):
+        # well_position -> sample_id, empty when layout has conflicts
         self.barcode = plate_barcode
-        self.wells_and_samples = wells_and_samples
+        self.loaded_wells = loaded_wells
+        self.conflicts = conflicts
+
 
+class ReportFormatter(tp.Generic[ReportT]):
+    """Subclasses write reports into a stream, format collects the output into a string"""
+
+    @classmethod
+    def format(cls, report: ReportT) -> str:
+        stream = io.StringIO()
+        cls.write(report, stream)
+        return stream.getvalue()
 
-class PlateReportFormatter:
     @staticmethod
-    def format(plate_report: PlateReport) -> str:
-        result = f"""
+    def write(report: ReportT, stream: tp.IO[str]) -> None:
+        raise NotImplementedError
+
+
+class PlateReportFormatter(ReportFormatter[PlateReport]):
+    @staticmethod
+    def write(plate_report: PlateReport, stream: tp.IO[str]) -> None:
+        stream.write(f"""
         ======== Plate: {plate_report.barcode} ========
-        """
+        """)
 
-        for (well, sample) in plate_report.wells_and_samples:
-            result += f"""
-            Well position: {WellPositionFormatAdapter.get_string_position(row=well.row, col=well.col)}
+        for well in plate_report.wells:
+            stream.write(f"""
+            Well position: {well.well_position}
             Sample ID: {well.sample_id}
-            Customer Sample Name: {sample.customer_sample_name}
-            """
+            Customer Sample Name: {well.customer_sample_name}
+            """)
+
 
-        return result
+class PlateGridFormatter(ReportFormatter[PlateReport]):
+    """8x12 plate map with sample ids, "." for empty wells"""
+
+    @staticmethod
+    def write(plate_report: PlateReport, stream: tp.IO[str]) -> None:
+        sample_ids = {(well.row, well.col): str(well.sample_id) for well in plate_report.wells}
+        width = max(len(sample_id) for sample_id in sample_ids.values()) if sample_ids else 1
+        width = max(width, len(str(PLATE_COLUMNS[-1])))
+
+        stream.write(f"Plate: {plate_report.barcode}\n")
+        stream.write("  " + " ".join(str(col).rjust(width) for col in PLATE_COLUMNS) + "\n")
+        for row_index, row_letter in enumerate(PLATE_ROWS, start=1):
+            cells = (sample_ids.get((row_index, col), ".").rjust(width) for col in PLATE_COLUMNS)
+            stream.write(f"{row_letter} " + " ".join(cells) + "\n")
 
 
-class TubeReportFormatter:
+class CsvReportFormatter(ReportFormatter[tp.Union[PlateReport, TubeReport]]):
     @staticmethod
-    def format(tube_report: TubeReport) -> str:
-        return f"""
+    def write(report: tp.Union[PlateReport, TubeReport], stream: tp.IO[str]) -> None:
+        writer = csv.writer(stream)
+        if isinstance(report, PlateReport):
+            writer.writerow(("plate_barcode", "well_position", "sample_id", "customer_sample_name"))
+            writer.writerows((report.barcode, well.well_position, well.sample_id, well.customer_sample_name)
+                             for well in report.wells)
+        else:
+            writer.writerow(("tube_barcode", "sample_id", "customer_sample_name"))
+            writer.writerow((report.barcode, report.sample_id, report.customer_sample_name))
+
+
+class TubeReportFormatter(ReportFormatter[TubeReport]):
+    @staticmethod
+    def write(tube_report: TubeReport, stream: tp.IO[str]) -> None:
+        stream.write(f"""
         ======== Tube: {tube_report.barcode} ========
         Sample ID: {tube_report.sample_id}
         Customer Sample Name: {tube_report.customer_sample_name}
-        """
+        """)
+
+
+class SampleLocationFormatter(ReportFormatter[SampleLocation]):
+    @staticmethod
+    def write(sample_location: SampleLocation, stream: tp.IO[str]) -> None:
+        stream.write(f"""
+        ======== Sample: {sample_location.sample_id} ========
+        Customer Sample Name: {sample_location.customer_sample_name}
+        Tube: {sample_location.tube_barcode}
+        Wells: {len(sample_location.wells)}
+        """)
+
+        for well in sample_location.wells:
+            stream.write(f"""
+            Plate {well.plate_barcode}, well {well.well_position}
+            """)
+
+
+class CustodyHistoryFormatter(ReportFormatter[CustodyHistory]):
+    @staticmethod
+    def write(custody_history: CustodyHistory, stream: tp.IO[str]) -> None:
+        stream.write(f"""
+        ======== History: {custody_history.subject} ========
+        Events: {len(custody_history.events)}
+        """)
+
+        for event in custody_history.events:
+            if event.plate_barcode is not None:
+                container = f"plate {event.plate_barcode}, well {event.well_position}"
+            elif event.source_tube_barcode is not None:
+                container = f"tube {event.source_tube_barcode} -> {event.tube_barcode}"
+            else:
+                container = f"tube {event.tube_barcode}"
+            stream.write(f"""
+            {event.occurred_at.isoformat()} {event.event_type}: sample {event.sample_id}, {container}
+            """)
 
 
-def print_report(report: tp.Union[PlateReport, TubeReport]) -> str:
+class PlateStatusReportFormatter(ReportFormatter[PlateStatusReport]):
+    @staticmethod
+    def write(plate_status_report: PlateStatusReport, stream: tp.IO[str]) -> None:
+        stream.write(f"""
+        ======== Plates: {plate_status_report.selection} ========
+        Plates: {len(plate_status_report.plates)}
+        Free wells: {plate_status_report.free_wells}
+        """)
+
+        for plate in plate_status_report.plates:
+            # Plates filled before fill times were recorded have no time
+            last_fill = "unknown" if plate.last_filled_at is None else \
+                f"{plate.last_filled_at.isoformat()} (sample {plate.last_sample_id})"
+            stream.write(f"""
+            {plate.plate_barcode}: {plate.well_count} wells, {plate.free_wells} free, last filled {last_fill}
+            """)
+
+
+class BulkReceiptReportFormatter(ReportFormatter[BulkReceiptReport]):
+    @staticmethod
+    def write(bulk_receipt_report: BulkReceiptReport, stream: tp.IO[str]) -> None:
+        stream.write(f"""
+        ======== Receipts import ========
+        Received: {len(bulk_receipt_report.sample_ids)}
+        Rejected: {len(bulk_receipt_report.rejections)}
+        """)
+
+        for rejection in bulk_receipt_report.rejections:
+            stream.write(f"""
+            Row {rejection.row_number} ({rejection.barcode}): {rejection.error}
+            """)
+
+
+class PlateLayoutReportFormatter(ReportFormatter[PlateLayoutReport]):
+    @staticmethod
+    def write(plate_layout_report: PlateLayoutReport, stream: tp.IO[str]) -> None:
+        stream.write(f"""
+        ======== Plate layout: {plate_layout_report.barcode} ========
+        Loaded wells: {len(plate_layout_report.loaded_wells)}
+        Conflicts: {len(plate_layout_report.conflicts)}
+        """)
+
+        for conflict in plate_layout_report.conflicts:
+            stream.write(f"""
+            Well {conflict.well_position} (sample_id: {conflict.sample_id}): {conflict.error}
+            """)
+
+
+Report = tp.Union[PlateReport, TubeReport, BulkReceiptReport, PlateLayoutReport, SampleLocation, CustodyHistory,
+                  PlateStatusReport]
+
+
+def report_to_dict(report: Report) -> tp.Dict[str, tp.Any]:
+    """Convert report to JSON serializable dict"""
     if isinstance(report, PlateReport):
-        return PlateReportFormatter.format(plate_report=report)
+        return {
+            "plate_barcode": report.barcode,
+            "wells": [
+                {
+                    "well_position": well.well_position,
+                    "sample_id": well.sample_id,
+                    "customer_sample_name": well.customer_sample_name
+                }
+                for well in report.wells
+            ]
+        }
     elif isinstance(report, TubeReport):
-        return TubeReportFormatter.format(tube_report=report)
+        return {
+            "tube_barcode": report.barcode,
+            "sample_id": report.sample_id,
+            "customer_sample_name": report.customer_sample_name
+        }
+    elif isinstance(report, BulkReceiptReport):
+        return {
+            "sample_ids": report.sample_ids,
+            "rejections": [
+                {"row_number": rejection.row_number, "tube_barcode": rejection.barcode,
+                 "error": type(rejection.error).__name__, "message": str(rejection.error)}
+                for rejection in report.rejections
+            ]
+        }
+    elif isinstance(report, PlateLayoutReport):
+        return {
+            "plate_barcode": report.barcode,
+            "loaded_wells": report.loaded_wells,
+            "conflicts": [
+                {"well_position": conflict.well_position, "sample_id": conflict.sample_id,
+                 "error": type(conflict.error).__name__, "message": str(conflict.error)}
+                for conflict in report.conflicts
+            ]
+        }
+    elif isinstance(report, SampleLocation):
+        return {
+            "sample_id": report.sample_id,
+            "customer_sample_name": report.customer_sample_name,
+            "tube_barcode": report.tube_barcode,
+            "wells": [well._asdict() for well in report.wells]
+        }
+    elif isinstance(report, CustodyHistory):
+        return {
+            "subject": report.subject,
+            "events": [dict(event._asdict(), occurred_at=event.occurred_at.isoformat()) for event in report.events]
+        }
+    elif isinstance(report, PlateStatusReport):
+        return {
+            "selection": report.selection,
+            "free_wells": report.free_wells,
+            "plates": [
+                dict(plate._asdict(),
+                     first_filled_at=plate.first_filled_at.isoformat() if plate.first_filled_at is not None else None,
+                     last_filled_at=plate.last_filled_at.isoformat() if plate.last_filled_at is not None else None)
+                for plate in report.plates
+            ]
+        }
     else:
         raise UnknownReportType
+
+
+def print_report(report: Report) -> str:
+    stream = io.StringIO()
+    write_report(report, stream)
+    return stream.getvalue()
+
+
+def write_report(report: Report, stream: tp.IO[str], report_format: str = TEXT_FORMAT) -> None:
+    """
+    Write report into stream without building the whole output in memory
+    :param report_format: one of REPORT_FORMATS, "grid" and "csv" are supported for plate and tube reports only
+    """
+    if report_format == TEXT_FORMAT:
+        if isinstance(report, PlateReport):
+            PlateReportFormatter.write(report, stream)
+        elif isinstance(report, TubeReport):
+            TubeReportFormatter.write(report, stream)
+        elif isinstance(report, BulkReceiptReport):
+            BulkReceiptReportFormatter.write(report, stream)
+        elif isinstance(report, PlateLayoutReport):
+            PlateLayoutReportFormatter.write(report, stream)
+        elif isinstance(report, SampleLocation):
+            SampleLocationFormatter.write(report, stream)
+        elif isinstance(report, CustodyHistory):
+            CustodyHistoryFormatter.write(report, stream)
+        elif isinstance(report, PlateStatusReport):
+            PlateStatusReportFormatter.write(report, stream)
+        else:
+            raise UnknownReportType
+    elif report_format == JSON_FORMAT:
+        json.dump(report_to_dict(report), stream)
+    elif report_format == GRID_FORMAT and isinstance(report, PlateReport):
+        PlateGridFormatter.write(report, stream)
+    elif report_format == CSV_FORMAT and isinstance(report, (PlateReport, TubeReport)):
+        CsvReportFormatter.write(report, stream)
+    else:
+        raise UnsupportedReportFormat(report_format=report_format, report_name=type(report).__name__)
@@ -0,0 +1,303 @@
+import argparse
+import json
+import re
+import typing as tp
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from database.database import DatabaseLayer
+from database.management import DatabaseInitializer, DatabaseArgumentsLoader
+from database.report_cache import ReportCache
+from database.scheme import Base
+from database.transactions import TransactionRunner
+from exceptions import BaseApplicationException, FormattingException, SampleNotFound, TubeNotFound, \
+    OccupiedWellsNotFound, SampleAlreadyReceived, OccupiedDestinationTube, WellPositionOccupied, \
+    ConflictingTubeTransfers, PlateFull, NotEnoughFreeWells, TransactionContention, SampleNameNotFound, \
+    CustodyHistoryNotFound
+from plate_occupancy import ROW_MAJOR, COLUMN_MAJOR
+from reports import WellPositionFormatAdapter, report_to_dict
+
+if tp.TYPE_CHECKING:
+    # NumPy is imported only by processes that load the inventory engine
+    from database.inventory_engine import InventoryEngine
+
+# First matching class wins, so subclasses go before their bases
+EXCEPTION_STATUSES: tp.List[tp.Tuple[tp.Type[BaseApplicationException], HTTPStatus]] = [
+    (FormattingException, HTTPStatus.BAD_REQUEST),
+    (SampleNotFound, HTTPStatus.NOT_FOUND),
+    (SampleNameNotFound, HTTPStatus.NOT_FOUND),
+    (TubeNotFound, HTTPStatus.NOT_FOUND),
+    (OccupiedWellsNotFound, HTTPStatus.NOT_FOUND),
+    (CustodyHistoryNotFound, HTTPStatus.NOT_FOUND),
+    (SampleAlreadyReceived, HTTPStatus.CONFLICT),
+    (OccupiedDestinationTube, HTTPStatus.CONFLICT),
+    (WellPositionOccupied, HTTPStatus.CONFLICT),
+    (ConflictingTubeTransfers, HTTPStatus.CONFLICT),
+    (PlateFull, HTTPStatus.CONFLICT),
+    (NotEnoughFreeWells, HTTPStatus.CONFLICT),
+    (TransactionContention, HTTPStatus.SERVICE_UNAVAILABLE),
+    (BaseApplicationException, HTTPStatus.UNPROCESSABLE_ENTITY),
+]
+
+Response = tp.Tuple[HTTPStatus, tp.Any]
+
+
+class BadRequest(Exception):
+    """Request body is not valid JSON or misses fields"""
+
+
+def status_for_exception(exc: BaseApplicationException) -> HTTPStatus:
+    for exception_type, status in EXCEPTION_STATUSES:
+        if isinstance(exc, exception_type):
+            return status
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+class SampleTrackingHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP/JSON front end for DatabaseLayer. Every request gets its own session from session_factory,
+    sessions share the connection pool of one engine.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address: tp.Tuple[str, int], session_factory: tp.Callable[[], Session],
+                 report_cache: tp.Optional[ReportCache] = None, quiet: bool = False,
+                 transaction_runner: tp.Optional[TransactionRunner] = None,
+                 inventory: tp.Optional["InventoryEngine"] = None):
+        super().__init__(server_address, SampleTrackingRequestHandler)
+        self.session_factory = session_factory
+        self.report_cache = report_cache
+        # Shared by request threads, writes of every request are applied to it after commit
+        self.inventory = inventory
+        # Shared by request sessions, so contention counters cover the whole server
+        self.transaction_runner = transaction_runner if transaction_runner is not None else TransactionRunner()
+        self.quiet = quiet
+
+
+class SampleTrackingRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests, every response must have Content-Length
+    protocol_version = "HTTP/1.1"
+    server: SampleTrackingHTTPServer
+
+    routes: tp.List[tp.Tuple[str, tp.Pattern[str], str]] = [
+        ("POST", re.compile(r"^/receipts$"), "record_receipt"),
+        ("POST", re.compile(r"^/receipts/bulk$"), "record_receipts_bulk"),
+        ("POST", re.compile(r"^/plates/(?P<plate_barcode>[^/]+)/wells$"), "add_to_plate"),
+        ("PUT", re.compile(r"^/plates/(?P<plate_barcode>[^/]+)/layout$"), "load_plate_layout"),
+        ("POST", re.compile(r"^/plates/pack$"), "pack_samples"),
+        ("POST", re.compile(r"^/transfers$"), "tube_transfer"),
+        ("POST", re.compile(r"^/transfers/batch$"), "tube_transfer_batch"),
+        ("GET", re.compile(r"^/containers/(?P<container_barcode>[^/]+)$"), "list_samples_in"),
+        ("GET", re.compile(r"^/samples/(?P<sample_id>[^/]+)/location$"), "locate_sample"),
+        ("GET", re.compile(r"^/history/(?P<subject>[^/]+)$"), "custody_history"),
+        ("GET", re.compile(r"^/stats/contention$"), "contention_stats"),
+    ]
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_PUT(self) -> None:
+        self._dispatch("PUT")
+
+    def log_message(self, format: str, *args: tp.Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _dispatch(self, method: str) -> None:
+        path = self.path.split("?", 1)[0]
+        path_matched = False
+
+        # Body is read before routing, so it is not parsed as the next request of the kept alive connection
+        try:
+            content = self.rfile.read(self._content_length())
+        except BadRequest as exc:
+            # End of the body is unknown, the connection can not be reused
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "BadRequest", "message": str(exc)}, close=True)
+            return
+
+        for route_method, pattern, operation_name in self.routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            path_matched = True
+            if route_method != method:
+                continue
+
+            try:
+                body = self._parse_json_body(content)
+                status, payload = self._run_operation(operation_name, match.groupdict(), body)
+            except BadRequest as exc:
+                status, payload = HTTPStatus.BAD_REQUEST, {"error": "BadRequest", "message": str(exc)}
+            except Exception as exc:
+                self.log_error("%s failed: %r", operation_name, exc)
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "InternalServerError", "message": ""}
+            self._send_json(status, payload)
+            return
+
+        if path_matched:
+            self._send_json(HTTPStatus.METHOD_NOT_ALLOWED, {"error": "MethodNotAllowed", "message": method})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "NotFound", "message": path})
+
+    def _run_operation(self, operation_name: str, path_arguments: tp.Dict[str, str], body: tp.Any) -> Response:
+        session = self.server.session_factory()
+        try:
+            database_layer = DatabaseLayer(session, report_cache=self.server.report_cache,
+                                           transaction_runner=self.server.transaction_runner,
+                                           inventory=self.server.inventory)
+            operation = getattr(self, f"_{operation_name}")
+            return tp.cast(Response, operation(database_layer, body, **path_arguments))
+        except BaseApplicationException as exc:
+            return status_for_exception(exc), {"error": type(exc).__name__, "message": str(exc)}
+        finally:
+            session.close()
+
+    def _content_length(self) -> int:
+        header = self.headers.get("Content-Length")
+        if header is None:
+            return 0
+        # int() would also accept "+1", "1_0" and non-ASCII digits
+        if not header.strip().isascii() or not header.strip().isdigit():
+            raise BadRequest(f"Bad Content-Length: {header}")
+        return int(header)
+
+    @staticmethod
+    def _parse_json_body(content: bytes) -> tp.Any:
+        if not content:
+            return {}
+        try:
+            return json.loads(content)
+        except ValueError as exc:
+            raise BadRequest(f"Body is not valid JSON: {exc}") from exc
+
+    def _send_json(self, status: HTTPStatus, payload: tp.Any, close: bool = False) -> None:
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        if close:
+            # Also sets close_connection
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(content)
+
+    @staticmethod
+    def _field(body: tp.Any, name: str, field_type: tp.Type[tp.Any] = str) -> tp.Any:
+        if not isinstance(body, dict) or name not in body:
+            raise BadRequest(f'Field "{name}" is required')
+        if not isinstance(body[name], field_type) or isinstance(body[name], bool):
+            raise BadRequest(f'Field "{name}" should be {field_type.__name__}')
+        return body[name]
+
+    @staticmethod
+    def _fill_order(body: tp.Any) -> str:
+        fill_order = body.get("fill_order", ROW_MAJOR) if isinstance(body, dict) else ROW_MAJOR
+        if fill_order not in (ROW_MAJOR, COLUMN_MAJOR):
+            raise BadRequest(f'Field "fill_order" should be "{ROW_MAJOR}" or "{COLUMN_MAJOR}"')
+        return tp.cast(str, fill_order)
+
+    def _record_receipt(self, database_layer: DatabaseLayer, body: tp.Any) -> Response:
+        sample = database_layer.record_receipt(self._field(body, "customer_sample_name"),
+                                               self._field(body, "tube_barcode"))
+        return HTTPStatus.CREATED, {"sample_id": sample.id, "tube_barcode": sample.tube_barcode}
+
+    def _record_receipts_bulk(self, database_layer: DatabaseLayer, body: tp.Any) -> Response:
+        rows = [(self._field(row, "customer_sample_name"), self._field(row, "tube_barcode"))
+                for row in self._field(body, "rows", list)]
+        return HTTPStatus.OK, report_to_dict(database_layer.record_receipts_bulk(rows))
+
+    def _add_to_plate(self, database_layer: DatabaseLayer, body: tp.Any, plate_barcode: str) -> Response:
+        sample_id = self._field(body, "sample_id", int)
+        well_position = self._field(body, "well_position") if body.get("well_position") is not None else None
+        well = database_layer.add_to_plate(sample_id, plate_barcode, well_position, fill_order=self._fill_order(body))
+        return HTTPStatus.CREATED, {
+            "plate_barcode": well.plate_barcode,
+            "well_position": WellPositionFormatAdapter.get_string_position(row=well.row, col=well.col),
+            "sample_id": well.sample_id
+        }
+
+    def _load_plate_layout(self, database_layer: DatabaseLayer, body: tp.Any, plate_barcode: str) -> Response:
+        wells = self._field(body, "wells", dict)
+        for well_position in wells:
+            self._field(wells, well_position, int)
+
+        report = database_layer.load_plate_layout(plate_barcode, wells)
+        return HTTPStatus.CONFLICT if report.conflicts else HTTPStatus.OK, report_to_dict(report)
+
+    def _pack_samples(self, database_layer: DatabaseLayer, body: tp.Any) -> Response:
+        sample_ids = self._field(body, "sample_ids", list)
+        plate_barcodes = self._field(body, "plate_barcodes", list)
+        if not all(isinstance(sample_id, int) and not isinstance(sample_id, bool) for sample_id in sample_ids):
+            raise BadRequest('Field "sample_ids" should be list of int')
+        if not all(isinstance(plate_barcode, str) for plate_barcode in plate_barcodes):
+            raise BadRequest('Field "plate_barcodes" should be list of str')
+
+        reports = database_layer.pack_samples(sample_ids, plate_barcodes, fill_order=self._fill_order(body))
+        return HTTPStatus.OK, [report_to_dict(report) for report in reports]
+
+    def _tube_transfer(self, database_layer: DatabaseLayer, body: tp.Any) -> Response:
+        database_layer.tube_transfer(self._field(body, "source_tube_barcode"),
+                                     self._field(body, "destination_tube_barcode"))
+        return HTTPStatus.OK, {}
+
+    def _tube_transfer_batch(self, database_layer: DatabaseLayer, body: tp.Any) -> Response:
+        transfers = [(self._field(transfer, "source_tube_barcode"), self._field(transfer, "destination_tube_barcode"))
+                     for transfer in self._field(body, "transfers", list)]
+        return HTTPStatus.OK, {"transferred": database_layer.tube_transfer_batch(transfers)}
+
+    def _list_samples_in(self, database_layer: DatabaseLayer, body: tp.Any, container_barcode: str) -> Response:
+        return HTTPStatus.OK, report_to_dict(database_layer.list_samples_in(container_barcode))
+
+    def _locate_sample(self, database_layer: DatabaseLayer, body: tp.Any, sample_id: str) -> Response:
+        # isdigit alone accepts non-ASCII digits like "²" that int() rejects
+        if not sample_id.isascii() or not sample_id.isdigit():
+            raise BadRequest(f"Sample id should be positive number, got: {sample_id}")
+        return HTTPStatus.OK, [report_to_dict(location) for location in database_layer.locate_sample(int(sample_id))]
+
+    def _custody_history(self, database_layer: DatabaseLayer, body: tp.Any, subject: str) -> Response:
+        # isdigit alone accepts non-ASCII digits like "²" that int() rejects, they are reported as bad barcodes
+        history = database_layer.custody_history(int(subject) if subject.isascii() and subject.isdigit() else subject)
+        return HTTPStatus.OK, report_to_dict(history)
+
+    def _contention_stats(self, database_layer: DatabaseLayer, body: tp.Any) -> Response:
+        return HTTPStatus.OK, database_layer.transaction_runner.counters.snapshot()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HTTP/JSON server for sample tracking")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--quiet', action='store_true', help='Do not log requests')
+    args = parser.parse_args()
+
+    database_arguments = DatabaseArgumentsLoader.load_database_arguments("PROD")
+    engine_options = DatabaseArgumentsLoader.load_engine_options("PROD")
+    slow_query_log_settings = DatabaseArgumentsLoader.load_slow_query_log_settings("PROD")
+    engine = DatabaseInitializer(Base=Base).init_database(
+        database_arguments, recreate=False, engine_options=engine_options,
+        slow_query_log_settings=slow_query_log_settings,
+        schema_cache_path=DatabaseArgumentsLoader.load_schema_cache_path("PROD")
+    )
+
+    report_cache_settings = DatabaseArgumentsLoader.load_report_cache_settings("PROD")
+    report_cache = ReportCache(**report_cache_settings) if report_cache_settings else None
+
+    transaction_runner = TransactionRunner(**DatabaseArgumentsLoader.load_transaction_retry_settings("PROD"))
+
+    inventory = None
+    if DatabaseArgumentsLoader.load_inventory_engine_enabled("PROD"):
+        from database.inventory_engine import InventoryEngine
+        with sessionmaker(bind=engine)() as session:
+            inventory = InventoryEngine.load(session)
+
+    # Session per request, all sessions share the engine connection pool
+    server = SampleTrackingHTTPServer((args.host, args.port), session_factory=sessionmaker(bind=engine),
+                                      report_cache=report_cache, quiet=args.quiet,
+                                      transaction_runner=transaction_runner, inventory=inventory)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    server.serve_forever()
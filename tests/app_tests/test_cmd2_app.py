@@ -1,9 +1,19 @@
+import datetime
+import json
+
 import cmd2_ext_test
 import pytest
+from sqlalchemy import select
 from sqlalchemy.orm import sessionmaker
 
+from command_journal import CollectingJournal, SUCCESS, ERROR
 from database.database import DatabaseLayer
+from database.instrumentation import SqlInstrumentation
+from database.inventory_engine import InventoryEngine
 from database.management import DatabaseInitializer
+from database.report_cache import ReportCache
+from database.scheme import Sample
+from database.transactions import GroupCommitter
 from main import MyCLIApp
 from cmd2 import CommandResult
 
@@ -45,6 +55,58 @@ class TestRecordReceiptCLIInterface:
         assert str(out.stderr).strip() == f'Sample in tube [NT100] was already received.'
 
 
+class TestImportReceiptsCLIInterface:
+
+    def test_import_receipts(self, default_app, tmp_path):
+        manifest_path = tmp_path / "manifest.csv"
+        manifest_path.write_text("customer_sample_name,tube_barcode\nfirst,NT1\nsecond,wrong_format\n")
+
+        out = default_app.app_cmd(f"import_receipts {manifest_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Received: 1" in str(out.stdout)
+        assert "Rejected: 1" in str(out.stdout)
+        assert "Row 2 (wrong_format)" in str(out.stdout)
+
+    def test_import_receipts_unsupported_format(self, default_app, tmp_path):
+        manifest_path = tmp_path / "manifest.xlsx"
+
+        out = default_app.app_cmd(f"import_receipts {manifest_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == f'Unsupported file format: {manifest_path}. Expected ".csv" or ".jsonl" file.'
+
+    def test_import_receipts_missing_file(self, default_app, tmp_path):
+        manifest_path = tmp_path / "manifest.csv"
+
+        out = default_app.app_cmd(f"import_receipts {manifest_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == f"Can not read manifest {manifest_path}: No such file or directory"
+
+    def test_import_receipts_incomplete_row(self, default_app, tmp_path):
+        manifest_path = tmp_path / "manifest.csv"
+        manifest_path.write_text("customer_sample_name,tube_barcode\nfirst,NT1\nsecond\n")
+
+        out = default_app.app_cmd(f"import_receipts {manifest_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Received: 1" in str(out.stdout)
+        assert "Rejected: 1" in str(out.stdout)
+
+    def test_import_receipts_malformed_file(self, default_app, tmp_path):
+        manifest_path = tmp_path / "manifest.jsonl"
+        manifest_path.write_text('{"customer_sample_name": "first", "tube_barcode": "NT1"}\nnot json\n')
+
+        out = default_app.app_cmd(f"import_receipts {manifest_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).startswith(f"Malformed line 2 in {manifest_path}:")
+        assert str(out.stdout) == ""
+
+
 class TestAddToPlateCLIInterface:
 
     def test_add_to_plate(self, default_app):
@@ -56,6 +118,16 @@ class TestAddToPlateCLIInterface:
         assert str(out.stderr) == ""
         assert str(out.stdout).strip() == f'Successfully added sample (id: {sample.id}) to plate DN100 at A1'
 
+    def test_add_to_plate_next_free_well(self, default_app):
+        sample = default_app.database_layer.record_receipt("Test sample", "NT1")
+        default_app.app_cmd(f"add_to_plate {sample.id} DN100 A1")
+
+        out = default_app.app_cmd(f"add_to_plate {sample.id} DN100 --column-major")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert str(out.stdout).strip() == f'Successfully added sample (id: {sample.id}) to plate DN100 at B1'
+
     def test_add_to_plate_bad_sample_id(self, default_app):
         sample = default_app.database_layer.record_receipt("Test sample", "NT1")
 
@@ -94,6 +166,70 @@ class TestAddToPlateCLIInterface:
         assert str(out.stderr).strip() == f"Well at position A1 already occupied."
 
 
+class TestPackSamplesCLIInterface:
+
+    def test_pack_samples(self, default_app):
+        sample = default_app.database_layer.record_receipt("Test sample", "NT1")
+
+        out = default_app.app_cmd(f"pack_samples --samples {sample.id} {sample.id} --plates DN100")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Loaded wells: 2" in str(out.stdout)
+
+    def test_pack_samples_not_enough_free_wells(self, default_app):
+        sample = default_app.database_layer.record_receipt("Test sample", "NT1")
+        sample_ids = " ".join([str(sample.id)] * 97)
+
+        out = default_app.app_cmd(f"pack_samples --samples {sample_ids} --plates DN100")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "Not enough free wells for 97 samples. Free wells: 96."
+
+
+class TestLoadPlateLayoutCLIInterface:
+
+    def test_load_plate_layout(self, default_app, tmp_path):
+        sample = default_app.database_layer.record_receipt("Test sample", "NT1")
+        layout_path = tmp_path / "layout.csv"
+        layout_path.write_text(f"well_position,sample_id\nA1,{sample.id}\nA2,{sample.id}\n")
+
+        out = default_app.app_cmd(f"load_plate_layout DN100 {layout_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Loaded wells: 2" in str(out.stdout)
+        assert "Conflicts: 0" in str(out.stdout)
+
+    def test_load_plate_layout_conflicts(self, default_app, tmp_path):
+        layout_path = tmp_path / "layout.csv"
+        layout_path.write_text("well_position,sample_id\nA1,99999999\n")
+
+        out = default_app.app_cmd(f"load_plate_layout DN100 {layout_path}")
+
+        assert isinstance(out, CommandResult)
+        assert "Loaded wells: 0" in str(out.stdout)
+        assert "Well A1 (sample_id: 99999999): sample_id 99999999 not found in table." in str(out.stdout)
+
+    def test_load_plate_layout_bad_sample_id(self, default_app, tmp_path):
+        layout_path = tmp_path / "layout.csv"
+        layout_path.write_text("well_position,sample_id\nA1,first\n")
+
+        out = default_app.app_cmd(f"load_plate_layout DN100 {layout_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip().startswith(f"Bad sample id in {layout_path}")
+
+    def test_load_plate_layout_duplicate_position(self, default_app, tmp_path):
+        layout_path = tmp_path / "layout.csv"
+        layout_path.write_text("well_position,sample_id\nA1,1\na1,2\n")
+
+        out = default_app.app_cmd(f"load_plate_layout DN100 {layout_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == f"Well position a1 is listed more than once in {layout_path}."
+
+
 class TestTubeTransferCLIInterface:
 
     def test_tube_transfer(self, default_app):
@@ -129,6 +265,42 @@ class TestTubeTransferCLIInterface:
         assert str(out.stderr).strip() == f'Source tube (NT1) is empty.'
 
 
+class TestRearrayCLIInterface:
+
+    def test_rearray(self, default_app, tmp_path):
+        _ = default_app.database_layer.record_receipt("Test sample", "NT1")
+        _ = default_app.database_layer.record_receipt("Test sample 2", "NT2")
+        worklist_path = tmp_path / "worklist.csv"
+        worklist_path.write_text("source_tube_barcode,destination_tube_barcode\nNT1,NT2\nNT2,NT1\n")
+
+        out = default_app.app_cmd(f"rearray {worklist_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert str(out.stdout).strip() == f"Successfully rearrayed 2 tubes from worklist {worklist_path}"
+
+    def test_rearray_destination_tube_occupied(self, default_app, tmp_path):
+        _ = default_app.database_layer.record_receipt("Test sample", "NT1")
+        _ = default_app.database_layer.record_receipt("Test sample 2", "NT2")
+        worklist_path = tmp_path / "worklist.csv"
+        worklist_path.write_text("source_tube_barcode,destination_tube_barcode\nNT1,NT2\n")
+
+        out = default_app.app_cmd(f"rearray {worklist_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "Tube with barcode NT2 already occupied."
+
+    def test_rearray_barcode_format(self, default_app, tmp_path):
+        worklist_path = tmp_path / "worklist.csv"
+        worklist_path.write_text("source_tube_barcode,destination_tube_barcode\nNT1,some_barcode\n")
+
+        out = default_app.app_cmd(f"rearray {worklist_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == (f"Bad tube barcode format in worklist {worklist_path}. "
+                                           f"Should be: NT<Number>")
+
+
 class TestListSamplesInCLIInterface:
 
     def test_list_samples_in(self, default_app):
@@ -161,3 +333,369 @@ class TestListSamplesInCLIInterface:
         assert isinstance(out, CommandResult)
         assert str(out.stderr).strip() == 'Barcode (some_barcode) has invalid format. Expected NT<Number> / DN<Number>'
 
+    def test_list_samples_in_plate_grid(self, default_app, sample_one):
+        default_app.database_layer.add_to_plate(sample_one.id, "DN1", "B3")
+
+        out = default_app.app_cmd("list_samples_in DN1 --format grid")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        lines = str(out.stdout).splitlines()
+        assert lines[0] == "Plate: DN1"
+        assert lines[3].split() == ["B", ".", ".", str(sample_one.id)] + ["."] * 9
+
+    def test_list_samples_in_tube_json(self, default_app, sample_one):
+        out = default_app.app_cmd("list_samples_in NT123 --format json")
+
+        assert isinstance(out, CommandResult)
+        assert json.loads(str(out.stdout)) == {"tube_barcode": "NT123", "sample_id": sample_one.id,
+                                               "customer_sample_name": "test"}
+
+    def test_list_samples_in_tube_grid(self, default_app, sample_one):
+        out = default_app.app_cmd("list_samples_in NT123 --format grid")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == 'Format "grid" is not supported for TubeReport.'
+
+
+class TestReportCacheStatsCLIInterface:
+
+    def test_report_cache_stats(self, session):
+        app = DefaultAppTester(database_layer=DatabaseLayer(session, report_cache=ReportCache(max_size=10)))
+        app.fixture_setup()
+        app.database_layer.record_receipt("Test sample", "NT1")
+        app.app_cmd("list_samples_in NT1")
+        app.app_cmd("list_samples_in NT1")
+
+        out = app.app_cmd("report_cache_stats")
+        app.fixture_teardown()
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stdout).strip() == "Hits: 1, misses: 1, hit ratio: 50.00%, size: 1 / 10"
+
+    def test_report_cache_stats_disabled(self, default_app):
+        out = default_app.app_cmd("report_cache_stats")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "Report cache is disabled. Set PROD_REPORT_CACHE_SIZE to enable it."
+
+
+class TestInventoryCheckCLIInterface:
+
+    def test_inventory_check(self, session):
+        app = DefaultAppTester(database_layer=DatabaseLayer(session, inventory=InventoryEngine.load(session)))
+        app.fixture_setup()
+        app.database_layer.record_receipt("Test sample", "NT1")
+
+        out = app.app_cmd("inventory_check")
+        app.fixture_teardown()
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert str(out.stdout).strip().endswith("In sync with database")
+
+    def test_inventory_check_disabled(self, default_app):
+        out = default_app.app_cmd("inventory_check")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "Inventory engine is disabled. Set PROD_INVENTORY_ENGINE=true to enable it."
+
+
+class TestSnapshotCLIInterface:
+
+    def test_snapshot(self, default_app, sample_one, tmp_path):
+        out = default_app.app_cmd(f"snapshot {tmp_path / 'snapshot'}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert str(out.stdout).strip() == f"Snapshot of 1 samples and 0 wells written to {tmp_path / 'snapshot'}"
+
+    def test_snapshot_exists(self, default_app, tmp_path):
+        out = default_app.app_cmd(f"snapshot {tmp_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == f"Snapshot {tmp_path} already exists. Choose another directory."
+
+
+class TestCommandLineInterface:
+
+    def test_run_command_line(self, default_app, sample_one):
+        assert default_app.run_command_line(["list_samples_in", "NT123", "--format", "json"]) == 0
+
+    def test_failed_command_line(self, default_app):
+        assert default_app.run_command_line(["list_samples_in", "NT404"]) == 1
+        assert default_app.run_command_line(["unknown_command"]) == 1
+        assert default_app.run_command_line(["record_receipt", "only_name"]) == 1
+
+class TestTransactionCLIInterface:
+
+    @pytest.fixture(scope="function")
+    def grouped_app(self, group_session):
+        database_layer = DatabaseLayer(group_session)
+        app = DefaultAppTester(database_layer=database_layer, group_committer=GroupCommitter(
+            group_session, every=3, on_rollback=database_layer.discard_derived_state))
+        app.fixture_setup()
+        yield app
+        app.fixture_teardown()
+
+    def test_rollback(self, grouped_app):
+        assert str(grouped_app.app_cmd("begin").stdout).strip() == "Transaction started"
+        grouped_app.app_cmd("record_receipt 'Test sample' NT1")
+        out = grouped_app.app_cmd("rollback")
+
+        assert str(out.stdout).strip() == "Rolled back 1 commands"
+        assert str(grouped_app.app_cmd("list_samples_in NT1").stderr).strip() != ""
+
+    def test_failed_command_does_not_abort_group(self, engine, grouped_app):
+        grouped_app.app_cmd("record_receipt 'Test sample' NT1")
+        out = grouped_app.app_cmd("record_receipt 'Test sample' NT1")
+        grouped_app.app_cmd("record_receipt 'Test sample' NT2")
+
+        assert str(out.stderr).strip() == 'Sample in tube [NT1] was already received.'
+        assert not grouped_app.group_committer.in_group
+        with engine.connect() as connection:
+            assert set(connection.scalars(select(Sample.tube_barcode))) == {"NT1", "NT2"}
+
+    def test_commit_without_transaction(self, grouped_app):
+        out = grouped_app.app_cmd("commit")
+
+        assert str(out.stderr).strip() == "No transaction in progress."
+
+    def test_pending_group_is_committed_by_command_line(self, engine, grouped_app):
+        assert grouped_app.run_command_line(["record_receipt", "Test sample", "NT1"]) == 0
+
+        assert not grouped_app.group_committer.in_group
+        with engine.connect() as connection:
+            assert set(connection.scalars(select(Sample.tube_barcode))) == {"NT1"}
+
+
+class TestDbPoolStatusCLIInterface:
+
+    def test_db_pool_status(self, default_app):
+        out = default_app.app_cmd("db_pool_status")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        # Test session holds one connection of default QueuePool(pool_size=5, max_overflow=10)
+        assert str(out.stdout).strip().startswith("Pool size: 5, checked out: 1, ")
+        assert str(out.stdout).strip().endswith("overflow: 0 / 10")
+
+
+
+class TestWhereIsCLIInterface:
+
+    def test_where_is(self, default_app):
+        sample = default_app.database_layer.record_receipt("Test sample", "NT1")
+        default_app.database_layer.add_to_plate(sample.id, "DN100", "B2")
+
+        out = default_app.app_cmd(f"where_is {sample.id}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Tube: NT1" in str(out.stdout)
+        assert "Plate DN100, well B2" in str(out.stdout)
+
+    def test_where_is_by_name(self, default_app):
+        default_app.database_layer.record_receipt("Test sample", "NT1")
+
+        out = default_app.app_cmd("where_is --name 'Test sample'")
+
+        assert isinstance(out, CommandResult)
+        assert "Tube: NT1" in str(out.stdout)
+
+    def test_where_is_not_found(self, default_app):
+        out = default_app.app_cmd("where_is 1000")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "sample_id 1000 not found in table."
+
+
+class TestHistoryCLIInterface:
+
+    def test_history(self, default_app):
+        sample = default_app.database_layer.record_receipt("Test sample", "NT1")
+        default_app.database_layer.tube_transfer("NT1", "NT2")
+
+        out = default_app.app_cmd(f"history {sample.id}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert f"received: sample {sample.id}, tube NT1" in str(out.stdout)
+        assert f"transferred: sample {sample.id}, tube NT1 -> NT2" in str(out.stdout)
+
+    def test_history_json(self, default_app):
+        default_app.database_layer.record_receipt("Test sample", "NT1")
+
+        out = default_app.app_cmd("history NT1 --format json")
+
+        assert isinstance(out, CommandResult)
+        payload = json.loads(str(out.stdout))
+        assert payload["subject"] == "NT1"
+        assert [event["event_type"] for event in payload["events"]] == ["received"]
+
+    def test_history_not_found(self, default_app):
+        out = default_app.app_cmd("history DN1")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "No custody events recorded for DN1."
+
+    def test_history_non_ascii_digits(self, default_app):
+        out = default_app.app_cmd("history \u00b2")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "Barcode (\u00b2) has invalid format. Expected NT<Number> / DN<Number>"
+
+    def test_list_samples_in_as_of(self, default_app):
+        default_app.database_layer.record_receipt("Test sample", "NT1")
+        before_transfer = datetime.datetime.now(datetime.timezone.utc)
+        default_app.database_layer.tube_transfer("NT1", "NT2")
+
+        out = default_app.app_cmd(f"list_samples_in NT1 --as-of {before_transfer.isoformat()}")
+        current = default_app.app_cmd("list_samples_in NT1")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Customer Sample Name: Test sample" in str(out.stdout)
+        assert str(current.stderr).strip() == "Tube with barcode NT1 not found."
+
+
+class TestPlateStatusCLIInterface:
+
+    def test_plate_status(self, default_app, sample_one):
+        default_app.database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        out = default_app.app_cmd("plate_status --partial")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert "Plates: partial" in str(out.stdout)
+        assert "Free wells: 95" in str(out.stdout)
+        assert "DN1: 1 wells, 95 free, last filled " in str(out.stdout)
+        assert f"(sample {sample_one.id})" in str(out.stdout)
+
+    def test_plate_status_json(self, default_app, sample_one):
+        default_app.database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        out = default_app.app_cmd("plate_status --full --format json")
+
+        assert isinstance(out, CommandResult)
+        assert json.loads(str(out.stdout)) == {"selection": "full", "free_wells": 0, "plates": []}
+
+    def test_plate_status_exclusive_selections(self, default_app):
+        out = default_app.app_cmd("plate_status --partial --full")
+
+        assert isinstance(out, CommandResult)
+        assert "not allowed with argument" in str(out.stderr)
+
+
+class TestContentionStatsCLIInterface:
+
+    def test_contention_stats(self, default_app):
+        default_app.app_cmd("record_receipt 'Test sample' NT1")
+        default_app.app_cmd("tube_transfer NT1 NT2")
+
+        out = default_app.app_cmd("contention_stats")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert str(out.stdout).strip().splitlines() == [
+            "Transactions: 2, retries: 0, gave up: 0, backoff: 0.0 ms",
+            "Serialization failures: 0, deadlocks: 0, lock timeouts: 0"
+        ]
+
+class TestExportInventoryCLIInterface:
+
+    def test_export_inventory(self, default_app, sample_one, tmp_path):
+        default_app.database_layer.add_to_plate(sample_one.id, "DN1", "A1")
+        export_path = tmp_path / "inventory.csv"
+
+        out = default_app.app_cmd(f"export_inventory {export_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr) == ""
+        assert str(out.stdout).strip() == f"Exported 1 rows to {export_path}"
+        assert export_path.read_text().splitlines() == [
+            "sample_id,customer_sample_name,tube_barcode,plate_barcode,well_position",
+            f"{sample_one.id},test,NT123,DN1,A1",
+        ]
+
+    def test_export_inventory_bad_range(self, default_app, tmp_path):
+        out = default_app.app_cmd(f"export_inventory {tmp_path / 'inventory.csv'} --from wrong_format")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == ('Bad barcode format. Expected: "DN<Number>" for plate or "NT<Number>" '
+                                           'for tube. Got: wrong_format')
+
+    def test_export_inventory_unsupported_format(self, default_app, tmp_path):
+        export_path = tmp_path / "inventory.xlsx"
+
+        out = default_app.app_cmd(f"export_inventory {export_path}")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == f'Unsupported file format: {export_path}. Expected ".csv" or ".jsonl" file.'
+
+
+class TestCommandJournalCLIInterface:
+
+    @pytest.fixture(scope="function")
+    def journaled_app(self, database_layer):
+        app = DefaultAppTester(database_layer=database_layer, journal=CollectingJournal())
+        app.fixture_setup()
+        yield app
+        app.fixture_teardown()
+
+    def test_journal_records_outcomes(self, journaled_app):
+        journaled_app.app_cmd("record_receipt 'Test sample' NT1")
+        journaled_app.app_cmd("record_receipt 'Test sample' NT1")
+        journaled_app.app_cmd("list_samples_in NT1 --format unknown")
+        journaled_app.app_cmd("report_cache_stats")
+
+        entries = journaled_app.journal.entries
+        assert [entry.line for entry in entries] == ["record_receipt 'Test sample' NT1",
+                                                     "record_receipt 'Test sample' NT1",
+                                                     "list_samples_in NT1 --format unknown",
+                                                     "report_cache_stats"]
+        assert [(entry.outcome, entry.error) for entry in entries] == [
+            (SUCCESS, None),
+            (ERROR, "SampleAlreadyReceived"),
+            (ERROR, "Cmd2ArgparseError"),
+            (ERROR, None),
+        ]
+        assert all(entry.duration_ms >= 0 for entry in entries)
+
+    def test_journal_skips_builtin_commands(self, journaled_app):
+        journaled_app.app_cmd("help")
+
+        assert journaled_app.journal.entries == []
+
+
+class TestStatsCLIInterface:
+
+    def test_stats(self, engine, session):
+        instrumentation = SqlInstrumentation()
+        instrumentation.instrument_engine(engine)
+        instrumentation.instrument_session(session)
+        app = DefaultAppTester(database_layer=DatabaseLayer(session), instrumentation=instrumentation)
+        app.fixture_setup()
+
+        app.app_cmd("record_receipt 'Test sample' NT1")
+        app.app_cmd("help")
+        out = app.app_cmd("stats --reset")
+        app.fixture_teardown()
+        instrumentation.remove_listeners()
+
+        assert isinstance(out, CommandResult)
+        lines = str(out.stdout).splitlines()
+        assert lines[0].split() == ["Command", "Count", "Stmts", "Rows", "SQL", "ms", "Python", "ms", "Commits",
+                                    "Commit", "ms"]
+        record_receipt_line, = [line for line in lines if line.startswith("record_receipt")]
+        assert record_receipt_line.split()[1] == "1"
+        assert record_receipt_line.split()[6] == "1.0"
+        assert not any(line.startswith("help") for line in lines)
+        assert list(instrumentation.snapshot()) == ["stats"]
+
+    def test_stats_disabled(self, default_app):
+        out = default_app.app_cmd("stats")
+
+        assert isinstance(out, CommandResult)
+        assert str(out.stderr).strip() == "SQL stats are disabled. Set PROD_SQL_STATS=true to enable them."
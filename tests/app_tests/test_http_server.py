@@ -0,0 +1,269 @@
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+from sqlalchemy.orm import Session
+
+from exceptions import TubeBarcodeBadFormat, SampleNotFound, SampleAlreadyReceived, BaseApplicationException, \
+    TransactionContention
+from server import SampleTrackingHTTPServer, status_for_exception
+
+
+@pytest.fixture(scope="function")
+def server(session):
+    # Every request gets a new session joined to the test transaction
+    connection = session.get_bind()
+    server = SampleTrackingHTTPServer(("127.0.0.1", 0), session_factory=lambda: Session(bind=connection), quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture(scope="function")
+def client(server):
+    client = http.client.HTTPConnection(*server.server_address)
+    yield client
+    client.close()
+
+
+def request(client, method, path, body=None):
+    client.request(method, path, body=None if body is None else json.dumps(body),
+                   headers={"Content-Type": "application/json"})
+    response = client.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def raw_status(server, path):
+    # http.client only sends ASCII paths, the server decodes the request line as ISO-8859-1: b"\xb2" is "²"
+    with socket.create_connection(server.server_address) as connection:
+        connection.sendall(b"GET " + path + b" HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n")
+        status_line = connection.makefile("rb").readline()
+    return int(status_line.split()[1])
+
+
+class TestStatusForException:
+
+    def test_status_for_exception(self):
+        assert status_for_exception(TubeBarcodeBadFormat(barcode="bad")) == 400
+        assert status_for_exception(SampleNotFound(sample_id=1)) == 404
+        assert status_for_exception(SampleAlreadyReceived(tube_barcode="NT1")) == 409
+        assert status_for_exception(TransactionContention(operation_name="tube_transfer", attempts=5)) == 503
+        assert status_for_exception(BaseApplicationException()) == 422
+
+
+def test_server_does_not_import_numpy():
+    # Fresh interpreter, the test session may have imported NumPy already
+    subprocess.run([sys.executable, "-c", "import sys, server, database.async_database; "
+                                          "assert 'numpy' not in sys.modules"], check=True)
+
+
+class TestHTTPServer:
+
+    def test_record_receipt(self, client):
+        status, payload = request(client, "POST", "/receipts",
+                                  {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        assert status == 201
+        assert payload["tube_barcode"] == "NT1"
+        assert payload["sample_id"] > 0
+
+    def test_record_receipt_duplicate(self, client):
+        request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, payload = request(client, "POST", "/receipts",
+                                  {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        assert status == 409
+        assert payload == {"error": "SampleAlreadyReceived", "message": "Sample already received for NT1."}
+
+    def test_record_receipt_bad_barcode(self, client):
+        status, payload = request(client, "POST", "/receipts",
+                                  {"customer_sample_name": "Test sample", "tube_barcode": "bad"})
+
+        assert status == 400
+        assert payload == {"error": "TubeBarcodeBadFormat",
+                           "message": 'Tube barcode wrong format. Expected: "NT<Number>". Got: bad'}
+
+    def test_record_receipt_missing_field(self, client):
+        status, payload = request(client, "POST", "/receipts", {"tube_barcode": "NT1"})
+
+        assert status == 400
+        assert payload["error"] == "BadRequest"
+
+    def test_invalid_json(self, client):
+        client.request("POST", "/receipts", body="{", headers={"Content-Type": "application/json"})
+        response = client.getresponse()
+
+        assert response.status == 400
+        assert json.loads(response.read())["error"] == "BadRequest"
+
+    def test_record_receipts_bulk(self, client):
+        status, payload = request(client, "POST", "/receipts/bulk", {"rows": [
+            {"customer_sample_name": "first", "tube_barcode": "NT1"},
+            {"customer_sample_name": "second", "tube_barcode": "bad"},
+        ]})
+
+        assert status == 200
+        assert list(payload["sample_ids"]) == ["NT1"]
+        assert payload["rejections"][0]["row_number"] == 2
+        assert payload["rejections"][0]["error"] == "TubeBarcodeBadFormat"
+
+    def test_add_to_plate_and_list_samples_in(self, client):
+        _, sample = request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, well = request(client, "POST", "/plates/DN1/wells", {"sample_id": sample["sample_id"]})
+        assert status == 201
+        assert well == {"plate_barcode": "DN1", "well_position": "A1", "sample_id": sample["sample_id"]}
+
+        status, report = request(client, "GET", "/containers/DN1")
+        assert status == 200
+        assert report == {"plate_barcode": "DN1", "wells": [
+            {"well_position": "A1", "sample_id": sample["sample_id"], "customer_sample_name": "Test sample"}
+        ]}
+
+    def test_add_to_plate_occupied(self, client):
+        _, sample = request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+        request(client, "POST", "/plates/DN1/wells", {"sample_id": sample["sample_id"], "well_position": "A1"})
+
+        status, payload = request(client, "POST", "/plates/DN1/wells",
+                                  {"sample_id": sample["sample_id"], "well_position": "A1"})
+
+        assert status == 409
+        assert payload["error"] == "WellPositionOccupied"
+
+    def test_load_plate_layout(self, client):
+        _, sample = request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, payload = request(client, "PUT", "/plates/DN1/layout", {"wells": {"A1": sample["sample_id"]}})
+        assert status == 200
+        assert payload["loaded_wells"] == {"A1": sample["sample_id"]}
+
+        status, payload = request(client, "PUT", "/plates/DN1/layout", {"wells": {"A1": sample["sample_id"]}})
+        assert status == 409
+        assert payload["conflicts"][0]["error"] == "WellPositionOccupied"
+
+    def test_pack_samples(self, client):
+        _, sample = request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, payload = request(client, "POST", "/plates/pack", {
+            "sample_ids": [sample["sample_id"]] * 2, "plate_barcodes": ["DN1"], "fill_order": "column"
+        })
+
+        assert status == 200
+        assert payload[0]["loaded_wells"] == {"A1": sample["sample_id"], "B1": sample["sample_id"]}
+
+    @pytest.mark.parametrize("body", [{"sample_ids": [1], "plate_barcodes": [1]},
+                                      {"sample_ids": ["1"], "plate_barcodes": ["DN1"]},
+                                      {"sample_ids": [True], "plate_barcodes": ["DN1"]}])
+    def test_pack_samples_bad_lists(self, client, body):
+        status, payload = request(client, "POST", "/plates/pack", body)
+
+        assert status == 400
+        assert payload["error"] == "BadRequest"
+
+    def test_tube_transfer(self, client):
+        request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, _ = request(client, "POST", "/transfers",
+                            {"source_tube_barcode": "NT1", "destination_tube_barcode": "NT2"})
+        assert status == 200
+
+        status, report = request(client, "GET", "/containers/NT2")
+        assert status == 200
+        assert report["customer_sample_name"] == "Test sample"
+
+    def test_tube_transfer_batch(self, client):
+        request(client, "POST", "/receipts", {"customer_sample_name": "first", "tube_barcode": "NT1"})
+        request(client, "POST", "/receipts", {"customer_sample_name": "second", "tube_barcode": "NT2"})
+
+        status, payload = request(client, "POST", "/transfers/batch", {"transfers": [
+            {"source_tube_barcode": "NT1", "destination_tube_barcode": "NT2"},
+            {"source_tube_barcode": "NT2", "destination_tube_barcode": "NT1"},
+        ]})
+
+        assert status == 200
+        assert payload == {"transferred": 2}
+        assert request(client, "GET", "/containers/NT1")[1]["customer_sample_name"] == "second"
+
+    def test_tube_transfer_batch_skips_same_tube(self, client):
+        request(client, "POST", "/receipts", {"customer_sample_name": "first", "tube_barcode": "NT1"})
+
+        status, payload = request(client, "POST", "/transfers/batch", {"transfers": [
+            {"source_tube_barcode": "NT1", "destination_tube_barcode": "NT1"},
+        ]})
+
+        assert status == 200
+        assert payload == {"transferred": 0}
+
+    def test_list_samples_in_not_found(self, client):
+        assert request(client, "GET", "/containers/NT1")[0] == 404
+        assert request(client, "GET", "/containers/bad")[0] == 400
+
+    def test_locate_sample(self, server, client):
+        _, sample = request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+        request(client, "POST", "/plates/DN1/wells", {"sample_id": sample["sample_id"], "well_position": "A1"})
+
+        status, payload = request(client, "GET", f"/samples/{sample['sample_id']}/location")
+
+        assert status == 200
+        assert payload == [{"sample_id": sample["sample_id"], "customer_sample_name": "Test sample",
+                            "tube_barcode": "NT1", "wells": [{"plate_barcode": "DN1", "well_position": "A1"}]}]
+        assert request(client, "GET", "/samples/1000/location")[0] == 404
+        assert request(client, "GET", "/samples/bad/location")[0] == 400
+        assert raw_status(server, b"/samples/\xb2/location") == 400
+
+    def test_custody_history(self, server, client):
+        _, sample = request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, payload = request(client, "GET", f"/history/{sample['sample_id']}")
+
+        assert status == 200
+        assert payload["subject"] == sample["sample_id"]
+        assert [(event["event_type"], event["tube_barcode"]) for event in payload["events"]] == [("received", "NT1")]
+        assert request(client, "GET", "/history/NT2")[0] == 404
+        assert request(client, "GET", "/history/bad")[0] == 400
+        assert raw_status(server, b"/history/\xb2") == 400
+
+    def test_contention_stats(self, client):
+        request(client, "POST", "/receipts", {"customer_sample_name": "Test sample", "tube_barcode": "NT1"})
+
+        status, payload = request(client, "GET", "/stats/contention")
+
+        assert status == 200
+        assert payload["transactions"] == 1
+        assert payload["retries"] == 0
+
+    def test_unknown_path(self, client):
+        assert request(client, "GET", "/unknown")[0] == 404
+
+    def test_method_not_allowed(self, client):
+        assert request(client, "GET", "/receipts")[0] == 405
+
+    @pytest.mark.parametrize("method, path", [("POST", "/unknown"), ("POST", "/containers/NT1")])
+    def test_body_of_rejected_request_is_drained(self, client, method, path):
+        client.request(method, path, body='{"tube_barcode": "NT1"}')
+        response = client.getresponse()
+        response.read()
+        assert response.status in (404, 405)
+
+        # Same connection, the unread body would have been parsed as the request line
+        assert request(client, "GET", "/stats/contention")[0] == 200
+        assert response.getheader("Connection") is None
+
+    @pytest.mark.parametrize("content_length", ["abc", "-1", "1_0"])
+    def test_bad_content_length(self, client, content_length):
+        client.putrequest("POST", "/receipts")
+        client.putheader("Content-Length", content_length)
+        client.endheaders()
+        response = client.getresponse()
+
+        assert response.status == 400
+        assert json.loads(response.read())["error"] == "BadRequest"
+        assert response.getheader("Connection") == "close"
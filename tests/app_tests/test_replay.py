@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.replay import replay
+from command_journal import JournalEntry, SUCCESS, ERROR
+from database.scheme import Base
+
+
+@pytest.fixture(scope="function")
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replay.sqlite'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def entries():
+    yield [
+        JournalEntry("2023-12-01T10:00:00.00+00:00", "record_receipt first NT1", "record_receipt", 2.0, SUCCESS, None),
+        JournalEntry("2023-12-01T10:00:00.10+00:00", "record_receipt first NT1", "record_receipt", 1.0, ERROR,
+                     "SampleAlreadyReceived"),
+        JournalEntry("2023-12-01T10:00:00.20+00:00", "add_to_plate 1 DN1 A1", "add_to_plate", 3.0, SUCCESS, None),
+        JournalEntry("2023-12-01T10:00:00.30+00:00", "list_samples_in DN1", "list_samples_in", 1.0, SUCCESS, None),
+    ]
+
+
+class TestReplay:
+
+    def test_replay(self, sqlite_engine, entries):
+        result = replay(entries, sqlite_engine)
+
+        assert result.mismatches == []
+        assert [entry.line for entry in result.replayed] == [entry.line for entry in entries]
+        summary = result.summary()
+        assert summary["all"]["count"] == 4
+        assert summary["record_receipt"]["count"] == 2
+
+    def test_replay_paced(self, sqlite_engine, entries):
+        result = replay(entries, sqlite_engine, paced=True, speed=2)
+
+        # Last command is due 0.3 s after the first one, divided by speed
+        assert result.elapsed_seconds >= 0.15
+        assert result.mismatches == []
+
+    def test_replay_reports_mismatches(self, sqlite_engine, entries):
+        result = replay(entries[2:], sqlite_engine)
+
+        assert [(replayed.line, replayed.error) for (_, replayed) in result.mismatches] == [
+            ("add_to_plate 1 DN1 A1", "SampleNotFound"),
+            ("list_samples_in DN1", "OccupiedWellsNotFound"),
+        ]
@@ -1,12 +1,12 @@
 import pytest
 import typing as tp
 from dotenv import load_dotenv
-from sqlalchemy import Engine
+from sqlalchemy import Engine, delete
 from sqlalchemy.orm import sessionmaker, Session
 
 from database.database import DatabaseLayer
 from database.management import DatabaseInitializer
-from database.scheme import Base, Sample
+from database.scheme import Base, Sample, Well, PlateSummary, custody_events
 from env import read_database_credentials_from_env
 
 
@@ -38,6 +38,22 @@ def session(engine: Engine) -> tp.Generator[Session, None, None]:
     database_connection.close()
 
 
+@pytest.fixture(scope="function")
+def group_session(engine: Engine) -> tp.Generator[Session, None, None]:
+    # Session of CLI app: commits are real unless group commit wraps them into savepoints, tables are emptied after
+    database_connection = engine.connect()
+    Session = sessionmaker(bind=database_connection, join_transaction_mode="create_savepoint")
+    session = Session()
+
+    yield session
+
+    session.close()
+    database_connection.close()
+    with engine.begin() as connection:
+        for table in (custody_events, Well.__table__, PlateSummary.__table__, Sample.__table__):
+            connection.execute(delete(table))
+
+
 @pytest.fixture(scope="function")
 def database_layer(session: Session) -> tp.Generator[DatabaseLayer, None, None]:
     yield DatabaseLayer(session)
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from benchmarks.seed import seed_samples
+from database.database import DatabaseLayer
+from database.scheme import Base, Sample, Well, PlateSummary
+
+
+@pytest.fixture(scope="function")
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'benchmark.sqlite'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+class TestSeedSamples:
+
+    def test_seed_samples(self, sqlite_engine):
+        plates_count = seed_samples(sqlite_engine, samples_count=250, plate_fill=0.5, chunk_size=100)
+
+        assert plates_count == 2
+        with Session(bind=sqlite_engine) as session:
+            assert session.scalar(select(func.count()).select_from(Sample)) == 250
+            assert session.scalar(select(func.count()).select_from(Well)) == 125
+            assert session.scalar(select(func.count()).select_from(PlateSummary)) == 2
+
+            database_layer = DatabaseLayer(session)
+            assert database_layer.list_samples_in("NT250").customer_sample_name == "sample 250"
+            assert [well.well_position for well in database_layer.list_samples_in("DN2").wells][-1] == "C5"
+            assert database_layer.list_tubes_in_range("NT10", "NT12")[0].sample_id == 10
+
+            # Occupancy of partially filled plate matches seeded wells
+            sample = database_layer.record_receipt("new sample", "NT251")
+            well = database_layer.add_to_plate(sample.id, "DN2")
+            assert (well.row, well.col) == (3, 6)
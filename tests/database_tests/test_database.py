@@ -1,9 +1,18 @@
+import json
+
+import pytest
 from dotenv import load_dotenv
 from sqlalchemy_utils import database_exists, create_database  # type: ignore
 
-from database.management import CreateEngineAdapter, DatabaseInitializer
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql.psycopg2 import EXECUTEMANY_VALUES_PLUS_BATCH
+
+from database.management import CreateEngineAdapter, CreateAsyncEngineAdapter, DatabaseInitializer, get_pool_status, \
+    schema_fingerprint
 from database.scheme import Base
-from env import read_database_credentials_from_env
+from env import read_database_credentials_from_env, read_engine_options_from_env, \
+    read_transaction_retry_settings_from_env
 
 
 class TestDatabase:
@@ -14,9 +23,142 @@ class TestDatabase:
         # <PASSWORD> is hidden in engine.url method
         assert str(engine.url) == "postgresql://USER:***@<HOST>:5555/<DB_NAME>"
 
+    def test_async_engine_creator(self):
+        engine = CreateAsyncEngineAdapter.create_engine(database="postgresql+psycopg2", user="USER",
+                                                        password="<PASSWORD>", host="<HOST>",
+                                                        port=5555, database_name="<DB_NAME>")
+        assert str(engine.url) == "postgresql+asyncpg://USER:***@<HOST>:5555/<DB_NAME>"
+
     def test_database_creation(self):
         load_dotenv()
         database_arguments = read_database_credentials_from_env("TEST")
 
         engine = DatabaseInitializer(Base=Base).init_database(database_arguments, recreate=False)
         assert database_exists(engine.url)
+
+    def test_engine_creator_options(self):
+        engine = CreateEngineAdapter.create_engine(database="postgresql+psycopg2", user="USER",
+                                                   password="<PASSWORD>", host="<HOST>",
+                                                   port=5555, database_name="<DB_NAME>",
+                                                   pool_size=3, max_overflow=7, pool_pre_ping=True,
+                                                   executemany_mode="values_plus_batch", executemany_page_size=500)
+
+        assert engine.pool.size() == 3
+        assert get_pool_status(engine) == {"size": 3, "checked_in": 0, "checked_out": 0,
+                                           "overflow": 0, "max_overflow": 7}
+        assert engine.pool._pre_ping
+        assert engine.dialect.executemany_mode is EXECUTEMANY_VALUES_PLUS_BATCH
+        assert engine.dialect.executemany_batch_page_size == 500
+        assert engine.dialect.insertmanyvalues_page_size == 500
+
+    def test_engine_options_from_env(self, monkeypatch):
+        monkeypatch.setenv("TEST_DATABASE_POOL_SIZE", "2")
+        monkeypatch.setenv("TEST_DATABASE_POOL_PRE_PING", "false")
+        monkeypatch.setenv("TEST_DATABASE_STATEMENT_TIMEOUT_MS", "0")
+
+        engine_options = read_engine_options_from_env("TEST")
+
+        assert engine_options["pool_size"] == 2
+        assert engine_options["max_overflow"] == 20
+        assert engine_options["pool_pre_ping"] is False
+        assert engine_options["statement_timeout_ms"] == 0
+        assert engine_options["lock_timeout_ms"] == 5000
+
+    def test_statement_timeout(self):
+        load_dotenv()
+        database_arguments = read_database_credentials_from_env("TEST")
+
+        engine = DatabaseInitializer(Base=Base).init_database(database_arguments, recreate=False,
+                                                              engine_options={"statement_timeout_ms": 1500})
+        with engine.connect() as connection:
+            assert connection.execute(text("SHOW statement_timeout")).scalar() == "1500ms"
+        engine.dispose()
+
+    def test_lock_timeout(self):
+        load_dotenv()
+        database_arguments = read_database_credentials_from_env("TEST")
+
+        engine = DatabaseInitializer(Base=Base).init_database(
+            database_arguments, recreate=False, engine_options={"statement_timeout_ms": 1500, "lock_timeout_ms": 200}
+        )
+        with engine.connect() as connection:
+            assert connection.execute(text("SHOW statement_timeout")).scalar() == "1500ms"
+            assert connection.execute(text("SHOW lock_timeout")).scalar() == "200ms"
+        engine.dispose()
+
+    def test_transaction_retry_settings_from_env(self, monkeypatch):
+        monkeypatch.setenv("TEST_TRANSACTION_MAX_ATTEMPTS", "3")
+        monkeypatch.setenv("TEST_TRANSACTION_BACKOFF_MS", "20")
+
+        assert read_transaction_retry_settings_from_env("TEST") == {
+            "max_attempts": 3, "backoff_seconds": 0.02, "max_backoff_seconds": 0.2
+        }
+
+
+class TestSchemaCache:
+
+    @pytest.fixture(scope="function")
+    def database_arguments(self):
+        load_dotenv()
+        return read_database_credentials_from_env("TEST")
+
+    @pytest.fixture(scope="function")
+    def schema_cache_path(self, database_arguments, tmp_path):
+        path = str(tmp_path / "schema_cache.json")
+        DatabaseInitializer(Base=Base).init_database(database_arguments, schema_cache_path=path)
+        return path
+
+    @staticmethod
+    def full_initializations(monkeypatch):
+        calls = []
+        create_schema = DatabaseInitializer._create_schema
+        monkeypatch.setattr(DatabaseInitializer, "_create_schema",
+                            lambda self, *args: calls.append(args) or create_schema(self, *args))
+        return calls
+
+    def test_full_initialization_writes_cache(self, schema_cache_path):
+        with open(schema_cache_path) as cache_file:
+            cache = json.load(cache_file)
+
+        assert cache["url"].endswith(f"/{read_database_credentials_from_env('TEST')['database_name']}")
+        assert "***" in cache["url"]
+        assert "migration_version" in cache
+
+    def test_matching_cache_skips_initialization(self, database_arguments, schema_cache_path, monkeypatch):
+        calls = self.full_initializations(monkeypatch)
+
+        engine = DatabaseInitializer(Base=Base).init_database(database_arguments, schema_cache_path=schema_cache_path)
+
+        assert calls == []
+        with engine.connect() as connection:
+            assert connection.scalar(text("SELECT 1")) == 1
+
+    def test_changed_schema_runs_initialization(self, database_arguments, schema_cache_path, monkeypatch):
+        with open(schema_cache_path) as cache_file:
+            cache = json.load(cache_file)
+        with open(schema_cache_path, "w") as cache_file:
+            json.dump({**cache, "fingerprint": "changed"}, cache_file)
+        calls = self.full_initializations(monkeypatch)
+
+        engine = DatabaseInitializer(Base=Base).init_database(database_arguments, schema_cache_path=schema_cache_path)
+
+        assert len(calls) == 1
+        with open(schema_cache_path) as cache_file:
+            assert json.load(cache_file)["fingerprint"] == schema_fingerprint(Base.metadata, engine.dialect)
+
+    def test_other_migration_version_runs_initialization(self, database_arguments, schema_cache_path, monkeypatch):
+        with open(schema_cache_path) as cache_file:
+            cache = json.load(cache_file)
+        with open(schema_cache_path, "w") as cache_file:
+            json.dump({**cache, "migration_version": -1}, cache_file)
+        calls = self.full_initializations(monkeypatch)
+
+        DatabaseInitializer(Base=Base).init_database(database_arguments, schema_cache_path=schema_cache_path)
+
+        assert len(calls) == 1
+
+    def test_fingerprint_follows_dialect(self):
+        assert schema_fingerprint(Base.metadata, postgresql.dialect()) == \
+            schema_fingerprint(Base.metadata, postgresql.dialect())
+        assert schema_fingerprint(Base.metadata, postgresql.dialect()) != \
+            schema_fingerprint(Base.metadata, sqlite.dialect())
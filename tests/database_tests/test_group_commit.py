@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import select
+
+from database.database import DatabaseLayer
+from database.report_cache import ReportCache
+from database.scheme import Sample
+from database.transactions import GroupCommitter
+from exceptions import SampleAlreadyReceived
+
+
+def committed_tube_barcodes(engine):
+    with engine.connect() as connection:
+        return set(connection.scalars(select(Sample.tube_barcode)))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="function")
+def layer(group_session):
+    return DatabaseLayer(group_session, report_cache=ReportCache(max_size=10))
+
+
+def run_operation(committer, operation):
+    committer.start_operation()
+    failed = False
+    try:
+        operation()
+    except SampleAlreadyReceived:
+        failed = True
+    committer.finish_operation(failed=failed)
+
+
+class TestGroupCommitter:
+
+    def test_group_is_committed_after_every_operations(self, engine, layer):
+        committer = GroupCommitter(layer.session, every=2)
+
+        run_operation(committer, lambda: layer.record_receipt("first", "NT1"))
+        assert committer.in_group
+        assert committed_tube_barcodes(engine) == set()
+
+        run_operation(committer, lambda: layer.record_receipt("second", "NT2"))
+        assert not committer.in_group
+        assert committed_tube_barcodes(engine) == {"NT1", "NT2"}
+        assert committer.groups_committed == 1
+
+    def test_failed_operation_is_rolled_back_alone(self, engine, layer):
+        committer = GroupCommitter(layer.session, every=3)
+
+        run_operation(committer, lambda: layer.record_receipt("first", "NT1"))
+        run_operation(committer, lambda: layer.record_receipt("duplicate", "NT1"))
+        run_operation(committer, lambda: layer.record_receipt("second", "NT2"))
+
+        assert committed_tube_barcodes(engine) == {"NT1", "NT2"}
+
+    def test_unfinished_writes_of_failed_operation_are_rolled_back(self, engine, layer):
+        committer = GroupCommitter(layer.session, every=2)
+
+        run_operation(committer, lambda: layer.record_receipt("first", "NT1"))
+        committer.start_operation()
+        layer.session.add(Sample(customer_sample_name="partial", tube_barcode="NT3"))
+        layer.session.flush()
+        committer.finish_operation(failed=True)
+
+        assert committed_tube_barcodes(engine) == {"NT1"}
+
+    def test_group_is_committed_after_max_seconds(self, engine, layer):
+        clock = FakeClock()
+        committer = GroupCommitter(layer.session, max_seconds=0.5, clock=clock)
+
+        run_operation(committer, lambda: layer.record_receipt("first", "NT1"))
+        clock.now = 0.6
+        run_operation(committer, lambda: layer.record_receipt("second", "NT2"))
+
+        assert committed_tube_barcodes(engine) == {"NT1", "NT2"}
+
+    def test_explicit_group_waits_for_commit(self, engine, layer):
+        committer = GroupCommitter(layer.session, every=1)
+
+        committer.begin()
+        run_operation(committer, lambda: layer.record_receipt("first", "NT1"))
+        run_operation(committer, lambda: layer.record_receipt("second", "NT2"))
+        assert committed_tube_barcodes(engine) == set()
+
+        committer.commit()
+        assert committed_tube_barcodes(engine) == {"NT1", "NT2"}
+
+    def test_rollback_discards_group_and_derived_state(self, engine, layer):
+        committer = GroupCommitter(layer.session, on_rollback=layer.discard_derived_state)
+
+        committer.begin()
+        run_operation(committer, lambda: layer.record_receipt("first", "NT1"))
+        layer.list_samples_in("NT1")
+        assert len(layer.report_cache) == 1
+
+        committer.rollback()
+
+        assert len(layer.report_cache) == 0
+        assert committed_tube_barcodes(engine) == set()
+        # Without group every operation commits on its own again
+        run_operation(committer, lambda: layer.record_receipt("second", "NT2"))
+        assert committed_tube_barcodes(engine) == {"NT2"}
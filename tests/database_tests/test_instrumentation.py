@@ -0,0 +1,132 @@
+import pytest
+from sqlalchemy import select
+
+from database.instrumentation import SqlInstrumentation, PrometheusFileWriter, format_prometheus, NO_COMMAND, \
+    CommandStats
+from database.scheme import Sample
+from database.transactions import ContentionCounters
+from exceptions import SampleAlreadyReceived
+
+
+@pytest.fixture(scope="function")
+def instrumentation(engine, session):
+    instrumentation = SqlInstrumentation()
+    instrumentation.instrument_engine(engine)
+    instrumentation.instrument_session(session)
+    yield instrumentation
+    instrumentation.remove_listeners()
+
+
+class TestSqlInstrumentation:
+
+    def test_command_stats(self, instrumentation, database_layer):
+        instrumentation.start_command("record_receipt")
+        database_layer.record_receipt("test", "NT1")
+        instrumentation.finish_command()
+
+        stats = instrumentation.snapshot()["record_receipt"]
+        assert stats.count == 1
+        assert stats.statements >= 1
+        assert stats.rows >= 1
+        assert stats.commits == 1
+        assert 0 < stats.sql_seconds <= stats.total_seconds
+        assert stats.python_seconds == pytest.approx(stats.total_seconds - stats.sql_seconds)
+
+    def test_statements_outside_of_commands(self, instrumentation, session):
+        session.execute(select(Sample.id))
+
+        assert instrumentation.snapshot()[NO_COMMAND].statements == 1
+
+    def test_commands_are_summed(self, instrumentation, database_layer, sample_one):
+        for _ in range(2):
+            instrumentation.start_command("list_samples_in")
+            database_layer.list_samples_in("NT123")
+            instrumentation.finish_command()
+
+        stats = instrumentation.snapshot()["list_samples_in"]
+        assert stats.count == 2
+        assert stats.statements == 2
+        assert stats.commits == 0
+
+    def test_reset(self, instrumentation, database_layer):
+        instrumentation.start_command("record_receipt")
+        database_layer.record_receipt("test", "NT1")
+        instrumentation.finish_command()
+
+        instrumentation.reset()
+
+        assert instrumentation.snapshot() == {}
+
+    def test_remove_listeners(self, instrumentation, session):
+        instrumentation.remove_listeners()
+
+        session.execute(select(Sample.id))
+
+        assert instrumentation.snapshot() == {}
+
+
+class TestWriteRoundTrips:
+
+    def test_record_receipt_statements(self, instrumentation, database_layer):
+        instrumentation.start_command("record_receipt")
+        database_layer.record_receipt("test", "NT1")
+        instrumentation.finish_command()
+
+        # Insert of sample, append of custody event
+        assert instrumentation.snapshot()["record_receipt"].statements == 2
+
+    def test_duplicate_receipt_single_statement(self, instrumentation, database_layer):
+        database_layer.record_receipt("test", "NT1")
+
+        instrumentation.start_command("record_receipt")
+        with pytest.raises(SampleAlreadyReceived):
+            database_layer.record_receipt("test", "NT1")
+        instrumentation.finish_command()
+
+        assert instrumentation.snapshot()["record_receipt"].statements == 1
+
+    def test_add_to_plate_statements(self, instrumentation, database_layer, sample_one):
+        sample_id = sample_one.id
+        database_layer.add_to_plate(sample_id, "DN1", "A1")
+
+        instrumentation.start_command("add_to_plate")
+        database_layer.add_to_plate(sample_id, "DN1", "A2")
+        instrumentation.finish_command()
+
+        # Plate summary lock, insert of well checking the sample, custody event, occupancy update
+        assert instrumentation.snapshot()["add_to_plate"].statements == 4
+
+class TestPrometheus:
+
+    def test_format_prometheus(self):
+        stats = CommandStats()
+        stats.count, stats.statements, stats.sql_seconds, stats.total_seconds = 2, 6, 0.5, 2.0
+
+        text = format_prometheus({"add_to_plate": stats})
+
+        assert "# TYPE sample_tracking_sql_statements_total counter" in text
+        assert 'sample_tracking_sql_statements_total{command="add_to_plate"} 6' in text
+        assert 'sample_tracking_python_seconds_total{command="add_to_plate"} 1.5' in text
+
+    def test_file_writer_interval(self, tmp_path):
+        now = [0.0]
+        path = tmp_path / "sample_tracking.prom"
+        instrumentation = SqlInstrumentation()
+        writer = PrometheusFileWriter(str(path), instrumentation, interval_seconds=10, clock=lambda: now[0])
+
+        assert writer.maybe_write()
+        assert not writer.maybe_write()
+        now[0] = 10.0
+        assert writer.maybe_write()
+        assert path.read_text().startswith("# HELP sample_tracking_commands_total")
+        assert [file.name for file in tmp_path.iterdir()] == ["sample_tracking.prom"]
+
+    def test_file_writer_contention_counters(self, tmp_path):
+        path = tmp_path / "sample_tracking.prom"
+        counters = ContentionCounters()
+        counters.increment("retries")
+        writer = PrometheusFileWriter(str(path), SqlInstrumentation(), contention_counters=counters)
+
+        writer.write()
+
+        assert "sample_tracking_transaction_retries_total 1\n" in path.read_text()
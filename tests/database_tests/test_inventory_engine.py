@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from sqlalchemy import event, insert, update
+
+from barcode_codec import tube_barcode_codec
+from database.database import DatabaseLayer
+from database.inventory_engine import InventoryEngine, KeyIndex, barcode_key
+from database.scheme import Sample, Well
+from exceptions import SampleAlreadyReceived, SampleNotFound, WellPositionOccupied, TubeNotFound, \
+    OccupiedDestinationTube, OccupiedWellsNotFound
+
+
+@pytest.fixture(scope="function")
+def layer(session):
+    return DatabaseLayer(session, inventory=InventoryEngine.load(session))
+
+
+class TestKeyIndex:
+
+    def test_put_get_remove(self):
+        index = KeyIndex(capacity=4)
+
+        for key in range(1, 1001):
+            index.put(key, key * 10)
+        index.remove(500)
+        index.put(7, 70000)
+
+        assert len(index) == 999
+        assert index.get(500) is None
+        assert index.get(7) == 70000
+        assert index.get(1000) == 10000
+        assert index.get(1001) is None
+
+    def test_removed_slots_are_reused(self):
+        index = KeyIndex(capacity=16)
+
+        for _ in range(100):
+            index.put(3, 1)
+            index.remove(3)
+
+        assert len(index) == 0
+        assert len(index._keys) == 16
+
+    def test_put_new_matches_put(self):
+        keys = np.random.default_rng(1).choice(1 << 40, size=5000, replace=False).astype(np.int64) + 1
+        index = KeyIndex()
+
+        index.put_new(keys[:4000], np.arange(4000, dtype=np.int64))
+        for position, key in enumerate(keys[4000:].tolist(), start=4000):
+            index.put(key, position)
+
+        assert len(index) == 5000
+        assert [index.get(key) for key in keys.tolist()] == list(range(5000))
+
+
+def test_barcode_key_keeps_leading_zeros():
+    assert barcode_key(tube_barcode_codec, "NT1") != barcode_key(tube_barcode_codec, "NT01")
+    assert barcode_key(tube_barcode_codec, "NT1x") is None
+    assert barcode_key(tube_barcode_codec, "NT" + "9" * 30) is None
+
+
+class TestInventoryEngine:
+
+    def test_load(self, session, database_layer):
+        first = database_layer.record_receipt("first", "NT1")
+        second = database_layer.record_receipt("второй", "NT0002")
+        database_layer.add_to_plate(first.id, "DN1", "B3")
+        database_layer.add_to_plate(second.id, "DN1", "A1")
+
+        inventory = InventoryEngine.load(session, batch_size=1)
+
+        assert inventory.tube_report("NT0002").customer_sample_name == "второй"
+        assert inventory.tube_sample_id("NT2") is None
+        assert [(well.well_position, well.sample_id, well.customer_sample_name)
+                for well in inventory.plate_report("DN1").wells] == [("A1", second.id, "второй"),
+                                                                     ("B3", first.id, "first")]
+        assert inventory.check_consistency(session) == []
+
+    def test_barcodes_without_key(self, session):
+        session.execute(insert(Sample).values(id=1, customer_sample_name=None, tube_barcode="NT1x"))
+        session.execute(insert(Well).values(plate_barcode="DN" + "1" * 40, row=1, col=1, sample_id=1))
+
+        inventory = InventoryEngine.load(session)
+
+        assert inventory.tube_report("NT1x").customer_sample_name is None
+        assert inventory.well_sample_id("DN" + "1" * 40, 1, 1) == 1
+        assert inventory.check_consistency(session) == []
+
+    def test_consistency_check_finds_drift(self, session, layer):
+        sample = layer.record_receipt("test", "NT1")
+        # Write that bypassed the layer
+        session.execute(update(Sample).where(Sample.id == sample.id).values(tube_barcode="NT5"))
+
+        mismatches = layer.inventory.check_consistency(session)
+
+        assert [(mismatch.kind, mismatch.key, mismatch.database_value, mismatch.memory_value)
+                for mismatch in mismatches] == [("tube", "NT5", sample.id, None)]
+
+
+class TestWriteThrough:
+
+    def test_writes_are_applied(self, session, layer):
+        sample = layer.record_receipt("test", "NT1")
+        report = layer.record_receipts_bulk([("a", "NT2"), ("b", "NT3")])
+        layer.tube_transfer("NT1", "NT4")
+        layer.tube_transfer_batch([("NT2", "NT3"), ("NT3", "NT2")])
+        layer.add_to_plate(sample.id, "DN1", "A1")
+        layer.load_plate_layout("DN1", {"A2": report.sample_ids["NT2"]})
+        layer.pack_samples([report.sample_ids["NT3"]], ["DN1"])
+
+        assert layer.list_samples_in("NT4").sample_id == sample.id
+        assert layer.list_samples_in("NT2").customer_sample_name == "b"
+        assert [well.well_position for well in layer.list_samples_in("DN1").wells] == ["A1", "A2", "A3"]
+        assert layer.inventory.check_consistency(session) == []
+
+    def test_errors_of_known_state(self, layer):
+        sample = layer.record_receipt("test", "NT1")
+        layer.record_receipt("test", "NT2")
+        layer.add_to_plate(sample.id, "DN1", "A1")
+
+        with pytest.raises(SampleAlreadyReceived):
+            layer.record_receipt("test", "NT1")
+        assert [rejection.row_number for rejection in layer.record_receipts_bulk([("a", "NT1")]).rejections] == [1]
+        with pytest.raises(SampleNotFound):
+            layer.add_to_plate(sample.id + 100, "DN1", "A1")
+        with pytest.raises(WellPositionOccupied):
+            layer.add_to_plate(sample.id, "DN1", "A1")
+        with pytest.raises(OccupiedDestinationTube):
+            layer.tube_transfer("NT1", "NT2")
+        with pytest.raises(TubeNotFound):
+            layer.tube_transfer("NT3", "NT4")
+        with pytest.raises(TubeNotFound):
+            layer.tube_transfer_batch([("NT1", "NT5"), ("NT3", "NT6")])
+        with pytest.raises(OccupiedWellsNotFound):
+            layer.list_samples_in("DN2")
+
+    def test_reads_do_not_query_database(self, session, layer):
+        layer.record_receipt("test", "NT1")
+        statements = []
+        connection = session.connection()
+
+        event.listen(connection, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        layer.list_samples_in("NT1")
+        assert statements == []
+
+        # Missing in memory is confirmed by the database
+        with pytest.raises(TubeNotFound):
+            layer.list_samples_in("NT2")
+        assert len(statements) == 1
+
+    def test_writes_of_other_processes(self, session, layer):
+        sample = layer.record_receipt("test", "NT1")
+        # Writes that bypassed the inventory: transfer NT1 -> NT5 and receipt of NT7
+        session.execute(update(Sample).where(Sample.id == sample.id)
+                        .values(tube_barcode="NT5", tube_barcode_number=tube_barcode_codec.number("NT5")))
+        other_sample_id = session.execute(
+            insert(Sample).values(customer_sample_name="other", tube_barcode="NT7",
+                                  tube_barcode_number=tube_barcode_codec.number("NT7")).returning(Sample.id)
+        ).scalar_one()
+
+        assert layer.list_samples_in("NT7").sample_id == other_sample_id
+        layer.tube_transfer("NT5", "NT6")
+        layer.tube_transfer_batch([("NT7", "NT8")])
+        layer.record_receipt("again", "NT1")
+        report = layer.record_receipts_bulk([("a", "NT2"), ("b", "NT6")])
+        assert [rejection.row_number for rejection in report.rejections] == [2]
+        layer.add_to_plate(other_sample_id, "DN1", "A1")
+        layer.pack_samples([other_sample_id], ["DN1"])
+
+        assert layer.list_samples_in("NT6").sample_id == sample.id
+        assert [well.sample_id for well in layer.list_samples_in("DN1").wells] == [other_sample_id] * 2
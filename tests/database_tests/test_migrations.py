@@ -0,0 +1,174 @@
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from database.migrations import Backfill, CreateIndex, Migration, MigrationRunner, load_migrations, \
+    schema_migrations, schema_migration_progress
+from exceptions import OfflineMigrationRequired
+
+# Schema before tube_barcode_number, plate_barcode_number and lookup indexes were added
+LEGACY_SCHEMA = [
+    "CREATE TABLE samples (id INTEGER PRIMARY KEY, customer_sample_name VARCHAR, "
+    "tube_barcode VARCHAR NOT NULL UNIQUE)",
+    "CREATE TABLE wells (plate_barcode VARCHAR NOT NULL, row INTEGER NOT NULL, col INTEGER NOT NULL, "
+    "sample_id INTEGER NOT NULL REFERENCES samples (id), PRIMARY KEY (plate_barcode, row, col))",
+]
+
+
+class InterruptedBackfill(Exception):
+    pass
+
+
+@pytest.fixture(scope="function")
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.execute(text("INSERT INTO samples (id, customer_sample_name, tube_barcode) VALUES "
+                                "(1, 'a', 'NT1'), (2, 'b', 'NT0002'), (3, 'c', 'NT3'), (4, 'd', 'NT4x'), "
+                                "(5, 'e', 'NT5')"))
+        connection.execute(text("INSERT INTO wells VALUES ('DN10', 1, 1, 1), ('DN10', 1, 2, 2), ('DN7', 8, 12, 3)"))
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+class TestLoadMigrations:
+
+    def test_versions_are_ordered(self):
+        versions = [migration.version for migration in load_migrations()]
+
+        assert versions == sorted(versions)
+        assert versions[:3] == [1, 2, 3]
+
+    def test_only_table_rewrites_are_offline(self):
+        assert [migration.online for migration in load_migrations()][:4] == [True, True, False, True]
+
+
+class TestMigrationRunner:
+
+    def test_migrates_legacy_schema(self, legacy_engine):
+        messages = []
+        runner = MigrationRunner(legacy_engine, online=False, batch_size=2, progress=messages.append)
+
+        applied = runner.migrate()
+
+        assert [migration.version for migration in applied] == [1, 2, 3, 4, 5]
+        assert runner.pending() == []
+        with legacy_engine.connect() as connection:
+            assert connection.execute(text("SELECT id, tube_barcode_number FROM samples ORDER BY id")).all() == \
+                [(1, 1), (2, 2), (3, 3), (4, None), (5, 5)]
+            assert connection.execute(text("SELECT DISTINCT plate_barcode, plate_barcode_number FROM wells "
+                                           "ORDER BY plate_barcode")).all() == [("DN10", 10), ("DN7", 7)]
+            assert connection.scalars(select(schema_migration_progress.c.version)).all() == []
+        assert {"ix_samples_tube_barcode_number", "ix_samples_customer_sample_name"} <= \
+            index_names(legacy_engine, "samples")
+        assert {"ix_wells_plate_barcode_number", "ix_wells_sample_id"} <= index_names(legacy_engine, "wells")
+        assert "Applying 0001: Numeric parts of tube and plate barcodes for range scans" in messages
+
+    def test_current_containers_are_recorded_as_custody_events(self, legacy_engine):
+        MigrationRunner(legacy_engine, online=False, batch_size=2).migrate()
+
+        with legacy_engine.connect() as connection:
+            assert connection.execute(text("SELECT event_type, sample_id, tube_barcode FROM custody_events "
+                                           "WHERE tube_barcode IS NOT NULL ORDER BY sample_id")).all() == \
+                [("recorded", 1, "NT1"), ("recorded", 2, "NT0002"), ("recorded", 3, "NT3"), ("recorded", 4, "NT4x"),
+                 ("recorded", 5, "NT5")]
+            assert connection.execute(text('SELECT sample_id, plate_barcode, "row", col FROM custody_events '
+                                           'WHERE plate_barcode IS NOT NULL ORDER BY sample_id')).all() == \
+                [(1, "DN10", 1, 1), (2, "DN10", 1, 2), (3, "DN7", 8, 12)]
+
+    def test_plate_summaries_are_built_from_wells(self, legacy_engine):
+        MigrationRunner(legacy_engine, online=False, batch_size=1).migrate()
+
+        with legacy_engine.connect() as connection:
+            summaries = connection.execute(text("SELECT plate_barcode, occupancy, well_count, last_sample_id, "
+                                                "last_filled_at IS NOT NULL FROM plate_summary "
+                                                "ORDER BY plate_barcode")).all()
+        assert [(plate_barcode, int.from_bytes(occupancy, "big"), well_count, last_sample_id, filled)
+                for plate_barcode, occupancy, well_count, last_sample_id, filled in summaries] == \
+            [("DN10", 0b11, 2, 2, 1), ("DN7", 1 << 95, 1, 3, 1)]
+
+    def test_second_run_does_nothing(self, legacy_engine):
+        MigrationRunner(legacy_engine, online=False).migrate()
+
+        assert MigrationRunner(legacy_engine, online=False).migrate() == []
+
+    def test_online_mode_refuses_offline_migrations(self, legacy_engine):
+        runner = MigrationRunner(legacy_engine, online=True)
+
+        with pytest.raises(OfflineMigrationRequired):
+            runner.migrate()
+        assert runner.applied_versions() == set()
+
+        assert [migration.version for migration in runner.migrate(target=2)] == [1, 2]
+        with pytest.raises(OfflineMigrationRequired):
+            runner.migrate()
+
+    def test_interrupted_backfill_resumes(self, legacy_engine):
+        migration = Migration(1, "Backfill", [
+            Backfill("samples", key="id",
+                     set_sql={"sqlite": "customer_sample_name = upper(customer_sample_name)"},
+                     where_sql={"sqlite": "customer_sample_name = lower(customer_sample_name)"},
+                     description="Upper case names"),
+        ])
+
+        def interrupt(seconds):
+            raise InterruptedBackfill()
+
+        with pytest.raises(InterruptedBackfill):
+            MigrationRunner(legacy_engine, [migration], batch_size=2, throttle_seconds=1, sleep=interrupt).migrate()
+
+        with legacy_engine.connect() as connection:
+            # First batch is committed together with its position
+            assert connection.scalars(text("SELECT customer_sample_name FROM samples ORDER BY id")).all() == \
+                ["A", "B", "c", "d", "e"]
+            assert connection.execute(select(schema_migration_progress.c.position,
+                                             schema_migration_progress.c.rows_done)).all() == [("2", 2)]
+
+        messages = []
+        slept = []
+        MigrationRunner(legacy_engine, [migration], batch_size=2, throttle_seconds=1, sleep=slept.append,
+                        progress=messages.append).migrate()
+
+        with legacy_engine.connect() as connection:
+            assert connection.scalars(text("SELECT customer_sample_name FROM samples ORDER BY id")).all() == \
+                ["A", "B", "C", "D", "E"]
+        assert "Resuming backfill after 2" in messages
+        assert "Upper case names: 5 rows updated, scanned up to id end of ~5 rows" in messages
+        assert slept == [1]
+
+    def test_stamp(self, legacy_engine):
+        runner = MigrationRunner(legacy_engine)
+
+        runner.stamp()
+
+        assert runner.pending() == []
+        assert runner.migrate() == []
+        assert "tube_barcode_number" not in {column["name"] for column in inspect(legacy_engine).get_columns("samples")}
+
+
+def test_postgresql_index_is_built_concurrently(engine):
+    runner = MigrationRunner(engine, [
+        Migration(9001, "Covering index", [CreateIndex("ix_test_wells_sample", "wells", ["sample_id"],
+                                                       include=["plate_barcode", "row", "col"])])
+    ])
+    try:
+        runner.migrate()
+
+        with engine.connect() as connection:
+            index = connection.execute(
+                text("SELECT pg_index.indisvalid, pg_indexes.indexdef FROM pg_indexes "
+                     "JOIN pg_class ON pg_class.relname = pg_indexes.indexname "
+                     "JOIN pg_index ON pg_index.indexrelid = pg_class.oid "
+                     "WHERE pg_indexes.indexname = 'ix_test_wells_sample'")
+            ).one()
+        assert index.indisvalid
+        assert index.indexdef.endswith('(sample_id) INCLUDE (plate_barcode, "row", col)')
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX IF EXISTS ix_test_wells_sample"))
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version == 9001))
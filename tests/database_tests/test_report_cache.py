@@ -0,0 +1,75 @@
+from database.report_cache import ReportCache
+from reports import TubeReport
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def tube_report(tube_barcode):
+    return TubeReport(tube_barcode=tube_barcode, sample_id=1, customer_sample_name="test")
+
+
+class TestReportCache:
+
+    def test_get_missing(self):
+        report_cache = ReportCache()
+
+        assert report_cache.get("NT1") is None
+        assert (report_cache.hits, report_cache.misses) == (0, 1)
+
+    def test_put_and_get(self):
+        report_cache = ReportCache()
+        report = tube_report("NT1")
+        report_cache.put("NT1", report)
+
+        assert report_cache.get("NT1") is report
+        assert (report_cache.hits, report_cache.misses) == (1, 0)
+        assert report_cache.hit_ratio == 1.0
+
+    def test_least_recently_used_evicted(self):
+        report_cache = ReportCache(max_size=2)
+        report_cache.put("NT1", tube_report("NT1"))
+        report_cache.put("NT2", tube_report("NT2"))
+        report_cache.get("NT1")
+
+        report_cache.put("NT3", tube_report("NT3"))
+
+        assert len(report_cache) == 2
+        assert report_cache.get("NT2") is None
+        assert report_cache.get("NT1") is not None
+        assert report_cache.get("NT3") is not None
+
+    def test_expired_entry(self):
+        clock = FakeClock()
+        report_cache = ReportCache(ttl_seconds=5, clock=clock)
+        report_cache.put("NT1", tube_report("NT1"))
+
+        clock.now = 4.9
+        assert report_cache.get("NT1") is not None
+
+        clock.now = 5.0
+        assert report_cache.get("NT1") is None
+        assert len(report_cache) == 0
+
+    def test_no_ttl(self):
+        clock = FakeClock()
+        report_cache = ReportCache(ttl_seconds=None, clock=clock)
+        report_cache.put("NT1", tube_report("NT1"))
+
+        clock.now = 10 ** 6
+        assert report_cache.get("NT1") is not None
+
+    def test_invalidate(self):
+        report_cache = ReportCache()
+        report_cache.put("NT1", tube_report("NT1"))
+        report_cache.put("NT2", tube_report("NT2"))
+
+        report_cache.invalidate("NT1", "NT3")
+
+        assert report_cache.get("NT1") is None
+        assert report_cache.get("NT2") is not None
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text, func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from database.database import DatabaseLayer
+from database.scheme import Base, Sample
+from database.slow_query_log import SlowQueryLog
+
+
+def read_entries(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.fixture(scope="function")
+def log_path(tmp_path):
+    yield tmp_path / "slow_queries.jsonl"
+
+
+@pytest.fixture(scope="function")
+def slow_query_log(engine, log_path):
+    # Zero threshold logs every statement
+    slow_query_log = SlowQueryLog(threshold_ms=0, path=str(log_path))
+    slow_query_log.attach(engine)
+    yield slow_query_log
+    slow_query_log.detach(engine)
+
+
+class TestSlowQueryLog:
+
+    def test_read_is_analyzed(self, slow_query_log, database_layer, sample_one, log_path):
+        database_layer.list_samples_in("NT123")
+
+        entry, = [entry for entry in read_entries(log_path) if entry["caller"][:1] == ["list_samples_in"]]
+        assert entry["caller"] == ["list_samples_in", "_get_tube_report"]
+        assert entry["statement"].startswith("SELECT")
+        assert entry["analyzed"] is True
+        assert any("actual time" in line for line in entry["plan"])
+        assert entry["suppressed"] == 0
+
+    def test_write_is_explained_without_analyze(self, slow_query_log, database_layer, log_path):
+        database_layer.record_receipt("test", "NT1")
+
+        insert_entry, = [entry for entry in read_entries(log_path) if entry["statement"].startswith("INSERT INTO samples")]
+        assert insert_entry["caller"] == ["record_receipt"]
+        assert insert_entry["analyzed"] is False
+        assert "Insert on samples" in insert_entry["plan"][0]
+        # Insert was not executed twice by EXPLAIN
+        assert database_layer.list_samples_in("NT1").customer_sample_name == "test"
+
+    def test_data_modifying_cte_is_explained_without_analyze(self, slow_query_log, session, log_path):
+        session.execute(text("WITH inserted AS (INSERT INTO samples (customer_sample_name, tube_barcode) "
+                             "VALUES ('test', 'NT1') RETURNING id) SELECT id FROM inserted"))
+
+        entry, = [entry for entry in read_entries(log_path) if entry["statement"].startswith("WITH inserted")]
+        assert entry["analyzed"] is False
+        assert session.scalar(select(func.count()).select_from(Sample).where(Sample.tube_barcode == "NT1")) == 1
+
+    def test_bulk_import_is_explained_without_analyze(self, slow_query_log, database_layer, log_path):
+        report = database_layer.record_receipts_bulk([("first", "NT1"), ("second", "NT2")])
+
+        assert set(report.sample_ids) == {"NT1", "NT2"}
+        merge_entry, = [entry for entry in read_entries(log_path)
+                        if "_copy_receipts" in entry["caller"] and entry["statement"].startswith("WITH")]
+        assert merge_entry["analyzed"] is False
+
+    def test_failed_statement_start_is_discarded(self, slow_query_log, session):
+        savepoint = session.begin_nested()
+        with pytest.raises(DBAPIError):
+            session.execute(text("SELECT 1 / 0"))
+        savepoint.rollback()
+
+        assert session.connection().info["slow_query_started"] == {}
+
+    def test_statement_without_plan(self, slow_query_log, session, log_path):
+        session.execute(text("SHOW search_path"))
+
+        entry, = read_entries(log_path)
+        assert entry["statement"] == "SHOW search_path"
+        assert "plan" not in entry and "plan_error" not in entry
+
+    def test_threshold(self, engine, session, log_path):
+        slow_query_log = SlowQueryLog(threshold_ms=60000, path=str(log_path))
+        slow_query_log.attach(engine)
+        session.execute(text("SELECT 1"))
+        slow_query_log.detach(engine)
+
+        assert not log_path.exists()
+
+    def test_rate_limit(self, engine, session, log_path):
+        now = [0.0]
+        slow_query_log = SlowQueryLog(threshold_ms=0, path=str(log_path), max_per_minute=2, clock=lambda: now[0])
+        slow_query_log.attach(engine)
+        for _ in range(5):
+            session.execute(text("SELECT 1"))
+        now[0] = 60.0
+        session.execute(text("SELECT 2"))
+        slow_query_log.detach(engine)
+
+        entries = read_entries(log_path)
+        assert [entry["statement"] for entry in entries] == ["SELECT 1", "SELECT 1", "SELECT 2"]
+        assert entries[-1]["suppressed"] == 3
+
+    def test_sqlite_query_plan(self, tmp_path, log_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'slow.sqlite'}")
+        Base.metadata.create_all(engine)
+        slow_query_log = SlowQueryLog(threshold_ms=0, path=str(log_path))
+        slow_query_log.attach(engine)
+
+        with Session(bind=engine) as session:
+            database_layer = DatabaseLayer(session)
+            database_layer.record_receipt("test", "NT1")
+            database_layer.list_samples_in("NT1")
+        slow_query_log.detach(engine)
+        engine.dispose()
+
+        entry = [entry for entry in read_entries(log_path) if entry["caller"][:1] == ["list_samples_in"]][-1]
+        assert any("samples" in line for line in entry["plan"])
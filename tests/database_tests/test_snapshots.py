@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from sqlalchemy import insert
+
+from database.scheme import Sample
+from database.snapshots import InventorySnapshot, write_snapshot
+from exceptions import SnapshotExists, SnapshotBadFormat
+
+
+@pytest.fixture(scope="function")
+def inventory(database_layer):
+    report = database_layer.record_receipts_bulk([("patient-2", "NT3"), ("patient-1", "NT1"), ("control", "NT2"),
+                                                  ("patient-10", "NT10")])
+    database_layer.load_plate_layout("DN2", {"A1": report.sample_ids["NT1"], "A2": report.sample_ids["NT3"]})
+    database_layer.load_plate_layout("DN1", {"H12": report.sample_ids["NT1"]})
+    return report.sample_ids
+
+
+class TestSnapshot:
+
+    def test_columns(self, session, inventory, tmp_path):
+        session.execute(insert(Sample).values(customer_sample_name=None, tube_barcode="NT4"))
+
+        snapshot = write_snapshot(session, str(tmp_path / "snapshot"), batch_size=2)
+
+        assert (snapshot.samples_count, snapshot.wells_count) == (5, 3)
+        assert snapshot.sample_ids.tolist() == sorted(snapshot.sample_ids.tolist())
+        samples = [(None if name == -1 else snapshot.strings[name], snapshot.strings[tube_barcode])
+                   for name, tube_barcode in zip(snapshot.customer_sample_names, snapshot.tube_barcodes)]
+        assert samples == [("patient-2", "NT3"), ("patient-1", "NT1"), ("control", "NT2"), ("patient-10", "NT10"),
+                           (None, "NT4")]
+        wells = sorted((snapshot.strings[plate_barcode], row, col, sample_id) for plate_barcode, row, col, sample_id
+                       in zip(snapshot.plate_barcodes, snapshot.rows, snapshot.cols, snapshot.well_sample_ids))
+        assert wells == [("DN1", 8, 12, inventory["NT1"]), ("DN2", 1, 1, inventory["NT1"]),
+                         ("DN2", 1, 2, inventory["NT3"])]
+        assert list(snapshot.strings) == sorted(snapshot.strings)
+        assert sorted(os.listdir(tmp_path)) == ["snapshot"]
+
+    def test_reopened_snapshot_is_memory_mapped(self, session, inventory, tmp_path):
+        write_snapshot(session, str(tmp_path / "snapshot"))
+
+        snapshot = InventorySnapshot.open(str(tmp_path / "snapshot"))
+
+        assert snapshot.sample_ids.filename is not None
+        assert not snapshot.sample_ids.flags.writeable
+
+    def test_queries(self, session, inventory, tmp_path):
+        snapshot = write_snapshot(session, str(tmp_path / "snapshot"))
+
+        assert snapshot.plate_fill_rates() == {"DN1": 1 / 96, "DN2": 2 / 96}
+        assert snapshot.count_samples_with_name_prefix("patient-1") == 2
+        assert snapshot.count_samples_with_name_prefix("p") == 3
+        assert snapshot.count_samples_with_name_prefix("x") == 0
+        assert snapshot.samples_per_name_prefix(3) == {"con": 1, "pat": 3}
+        assert snapshot.strings[snapshot.code("NT10")] == "NT10"
+        assert snapshot.code("NT5") is None
+
+    def test_empty_database(self, session, tmp_path):
+        snapshot = write_snapshot(session, str(tmp_path / "snapshot"))
+
+        assert (snapshot.samples_count, snapshot.wells_count, len(snapshot.strings)) == (0, 0, 0)
+        assert snapshot.plate_fill_rates() == {}
+
+    def test_existing_snapshot_is_kept(self, session, tmp_path):
+        write_snapshot(session, str(tmp_path / "snapshot"))
+
+        with pytest.raises(SnapshotExists):
+            write_snapshot(session, str(tmp_path / "snapshot"))
+
+    def test_not_a_snapshot(self, tmp_path):
+        with pytest.raises(SnapshotBadFormat):
+            InventorySnapshot.open(str(tmp_path))
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from database.database import DatabaseLayer
+from database.management import DatabaseInitializer
+from database.scheme import Base, Sample
+from database.transactions import TransactionRunner
+from env import read_database_credentials_from_env
+from exceptions import TubeNotFound, OccupiedDestinationTube
+
+TUBE_BARCODES = ["NT9001", "NT9002", "NT9003"]
+
+
+@pytest.fixture(scope="function")
+def committed_tubes(engine):
+    # Concurrent transactions only see committed rows, so these tests can not use the rolled back test transaction
+    with engine.begin() as connection:
+        connection.execute(insert(Sample), [
+            {"customer_sample_name": "contention", "tube_barcode": "NT9001", "tube_barcode_number": 9001},
+            {"customer_sample_name": "contention", "tube_barcode": "NT9002", "tube_barcode_number": 9002},
+        ])
+    yield
+    with engine.begin() as connection:
+        connection.execute(delete(Sample).where(Sample.tube_barcode.in_(TUBE_BARCODES)))
+
+
+def run_in_thread(function):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = function()
+        except Exception as exc:
+            outcome["error"] = exc
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def tube_barcodes(engine):
+    with engine.connect() as connection:
+        return set(connection.scalars(select(Sample.tube_barcode).where(Sample.tube_barcode.in_(TUBE_BARCODES))))
+
+
+class TestTubeTransferContention:
+
+    def test_lock_timeout_is_retried(self, committed_tubes):
+        load_dotenv()
+        database_arguments = read_database_credentials_from_env("TEST")
+        engine = DatabaseInitializer(Base=Base).init_database(database_arguments, engine_options={"lock_timeout_ms": 50})
+        holder = engine.connect()
+        holder.begin()
+        holder.execute(text("SELECT id FROM samples WHERE tube_barcode = 'NT9001' FOR UPDATE"))
+
+        def release_lock(delay):
+            holder.commit()
+
+        runner = TransactionRunner(sleep=release_lock)
+        try:
+            with Session(bind=engine) as session:
+                DatabaseLayer(session, transaction_runner=runner).tube_transfer("NT9001", "NT9003")
+            assert tube_barcodes(engine) == {"NT9002", "NT9003"}
+        finally:
+            holder.close()
+            engine.dispose()
+
+        counters = runner.counters.snapshot()
+        assert (counters["lock_timeouts"], counters["retries"], counters["exhausted"]) == (1, 1, 0)
+
+    def test_concurrent_transfer_of_same_source(self, engine, committed_tubes):
+        with engine.connect() as first:
+            first.execute(update(Sample).where(Sample.tube_barcode == "NT9001").values(tube_barcode="NT9003"))
+
+            # Waits for the row lock of the first transfer, then finds the source empty
+            session = Session(bind=engine)
+            thread, outcome = run_in_thread(lambda: DatabaseLayer(session).tube_transfer("NT9001", "NT9004"))
+            time.sleep(0.2)
+            first.commit()
+            thread.join()
+            session.close()
+
+        assert isinstance(outcome.get("error"), TubeNotFound)
+        assert tube_barcodes(engine) == {"NT9002", "NT9003"}
+
+    def test_concurrent_transfer_to_same_destination(self, engine, committed_tubes):
+        with engine.connect() as first:
+            first.execute(update(Sample).where(Sample.tube_barcode == "NT9001").values(tube_barcode="NT9003"))
+
+            # Destination is free in its snapshot, unique index waits for the first transfer and then fails
+            session = Session(bind=engine)
+            thread, outcome = run_in_thread(lambda: DatabaseLayer(session).tube_transfer("NT9002", "NT9003"))
+            time.sleep(0.2)
+            first.commit()
+            thread.join()
+            session.close()
+
+        assert isinstance(outcome.get("error"), OccupiedDestinationTube)
+        assert tube_barcodes(engine) == {"NT9002", "NT9003"}
@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import SmallInteger, inspect
 from sqlalchemy.exc import IntegrityError
 
 from database.scheme import Sample, Well
@@ -107,3 +108,16 @@ class TestWellTable:
             .all()
 
         assert fetched_wells_and_samples == [(new_well, sample_one)]
+
+    def test_sample_id_index(self, engine):
+        indexes = {index["name"]: index for index in inspect(engine).get_indexes("wells")}
+
+        assert indexes["ix_wells_sample_id"]["column_names"] == ["sample_id"]
+        if engine.dialect.name == "postgresql":
+            assert indexes["ix_wells_sample_id"]["include_columns"] == ["plate_barcode", "row", "col"]
+
+    def test_row_col_are_small_integers(self, engine):
+        columns = {column["name"]: column for column in inspect(engine).get_columns("wells")}
+
+        assert isinstance(columns["row"]["type"], SmallInteger)
+        assert isinstance(columns["col"]["type"], SmallInteger)
@@ -1,7 +1,10 @@
 import pytest
 
+from database import dialects
+from database.scheme import PlateSummary
 from exceptions import PlateBarcodeBadFormat, SampleNotFound, SampleIdBadFormatting, WellPositionOccupied, \
-    WellPositionBadFormatting
+    WellPositionBadFormatting, PlateFull
+from plate_occupancy import COLUMN_MAJOR, mask_from_positions
 
 
 class TestAddToPlate:
@@ -63,6 +66,18 @@ class TestAddToPlate:
         with pytest.raises(WellPositionOccupied):
             database_layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN1", well_position="A1")
 
+    @pytest.mark.parametrize("on_conflict_dialects", [dialects.ON_CONFLICT_DIALECTS, ()])
+    def test_well_occupied_behind_plate_summary(self, database_layer, session, sample_one, sample_two, monkeypatch,
+                                                on_conflict_dialects):
+        monkeypatch.setattr(dialects, "ON_CONFLICT_DIALECTS", on_conflict_dialects)
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        session.get(PlateSummary, "DN1").occupancy = 0
+        session.commit()
+
+        with pytest.raises(WellPositionOccupied):
+            database_layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN1", well_position="A1")
+        assert database_layer.list_samples_in("DN1").wells[0].sample_id == sample_one.id
+
     def test_well_sample_not_found(self, database_layer):
         with pytest.raises(SampleNotFound):
             database_layer.add_to_plate(sample_id=993, plate_barcode="DN1", well_position="A1")
@@ -70,3 +85,58 @@ class TestAddToPlate:
     def test_sample_id_wrong_format(self, database_layer):
         with pytest.raises(SampleIdBadFormatting):
             database_layer.add_to_plate(sample_id=-1, plate_barcode="DN1", well_position="A1")
+
+    def test_add_to_plate_next_free_well(self, database_layer, sample_one):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        well = database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1")
+
+        assert (well.row, well.col) == (1, 2)
+
+    def test_add_to_plate_next_free_well_column_major(self, database_layer, sample_one):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        well = database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", fill_order=COLUMN_MAJOR)
+
+        assert (well.row, well.col) == (2, 1)
+
+    def test_add_to_plate_returns_persistent_well(self, database_layer, session, sample_one):
+        well = database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="B3")
+
+        assert well in session
+        assert (well.plate_barcode, well.row, well.col, well.sample_id) == ("DN1", 2, 3, sample_one.id)
+
+    def test_sample_not_found_before_occupied_well(self, database_layer, sample_one):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        with pytest.raises(SampleNotFound):
+            database_layer.add_to_plate(sample_id=sample_one.id + 1000, plate_barcode="DN1", well_position="A1")
+
+    def test_sample_not_found_before_plate_full(self, database_layer, sample_one):
+        for _ in range(96):
+            database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1")
+
+        with pytest.raises(SampleNotFound):
+            database_layer.add_to_plate(sample_id=sample_one.id + 1000, plate_barcode="DN1")
+
+    def test_add_to_plate_plate_full(self, database_layer, sample_one):
+        for _ in range(96):
+            database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1")
+
+        with pytest.raises(PlateFull):
+            database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1")
+
+    def test_plate_summary_follows_wells(self, database_layer, session, sample_one):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        database_layer.load_plate_layout("DN1", {"B2": sample_one.id})
+
+        assert session.get(PlateSummary, "DN1").occupancy == mask_from_positions([(1, 1), (2, 2)])
+
+    def test_plate_summary_rebuilt_from_wells(self, database_layer, session, sample_one):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        session.delete(session.get(PlateSummary, "DN1"))
+        session.commit()
+
+        with pytest.raises(WellPositionOccupied):
+            database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        assert session.get(PlateSummary, "DN1").occupancy == mask_from_positions([(1, 1)])
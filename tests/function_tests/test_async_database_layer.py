@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.async_database import AsyncDatabaseLayer, create_async_session_factory
+from database.database import DatabaseLayer
+from database.report_cache import ReportCache
+from database.scheme import Base
+from database.transactions import TransactionRunner, transactional
+from exceptions import TubeBarcodeBadFormat, SampleAlreadyReceived, SampleNotFound, WellPositionOccupied, \
+    OccupiedDestinationTube, TubeNotFound, OccupiedWellsNotFound, TransactionContention
+from reports import TubeReport, PlateReport
+
+
+@pytest.fixture(scope="function")
+def async_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'samples.db'}")
+
+    async def create_tables():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture(scope="function")
+def async_database_layer(async_engine):
+    yield AsyncDatabaseLayer(create_async_session_factory(async_engine))
+
+
+class TestAsyncDatabaseLayer:
+
+    def test_record_receipt(self, async_database_layer):
+        sample = asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+
+        assert sample.id > 0
+        assert sample.tube_barcode == "NT1"
+
+    def test_record_receipt_errors(self, async_database_layer):
+        asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+
+        with pytest.raises(TubeBarcodeBadFormat):
+            asyncio.run(async_database_layer.record_receipt("test", "bad_barcode"))
+        with pytest.raises(SampleAlreadyReceived):
+            asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+
+    def test_concurrent_record_receipts(self, async_database_layer):
+        async def record_receipts():
+            return await asyncio.gather(*[
+                async_database_layer.record_receipt(f"test {number}", f"NT{number}") for number in range(1, 21)
+            ])
+
+        samples = asyncio.run(record_receipts())
+
+        assert len({sample.id for sample in samples}) == 20
+
+    def test_add_to_plate(self, async_database_layer):
+        async def add_to_plate():
+            sample = await async_database_layer.record_receipt("test", "NT1")
+            well = await async_database_layer.add_to_plate(sample.id, "DN1", "A1")
+            next_well = await async_database_layer.add_to_plate(sample.id, "DN1")
+            return sample, well, next_well
+
+        sample, well, next_well = asyncio.run(add_to_plate())
+
+        assert (well.row, well.col, well.sample_id) == (1, 1, sample.id)
+        assert (next_well.row, next_well.col) == (1, 2)
+
+    def test_add_to_plate_errors(self, async_database_layer):
+        sample = asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+        asyncio.run(async_database_layer.add_to_plate(sample.id, "DN1", "A1"))
+
+        with pytest.raises(WellPositionOccupied):
+            asyncio.run(async_database_layer.add_to_plate(sample.id, "DN1", "A1"))
+        with pytest.raises(SampleNotFound):
+            asyncio.run(async_database_layer.add_to_plate(993, "DN1", "A2"))
+
+    def test_tube_transfer(self, async_database_layer):
+        sample = asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+        asyncio.run(async_database_layer.record_receipt("test", "NT2"))
+
+        asyncio.run(async_database_layer.tube_transfer("NT1", "NT3"))
+
+        tube_report = asyncio.run(async_database_layer.list_samples_in("NT3"))
+        assert tube_report.sample_id == sample.id
+        with pytest.raises(OccupiedDestinationTube):
+            asyncio.run(async_database_layer.tube_transfer("NT3", "NT2"))
+        with pytest.raises(TubeNotFound):
+            asyncio.run(async_database_layer.tube_transfer("NT1", "NT4"))
+
+    def test_list_samples_in(self, async_database_layer):
+        sample = asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+        asyncio.run(async_database_layer.add_to_plate(sample.id, "DN1", "A1"))
+
+        tube_report = asyncio.run(async_database_layer.list_samples_in("NT1"))
+        plate_report = asyncio.run(async_database_layer.list_samples_in("DN1"))
+
+        assert isinstance(tube_report, TubeReport)
+        assert isinstance(plate_report, PlateReport)
+        assert [well.sample_id for well in plate_report.wells] == [sample.id]
+        with pytest.raises(OccupiedWellsNotFound):
+            asyncio.run(async_database_layer.list_samples_in("DN2"))
+
+    def test_shared_report_cache(self, async_engine):
+        report_cache = ReportCache()
+        async_database_layer = AsyncDatabaseLayer(create_async_session_factory(async_engine), report_cache=report_cache)
+        asyncio.run(async_database_layer.record_receipt("test", "NT1"))
+
+        asyncio.run(async_database_layer.list_samples_in("NT1"))
+        asyncio.run(async_database_layer.list_samples_in("NT1"))
+
+        assert (report_cache.hits, report_cache.misses) == (1, 1)
+
+
+class SqliteBusy(Exception):
+    sqlite_errorcode = 5
+
+
+class TestAsyncRetries:
+
+    @pytest.fixture(scope="function")
+    def delays(self):
+        return []
+
+    @pytest.fixture(scope="function")
+    def retrying_layer(self, async_engine, delays):
+        async def sleep(delay):
+            delays.append(delay)
+
+        # Blocking sleep of the runner must not be called from the event loop
+        runner = TransactionRunner(max_attempts=3, backoff_seconds=0.01, random_fraction=lambda: 1.0,
+                                   sleep=lambda delay: pytest.fail("blocking sleep"))
+        return AsyncDatabaseLayer(create_async_session_factory(async_engine), transaction_runner=runner, sleep=sleep)
+
+    def busy_record_receipt(self, monkeypatch, failures):
+        record_receipt = DatabaseLayer.record_receipt.__wrapped__
+        calls = []
+
+        def busy(layer, customer_sample_name, tube_barcode):
+            calls.append(tube_barcode)
+            if len(calls) <= failures:
+                raise OperationalError("INSERT INTO samples", {}, SqliteBusy())
+            return record_receipt(layer, customer_sample_name, tube_barcode)
+
+        monkeypatch.setattr(DatabaseLayer, "record_receipt", transactional(busy))
+        return calls
+
+    def test_contention_is_retried_with_async_sleep(self, retrying_layer, delays, monkeypatch):
+        calls = self.busy_record_receipt(monkeypatch, failures=2)
+
+        sample = asyncio.run(retrying_layer.record_receipt("test", "NT1"))
+
+        assert sample.tube_barcode == "NT1"
+        assert len(calls) == 3
+        assert delays == [0.01, 0.02]
+        counters = retrying_layer.transaction_runner.counters.snapshot()
+        assert (counters["transactions"], counters["retries"], counters["lock_timeouts"]) == (1, 2, 2)
+
+    def test_contention_exhausted(self, retrying_layer, delays, monkeypatch):
+        self.busy_record_receipt(monkeypatch, failures=3)
+
+        with pytest.raises(TransactionContention):
+            asyncio.run(retrying_layer.record_receipt("test", "NT1"))
+
+        assert len(delays) == 2
+        assert retrying_layer.transaction_runner.counters.snapshot()["exhausted"] == 1
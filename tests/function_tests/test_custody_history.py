@@ -0,0 +1,164 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from database.database import DatabaseLayer
+from database.partitions import month_start, next_month, monthly_partition_name, create_monthly_partitions
+from exceptions import CustodyHistoryNotFound, TubeNotFound, OccupiedWellsNotFound, SampleIdBadFormatting, \
+    BarcodeBadFormat, OccupiedDestinationTube
+
+START = datetime.datetime(2026, 10, 13, 9, 0, tzinfo=datetime.timezone.utc)
+
+
+class FakeClock:
+    """Advances by one hour on every call"""
+
+    def __init__(self, start=START):
+        self.now = start
+
+    def __call__(self):
+        self.now += datetime.timedelta(hours=1)
+        return self.now
+
+
+def at(hours):
+    return START + datetime.timedelta(hours=hours)
+
+
+@pytest.fixture(scope="function")
+def layer(session):
+    return DatabaseLayer(session, clock=FakeClock())
+
+
+class TestCustodyEvents:
+
+    def test_sample_history(self, layer):
+        sample = layer.record_receipt("test", "NT1")  # 10:00
+        layer.tube_transfer("NT1", "NT2")  # 11:00
+        layer.add_to_plate(sample.id, "DN1", "B3")  # 12:00
+
+        history = layer.custody_history(sample.id)
+
+        assert [(event.occurred_at, event.event_type, event.tube_barcode, event.source_tube_barcode,
+                 event.plate_barcode, event.well_position) for event in history.events] == [
+            (at(1), "received", "NT1", None, None, None),
+            (at(2), "transferred", "NT2", "NT1", None, None),
+            (at(3), "plated", None, None, "DN1", "B3"),
+        ]
+
+    def test_tube_history_includes_departures(self, layer):
+        first = layer.record_receipt("first", "NT1")
+        layer.tube_transfer("NT1", "NT2")
+        second = layer.record_receipt("second", "NT1")
+
+        history = layer.custody_history("NT1")
+
+        assert [(event.sample_id, event.event_type) for event in history.events] == \
+            [(first.id, "received"), (first.id, "transferred"), (second.id, "received")]
+
+    def test_bulk_writes_are_recorded(self, layer):
+        report = layer.record_receipts_bulk([("a", "NT1"), ("b", "NT2"), ("c", "NT3")])
+        layer.tube_transfer_batch([("NT1", "NT2"), ("NT2", "NT1")])
+        layer.load_plate_layout("DN1", {"A1": report.sample_ids["NT1"]})
+        layer.pack_samples([report.sample_ids["NT3"]], ["DN1"])
+
+        assert [event.event_type for event in layer.custody_history(report.sample_ids["NT1"]).events] == \
+            ["received", "transferred", "plated"]
+        assert [event.well_position for event in layer.custody_history("DN1").events] == ["A1", "A2"]
+
+    def test_failed_write_is_not_recorded(self, layer):
+        layer.record_receipt("test", "NT1")
+        layer.record_receipt("test", "NT2")
+
+        with pytest.raises(OccupiedDestinationTube):
+            layer.tube_transfer("NT1", "NT2")
+
+        assert len(layer.custody_history("NT2").events) == 1
+
+    def test_history_not_found(self, layer):
+        with pytest.raises(CustodyHistoryNotFound):
+            layer.custody_history("NT1")
+        with pytest.raises(SampleIdBadFormatting):
+            layer.custody_history(0)
+        with pytest.raises(BarcodeBadFormat):
+            layer.custody_history("XX1")
+
+
+class TestListSamplesAsOf:
+
+    def test_tube_as_of(self, layer):
+        first = layer.record_receipt("first", "NT1")  # 10:00
+        layer.tube_transfer("NT1", "NT2")  # 11:00
+        second = layer.record_receipt("second", "NT1")  # 12:00
+
+        assert layer.list_samples_in("NT1", as_of=at(1)).sample_id == first.id
+        assert layer.list_samples_in("NT1", as_of=at(3)).sample_id == second.id
+        assert layer.list_samples_in("NT2", as_of=at(2)).customer_sample_name == "first"
+        with pytest.raises(TubeNotFound):
+            layer.list_samples_in("NT1", as_of=at(2))
+        with pytest.raises(TubeNotFound):
+            layer.list_samples_in("NT2", as_of=at(1))
+
+    def test_plate_as_of(self, layer):
+        first = layer.record_receipt("first", "NT1")  # 10:00
+        second = layer.record_receipt("second", "NT2")  # 11:00
+        layer.add_to_plate(first.id, "DN1", "A2")  # 12:00
+        layer.add_to_plate(second.id, "DN1", "A1")  # 13:00
+
+        report = layer.list_samples_in("DN1", as_of=at(3))
+
+        assert [(well.well_position, well.sample_id) for well in report.wells] == [("A2", first.id)]
+        assert [well.well_position for well in layer.list_samples_in("DN1", as_of=at(4)).wells] == ["A1", "A2"]
+        with pytest.raises(OccupiedWellsNotFound):
+            layer.list_samples_in("DN1", as_of=at(2))
+
+    def test_naive_as_of_is_local_time(self, layer):
+        layer.record_receipt("first", "NT1")
+
+        local_time = at(1).astimezone().replace(tzinfo=None)
+
+        assert layer.list_samples_in("NT1", as_of=local_time).customer_sample_name == "first"
+
+
+class TestPartitions:
+
+    def test_monthly_partitions(self, session):
+        current_month = month_start(datetime.datetime.now(datetime.timezone.utc))
+
+        partitions = set(session.scalars(text(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent WHERE parent.relname = 'custody_events'"
+        )))
+
+        assert {"custody_events_default", monthly_partition_name("custody_events", current_month),
+                monthly_partition_name("custody_events", next_month(current_month))} <= partitions
+
+    def test_as_of_reads_only_earlier_partitions(self, session):
+        current_month = month_start(datetime.datetime.now(datetime.timezone.utc))
+
+        plan = "\n".join(session.scalars(text(
+            "EXPLAIN SELECT sample_id FROM custody_events WHERE tube_barcode = 'NT1' AND occurred_at <= :as_of"
+        ), {"as_of": current_month + datetime.timedelta(days=1)}))
+
+        assert monthly_partition_name("custody_events", current_month) in plan
+        assert monthly_partition_name("custody_events", next_month(current_month)) not in plan
+
+    def test_create_partition_moves_rows_from_default(self, session):
+        # Past the months created ahead, so the event lands in the default partition
+        month = month_start(datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=366))
+        layer = DatabaseLayer(session, clock=FakeClock(start=month))
+        layer.record_receipt("test", "NT1")
+
+        def partition_of_event():
+            return session.scalar(text(
+                "SELECT tableoid::regclass::text FROM custody_events WHERE tube_barcode = 'NT1'"
+            ))
+
+        assert partition_of_event() == "custody_events_default"
+
+        create_monthly_partitions(session.connection(), "custody_events", first_month=month, months=1)
+
+        assert partition_of_event() == monthly_partition_name("custody_events", month)
+        assert session.scalar(text("SELECT count(*) FROM custody_events_default")) == 0
+        assert layer.list_samples_in("NT1").customer_sample_name == "test"
@@ -0,0 +1,54 @@
+import pytest
+
+from exceptions import BarcodeBadFormat, TubeBarcodeBadFormat
+from reports import InventoryRow
+
+
+class TestIterInventory:
+
+    def test_iter_inventory(self, database_layer, sample_one, sample_two):
+        database_layer.add_to_plate(sample_one.id, "DN1", "B2")
+        database_layer.add_to_plate(sample_one.id, "DN2", "A1")
+
+        rows = list(database_layer.iter_inventory())
+
+        assert rows == [
+            InventoryRow(sample_one.id, "test", "NT123", "DN1", "B2"),
+            InventoryRow(sample_one.id, "test", "NT123", "DN2", "A1"),
+            InventoryRow(sample_two.id, "test second sample", "NT333", None, None),
+        ]
+
+    def test_iter_inventory_small_batches(self, database_layer):
+        samples = [database_layer.record_receipt(f"sample {number}", f"NT{number}") for number in range(1, 8)]
+
+        rows = list(database_layer.iter_inventory(batch_size=2))
+
+        assert [row.sample_id for row in rows] == [sample.id for sample in samples]
+
+    def test_iter_inventory_plate_prefix(self, database_layer, sample_one, sample_two):
+        database_layer.add_to_plate(sample_one.id, "DN12", "A1")
+        database_layer.add_to_plate(sample_two.id, "DN2", "A1")
+
+        rows = list(database_layer.iter_inventory(plate_prefix="DN1"))
+
+        assert rows == [InventoryRow(sample_one.id, "test", "NT123", "DN12", "A1")]
+
+    def test_iter_inventory_tube_range(self, database_layer, sample_one, sample_two):
+        rows = list(database_layer.iter_inventory(first_barcode="NT200", last_barcode="NT0400"))
+
+        assert [row.tube_barcode for row in rows] == ["NT333"]
+
+    def test_iter_inventory_open_plate_range(self, database_layer, sample_one, sample_two):
+        database_layer.add_to_plate(sample_one.id, "DN5", "A1")
+        database_layer.add_to_plate(sample_two.id, "DN50", "A1")
+
+        rows = list(database_layer.iter_inventory(first_barcode="DN10"))
+
+        assert [(row.plate_barcode, row.sample_id) for row in rows] == [("DN50", sample_two.id)]
+
+    def test_iter_inventory_bad_range(self, database_layer):
+        with pytest.raises(BarcodeBadFormat):
+            database_layer.iter_inventory(first_barcode="wrong_format")
+
+        with pytest.raises(TubeBarcodeBadFormat):
+            database_layer.iter_inventory(first_barcode="NT1", last_barcode="DN2")
@@ -1,6 +1,7 @@
 import pytest
 
 from database.database import TubeReport, PlateReport
+from reports import PlateWell
 from exceptions import BarcodeBadFormat, TubeNotFound, OccupiedWellsNotFound
 
 
@@ -31,8 +32,10 @@ def well_three(sample_one, plate_barcode, database_layer):
 
 
 @pytest.fixture(scope="function")
-def wells_and_samples(well_one, well_two, well_three, sample_one):
-    yield [(well_one, sample_one), (well_two, sample_one), (well_three, sample_one)]
+def plate_wells(well_one, well_two, well_three, sample_one):
+    yield [PlateWell("A1", 1, 1, sample_one.id, sample_one.customer_sample_name),
+           PlateWell("A2", 1, 2, sample_one.id, sample_one.customer_sample_name),
+           PlateWell("B2", 2, 2, sample_one.id, sample_one.customer_sample_name)]
 
 
 class TestListSamplesIn:
@@ -45,12 +48,12 @@ class TestListSamplesIn:
         assert tube_report.sample_id == sample_one.id
         assert tube_report.customer_sample_name == sample_one.customer_sample_name
 
-    def test_list_samples_in_plate(self, database_layer, plate_barcode, wells_and_samples):
+    def test_list_samples_in_plate(self, database_layer, plate_barcode, plate_wells):
         plate_report = database_layer.list_samples_in(container_barcode=plate_barcode)
 
         assert isinstance(plate_report, PlateReport)
         assert plate_report.barcode == plate_barcode
-        assert set(plate_report.wells_and_samples) == set(wells_and_samples)
+        assert plate_report.wells == plate_wells
 
     def test_list_samples_in_tube_not_found(self, database_layer):
         with pytest.raises(TubeNotFound):
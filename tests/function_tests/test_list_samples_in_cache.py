@@ -0,0 +1,98 @@
+import pytest
+
+from database.database import DatabaseLayer
+from database.report_cache import ReportCache
+from exceptions import TubeNotFound
+
+
+@pytest.fixture(scope="function")
+def report_cache():
+    yield ReportCache(max_size=16, ttl_seconds=None)
+
+
+@pytest.fixture(scope="function")
+def cached_database_layer(session, report_cache):
+    yield DatabaseLayer(session, report_cache=report_cache)
+
+
+class TestListSamplesInCache:
+
+    def test_tube_report_cached(self, cached_database_layer, report_cache):
+        cached_database_layer.record_receipt(customer_sample_name="test", tube_barcode="NT1")
+
+        first_report = cached_database_layer.list_samples_in("NT1")
+        second_report = cached_database_layer.list_samples_in("NT1")
+
+        assert second_report is first_report
+        assert (report_cache.hits, report_cache.misses) == (1, 1)
+
+    def test_missing_tube_not_cached(self, cached_database_layer, report_cache):
+        with pytest.raises(TubeNotFound):
+            cached_database_layer.list_samples_in("NT1")
+
+        assert len(report_cache) == 0
+
+    def test_tube_transfer_invalidates_both_tubes(self, cached_database_layer, report_cache):
+        sample = cached_database_layer.record_receipt(customer_sample_name="test", tube_barcode="NT1")
+        cached_database_layer.list_samples_in("NT1")
+        with pytest.raises(TubeNotFound):
+            cached_database_layer.list_samples_in("NT2")
+
+        cached_database_layer.tube_transfer("NT1", "NT2")
+
+        with pytest.raises(TubeNotFound):
+            cached_database_layer.list_samples_in("NT1")
+        assert cached_database_layer.list_samples_in("NT2").sample_id == sample.id
+
+    def test_tube_transfer_batch_invalidates_tubes(self, cached_database_layer):
+        cached_database_layer.record_receipt(customer_sample_name="first", tube_barcode="NT1")
+        cached_database_layer.record_receipt(customer_sample_name="second", tube_barcode="NT2")
+        cached_database_layer.list_samples_in("NT1")
+        cached_database_layer.list_samples_in("NT2")
+
+        cached_database_layer.tube_transfer_batch([("NT1", "NT2"), ("NT2", "NT1")])
+
+        assert cached_database_layer.list_samples_in("NT1").customer_sample_name == "second"
+        assert cached_database_layer.list_samples_in("NT2").customer_sample_name == "first"
+
+    def test_record_receipt_invalidates_tube(self, cached_database_layer, report_cache):
+        report_cache.put("NT1", "stale report")
+
+        cached_database_layer.record_receipt(customer_sample_name="test", tube_barcode="NT1")
+
+        assert cached_database_layer.list_samples_in("NT1").customer_sample_name == "test"
+
+    def test_record_receipts_bulk_invalidates_tubes(self, cached_database_layer, report_cache):
+        report_cache.put("NT1", "stale report")
+
+        cached_database_layer.record_receipts_bulk([("test", "NT1")])
+
+        assert cached_database_layer.list_samples_in("NT1").customer_sample_name == "test"
+
+    def test_add_to_plate_invalidates_plate(self, cached_database_layer, sample_one):
+        cached_database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        assert len(cached_database_layer.list_samples_in("DN1").wells) == 1
+
+        cached_database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A2")
+
+        assert len(cached_database_layer.list_samples_in("DN1").wells) == 2
+
+    def test_bulk_plate_writes_invalidate_plate(self, cached_database_layer, sample_one):
+        cached_database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        cached_database_layer.list_samples_in("DN1")
+
+        cached_database_layer.load_plate_layout("DN1", {"B1": sample_one.id})
+        assert len(cached_database_layer.list_samples_in("DN1").wells) == 2
+
+        cached_database_layer.pack_samples([sample_one.id], ["DN1"])
+        assert len(cached_database_layer.list_samples_in("DN1").wells) == 3
+
+    def test_cached_plate_report_survives_commit(self, cached_database_layer, sample_one, sample_two):
+        cached_database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        cached_database_layer.list_samples_in("DN1")
+
+        cached_database_layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN2", well_position="A1")
+
+        well, = cached_database_layer.list_samples_in("DN1").wells
+        assert (well.row, well.col, well.sample_id) == (1, 1, sample_one.id)
+        assert well.customer_sample_name == sample_one.customer_sample_name
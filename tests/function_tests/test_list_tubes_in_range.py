@@ -0,0 +1,36 @@
+import pytest
+
+from database.scheme import Sample, Well
+from exceptions import TubeBarcodeBadFormat
+
+
+class TestListTubesInRange:
+
+    def test_list_tubes_in_range(self, database_layer):
+        for tube_barcode in ("NT999", "NT1000", "NT01500", "NT2000", "NT2001"):
+            database_layer.record_receipt(customer_sample_name=tube_barcode, tube_barcode=tube_barcode)
+
+        tube_reports = database_layer.list_tubes_in_range("NT1000", "NT2000")
+
+        assert [tube_report.barcode for tube_report in tube_reports] == ["NT1000", "NT01500", "NT2000"]
+        assert [tube_report.customer_sample_name for tube_report in tube_reports] == ["NT1000", "NT01500", "NT2000"]
+
+    def test_list_tubes_in_range_empty(self, database_layer, sample_one):
+        assert database_layer.list_tubes_in_range("NT1", "NT2") == []
+
+    def test_list_tubes_in_range_bad_format(self, database_layer):
+        with pytest.raises(TubeBarcodeBadFormat):
+            database_layer.list_tubes_in_range("NT1", "DN2")
+
+    def test_barcode_numbers_follow_writes(self, database_layer, session, sample_one, sample_two):
+        database_layer.tube_transfer(sample_one.tube_barcode, "NT42")
+        database_layer.tube_transfer_batch([(sample_two.tube_barcode, "NT0043")])
+        database_layer.record_receipts_bulk([("bulk", "NT44")])
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN5", well_position="A1")
+        database_layer.load_plate_layout("DN06", {"A1": sample_two.id})
+
+        tube_barcode_numbers = dict(session.query(Sample.tube_barcode, Sample.tube_barcode_number).all())
+        assert tube_barcode_numbers == {"NT42": 42, "NT0043": 43, "NT44": 44}
+
+        plate_barcode_numbers = dict(session.query(Well.plate_barcode, Well.plate_barcode_number).all())
+        assert plate_barcode_numbers == {"DN5": 5, "DN06": 6}
@@ -0,0 +1,60 @@
+import pytest
+
+from database.scheme import Well
+from exceptions import PlateBarcodeBadFormat, SampleNotFound, SampleIdBadFormatting, WellPositionOccupied, \
+    WellPositionBadFormatting
+
+
+class TestLoadPlateLayout:
+
+    def test_load_plate_layout(self, database_layer, session, sample_one, sample_two):
+        report = database_layer.load_plate_layout("DN1", {"A1": sample_one.id, "h12": sample_two.id})
+
+        assert report.conflicts == []
+        assert report.loaded_wells == {"A1": sample_one.id, "H12": sample_two.id}
+
+        wells = session.query(Well).filter(Well.plate_barcode == "DN1").all()
+        assert {(well.row, well.col, well.sample_id) for well in wells} == {(1, 1, sample_one.id),
+                                                                             (8, 12, sample_two.id)}
+
+    def test_load_plate_layout_empty(self, database_layer):
+        report = database_layer.load_plate_layout("DN1", {})
+
+        assert report.loaded_wells == {}
+        assert report.conflicts == []
+
+    def test_load_plate_layout_bad_plate_barcode(self, database_layer, sample_one):
+        with pytest.raises(PlateBarcodeBadFormat):
+            database_layer.load_plate_layout("PR1", {"A1": sample_one.id})
+
+    def test_load_plate_layout_bad_formats(self, database_layer, sample_one):
+        report = database_layer.load_plate_layout("DN1", {"A1": sample_one.id, "A13": sample_one.id, "B1": -1})
+
+        assert report.loaded_wells == {}
+        errors = {conflict.well_position: type(conflict.error) for conflict in report.conflicts}
+        assert errors == {"A13": WellPositionBadFormatting, "B1": SampleIdBadFormatting}
+
+    def test_load_plate_layout_sample_not_found(self, database_layer, session, sample_one):
+        report = database_layer.load_plate_layout("DN1", {"A1": sample_one.id, "A2": 993})
+
+        assert report.loaded_wells == {}
+        assert [conflict.well_position for conflict in report.conflicts] == ["A2"]
+        assert isinstance(report.conflicts[0].error, SampleNotFound)
+        assert session.query(Well).filter(Well.plate_barcode == "DN1").count() == 0
+
+    def test_load_plate_layout_occupied_well(self, database_layer, session, sample_one):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        report = database_layer.load_plate_layout("DN1", {"A1": sample_one.id, "A2": sample_one.id})
+
+        assert report.loaded_wells == {}
+        assert [conflict.well_position for conflict in report.conflicts] == ["A1"]
+        assert isinstance(report.conflicts[0].error, WellPositionOccupied)
+        assert session.query(Well).filter(Well.plate_barcode == "DN1").count() == 1
+
+    def test_load_plate_layout_duplicate_position(self, database_layer, sample_one):
+        report = database_layer.load_plate_layout("DN1", {"a1": sample_one.id, "A1": sample_one.id})
+
+        assert report.loaded_wells == {}
+        assert len(report.conflicts) == 1
+        assert isinstance(report.conflicts[0].error, WellPositionOccupied)
@@ -0,0 +1,46 @@
+import pytest
+
+from reports import WellLocation
+from exceptions import SampleNotFound, SampleNameNotFound, SampleIdBadFormatting
+
+
+class TestLocateSample:
+
+    def test_locate_sample_in_tube_only(self, database_layer, sample_one):
+        locations = database_layer.locate_sample(sample_one.id)
+
+        assert len(locations) == 1
+        assert locations[0].sample_id == sample_one.id
+        assert locations[0].customer_sample_name == "test"
+        assert locations[0].tube_barcode == "NT123"
+        assert locations[0].wells == []
+
+    def test_locate_sample_in_wells(self, database_layer, sample_one, sample_two):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN2", well_position="B3")
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A2")
+        database_layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN1", well_position="A1")
+
+        locations = database_layer.locate_sample(sample_one.id)
+
+        assert locations[0].wells == [WellLocation("DN1", "A2"), WellLocation("DN2", "B3")]
+
+    def test_locate_sample_by_name(self, database_layer, sample_one):
+        other_sample = database_layer.record_receipt(customer_sample_name="test", tube_barcode="NT124")
+        database_layer.record_receipt(customer_sample_name="another", tube_barcode="NT125")
+
+        locations = database_layer.locate_sample("test")
+
+        assert [location.sample_id for location in locations] == sorted([sample_one.id, other_sample.id])
+        assert [location.tube_barcode for location in locations] == ["NT123", "NT124"]
+
+    def test_locate_sample_not_found(self, database_layer):
+        with pytest.raises(SampleNotFound):
+            database_layer.locate_sample(1000)
+
+    def test_locate_sample_name_not_found(self, database_layer):
+        with pytest.raises(SampleNameNotFound):
+            database_layer.locate_sample("unknown")
+
+    def test_locate_sample_bad_id(self, database_layer):
+        with pytest.raises(SampleIdBadFormatting):
+            database_layer.locate_sample(0)
@@ -0,0 +1,56 @@
+import pytest
+
+from database.scheme import Well
+from exceptions import PlateBarcodeBadFormat, SampleNotFound, SampleIdBadFormatting, NotEnoughFreeWells
+from plate_occupancy import COLUMN_MAJOR
+
+
+class TestPackSamples:
+
+    def test_pack_samples(self, database_layer, sample_one, sample_two):
+        database_layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        reports = database_layer.pack_samples([sample_one.id, sample_two.id], ["DN1"])
+
+        assert len(reports) == 1
+        assert reports[0].barcode == "DN1"
+        assert reports[0].loaded_wells == {"A2": sample_one.id, "A3": sample_two.id}
+
+    def test_pack_samples_column_major(self, database_layer, sample_one, sample_two):
+        reports = database_layer.pack_samples([sample_one.id, sample_two.id], ["DN1"], fill_order=COLUMN_MAJOR)
+
+        assert reports[0].loaded_wells == {"A1": sample_one.id, "B1": sample_two.id}
+
+    def test_pack_samples_several_plates(self, database_layer, session, sample_one, sample_two):
+        database_layer.pack_samples([sample_one.id] * 95, ["DN1"])
+
+        reports = database_layer.pack_samples([sample_one.id, sample_two.id, sample_two.id], ["DN1", "DN2"])
+
+        assert [report.barcode for report in reports] == ["DN1", "DN2"]
+        assert reports[0].loaded_wells == {"H12": sample_one.id}
+        assert reports[1].loaded_wells == {"A1": sample_two.id, "A2": sample_two.id}
+        assert session.query(Well).count() == 98
+
+    def test_pack_samples_unused_plate(self, database_layer, sample_one):
+        reports = database_layer.pack_samples([sample_one.id], ["DN1", "DN2"])
+
+        assert [report.barcode for report in reports] == ["DN1"]
+
+    def test_pack_samples_not_enough_free_wells(self, database_layer, session, sample_one):
+        with pytest.raises(NotEnoughFreeWells):
+            database_layer.pack_samples([sample_one.id] * 97, ["DN1"])
+
+    def test_pack_samples_empty(self, database_layer):
+        assert database_layer.pack_samples([], ["DN1"]) == []
+
+    def test_pack_samples_sample_not_found(self, database_layer, sample_one):
+        with pytest.raises(SampleNotFound):
+            database_layer.pack_samples([sample_one.id, 993], ["DN1"])
+
+    def test_pack_samples_bad_sample_id(self, database_layer):
+        with pytest.raises(SampleIdBadFormatting):
+            database_layer.pack_samples([-1], ["DN1"])
+
+    def test_pack_samples_bad_plate_barcode(self, database_layer, sample_one):
+        with pytest.raises(PlateBarcodeBadFormat):
+            database_layer.pack_samples([sample_one.id], ["PR1"])
@@ -0,0 +1,99 @@
+import datetime
+
+import pytest
+
+from database.database import DatabaseLayer
+from database.scheme import PlateSummary
+from exceptions import SampleNotFound
+
+
+class SteppingClock:
+    """Returns 09:00, 10:00, ... on consecutive calls"""
+
+    def __init__(self):
+        self.now = datetime.datetime(2026, 10, 13, 8, tzinfo=datetime.timezone.utc)
+
+    def __call__(self):
+        self.now += datetime.timedelta(hours=1)
+        return self.now
+
+
+def at(hour):
+    return datetime.datetime(2026, 10, 13, hour, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture(scope="function")
+def layer(session):
+    return DatabaseLayer(session, clock=SteppingClock())
+
+
+class TestPlateSummaryMaintenance:
+
+    def test_add_to_plate(self, layer, session, sample_one, sample_two):
+        layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+        layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN1")
+
+        plate_summary = session.get(PlateSummary, "DN1")
+        assert plate_summary.well_count == 2
+        # Times of custody events of the placements
+        assert (plate_summary.first_filled_at, plate_summary.last_filled_at) == (at(9), at(10))
+        assert plate_summary.last_sample_id == sample_two.id
+
+    def test_load_plate_layout(self, layer, session, sample_one, sample_two):
+        layer.load_plate_layout("DN1", {"B1": sample_two.id, "A1": sample_one.id})
+
+        plate_summary = session.get(PlateSummary, "DN1")
+        assert plate_summary.well_count == 2
+        assert plate_summary.last_sample_id == sample_one.id
+
+    def test_pack_samples(self, layer, session, sample_one, sample_two):
+        layer.pack_samples([sample_one.id] * 95 + [sample_two.id, sample_one.id], ["DN1", "DN2"])
+
+        assert session.get(PlateSummary, "DN1").well_count == 96
+        assert session.get(PlateSummary, "DN1").last_sample_id == sample_two.id
+        assert session.get(PlateSummary, "DN2").well_count == 1
+
+    def test_failed_placement_keeps_statistics(self, layer, session, sample_one):
+        layer.add_to_plate(sample_id=sample_one.id, plate_barcode="DN1", well_position="A1")
+
+        with pytest.raises(SampleNotFound):
+            layer.add_to_plate(sample_id=993, plate_barcode="DN1")
+
+        plate_summary = session.get(PlateSummary, "DN1")
+        assert (plate_summary.well_count, plate_summary.last_sample_id) == (1, sample_one.id)
+
+
+class TestPlateStatus:
+
+    @pytest.fixture(scope="function")
+    def plates(self, layer, sample_one, sample_two):
+        layer.pack_samples([sample_one.id] * 96, ["DN1"])
+        layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN2")
+        layer.add_to_plate(sample_id=sample_two.id, plate_barcode="DN3")
+        # Plate row of failed placement, the plate has no wells
+        with pytest.raises(SampleNotFound):
+            layer.add_to_plate(sample_id=993, plate_barcode="DN4")
+
+    def test_all_plates(self, layer, plates):
+        report = layer.plate_status()
+
+        assert report.selection == "all"
+        assert [(plate.plate_barcode, plate.well_count, plate.free_wells) for plate in report.plates] == \
+            [("DN1", 96, 0), ("DN2", 1, 95), ("DN3", 1, 95)]
+        assert report.free_wells == 190
+
+    def test_partial(self, layer, plates):
+        assert [plate.plate_barcode for plate in layer.plate_status(partial=True).plates] == ["DN2", "DN3"]
+
+    def test_full(self, layer, plates):
+        assert [plate.plate_barcode for plate in layer.plate_status(full=True).plates] == ["DN1"]
+
+    def test_empty_since(self, layer, plates):
+        last_filled_at = {plate.plate_barcode: plate.last_filled_at for plate in layer.plate_status().plates}
+
+        report = layer.plate_status(empty_since=last_filled_at["DN3"])
+
+        # Full DN1 was filled earlier but has no free wells
+        assert [plate.plate_barcode for plate in report.plates] == ["DN2"]
+        assert last_filled_at["DN1"] < last_filled_at["DN2"] < last_filled_at["DN3"]
+        assert report.selection == f"partial, empty since {last_filled_at['DN3'].isoformat()}"
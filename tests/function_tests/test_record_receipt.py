@@ -1,4 +1,6 @@
 import pytest
+
+from database import dialects
 from exceptions import TubeBarcodeBadFormat, SampleAlreadyReceived
 
 
@@ -36,9 +38,35 @@ class TestRecordReceipt:
         with pytest.raises(TubeBarcodeBadFormat):
             database_layer.record_receipt(customer_sample_name="test_tube", tube_barcode="123NT")
 
+    @pytest.mark.parametrize("tube_barcode", ["NT1\n", "NT\u0661"])
+    def test_record_receipt_with_wrong_tube_barcode_format_non_ascii_digits(self, database_layer, tube_barcode):
+        with pytest.raises(TubeBarcodeBadFormat):
+            database_layer.record_receipt(customer_sample_name="test_tube", tube_barcode=tube_barcode)
+
     def test_record_receipt_dublicate_tubes(self, database_layer):
         # Any str convertable objects can be passed in function
         new_sample = database_layer.record_receipt(customer_sample_name="test_tube", tube_barcode="NT1")
 
         with pytest.raises(SampleAlreadyReceived):
             database_layer.record_receipt(customer_sample_name="test_tube", tube_barcode="NT1")
+
+    def test_record_receipt_duplicate_keeps_session_usable(self, database_layer, session):
+        first_sample = database_layer.record_receipt(customer_sample_name="test_tube", tube_barcode="NT1")
+
+        with pytest.raises(SampleAlreadyReceived):
+            database_layer.record_receipt(customer_sample_name="other", tube_barcode="NT1")
+
+        # No rollback on duplicate, returned sample stays persistent and loaded
+        assert first_sample in session
+        assert first_sample.customer_sample_name == "test_tube"
+        assert database_layer.list_samples_in("NT1").sample_id == first_sample.id
+
+    def test_record_receipt_duplicate_without_on_conflict(self, database_layer, session, monkeypatch):
+        # Dialects without ON CONFLICT insert in a savepoint, the duplicate is rolled back alone
+        monkeypatch.setattr(dialects, "ON_CONFLICT_DIALECTS", ())
+        first_sample = database_layer.record_receipt(customer_sample_name="test_tube", tube_barcode="NT1")
+
+        with pytest.raises(SampleAlreadyReceived):
+            database_layer.record_receipt(customer_sample_name="other", tube_barcode="NT1")
+
+        assert database_layer.list_samples_in("NT1").sample_id == first_sample.id
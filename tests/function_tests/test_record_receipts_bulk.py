@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import database
+from database.database import DatabaseLayer
+from database.scheme import Base, Sample
+from exceptions import TubeBarcodeBadFormat, SampleAlreadyReceived, ManifestRowIncomplete
+
+
+class TestRecordReceiptsBulk:
+
+    def test_record_receipts_bulk(self, database_layer, session):
+        report = database_layer.record_receipts_bulk([("first", "NT1"), ("second", "NT2"), ("third", "NT3")])
+
+        assert report.rejections == []
+        assert set(report.sample_ids) == {"NT1", "NT2", "NT3"}
+
+        for tube_barcode, sample_id in report.sample_ids.items():
+            assert session.get(Sample, sample_id).tube_barcode == tube_barcode
+
+    def test_record_receipts_bulk_empty(self, database_layer):
+        report = database_layer.record_receipts_bulk([])
+
+        assert report.sample_ids == {}
+        assert report.rejections == []
+
+    def test_record_receipts_bulk_bad_barcode(self, database_layer):
+        report = database_layer.record_receipts_bulk([("first", "NT1"), ("second", "bad_barcode")])
+
+        assert set(report.sample_ids) == {"NT1"}
+        assert len(report.rejections) == 1
+        assert report.rejections[0].row_number == 2
+        assert report.rejections[0].barcode == "bad_barcode"
+        assert isinstance(report.rejections[0].error, TubeBarcodeBadFormat)
+
+    def test_record_receipts_bulk_duplicate_in_rows(self, database_layer):
+        report = database_layer.record_receipts_bulk([("first", "NT1"), ("second", "NT1")])
+
+        assert set(report.sample_ids) == {"NT1"}
+        assert [rejection.row_number for rejection in report.rejections] == [2]
+        assert isinstance(report.rejections[0].error, SampleAlreadyReceived)
+
+    def test_record_receipts_bulk_already_received(self, database_layer, sample_one):
+        report = database_layer.record_receipts_bulk([("first", "NT1"), ("second", sample_one.tube_barcode)])
+
+        assert set(report.sample_ids) == {"NT1"}
+        assert [rejection.row_number for rejection in report.rejections] == [2]
+        assert isinstance(report.rejections[0].error, SampleAlreadyReceived)
+
+    def test_record_receipts_bulk_rejections_ordered_by_row(self, database_layer, sample_one):
+        report = database_layer.record_receipts_bulk([
+            ("first", sample_one.tube_barcode), ("second", "bad_barcode"), ("third", "NT1")
+        ])
+
+        assert [rejection.row_number for rejection in report.rejections] == [1, 2]
+
+    def test_record_receipts_bulk_incomplete_rows(self, database_layer):
+        report = database_layer.record_receipts_bulk([("first", "NT1"), ("second", None), (None, "NT3"), ("fourth",)])
+
+        assert set(report.sample_ids) == {"NT1"}
+        assert [(rejection.row_number, rejection.barcode) for rejection in report.rejections] == \
+            [(2, ""), (3, "NT3"), (4, "")]
+        assert all(isinstance(rejection.error, ManifestRowIncomplete) for rejection in report.rejections)
+
+    def test_insert_receipts_in_batches(self, database_layer, sample_one, session, monkeypatch):
+        monkeypatch.setattr(database, "RECEIPTS_BATCH_SIZE", 2)
+
+        sample_ids = database_layer._insert_receipts_in_batches([
+            (1, "first", "NT1", 1), (2, "second", sample_one.tube_barcode, 123), (3, "third", "NT3", 3)
+        ])
+
+        assert set(sample_ids) == {"NT1", "NT3"}
+        assert session.get(Sample, sample_ids["NT3"]).customer_sample_name == "third"
+
+    def test_record_receipts_bulk_empty_name(self, database_layer, session):
+        # PostgreSQL path goes through COPY, empty name must not become NULL
+        report = database_layer.record_receipts_bulk([("", "NT1")])
+
+        assert session.get(Sample, report.sample_ids["NT1"]).customer_sample_name == ""
+
+    def test_record_receipts_bulk_empty_name_sqlite(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with Session(engine) as sqlite_session:
+            report = DatabaseLayer(sqlite_session).record_receipts_bulk([("", "NT1")])
+
+            assert sqlite_session.get(Sample, report.sample_ids["NT1"]).customer_sample_name == ""
+        engine.dispose()
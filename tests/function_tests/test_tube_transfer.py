@@ -12,6 +12,11 @@ class TestTubeTransfer:
         with pytest.raises(TubeBarcodeBadFormat):
             database_layer.tube_transfer(sample_one.tube_barcode, "999")
 
+    @pytest.mark.parametrize("tube_barcode", ["NT999\n", "NT\u0661"])
+    def test_tube_transfer_bad_format_non_ascii_digits(self, database_layer, sample_one, tube_barcode):
+        with pytest.raises(TubeBarcodeBadFormat):
+            database_layer.tube_transfer(sample_one.tube_barcode, tube_barcode)
+
     def test_tube_transfer_not_existing_source_tube(self, database_layer):
         with pytest.raises(TubeNotFound):
             database_layer.tube_transfer("NT100000", "NT999")
@@ -0,0 +1,72 @@
+import pytest
+
+from database.scheme import Sample
+from exceptions import TubeBarcodeBadFormat, OccupiedDestinationTube, TubeNotFound, ConflictingTubeTransfers
+
+
+def tube_barcodes(session):
+    return {sample.id: sample.tube_barcode for sample in session.query(Sample).all()}
+
+
+class TestTubeTransferBatch:
+
+    def test_tube_transfer_batch(self, database_layer, session, sample_one, sample_two):
+        database_layer.tube_transfer_batch([(sample_one.tube_barcode, "NT1"), (sample_two.tube_barcode, "NT2")])
+
+        assert tube_barcodes(session) == {sample_one.id: "NT1", sample_two.id: "NT2"}
+
+    def test_tube_transfer_batch_empty(self, database_layer):
+        database_layer.tube_transfer_batch([])
+
+    def test_tube_transfer_batch_swap(self, database_layer, session, sample_one, sample_two):
+        tube_one, tube_two = sample_one.tube_barcode, sample_two.tube_barcode
+
+        database_layer.tube_transfer_batch([(tube_one, tube_two), (tube_two, tube_one)])
+
+        assert tube_barcodes(session) == {sample_one.id: tube_two, sample_two.id: tube_one}
+
+    def test_tube_transfer_batch_chain(self, database_layer, session, sample_one, sample_two):
+        tube_one, tube_two = sample_one.tube_barcode, sample_two.tube_barcode
+
+        database_layer.tube_transfer_batch([(tube_two, "NT1"), (tube_one, tube_two)])
+
+        assert tube_barcodes(session) == {sample_one.id: tube_two, sample_two.id: "NT1"}
+
+    def test_tube_transfer_batch_same_tube(self, database_layer, session, sample_one):
+        transferred = database_layer.tube_transfer_batch([(sample_one.tube_barcode, sample_one.tube_barcode)])
+
+        assert transferred == 0
+        assert tube_barcodes(session) == {sample_one.id: sample_one.tube_barcode}
+
+    def test_tube_transfer_batch_same_tube_bad_format(self, database_layer):
+        with pytest.raises(TubeBarcodeBadFormat):
+            database_layer.tube_transfer_batch([("XX", "XX")])
+
+    def test_tube_transfer_batch_counts_applied_transfers(self, database_layer, session, sample_one, sample_two):
+        transferred = database_layer.tube_transfer_batch([(sample_one.tube_barcode, "NT1"),
+                                                          (sample_two.tube_barcode, sample_two.tube_barcode)])
+
+        assert transferred == 1
+        assert tube_barcodes(session) == {sample_one.id: "NT1", sample_two.id: sample_two.tube_barcode}
+
+    def test_tube_transfer_batch_bad_format(self, database_layer, sample_one):
+        with pytest.raises(TubeBarcodeBadFormat):
+            database_layer.tube_transfer_batch([(sample_one.tube_barcode, "999")])
+
+    def test_tube_transfer_batch_not_existing_source_tube(self, database_layer, session, sample_one):
+        with pytest.raises(TubeNotFound):
+            database_layer.tube_transfer_batch([(sample_one.tube_barcode, "NT1"), ("NT100000", "NT2")])
+
+        assert tube_barcodes(session) == {sample_one.id: sample_one.tube_barcode}
+
+    def test_tube_transfer_batch_occupied_destination_tube(self, database_layer, sample_one, sample_two):
+        with pytest.raises(OccupiedDestinationTube):
+            database_layer.tube_transfer_batch([(sample_one.tube_barcode, sample_two.tube_barcode)])
+
+    def test_tube_transfer_batch_duplicate_source(self, database_layer, sample_one):
+        with pytest.raises(ConflictingTubeTransfers):
+            database_layer.tube_transfer_batch([(sample_one.tube_barcode, "NT1"), (sample_one.tube_barcode, "NT2")])
+
+    def test_tube_transfer_batch_duplicate_destination(self, database_layer, sample_one, sample_two):
+        with pytest.raises(ConflictingTubeTransfers):
+            database_layer.tube_transfer_batch([(sample_one.tube_barcode, "NT1"), (sample_two.tube_barcode, "NT1")])
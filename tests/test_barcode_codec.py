@@ -0,0 +1,54 @@
+import pytest
+
+from barcode_codec import Barcode, tube_barcode_codec, plate_barcode_codec
+from exceptions import TubeBarcodeBadFormat, PlateBarcodeBadFormat
+
+
+class TestBarcodeCodec:
+
+    def test_parse_tube_barcode(self):
+        barcode = tube_barcode_codec.parse("NT00042")
+
+        assert barcode.prefix == "NT"
+        assert barcode.number == 42
+        assert barcode.width == 5
+        assert str(barcode) == "NT00042"
+
+    def test_parse_plate_barcode(self):
+        assert plate_barcode_codec.parse("DN7") == Barcode(prefix="DN", number=7, width=1)
+
+    def test_barcodes_with_leading_zeros_differ(self):
+        assert tube_barcode_codec.parse("NT1") != tube_barcode_codec.parse("NT01")
+        assert tube_barcode_codec.number("NT1") == tube_barcode_codec.number("NT01")
+
+    def test_barcodes_ordering(self):
+        barcodes = [tube_barcode_codec.parse(barcode) for barcode in ("NT10", "NT9", "NT100")]
+
+        assert [str(barcode) for barcode in sorted(barcodes)] == ["NT9", "NT10", "NT100"]
+
+    def test_barcode_has_no_dict(self):
+        with pytest.raises(AttributeError):
+            tube_barcode_codec.parse("NT1").extra = 1
+
+    def test_parse_tube_barcode_bad_format(self):
+        with pytest.raises(TubeBarcodeBadFormat):
+            tube_barcode_codec.parse("DN1")
+
+    def test_parse_plate_barcode_bad_format(self):
+        with pytest.raises(PlateBarcodeBadFormat):
+            plate_barcode_codec.parse("DN")
+
+    def test_validate(self):
+        assert tube_barcode_codec.validate("NT1")
+        assert not tube_barcode_codec.validate("NT")
+        assert not tube_barcode_codec.validate("NT-1")
+        assert not tube_barcode_codec.validate("NT1a")
+        assert not tube_barcode_codec.validate("NT²")
+        assert not tube_barcode_codec.validate("1NT")
+
+    def test_number(self):
+        assert tube_barcode_codec.number("NT1000") == 1000
+        assert tube_barcode_codec.number("TRANSFER-1") is None
+
+    def test_parse_many(self):
+        assert tube_barcode_codec.parse_many(["NT1", "bad"]) == [Barcode(prefix="NT", number=1, width=1), None]
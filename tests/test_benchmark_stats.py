@@ -0,0 +1,43 @@
+import pytest
+
+from benchmarks.stats import percentile, summarize, find_regressions
+
+
+def result(operation, p95_ms, p99_ms, throughput_per_second):
+    return {"backend": "sqlite", "scale": "10k", "operation": operation, "p95_ms": p95_ms, "p99_ms": p99_ms,
+            "throughput_per_second": throughput_per_second}
+
+
+class TestBenchmarkStats:
+
+    def test_percentile(self):
+        values = [5.0, 1.0, 3.0, 2.0, 4.0]
+
+        assert percentile(values, 0) == 1.0
+        assert percentile(values, 50) == 3.0
+        assert percentile(values, 100) == 5.0
+        assert percentile(values, 95) == pytest.approx(4.8)
+
+    def test_percentile_empty(self):
+        with pytest.raises(ValueError):
+            percentile([], 50)
+
+    def test_summarize(self):
+        summary = summarize([0.001] * 99 + [0.1], elapsed_seconds=0.199)
+
+        assert summary["count"] == 100
+        assert summary["throughput_per_second"] == pytest.approx(502.5, rel=1e-3)
+        assert summary["p50_ms"] == pytest.approx(1.0)
+        assert summary["p99_ms"] == pytest.approx(1.99)
+
+    def test_find_regressions(self):
+        baseline = [result("record_receipt", 2.0, 3.0, 500.0), result("add_to_plate", 5.0, 9.0, 200.0)]
+        results = [result("record_receipt", 2.3, 3.0, 450.0), result("add_to_plate", 5.0, 12.0, 150.0),
+                   result("tube_transfer", 100.0, 100.0, 1.0)]
+
+        regressions = find_regressions(results, baseline, threshold=0.2)
+
+        assert [(regression.key, regression.metric) for regression in regressions] == [
+            ("sqlite/10k/add_to_plate", "p99_ms"),
+            ("sqlite/10k/add_to_plate", "throughput_per_second"),
+        ]
@@ -0,0 +1,41 @@
+import io
+
+from command_journal import CommandJournal, JournalEntry, read_journal, SUCCESS, ERROR
+
+
+class TestCommandJournal:
+
+    def test_record_and_read(self, tmp_path):
+        path = tmp_path / "journal.jsonl"
+        entries = [
+            JournalEntry("2023-12-01T10:00:00+00:00", "record_receipt 'Test sample' NT1", "record_receipt", 1.5,
+                         SUCCESS, None),
+            JournalEntry("2023-12-01T10:00:01+00:00", "record_receipt 'Test sample' NT1", "record_receipt", 0.5,
+                         ERROR, "SampleAlreadyReceived"),
+        ]
+
+        journal = CommandJournal.open(str(path))
+        for entry in entries:
+            journal.record(entry)
+        journal.close()
+
+        assert list(read_journal(str(path))) == entries
+        assert (entries[1].started_at - entries[0].started_at).total_seconds() == 1
+
+    def test_journal_appends(self, tmp_path):
+        path = tmp_path / "journal.jsonl"
+        entry = JournalEntry("2023-12-01T10:00:00+00:00", "help", "help", 1.0, SUCCESS, None)
+
+        for _ in range(2):
+            journal = CommandJournal.open(str(path))
+            journal.record(entry)
+            journal.close()
+
+        assert len(list(read_journal(str(path)))) == 2
+
+    def test_record_writes_one_line(self):
+        stream = io.StringIO()
+
+        CommandJournal(stream).record(JournalEntry("2023-12-01T10:00:00+00:00", "help", "help", 1.0, SUCCESS, None))
+
+        assert stream.getvalue().count("\n") == 1
@@ -0,0 +1,98 @@
+import pytest
+
+from exceptions import UnsupportedFileFormat, FileColumnMissing, FileRowMalformed
+from file_formats import read_rows, write_rows
+
+
+class TestReadRows:
+
+    def test_read_csv_rows(self, tmp_path):
+        path = tmp_path / "manifest.csv"
+        path.write_text("tube_barcode,customer_sample_name\nNT1,first\nNT2,second\n")
+
+        rows = list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+        assert rows == [("first", "NT1"), ("second", "NT2")]
+
+    def test_read_jsonl_rows(self, tmp_path):
+        path = tmp_path / "manifest.jsonl"
+        path.write_text('{"customer_sample_name": "first", "tube_barcode": "NT1"}\n\n'
+                        '{"customer_sample_name": 123, "tube_barcode": "NT2"}\n')
+
+        rows = list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+        assert rows == [("first", "NT1"), ("123", "NT2")]
+
+    def test_read_rows_unsupported_format(self, tmp_path):
+        with pytest.raises(UnsupportedFileFormat):
+            read_rows(str(tmp_path / "manifest.xlsx"), columns=("tube_barcode",))
+
+    def test_read_csv_rows_missing_column(self, tmp_path):
+        path = tmp_path / "manifest.csv"
+        path.write_text("tube_barcode\nNT1\n")
+
+        with pytest.raises(FileColumnMissing):
+            list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+    def test_read_jsonl_rows_missing_column(self, tmp_path):
+        path = tmp_path / "manifest.jsonl"
+        path.write_text('{"tube_barcode": "NT1"}\n')
+
+        with pytest.raises(FileColumnMissing):
+            list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+    def test_read_csv_short_row(self, tmp_path):
+        path = tmp_path / "manifest.csv"
+        path.write_text("customer_sample_name,tube_barcode\nfirst\n")
+
+        rows = list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+        assert rows == [("first", None)]
+
+    def test_read_jsonl_null_value(self, tmp_path):
+        path = tmp_path / "manifest.jsonl"
+        path.write_text('{"customer_sample_name": "first", "tube_barcode": null}\n')
+
+        rows = list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+        assert rows == [("first", None)]
+
+    @pytest.mark.parametrize("line", ['{"customer_sample_name": "first",', '["first", "NT1"]'])
+    def test_read_jsonl_malformed_line(self, tmp_path, line):
+        path = tmp_path / "manifest.jsonl"
+        path.write_text('{"customer_sample_name": "first", "tube_barcode": "NT1"}\n' + line + "\n")
+
+        with pytest.raises(FileRowMalformed, match="line 2"):
+            list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+    def test_read_csv_not_utf8(self, tmp_path):
+        path = tmp_path / "manifest.csv"
+        path.write_bytes(b"customer_sample_name,tube_barcode\n\xff\xfe,NT1\n")
+
+        with pytest.raises(FileRowMalformed):
+            list(read_rows(str(path), columns=("customer_sample_name", "tube_barcode")))
+
+
+class TestWriteRows:
+
+    def test_write_csv_rows(self, tmp_path):
+        path = tmp_path / "export.csv"
+
+        rows_count = write_rows(str(path), ("sample_id", "plate_barcode"), iter([(1, "DN1"), (2, None)]))
+
+        assert rows_count == 2
+        assert path.read_text().splitlines() == ["sample_id,plate_barcode", "1,DN1", "2,"]
+
+    def test_write_jsonl_rows(self, tmp_path):
+        path = tmp_path / "export.jsonl"
+
+        rows_count = write_rows(str(path), ("sample_id", "plate_barcode"), iter([(1, "DN1"), (2, None)]))
+
+        assert rows_count == 2
+        assert path.read_text() == ('{"sample_id": 1, "plate_barcode": "DN1"}\n'
+                                    '{"sample_id": 2, "plate_barcode": null}\n')
+
+    def test_write_rows_unsupported_format(self, tmp_path):
+        with pytest.raises(UnsupportedFileFormat):
+            write_rows(str(tmp_path / "export.xlsx"), ("sample_id",), [])
+        assert not (tmp_path / "export.xlsx").exists()
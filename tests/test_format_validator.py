@@ -18,6 +18,10 @@ class TestFormatValidator:
     def test_tube_barcode_validator_no_number_id(self):
         assert not tube_barcode_validator.validate("NT")
 
+    @pytest.mark.parametrize("barcode", ["NT1\n", "NT\u0661", "NT\uff11", " NT1"])
+    def test_tube_barcode_validator_only_ascii_digits_to_end(self, barcode):
+        assert not tube_barcode_validator.validate(barcode)
+
     def test_plate_barcode_validator(self):
         assert plate_barcode_validator.validate("DN1")
         assert plate_barcode_validator.validate("DN10000")
@@ -32,6 +36,12 @@ class TestFormatValidator:
         assert well_position_validator.validate("A12")
         assert well_position_validator.validate("H12")
 
+    def test_plate_and_well_validators_only_ascii_digits_to_end(self):
+        assert not plate_barcode_validator.validate("DN1\n")
+        assert not plate_barcode_validator.validate("DN\u0661")
+        assert not well_position_validator.validate("A1\n")
+        assert not well_position_validator.validate("A\u0661")
+
     def test_well_position_validator_no_number_id(self):
         assert not well_position_validator.validate("A")
 
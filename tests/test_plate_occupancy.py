@@ -0,0 +1,48 @@
+import pytest
+
+from plate_occupancy import FULL_PLATE_MASK, ROW_MAJOR, COLUMN_MAJOR, well_bit, is_occupied, occupy, \
+    occupied_count, mask_from_positions, next_free_well, free_wells
+
+
+class TestPlateOccupancy:
+
+    def test_well_bit(self):
+        assert well_bit(1, 1) == 1
+        assert well_bit(1, 2) == 2
+        assert well_bit(2, 1) == 1 << 12
+        assert well_bit(8, 12) == 1 << 95
+
+    def test_occupy(self):
+        mask = occupy(0, 2, 3)
+
+        assert is_occupied(mask, 2, 3)
+        assert not is_occupied(mask, 3, 2)
+        assert occupied_count(mask) == 1
+
+    def test_mask_from_positions(self):
+        assert mask_from_positions([(1, 1), (8, 12)]) == well_bit(1, 1) | well_bit(8, 12)
+        assert occupied_count(FULL_PLATE_MASK) == 96
+
+    def test_next_free_well_row_major(self):
+        assert next_free_well(0, ROW_MAJOR) == (1, 1)
+        assert next_free_well(mask_from_positions([(1, 1), (1, 2)]), ROW_MAJOR) == (1, 3)
+        assert next_free_well(mask_from_positions([(1, col) for col in range(1, 13)]), ROW_MAJOR) == (2, 1)
+
+    def test_next_free_well_column_major(self):
+        assert next_free_well(0, COLUMN_MAJOR) == (1, 1)
+        assert next_free_well(mask_from_positions([(1, 1), (2, 1)]), COLUMN_MAJOR) == (3, 1)
+        assert next_free_well(mask_from_positions([(row, 1) for row in range(1, 9)]), COLUMN_MAJOR) == (1, 2)
+
+    def test_next_free_well_full_plate(self):
+        assert next_free_well(FULL_PLATE_MASK, ROW_MAJOR) is None
+        assert next_free_well(FULL_PLATE_MASK, COLUMN_MAJOR) is None
+
+    def test_free_wells(self):
+        mask = FULL_PLATE_MASK & ~well_bit(3, 4) & ~well_bit(2, 5)
+
+        assert list(free_wells(mask, ROW_MAJOR)) == [(2, 5), (3, 4)]
+        assert list(free_wells(mask, COLUMN_MAJOR)) == [(3, 4), (2, 5)]
+
+    def test_free_wells_unknown_order(self):
+        with pytest.raises(ValueError):
+            list(free_wells(0, "diagonal"))
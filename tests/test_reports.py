@@ -0,0 +1,105 @@
+import datetime
+import io
+import json
+
+import pytest
+
+from exceptions import UnsupportedReportFormat
+from reports import PlateReport, PlateWell, TubeReport, BulkReceiptReport, SampleLocation, WellLocation, \
+    CustodyEvent, CustodyHistory, write_report, print_report, BulkReceiptReportFormatter, RowRejection
+
+
+@pytest.fixture(scope="function")
+def plate_report():
+    yield PlateReport(plate_barcode="DN1", wells=[PlateWell("A1", 1, 1, 7, "first"),
+                                                   PlateWell("H12", 8, 12, 123, "second")])
+
+
+def written_report(report, report_format):
+    stream = io.StringIO()
+    write_report(report, stream, report_format)
+    return stream.getvalue()
+
+
+class TestWriteReport:
+
+    def test_text_plate_report(self, plate_report):
+        output = written_report(plate_report, "text")
+
+        assert output == print_report(plate_report)
+        assert "Plate: DN1" in output
+        assert "Well position: H12" in output
+        assert "Customer Sample Name: second" in output
+
+    def test_grid_plate_report(self, plate_report):
+        lines = written_report(plate_report, "grid").splitlines()
+
+        assert lines[0] == "Plate: DN1"
+        assert lines[1] == "    1   2   3   4   5   6   7   8   9  10  11  12"
+        assert lines[2] == "A   7   .   .   .   .   .   .   .   .   .   .   ."
+        assert lines[9] == "H   .   .   .   .   .   .   .   .   .   .   . 123"
+        assert len(lines) == 10
+
+    def test_json_plate_report(self, plate_report):
+        assert json.loads(written_report(plate_report, "json")) == {
+            "plate_barcode": "DN1",
+            "wells": [
+                {"well_position": "A1", "sample_id": 7, "customer_sample_name": "first"},
+                {"well_position": "H12", "sample_id": 123, "customer_sample_name": "second"},
+            ]
+        }
+
+    def test_csv_plate_report(self, plate_report):
+        assert written_report(plate_report, "csv").splitlines() == [
+            "plate_barcode,well_position,sample_id,customer_sample_name",
+            "DN1,A1,7,first",
+            "DN1,H12,123,second",
+        ]
+
+    def test_csv_tube_report(self):
+        tube_report = TubeReport(tube_barcode="NT1", sample_id=7, customer_sample_name="first, second")
+
+        assert written_report(tube_report, "csv").splitlines() == [
+            "tube_barcode,sample_id,customer_sample_name",
+            'NT1,7,"first, second"',
+        ]
+
+    def test_unsupported_format(self):
+        with pytest.raises(UnsupportedReportFormat):
+            written_report(TubeReport(tube_barcode="NT1", sample_id=7, customer_sample_name="first"), "grid")
+
+        with pytest.raises(UnsupportedReportFormat):
+            written_report(BulkReceiptReport(sample_ids={}, rejections=[]), "csv")
+
+    def test_format_collects_written_report(self):
+        report = BulkReceiptReport(sample_ids={"NT1": 1}, rejections=[
+            RowRejection(2, "bad", UnsupportedReportFormat(report_format="x", report_name="y"))
+        ])
+
+        assert BulkReceiptReportFormatter.format(report) == written_report(report, "text") == print_report(report)
+        assert "Row 2 (bad)" in print_report(report)
+
+    def test_json_sample_location(self):
+        location = SampleLocation(sample_id=7, customer_sample_name="first", tube_barcode="NT1",
+                                  wells=[WellLocation("DN1", "A1")])
+
+        assert json.loads(written_report(location, "json")) == {
+            "sample_id": 7, "customer_sample_name": "first", "tube_barcode": "NT1",
+            "wells": [{"plate_barcode": "DN1", "well_position": "A1"}]
+        }
+        assert "Plate DN1, well A1" in written_report(location, "text")
+
+    def test_custody_history(self):
+        occurred_at = datetime.datetime(2026, 10, 13, 9, 0, tzinfo=datetime.timezone.utc)
+        history = CustodyHistory(subject=7, events=[
+            CustodyEvent(occurred_at, "transferred", 7, "NT2", "NT1", None, None),
+            CustodyEvent(occurred_at, "plated", 7, None, None, "DN1", "A1"),
+        ])
+
+        assert json.loads(written_report(history, "json"))["events"][0] == {
+            "occurred_at": "2026-10-13T09:00:00+00:00", "event_type": "transferred", "sample_id": 7,
+            "tube_barcode": "NT2", "source_tube_barcode": "NT1", "plate_barcode": None, "well_position": None
+        }
+        text = written_report(history, "text")
+        assert "2026-10-13T09:00:00+00:00 transferred: sample 7, tube NT1 -> NT2" in text
+        assert "plated: sample 7, plate DN1, well A1" in text
@@ -0,0 +1,147 @@
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from database.transactions import TransactionRunner, ContentionCounters, classify_contention_error, \
+    format_contention_prometheus, transactional, SERIALIZATION_FAILURE, DEADLOCK, LOCK_NOT_AVAILABLE
+from exceptions import TransactionContention
+
+
+class DriverError(Exception):
+    def __init__(self, pgcode=None, sqlite_errorcode=None):
+        super().__init__(pgcode or sqlite_errorcode)
+        if pgcode is not None:
+            self.pgcode = pgcode
+        if sqlite_errorcode is not None:
+            self.sqlite_errorcode = sqlite_errorcode
+
+
+def operational_error(**codes):
+    return OperationalError("UPDATE samples", {}, DriverError(**codes))
+
+
+class FailingOperation:
+    """Raises given errors on first calls, then returns "done" """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "done"
+
+
+@pytest.fixture(scope="function")
+def delays():
+    return []
+
+
+@pytest.fixture(scope="function")
+def runner(delays):
+    return TransactionRunner(max_attempts=3, backoff_seconds=0.01, max_backoff_seconds=0.015, sleep=delays.append,
+                             random_fraction=lambda: 1.0)
+
+
+class TestClassifyContentionError:
+
+    def test_postgresql_codes(self):
+        assert classify_contention_error(operational_error(pgcode="40001")) == SERIALIZATION_FAILURE
+        assert classify_contention_error(operational_error(pgcode="40P01")) == DEADLOCK
+        assert classify_contention_error(operational_error(pgcode="55P03")) == LOCK_NOT_AVAILABLE
+
+    def test_sqlite_busy(self):
+        assert classify_contention_error(operational_error(sqlite_errorcode=5)) == LOCK_NOT_AVAILABLE
+
+    def test_other_errors(self):
+        assert classify_contention_error(IntegrityError("INSERT", {}, DriverError(pgcode="23505"))) is None
+        assert classify_contention_error(operational_error()) is None
+        assert classify_contention_error(ValueError()) is None
+
+
+class TestTransactionRunner:
+
+    def test_success(self, runner, delays):
+        assert runner.run(Session(), FailingOperation()) == "done"
+
+        assert delays == []
+        assert runner.counters.snapshot()["transactions"] == 1
+
+    def test_retries_contention_errors(self, runner, delays):
+        operation = FailingOperation(operational_error(pgcode="40P01"), operational_error(pgcode="40001"))
+
+        assert runner.run(Session(), operation) == "done"
+
+        assert operation.calls == 3
+        # Exponential backoff capped by max_backoff_seconds
+        assert delays == [0.01, 0.015]
+        counters = runner.counters.snapshot()
+        assert (counters["transactions"], counters["retries"], counters["exhausted"]) == (1, 2, 0)
+        assert (counters["deadlocks"], counters["serialization_failures"]) == (1, 1)
+        assert counters["backoff_seconds"] == pytest.approx(0.025)
+
+    def test_exhausted(self, runner, delays):
+        operation = FailingOperation(*[operational_error(pgcode="55P03")] * 3)
+
+        with pytest.raises(TransactionContention):
+            runner.run(Session(), operation, operation_name="tube_transfer")
+
+        assert operation.calls == 3
+        assert len(delays) == 2
+        assert runner.counters.snapshot()["exhausted"] == 1
+        assert runner.counters.snapshot()["lock_timeouts"] == 3
+
+    def test_other_errors_are_not_retried(self, runner):
+        operation = FailingOperation(IntegrityError("INSERT", {}, DriverError(pgcode="23505")))
+
+        with pytest.raises(IntegrityError):
+            runner.run(Session(), operation)
+
+        assert operation.calls == 1
+        assert runner.counters.snapshot()["retries"] == 0
+
+    def test_nested_runs_are_retried_by_outer_run(self, runner):
+        session = Session()
+        inner_operation = FailingOperation(operational_error(pgcode="40P01"))
+
+        assert runner.run(session, lambda: runner.run(session, inner_operation)) == "done"
+
+        assert inner_operation.calls == 2
+        assert runner.counters.snapshot()["transactions"] == 1
+
+    def test_jitter(self):
+        runner = TransactionRunner(backoff_seconds=0.01, max_backoff_seconds=1, random_fraction=lambda: 0.5)
+
+        assert runner.backoff(1) == pytest.approx(0.005)
+        assert runner.backoff(3) == pytest.approx(0.02)
+
+
+class TestTransactional:
+
+    def test_method_is_run_by_runner(self, runner, delays):
+        class Layer:
+            def __init__(self):
+                self.session = Session()
+                self.transaction_runner = runner
+                self.operation = FailingOperation(operational_error(pgcode="40001"))
+
+            @transactional
+            def write(self, suffix):
+                return self.operation() + suffix
+
+        layer = Layer()
+
+        assert layer.write("!") == "done!"
+        assert layer.operation.calls == 2
+
+
+def test_format_contention_prometheus():
+    counters = ContentionCounters()
+    counters.increment("deadlocks", 2)
+
+    text = format_contention_prometheus(counters)
+
+    assert "# TYPE sample_tracking_deadlocks_total counter\nsample_tracking_deadlocks_total 2\n" in text
+    assert "sample_tracking_transaction_retries_total 0\n" in text